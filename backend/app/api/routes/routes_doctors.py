@@ -3,11 +3,14 @@ Doctor Search and Management Routes
 """
 from fastapi import APIRouter, HTTPException, Query
 from pydantic import BaseModel
-import pandas as pd
 import logging
 from typing import List, Optional
 import os
 
+from app.core.lazy_imports import lazy_import
+
+pd = lazy_import("pandas")
+
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/doctors", tags=["Doctors"])
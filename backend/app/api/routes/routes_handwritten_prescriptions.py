@@ -4,6 +4,7 @@ Hybrid OCR + CNN + LLM Pipeline
 """
 
 from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, status
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from typing import Optional
 import logging
@@ -12,14 +13,39 @@ from app.core.database import get_db
 from app.core.middleware import get_current_user
 from app.models.models import User
 from app.core.rls_context import get_db_with_rls
-from app.services.handwritten_prescription_analyzer import HybridHandwrittenPrescriptionAnalyzer
+from app.core.result_cache import results
+from app.core.single_flight import digest_key, flights
+from app.core.uploads import receive_upload
+from app.services.llm_scheduler import LLMOverloadedError
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/handwritten-prescriptions", tags=["Handwritten Prescriptions"])
 
-# Initialize analyzer
-analyzer = HybridHandwrittenPrescriptionAnalyzer()
+# Analyzer (and its OCR models) is created on first request, not at import
+_analyzer = None
+
+
+def get_analyzer():
+    """Get or create the shared HybridHandwrittenPrescriptionAnalyzer"""
+    global _analyzer
+    if _analyzer is None:
+        from app.services.handwritten_prescription_analyzer import HybridHandwrittenPrescriptionAnalyzer
+        _analyzer = HybridHandwrittenPrescriptionAnalyzer()
+    return _analyzer
+
+
+def _analyze_upload(upload, filename: str):
+    """Analyze an upload (blocking): the analyzer and the upload's file are only created in the worker thread"""
+    return get_analyzer().analyze_upload(upload.path, filename)
+
+
+def _compare_methods(upload):
+    """Preprocess an upload and run every OCR method on it (blocking)"""
+    preprocessed = get_analyzer().preprocessor.preprocess_for_ocr(upload.path)
+
+    from app.services.handwritten_prescription_ocr import MultiMethodHandwrittenOCR
+    return MultiMethodHandwrittenOCR().extract_text_multimethod(preprocessed)
 
 
 @router.post("/analyze")
@@ -48,23 +74,8 @@ async def analyze_handwritten_prescription(
     - structured_data: Complete parsed prescription
     """
     db = get_db_with_rls(db, user.id)
+    upload = None
     try:
-        # Read file content
-        content = await file.read()
-
-        if not content:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Empty file"
-            )
-
-        # Check file size (max 10 MB)
-        if len(content) > 10 * 1024 * 1024:
-            raise HTTPException(
-                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-                detail="File too large. Maximum 10 MB allowed."
-            )
-
         # Validate file type
         filename = file.filename.lower()
         allowed_extensions = ['.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.tif']
@@ -74,10 +85,30 @@ async def analyze_handwritten_prescription(
                 detail=f"Unsupported file format. Allowed: {', '.join(allowed_extensions)}"
             )
 
+        # Stream the upload (max 10 MB, image content only)
+        upload = await receive_upload(file, formats={"jpeg", "png", "bmp", "tiff"})
+
+        if not upload.size:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Empty file"
+            )
+
         logger.info(f"Analyzing handwritten prescription from user {user.id}: {filename}")
 
-        # Analyze prescription
-        result = analyzer.analyze_from_bytes(content, filename)
+        # Analyze prescription (repeat uploads by this user are served from cache)
+        result = await run_in_threadpool(
+            results.cached,
+            "handwritten_prescription",
+            user.id,
+            upload.data,
+            flights.do,
+            digest_key("handwritten_prescription", upload.digest),
+            _analyze_upload,
+            upload,
+            filename,
+            digest=upload.digest,
+        )
 
         # Add user information to result
         result['user_id'] = user.id
@@ -87,12 +118,17 @@ async def analyze_handwritten_prescription(
 
     except HTTPException:
         raise
+    except LLMOverloadedError:
+        raise
     except Exception as e:
         logger.error(f"Error analyzing prescription: {e}", exc_info=True)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to analyze prescription: {str(e)}"
         )
+    finally:
+        if upload:
+            upload.close()
 
 
 @router.get("/service-info")
@@ -240,57 +276,42 @@ async def compare_ocr_methods(
     - Merged result with voting
     - Confidence comparison
     """
+    upload = None
     try:
-        content = await file.read()
+        upload = await receive_upload(file)
 
-        if not content:
+        if not upload.size:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Empty file"
             )
 
-        # Save to temp file
-        import tempfile
-        import os
-        import cv2
+        # Preprocess and extract with each method, off the event loop
+        result = await run_in_threadpool(_compare_methods, upload)
 
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as tmp:
-            tmp.write(content)
-            temp_path = tmp.name
-
-        try:
-            # Preprocess image
-            preprocessed = analyzer.preprocessor.preprocess_for_ocr(temp_path)
-
-            # Extract with each method
-            from app.services.handwritten_prescription_ocr import MultiMethodHandwrittenOCR
-            ocr = MultiMethodHandwrittenOCR()
-
-            # Get detailed results
-            result = ocr.extract_text_multimethod(preprocessed)
-
-            return {
-                "user_id": user.id,
-                "filename": file.filename,
-                "methods_comparison": result['detailed_results'],
-                "merged_result": {
-                    "text": result['text'],
-                    "confidence": result['confidence'],
-                    "quality_score": result['quality_score'],
-                    "best_method": result['detailed_results'].get('best_method')
-                }
+        return {
+            "user_id": user.id,
+            "filename": file.filename,
+            "methods_comparison": result['detailed_results'],
+            "merged_result": {
+                "text": result['text'],
+                "confidence": result['confidence'],
+                "quality_score": result['quality_score'],
+                "best_method": result['detailed_results'].get('best_method')
             }
+        }
 
-        finally:
-            if os.path.exists(temp_path):
-                os.unlink(temp_path)
-
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in method comparison: {e}", exc_info=True)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to compare methods: {str(e)}"
         )
+    finally:
+        if upload:
+            upload.close()
 
 
 @router.get("/health")
@@ -4,12 +4,15 @@ Separate endpoint from handwritten prescription analysis
 """
 
 from fastapi import APIRouter, File, UploadFile, HTTPException, status, Depends
+from starlette.concurrency import run_in_threadpool
 from typing import Dict, Any
 import logging
-import tempfile
-import cv2
 
 from app.core.middleware import get_current_user_optional
+from app.core.result_cache import results
+from app.core.single_flight import digest_key, flights
+from app.core.uploads import receive_upload
+from app.services.llm_scheduler import LLMOverloadedError
 from app.models.models import User
 
 logger = logging.getLogger(__name__)
@@ -18,6 +21,7 @@ router = APIRouter(prefix="/api/hospital-reports", tags=["Hospital Reports"])
 
 # File upload constraints
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
+ALLOWED_FORMATS = {'jpeg', 'png', 'webp', 'bmp', 'tiff', 'pdf'}
 ALLOWED_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.bmp', '.tiff', '.pdf'}
 
 
@@ -49,7 +53,7 @@ async def analyze_hospital_report(
     Returns:
         Structured hospital report data with all extracted fields
     """
-    temp_file_path = None
+    upload = None
     
     try:
         # Log request
@@ -64,45 +68,40 @@ async def analyze_hospital_report(
                 detail=f"File type not allowed. Allowed: {', '.join(ALLOWED_EXTENSIONS)}"
             )
         
-        # Read file content
-        file_content = await file.read()
-        file_size = len(file_content)
+        # Stream the upload, rejecting oversized or non-image content early
+        upload = await receive_upload(file, formats=ALLOWED_FORMATS, max_size=MAX_FILE_SIZE)
         
-        # Validate file size
-        if file_size > MAX_FILE_SIZE:
-            raise HTTPException(
-                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-                detail=f"File too large. Max: {MAX_FILE_SIZE / 1024 / 1024}MB"
-            )
-        
-        if file_size < 1000:
+        if upload.size < 1000:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="File too small. Please upload a complete hospital report image"
             )
         
-        # Save temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.tmp') as tmp:
-            tmp.write(file_content)
-            temp_file_path = tmp.name
-        
-        logger.debug(f"Temporary file saved: {temp_file_path}")
-        
         # Verify it's a valid image
-        image = cv2.imread(temp_file_path)
-        if image is None:
+        if not upload.is_image():
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Invalid image file. Please upload a valid image"
             )
         
-        logger.debug(f"Image validated. Size: {image.shape}")
+        logger.debug(f"Image validated. Format: {upload.format}, {upload.size} bytes")
         
         # Run hospital report analysis
         logger.info("🏥 Starting hospital report analysis pipeline...")
         from app.services.hospital_report_analyzer import HospitalReportAnalyzer
         
-        result = HospitalReportAnalyzer.analyze_hospital_report(temp_file_path)
+        # Identical uploads in flight share one analysis; the user's repeat uploads are served from cache
+        result = await run_in_threadpool(
+            results.cached,
+            "hospital_report",
+            user.id if user else None,
+            upload.data,
+            flights.do,
+            digest_key("hospital_report", upload.digest),
+            # The upload's file is written in the worker thread, and not at all for cached results
+            lambda: HospitalReportAnalyzer.analyze_hospital_report(upload.path),
+            digest=upload.digest,
+        )
         
         # Add user context
         if user and user.id != 0:
@@ -125,6 +124,8 @@ async def analyze_hospital_report(
     except HTTPException as http_err:
         logger.error(f"HTTP Error: {http_err.detail}")
         raise
+    except LLMOverloadedError:
+        raise
     except Exception as err:
         logger.error(f"❌ Error analyzing hospital report: {str(err)}", exc_info=True)
         raise HTTPException(
@@ -132,15 +133,9 @@ async def analyze_hospital_report(
             detail=f"Hospital report analysis failed: {str(err)}"
         )
     finally:
-        # Clean up temporary file
-        if temp_file_path:
-            import os
-            try:
-                if os.path.exists(temp_file_path):
-                    os.unlink(temp_file_path)
-                    logger.debug(f"Temporary file cleaned up: {temp_file_path}")
-            except Exception as cleanup_err:
-                logger.warning(f"Failed to clean up temporary file: {cleanup_err}")
+        # Release the upload buffer / spooled file
+        if upload:
+            upload.close()
 
 
 @router.get("/info")
@@ -163,11 +158,8 @@ async def health_check():
     Returns:
         Service status and available OCR engines
     """
-    try:
-        import pytesseract
-        tesseract_available = True
-    except:
-        tesseract_available = False
+    from app.services import tesseract_pool
+    tesseract_available = tesseract_pool.is_available()
     
     try:
         import easyocr
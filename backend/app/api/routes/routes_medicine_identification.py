@@ -4,25 +4,23 @@ API routes for medicine identification from images
 from fastapi import APIRouter, File, UploadFile, HTTPException, status, Depends
 from fastapi.responses import JSONResponse
 import logging
-import os
-import tempfile
 import shutil
 from typing import Optional
 from sqlalchemy.orm import Session
-import cv2
-import numpy as np
 
 from app.core.database import get_db
 from app.core.middleware import get_current_user, get_current_user_optional
 from app.core.rls_context import get_db_with_rls
-from app.services.medicine_ocr_service import process_medicine_image
+from app.core.uploads import receive_upload
 from app.models.models import Prescription, MedicineHistory
+from app.services.llm_scheduler import LLMOverloadedError
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/medicine-identification", tags=["medicine-identification"])
 
 ALLOWED_EXTENSIONS = {'jpg', 'jpeg', 'png', 'webp', 'bmp', 'tiff'}
+ALLOWED_FORMATS = {'jpeg', 'png', 'webp', 'bmp', 'tiff'}
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
 
 
@@ -48,7 +46,7 @@ async def analyze_medicine_image(
     
     Returns medicine details: dosage, precautions, food interaction, age restrictions, etc.
     """
-    temp_file_path = None
+    upload = None
     
     logger.info(f"📥 Received medicine identification request from user: {user_id}")
     logger.info(f"📄 File: {file.filename}, Type: {file.content_type}, Size: {file.size}")
@@ -67,31 +65,17 @@ async def analyze_medicine_image(
                 detail=f"File type not allowed. Allowed: {', '.join(ALLOWED_EXTENSIONS)}"
             )
         
-        # Check file size
-        file_size = 0
-        file_content = await file.read()
-        file_size = len(file_content)
+        # Stream the upload, rejecting oversized or non-image content early
+        upload = await receive_upload(file, formats=ALLOWED_FORMATS, max_size=MAX_FILE_SIZE)
         
-        if file_size > MAX_FILE_SIZE:
-            raise HTTPException(
-                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-                detail=f"File too large. Max: {MAX_FILE_SIZE / 1024 / 1024}MB"
-            )
-        
-        if file_size < 1000:
+        if upload.size < 1000:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="File too small. Please upload a complete image"
             )
         
-        # Save temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.tmp') as tmp:
-            tmp.write(file_content)
-            temp_file_path = tmp.name
-        
         # Verify it's a valid image
-        image = cv2.imread(temp_file_path)
-        if image is None:
+        if not upload.is_image():
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Invalid image file. Please upload a valid image"
@@ -99,7 +83,10 @@ async def analyze_medicine_image(
         
         # Process image
         logger.info(f"Processing medicine image for user {user_id}")
-        result = await process_medicine_image(temp_file_path)
+        from app.services.medicine_ocr_service import process_medicine_image
+        result = await process_medicine_image(
+            lambda: upload.path, content=upload.data, user_id=getattr(user_id, "id", user_id), digest=upload.digest
+        )
         
         # Return properly formatted response
         if result.get('success'):
@@ -130,6 +117,7 @@ async def analyze_medicine_image(
                     "success": True,
                     "analysis": result.get('analysis', {}),
                     "ocr_text": result.get('ocr_text', ''),
+                    "pipeline_stages": result.get('pipeline_stages', {}),
                     "message": "Medicine identification successful"
                 }
             )
@@ -142,6 +130,8 @@ async def analyze_medicine_image(
     except HTTPException as e:
         logger.error(f"HTTP Error: {e.detail}")
         raise
+    except LLMOverloadedError:
+        raise
     except Exception as e:
         logger.error(f"Unexpected error: {str(e)}", exc_info=True)
         raise HTTPException(
@@ -149,12 +139,9 @@ async def analyze_medicine_image(
             detail=f"Error processing image: {str(e)}"
         )
     finally:
-        # Cleanup
-        if temp_file_path and os.path.exists(temp_file_path):
-            try:
-                os.remove(temp_file_path)
-            except Exception as e:
-                logger.warning(f"Failed to cleanup temp file: {e}")
+        # Release the upload buffer / spooled file
+        if upload:
+            upload.close()
 
 
 @router.post("/save-to-prescription")
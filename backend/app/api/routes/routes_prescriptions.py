@@ -1,19 +1,24 @@
 from fastapi import APIRouter, Depends, HTTPException, status, File, UploadFile
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from app.core.database import get_db
 from app.core.middleware import get_current_user, get_current_user_optional
 from app.core.rls_context import get_db_with_rls
+from app.core.result_cache import results
+from app.core.single_flight import digest_key, flights
+from app.core.uploads import receive_upload
+from app.services.llm_scheduler import LLMOverloadedError
 from app.models.models import Prescription, User
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 import logging
-import tempfile
-import cv2
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/prescriptions", tags=["prescriptions"])
+# Image analysis (OCR + LLM) is kept off the CRUD router so it can run in the OCR worker role
+analysis_router = APIRouter(prefix="/api/prescriptions", tags=["prescriptions"])
 
 class PrescriptionCreate(BaseModel):
     medicine_name: str
@@ -220,6 +225,7 @@ async def delete_prescription(
 # AI Medicine Identification Section - Prescription Handwriting Analysis
 
 ALLOWED_IMAGE_EXTENSIONS = {'jpg', 'jpeg', 'png', 'webp', 'bmp', 'tiff'}
+ALLOWED_IMAGE_FORMATS = {'jpeg', 'png', 'webp', 'bmp', 'tiff'}
 MAX_IMAGE_FILE_SIZE = 10 * 1024 * 1024  # 10MB
 
 
@@ -228,7 +234,7 @@ def allowed_image_file(filename: str) -> bool:
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_IMAGE_EXTENSIONS
 
 
-@router.post("/analyze", response_model=Dict[str, Any])
+@analysis_router.post("/analyze", response_model=Dict[str, Any])
 async def analyze_handwritten_prescription(
     file: UploadFile = File(...),
     user: Optional[User] = Depends(get_current_user_optional),
@@ -245,7 +251,7 @@ async def analyze_handwritten_prescription(
     
     Returns: Structured list of medicines with dosages and frequencies
     """
-    temp_file_path = None
+    upload = None
     
     logger.info(f"📥 Received prescription analysis request from user: {user.id if user else 'anonymous'}")
     logger.info(f"📄 File: {file.filename}, Type: {file.content_type}, Size: {file.size}")
@@ -264,45 +270,40 @@ async def analyze_handwritten_prescription(
                 detail=f"File type not allowed. Allowed: {', '.join(ALLOWED_IMAGE_EXTENSIONS)}"
             )
         
-        # Read and validate file size
-        file_content = await file.read()
-        file_size = len(file_content)
+        # Stream the upload, rejecting oversized or non-image content early
+        upload = await receive_upload(file, formats=ALLOWED_IMAGE_FORMATS, max_size=MAX_IMAGE_FILE_SIZE)
         
-        if file_size > MAX_IMAGE_FILE_SIZE:
-            raise HTTPException(
-                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-                detail=f"File too large. Max: {MAX_IMAGE_FILE_SIZE / 1024 / 1024}MB"
-            )
-        
-        if file_size < 1000:
+        if upload.size < 1000:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="File too small. Please upload a complete prescription image"
             )
         
-        # Save temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.tmp') as tmp:
-            tmp.write(file_content)
-            temp_file_path = tmp.name
-        
-        logger.debug(f"Temporary file saved: {temp_file_path}")
-        
         # Verify it's a valid image
-        image = cv2.imread(temp_file_path)
-        if image is None:
+        if not upload.is_image():
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Invalid image file. Please upload a valid image"
             )
         
-        logger.debug(f"Image validated. Size: {image.shape}")
+        logger.debug(f"Image validated. Format: {upload.format}, {upload.size} bytes")
         
         # Run prescription analysis (line-based OCR + LLM)
         logger.info("🏥 Starting prescription analysis pipeline...")
         from app.services.handwritten_prescription_analyzer import HybridHandwrittenPrescriptionAnalyzer
         
-        analyzer = HybridHandwrittenPrescriptionAnalyzer()
-        result = analyzer.analyze_prescription(temp_file_path)
+        # Identical uploads in flight share one analysis; the user's repeat uploads are served from cache
+        result = await run_in_threadpool(
+            results.cached,
+            "prescription",
+            user.id if user else None,
+            upload.data,
+            flights.do,
+            digest_key("prescription", upload.digest),
+            # The upload's file is written in the worker thread, and not at all for cached results
+            lambda: HybridHandwrittenPrescriptionAnalyzer().analyze_prescription(upload.path),
+            digest=upload.digest,
+        )
         
         # Fail fast on pipeline errors
         if result.get("status") == "error":
@@ -325,6 +326,8 @@ async def analyze_handwritten_prescription(
     except HTTPException as http_err:
         logger.error(f"HTTP Error: {http_err.detail}")
         raise
+    except LLMOverloadedError:
+        raise
     except Exception as err:
         logger.error(f"❌ Error analyzing prescription: {str(err)}", exc_info=True)
         raise HTTPException(
@@ -332,12 +335,6 @@ async def analyze_handwritten_prescription(
             detail=f"Prescription analysis failed: {str(err)}"
         )
     finally:
-        # Clean up temporary file
-        if temp_file_path:
-            import os
-            try:
-                if os.path.exists(temp_file_path):
-                    os.unlink(temp_file_path)
-                    logger.debug(f"Temporary file cleaned up: {temp_file_path}")
-            except Exception as cleanup_err:
-                logger.warning(f"Failed to clean up temporary file: {cleanup_err}")
\ No newline at end of file
+        # Release the upload buffer / spooled file
+        if upload:
+            upload.close()
\ No newline at end of file
@@ -41,12 +41,26 @@ class Settings(BaseSettings):
         "http://0.0.0.0:8000",
     ]
     
+    # Feature routers to register ("all", or comma-separated names from
+    # app.main.FEATURE_ROUTERS, e.g. "auth,dashboard,reminders")
+    ENABLED_FEATURES: str = os.getenv("ENABLED_FEATURES", "all")
+    
+    # Worker role ("all", "api", "ocr", "llm", "tts"); see app/core/worker_roles.py
+    WORKER_ROLE: str = os.getenv("WORKER_ROLE", "all")
+    OCR_WORKER_URL: str = os.getenv("OCR_WORKER_URL", "")
+    LLM_WORKER_URL: str = os.getenv("LLM_WORKER_URL", "")
+    TTS_WORKER_URL: str = os.getenv("TTS_WORKER_URL", "")
+    
     # LLM Configuration
     LLM_PROVIDER: str = os.getenv("LLM_PROVIDER", "ollama")
     OLLAMA_BASE_URL: str = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
     OLLAMA_URL: str = os.getenv("OLLAMA_URL", "http://localhost:11434")  # Alternative naming
     LLM_MODEL: str = os.getenv("LLM_MODEL", "microsoft/phi-4")
     OLLAMA_MODEL: str = os.getenv("OLLAMA_MODEL", "phi4")
+    # How long Ollama keeps the model loaded between requests ("-1" pins it);
+    # OLLAMA_PRELOAD loads it at startup on workers that serve LLM features
+    OLLAMA_KEEP_ALIVE: str = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+    OLLAMA_PRELOAD: bool = os.getenv("OLLAMA_PRELOAD", "true").lower() == "true"
     LLM_TEMPERATURE: float = float(os.getenv("LLM_TEMPERATURE", "0.2"))
     LLM_MAX_TOKENS: int = int(os.getenv("LLM_MAX_TOKENS", "1024"))
     
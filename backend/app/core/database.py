@@ -3,13 +3,20 @@ PostgreSQL Database Configuration - Azure PostgreSQL
 Clean implementation without SQLite fallbacks
 """
 import os
+import hashlib
+import threading
+import time
+from datetime import datetime
 from pathlib import Path
+from typing import Callable, Optional
 from sqlalchemy import create_engine, text, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
 from dotenv import load_dotenv
 import logging
 
+from app.core.metrics import DB_QUERY_SECONDS
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -30,6 +37,14 @@ if not DATABASE_URL.startswith("postgresql://"):
 
 logger.info(f"✅ PostgreSQL connection configured: {DATABASE_URL[:70]}...")
 
+# Startup mode:
+#   "eager" - verify connection and create/verify tables before serving (default)
+#   "lazy"  - serve immediately; a background readiness probe does the checks
+DB_STARTUP_MODE = os.getenv("DB_STARTUP_MODE", "eager").lower()
+
+# Re-run create_all even when the stored schema version matches (dev convenience)
+DB_FORCE_CREATE_ALL = os.getenv("DB_FORCE_CREATE_ALL", os.getenv("DEBUG", "False")).lower() == "true"
+
 # Create PostgreSQL engine
 engine = create_engine(
     DATABASE_URL,
@@ -44,6 +59,28 @@ engine = create_engine(
     }
 )
 
+
+# Statement timings for the sanjeevani_db_query_duration_seconds histogram
+@event.listens_for(engine, "before_cursor_execute")
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_times", []).append(time.perf_counter())
+
+
+@event.listens_for(engine, "after_cursor_execute")
+def _record_query_time(conn, cursor, statement, parameters, context, executemany):
+    start_times = conn.info.get("query_start_times")
+    if start_times:
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "UNKNOWN"
+        DB_QUERY_SECONDS.observe(time.perf_counter() - start_times.pop(), operation=operation)
+
+
+@event.listens_for(engine, "handle_error")
+def _discard_query_timer(exception_context):
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("query_start_times"):
+        conn.info["query_start_times"].pop()
+
+
 # Session factory
 SessionLocal = sessionmaker(
     autocommit=False,
@@ -80,10 +117,50 @@ def verify_connection() -> bool:
         return False
 
 
+def schema_fingerprint() -> str:
+    """
+    Stable hash of the tables/columns registered on Base.metadata.
+    Changes whenever a model gains, loses or retypes a column.
+    """
+    digest = hashlib.sha256()
+    for table in Base.metadata.sorted_tables:
+        digest.update(table.name.encode())
+        for column in table.columns:
+            digest.update(
+                f"|{column.name}:{type(column.type).__name__}:{column.nullable}".encode()
+            )
+        digest.update(b"\n")
+    return digest.hexdigest()[:16]
+
+
+def _get_stored_schema_version(conn) -> Optional[str]:
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_version ("
+        "id INTEGER PRIMARY KEY, "
+        "version VARCHAR(64) NOT NULL, "
+        "applied_at TIMESTAMP NOT NULL DEFAULT now())"
+    ))
+    return conn.execute(text("SELECT version FROM schema_version WHERE id = 1")).scalar()
+
+
+def _store_schema_version(conn, version: str):
+    conn.execute(
+        text(
+            "INSERT INTO schema_version (id, version, applied_at) VALUES (1, :version, now()) "
+            "ON CONFLICT (id) DO UPDATE SET version = EXCLUDED.version, applied_at = EXCLUDED.applied_at"
+        ),
+        {"version": version},
+    )
+
+
 def init_db():
     """
     Initialize database by creating all tables.
     Creates tables based on SQLAlchemy models.
+
+    create_all is skipped when the schema version stored in the database
+    matches the current model fingerprint (set DB_FORCE_CREATE_ALL=true or
+    DEBUG=true to always run it).
     """
     try:
         logger.info("📊 Initializing PostgreSQL database...")
@@ -92,9 +169,22 @@ def init_db():
         if not verify_connection():
             raise ConnectionError("Cannot connect to PostgreSQL database")
         
+        # Register all tables on Base.metadata even if no router imported them
+        from app.models import models  # noqa: F401
+        
+        current_version = schema_fingerprint()
+        with engine.begin() as conn:
+            stored_version = _get_stored_schema_version(conn)
+        
+        if stored_version == current_version and not DB_FORCE_CREATE_ALL:
+            logger.info(f"✅ Schema version {current_version} up to date, skipping create_all")
+            return True
+        
         # Create all tables
         Base.metadata.create_all(bind=engine)
-        logger.info("✅ All database tables created/verified")
+        with engine.begin() as conn:
+            _store_schema_version(conn, current_version)
+        logger.info(f"✅ All database tables created/verified (schema version {current_version})")
         
         return True
     except Exception as e:
@@ -102,11 +192,74 @@ def init_db():
         raise
 
 
-# Test connection on module import
-try:
-    verify_connection()
-except Exception as e:
-    logger.warning(f"⚠️  Database connection not available yet: {e}")
+class DatabaseReadiness:
+    """
+    Readiness state filled in by the background probe.
+    Lets workers accept traffic before the database has answered.
+    """
+
+    def __init__(self):
+        self._ready = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.attempts = 0
+        self.last_error: Optional[str] = None
+        self.ready_at: Optional[datetime] = None
+
+    @property
+    def is_ready(self) -> bool:
+        return self._ready.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._ready.wait(timeout)
+
+    def status(self) -> dict:
+        return {
+            "ready": self.is_ready,
+            "mode": DB_STARTUP_MODE,
+            "attempts": self.attempts,
+            "last_error": self.last_error,
+            "ready_at": self.ready_at.isoformat() if self.ready_at else None,
+        }
+
+    def mark_ready(self):
+        self.last_error = None
+        self.ready_at = datetime.utcnow()
+        self._ready.set()
+
+    def start_probe(
+        self,
+        on_ready: Optional[Callable[[], None]] = None,
+        initial_delay: float = 1.0,
+        max_delay: float = 30.0,
+    ):
+        """
+        Run init_db() in a daemon thread, retrying with exponential backoff
+        until it succeeds, then call on_ready (e.g. seed rows).
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        def _probe():
+            delay = initial_delay
+            while not self.is_ready:
+                self.attempts += 1
+                try:
+                    init_db()
+                    if on_ready:
+                        on_ready()
+                    self.mark_ready()
+                    logger.info(f"✅ Database ready after {self.attempts} attempt(s)")
+                except Exception as e:
+                    self.last_error = str(e)
+                    logger.warning(f"⚠️  Database not ready (attempt {self.attempts}): {e}; retrying in {delay:.0f}s")
+                    time.sleep(delay)
+                    delay = min(delay * 2, max_delay)
+
+        self._thread = threading.Thread(target=_probe, name="db-readiness-probe", daemon=True)
+        self._thread.start()
+
+
+db_readiness = DatabaseReadiness()
 
 
 if __name__ == "__main__":
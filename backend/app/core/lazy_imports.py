@@ -0,0 +1,80 @@
+"""
+Lazy Import Utility
+Defers loading of heavy ML/OCR libraries (cv2, easyocr, torch, pandas, ...)
+until first attribute access so API-only workers never pay for them.
+"""
+
+import importlib
+import importlib.util
+import logging
+import threading
+import time
+from types import ModuleType
+from typing import Any, Dict
+
+logger = logging.getLogger(__name__)
+
+# module name -> seconds spent importing it on first use
+_load_times: Dict[str, float] = {}
+
+
+class LazyModule(ModuleType):
+    """
+    Module proxy that imports the real module on first attribute access.
+
+    Usage:
+        cv2 = lazy_import("cv2")
+        ...
+        image = cv2.imread(path)  # cv2 is imported here, not at module load
+    """
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.__dict__["_lazy_name"] = name
+        self.__dict__["_lazy_module"] = None
+        self.__dict__["_lazy_lock"] = threading.Lock()
+
+    def _load(self) -> ModuleType:
+        module = self.__dict__["_lazy_module"]
+        if module is not None:
+            return module
+
+        with self.__dict__["_lazy_lock"]:
+            module = self.__dict__["_lazy_module"]
+            if module is None:
+                name = self.__dict__["_lazy_name"]
+                start = time.perf_counter()
+                module = importlib.import_module(name)
+                elapsed = time.perf_counter() - start
+                _load_times[name] = elapsed
+                logger.info(f"📦 Lazy-loaded {name} in {elapsed * 1000:.0f} ms")
+                self.__dict__["_lazy_module"] = module
+        return module
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self) -> str:
+        state = "loaded" if self.__dict__["_lazy_module"] is not None else "not loaded"
+        return f"<LazyModule {self.__dict__['_lazy_name']!r} ({state})>"
+
+
+def lazy_import(name: str) -> LazyModule:
+    """Return a proxy for `name` that is imported on first use"""
+    return LazyModule(name)
+
+
+def is_available(name: str) -> bool:
+    """Check whether a module is installed without importing it"""
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+def get_load_times() -> Dict[str, float]:
+    """Seconds spent importing each lazily loaded module so far"""
+    return dict(_load_times)
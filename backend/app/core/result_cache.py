@@ -0,0 +1,284 @@
+"""
+Upload Result Cache
+Analysis results for uploaded images, so a user re-uploading the same
+prescription, report or strip photo (typically after a slow response) gets
+the earlier result back instead of another OCR + LLM run.
+
+An upload matches a cached one when
+    - its bytes are identical (sha256), or
+    - it is the same picture re-encoded, resized or re-saved by a phone
+      gallery: its 64-bit perceptual hash (pHash, the signs of the image's
+      lowest DCT frequencies) is within RESULT_CACHE_MAX_DISTANCE bits of
+      the cached one, and a 128x128 thumbnail of it differs nowhere (no 8x8
+      tile) by more than MAX_TILE_DIFF from the cached thumbnail.
+
+The hash finds candidates; the thumbnail check is what keeps two
+prescriptions on the same letterhead, or the same slip with one dose
+changed, apart - their hashes are often only a few bits apart. Candidates
+come from a multi-index: the hash is split into MAX_DISTANCE + 1 bands and
+any hash within MAX_DISTANCE bits shares at least one band exactly, so a
+lookup only compares entries sharing a band instead of every entry.
+
+Entries are scoped per user and never shared between users; anonymous
+uploads are not cached. Entries expire after RESULT_CACHE_TTL seconds and
+the least recently used are evicted beyond RESULT_CACHE_MAX_ENTRIES.
+Failed analyses are not cached.
+"""
+
+import copy
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from app.core.lazy_imports import lazy_import
+from app.core.metrics import counter, gauge_callback
+
+logger = logging.getLogger(__name__)
+
+cv2 = lazy_import("cv2")
+
+# Set RESULT_CACHE_ENABLED=false to analyze every upload
+ENABLED = os.getenv("RESULT_CACHE_ENABLED", "true").lower() == "true"
+
+# Seconds a cached result is served
+TTL = float(os.getenv("RESULT_CACHE_TTL", "3600"))
+
+# Results kept across all users
+MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "512"))
+
+# Largest pHash Hamming distance (of 64 bits) for a near-duplicate candidate; 0 = exact matches only
+MAX_DISTANCE = int(os.getenv("RESULT_CACHE_MAX_DISTANCE", "6"))
+
+HASH_BITS = 64
+
+# Near-duplicate thumbnails: side (px), tile side (px), and the largest mean
+# difference of any tile, in standard deviations of the normalized thumbnail.
+# Re-encoded copies stay under 0.06; a changed dose digit on a page exceeds 0.4.
+THUMBNAIL_SIZE = 128
+TILE_SIZE = 8
+MAX_TILE_DIFF = 0.25
+
+# Largest relative difference of width/height ratios for a near-duplicate
+MAX_ASPECT_DIFF = 0.02
+
+LOOKUPS = counter(
+    "sanjeevani_result_cache_lookups_total", "Upload result cache lookups by outcome", ("namespace", "outcome")
+)
+
+Key = Tuple[str, str, str]  # (namespace, user, sha256)
+
+
+@dataclass
+class Fingerprint:
+    """What an upload is matched on"""
+    digest: str
+    phash: Optional[int] = None
+    thumbnail: Optional[np.ndarray] = None  # THUMBNAIL_SIZE^2 uint8 grey
+    aspect: float = 0.0
+
+
+def perceptual_hash(gray: np.ndarray) -> int:
+    """64-bit pHash: signs of the 8x8 lowest DCT frequencies (minus DC) against their median"""
+    small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:8, :8].flatten()
+    low[0] = 0.0  # DC is overall brightness
+    bits = low > np.median(low[1:])
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def fingerprint(content: bytes, digest: Optional[str] = None) -> Fingerprint:
+    """
+    Exact digest of the bytes (computed unless given), plus the perceptual
+    parts if they decode as an image. content may be any buffer (bytes,
+    memoryview, mmap).
+    """
+    digest = digest or hashlib.sha256(content).hexdigest()
+    try:
+        gray = cv2.imdecode(np.frombuffer(content, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+    except cv2.error:
+        gray = None
+    if gray is None or gray.size == 0:
+        return Fingerprint(digest)
+    height, width = gray.shape
+    return Fingerprint(
+        digest,
+        perceptual_hash(gray),
+        cv2.resize(gray, (THUMBNAIL_SIZE, THUMBNAIL_SIZE), interpolation=cv2.INTER_AREA),
+        width / float(height),
+    )
+
+
+def _normalized(thumbnail: np.ndarray) -> np.ndarray:
+    values = thumbnail.astype(np.float32)
+    values -= values.mean()
+    return values / (values.std() + 1e-6)
+
+
+def same_picture(a: Fingerprint, b: Fingerprint) -> bool:
+    """Whether two decodable uploads show the same picture, tile by tile"""
+    if abs(a.aspect - b.aspect) > MAX_ASPECT_DIFF * max(a.aspect, b.aspect):
+        return False
+    tiles = THUMBNAIL_SIZE // TILE_SIZE
+    diff = np.abs(_normalized(a.thumbnail) - _normalized(b.thumbnail))
+    return float(diff.reshape(tiles, TILE_SIZE, tiles, TILE_SIZE).mean(axis=(1, 3)).max()) <= MAX_TILE_DIFF
+
+
+def _bands(max_distance: int) -> List[Tuple[int, int]]:
+    """(shift, mask) of max_distance + 1 near-equal bands covering the hash"""
+    count = min(max_distance + 1, HASH_BITS)
+    edges = [round(i * HASH_BITS / count) for i in range(count + 1)]
+    return [(start, (1 << (end - start)) - 1) for start, end in zip(edges, edges[1:])]
+
+
+@dataclass
+class _Entry:
+    scope: Tuple[str, str]  # (namespace, user)
+    fingerprint: Fingerprint
+    result: Any
+    expires: float
+
+
+class ResultCache:
+    """Per-user LRU + TTL cache of analysis results with near-duplicate image lookup"""
+
+    def __init__(self, ttl: float = TTL, max_entries: int = MAX_ENTRIES,
+                 max_distance: int = MAX_DISTANCE, enabled: bool = ENABLED):
+        self.enabled = enabled and max_entries > 0
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self._bands = _bands(max_distance)
+        self._lock = threading.Lock()
+        # Least recently used first
+        self._entries: "OrderedDict[Key, _Entry]" = OrderedDict()
+        # (namespace, user, band index, band value) -> keys of entries with that band
+        self._index: Dict[Tuple[str, str, int, int], Set[Key]] = {}
+
+    def _band_keys(self, scope: Tuple[str, str], phash: int):
+        for i, (shift, mask) in enumerate(self._bands):
+            yield scope + (i, (phash >> shift) & mask)
+
+    def _remove(self, key: Key) -> None:
+        entry = self._entries.pop(key)
+        if entry.fingerprint.phash is None:
+            return
+        for band_key in self._band_keys(entry.scope, entry.fingerprint.phash):
+            keys = self._index.get(band_key)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._index[band_key]
+
+    def _live(self, key: Key, now: float) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires <= now:
+            self._remove(key)
+            return None
+        return entry
+
+    def _near_duplicate(self, scope: Tuple[str, str], upload: Fingerprint, now: float) -> Optional[Key]:
+        """Closest (by pHash) cached upload in scope that passes the thumbnail check"""
+        candidates: Set[Key] = set()
+        for band_key in self._band_keys(scope, upload.phash):
+            candidates |= self._index.get(band_key, set())
+        ranked = []
+        for key in candidates:
+            entry = self._live(key, now)
+            if entry is None:
+                continue
+            distance = (entry.fingerprint.phash ^ upload.phash).bit_count()
+            if distance <= self.max_distance:
+                ranked.append((distance, key))
+        for _, key in sorted(ranked):
+            if same_picture(self._entries[key].fingerprint, upload):
+                return key
+        return None
+
+    def get(self, namespace: str, user: str, upload: Fingerprint) -> Tuple[Optional[str], Any]:
+        """("exact" | "near" | None, copy of the cached result)"""
+        now = time.monotonic()
+        scope = (namespace, user)
+        with self._lock:
+            outcome, key = "exact", scope + (upload.digest,)
+            if self._live(key, now) is None:
+                outcome, key = "near", None
+                if upload.phash is not None and self.max_distance > 0:
+                    key = self._near_duplicate(scope, upload, now)
+            if key is None:
+                return None, None
+            self._entries.move_to_end(key)
+            result = self._entries[key].result
+        return outcome, copy.deepcopy(result)
+
+    def put(self, namespace: str, user: str, upload: Fingerprint, result: Any) -> None:
+        scope = (namespace, user)
+        key = scope + (upload.digest,)
+        entry = _Entry(scope, upload, copy.deepcopy(result), time.monotonic() + self.ttl)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            if upload.phash is not None:
+                for band_key in self._band_keys(scope, upload.phash):
+                    self._index.setdefault(band_key, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def cached(self, namespace: str, user_id: Any, content: bytes,
+               fn: Callable[..., Any], *args, digest: Optional[str] = None, **kwargs) -> Any:
+        """
+        Result of fn(*args, **kwargs) for the uploaded content, served from the
+        user's earlier upload of the same (or a near-duplicate) image when one
+        is cached. A falsy user_id (anonymous) bypasses the cache. digest is
+        the content's sha256 if the caller already has it. Callers may mutate
+        what they receive.
+        """
+        if not self.enabled or not user_id:
+            return fn(*args, **kwargs)
+
+        user = str(user_id)
+        upload = fingerprint(content, digest)
+        outcome, result = self.get(namespace, user, upload)
+        LOOKUPS.inc(namespace=namespace, outcome=outcome or "miss")
+        if outcome is not None:
+            logger.info(f"♻️ Returning cached {namespace} result ({outcome} match of an earlier upload)")
+            if isinstance(result, dict):
+                result["result_cache"] = outcome
+            return result
+
+        result = fn(*args, **kwargs)
+        if _succeeded(result):
+            self.put(namespace, user, upload, result)
+        return result
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._index.clear()
+
+
+def _succeeded(result: Any) -> bool:
+    """Results worth serving again: not error payloads"""
+    if not isinstance(result, dict):
+        return result is not None
+    return result.get("status") != "error" and result.get("success") is not False and not result.get("error")
+
+
+# Shared per-process cache; namespaces match the single-flight keys ("medicine_image", "hospital_report", ...)
+results = ResultCache()
+
+gauge_callback(
+    "sanjeevani_result_cache_entries", "Analysis results held by the upload result cache", (),
+    lambda: [({}, len(results))],
+)
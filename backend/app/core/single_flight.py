@@ -0,0 +1,127 @@
+"""
+Single-Flight Request Coalescing
+Concurrent identical requests (same symptoms, same question, same uploaded
+image) share one in-flight computation instead of each running the LLM or
+OCR pipeline again.
+
+The first caller for a key runs the work; callers arriving while it is in
+flight wait for it and receive a copy of its result (or its exception).
+Nothing is cached once the computation finishes. Work runs in threads (the
+async routes offload it with run_in_threadpool), so callers from different
+requests can meet on the same key.
+"""
+
+import copy
+import hashlib
+import json
+import logging
+import os
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from app.core.metrics import gauge_callback
+
+logger = logging.getLogger(__name__)
+
+# Set SINGLE_FLIGHT_ENABLED=false to run every request independently
+ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() == "true"
+
+
+def request_key(namespace: str, payload: Any) -> str:
+    """Stable key for a normalized request payload ("namespace:sha256")"""
+    canonical = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return f"{namespace}:{hashlib.sha256(canonical.encode('utf-8')).hexdigest()}"
+
+
+def content_key(namespace: str, content: bytes) -> str:
+    """Key for uploaded file content"""
+    return digest_key(namespace, hashlib.sha256(content).hexdigest())
+
+
+def digest_key(namespace: str, digest: str) -> str:
+    """Key for uploaded file content whose sha256 (hex) is already known"""
+    return f"{namespace}:{digest}"
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Runs at most one computation per key at a time; duplicates wait and share it"""
+
+    def __init__(self, enabled: bool = ENABLED):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def do(self, key: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Return fn(*args, **kwargs), sharing the run with concurrent callers
+        using the same key. Waiting callers get a deep copy of the result, so
+        callers may mutate what they receive.
+        """
+        if not self.enabled:
+            return fn(*args, **kwargs)
+
+        namespace = key.split(":", 1)[0]
+        with self._lock:
+            stats = self._stats.setdefault(namespace, {"executed": 0, "coalesced": 0})
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                stats["coalesced"] += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                stats["executed"] += 1
+                leader = True
+
+        if not leader:
+            logger.info(f"🔗 Coalesced duplicate {namespace} request (waiting on in-flight run)")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        else:
+            return result
+        finally:
+            with self._lock:
+                # No caller can join once the key is removed, so the waiter count is final
+                self._calls.pop(key, None)
+                waiters = call.waiters
+            if waiters and call.error is None:
+                # Snapshot before the leader gets the original back and can mutate it
+                call.result = copy.deepcopy(result)
+            call.done.set()
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Executed and coalesced request counts per namespace"""
+        with self._lock:
+            return {namespace: dict(counts) for namespace, counts in self._stats.items()}
+
+
+# Shared per-process group; keys are namespaced by the caller ("symptoms:...", "medicine_image:...")
+flights = SingleFlight()
+
+gauge_callback(
+    "sanjeevani_single_flight_in_flight", "Distinct computations currently shared by single-flight", (),
+    lambda: [({}, flights.in_flight())],
+)
@@ -0,0 +1,343 @@
+"""
+Upload Ingestion
+Receives an uploaded image in chunks instead of reading it whole, so a
+request never holds more of the file than it has to:
+
+    - the size limit is enforced while reading (and up front from the
+      declared size), an oversized upload is rejected at the first chunk
+      past the limit
+    - the format is sniffed from the first bytes (magic numbers, not the
+      filename) and unsupported content is rejected before the rest is read
+    - the sha256 is computed as chunks arrive (single-flight and result
+      cache keys)
+    - files up to UPLOAD_MEMORY_LIMIT stay in memory while the process
+      holds less than UPLOAD_MEMORY_BUDGET of upload buffers in total;
+      anything else is spooled to a temporary file, so memory held for
+      concurrent uploads stays within the budget however many arrive
+    - the bytes are exposed without copies: a memoryview of the buffer, or
+      an mmap of the spooled file, which cv2.imdecode reads directly
+
+Services that take a file path get the spooled file itself; in-memory
+uploads are written out once, on first request for a path.
+
+Starlette parses the multipart body before the route runs, into its own
+SpooledTemporaryFile (in memory up to 1 MB, on disk beyond). receive_upload
+reads from that file, so an upload above 1 MB is written to disk twice and
+its size limit only applies once the whole body has arrived.
+UploadLimitMiddleware therefore bounds network intake before parsing: a
+multipart request declaring a Content-Length over the limit is rejected
+with 413 unread, and a body that turns out longer (chunked transfer) is cut
+off at the limit.
+"""
+
+import hashlib
+import logging
+import mmap
+import os
+import tempfile
+import threading
+from typing import FrozenSet, Iterable, Optional
+
+import numpy as np
+from fastapi import HTTPException, UploadFile, status
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+
+from app.core.lazy_imports import lazy_import
+from app.core.metrics import gauge_callback
+
+logger = logging.getLogger(__name__)
+
+cv2 = lazy_import("cv2")
+
+# Largest accepted upload (bytes)
+MAX_UPLOAD_SIZE = int(os.getenv("UPLOAD_MAX_BYTES", str(10 * 1024 * 1024)))
+
+# Largest upload kept in memory (bytes); bigger ones are spooled to disk
+MEMORY_LIMIT = int(os.getenv("UPLOAD_MEMORY_LIMIT", str(1024 * 1024)))
+
+# In-memory upload bytes the process holds at once across requests
+MEMORY_BUDGET = int(os.getenv("UPLOAD_MEMORY_BUDGET", str(32 * 1024 * 1024)))
+
+# Multipart framing (boundaries, part headers, other form fields) allowed on top of the file
+MULTIPART_OVERHEAD = 64 * 1024
+
+# Bytes read from the request per step
+CHUNK_SIZE = 256 * 1024
+
+IMAGE_FORMATS: FrozenSet[str] = frozenset({"jpeg", "png", "webp", "bmp", "tiff"})
+
+SUFFIXES = {"jpeg": ".jpg", "png": ".png", "webp": ".webp", "bmp": ".bmp", "tiff": ".tif", "pdf": ".pdf"}
+
+# Bytes needed to tell every supported format apart
+SNIFF_SIZE = 12
+
+
+def sniff_format(head: bytes) -> Optional[str]:
+    """File format from its first SNIFF_SIZE bytes, None if not a supported one"""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    if head.startswith(b"BM"):
+        return "bmp"
+    if head[:4] in (b"II*\x00", b"MM\x00*"):
+        return "tiff"
+    if head.startswith(b"%PDF"):
+        return "pdf"
+    return None
+
+
+class _MemoryBudget:
+    """Bytes of upload buffers held in memory, across concurrent requests"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.used = 0
+        self._lock = threading.Lock()
+
+    def reserve(self, size: int) -> bool:
+        with self._lock:
+            if self.used + size > self.limit:
+                return False
+            self.used += size
+            return True
+
+    def release(self, size: int) -> None:
+        with self._lock:
+            self.used -= size
+
+
+memory_budget = _MemoryBudget(MEMORY_BUDGET)
+
+gauge_callback(
+    "sanjeevani_upload_memory_bytes", "Upload bytes currently buffered in memory", (),
+    lambda: [({}, memory_budget.used)],
+)
+
+
+class Upload:
+    """A received upload: in memory or spooled to a temporary file"""
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.size = 0
+        self.format: Optional[str] = None
+        self.digest = ""
+        self._hash = hashlib.sha256()
+        self._buffer: Optional[bytearray] = bytearray()
+        self._reserved = 0
+        self._path: Optional[str] = None
+        self._file = None
+        self._map: Optional[mmap.mmap] = None
+
+    @property
+    def in_memory(self) -> bool:
+        return self._buffer is not None
+
+    def _spool(self) -> None:
+        """Move the buffer to a temporary file; later chunks go straight to it"""
+        fd, self._path = tempfile.mkstemp(suffix=SUFFIXES.get(self.format, ".tmp"))
+        self._file = os.fdopen(fd, "wb")
+        self._file.write(self._buffer)
+        self._buffer = None
+        memory_budget.release(self._reserved)
+        self._reserved = 0
+
+    def _buffer_chunk(self, chunk: bytes) -> bool:
+        """Keep one chunk in memory if the file and the process budget allow it"""
+        if not self.in_memory or self.size > MEMORY_LIMIT or not memory_budget.reserve(len(chunk)):
+            return False
+        self._reserved += len(chunk)
+        self._buffer += chunk
+        return True
+
+    def _write_chunk(self, chunk: bytes) -> None:
+        """Write one chunk to the spooled file (blocking: called from a worker thread)"""
+        if self.in_memory:
+            self._spool()
+        self._file.write(chunk)
+
+    def _finish(self) -> None:
+        self.digest = self._hash.hexdigest()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    @property
+    def data(self) -> memoryview:
+        """The uploaded bytes, without a copy"""
+        if self.in_memory:
+            return memoryview(self._buffer)
+        if self._map is None:
+            with open(self._path, "rb") as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(self._map)
+
+    def image(self, flags: Optional[int] = None) -> Optional[np.ndarray]:
+        """Decoded image (BGR by default), None if the content does not decode"""
+        flags = cv2.IMREAD_COLOR if flags is None else flags
+        return cv2.imdecode(np.frombuffer(self.data, dtype=np.uint8), flags)
+
+    def is_image(self) -> bool:
+        """Whether the content decodes, checked on a 1/8-scale decode rather than a full-size one"""
+        image = self.image(cv2.IMREAD_REDUCED_GRAYSCALE_8)
+        return image is not None and image.size > 0
+
+    @property
+    def path(self) -> str:
+        """The upload as a file, for services that read from disk"""
+        if self._path is None:
+            fd, path = tempfile.mkstemp(suffix=SUFFIXES.get(self.format, ".tmp"))
+            with os.fdopen(fd, "wb") as f:
+                f.write(self._buffer)
+            self._path = path
+        return self._path
+
+    def close(self) -> None:
+        """Release the buffer or the spooled file"""
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                # A decoded view is still alive; the map is closed when it is collected
+                pass
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._path is not None:
+            try:
+                os.unlink(self._path)
+            except OSError as e:
+                logger.warning(f"Failed to clean up upload file {self._path}: {e}")
+            self._path = None
+        if self._reserved:
+            memory_budget.release(self._reserved)
+            self._reserved = 0
+        self._buffer = None
+
+
+def _reject(code: int, detail: str) -> HTTPException:
+    return HTTPException(status_code=code, detail=detail)
+
+
+async def receive_upload(
+    file: UploadFile,
+    formats: Iterable[str] = IMAGE_FORMATS,
+    max_size: int = MAX_UPLOAD_SIZE,
+) -> Upload:
+    """
+    Read an uploaded file in chunks, enforcing max_size and the allowed
+    formats. Raises HTTPException 413 (too large) or 400 (unsupported
+    content); the caller must close() the returned Upload.
+    """
+    formats = frozenset(formats)
+    too_large = _reject(
+        status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, f"File too large. Max: {max_size / 1024 / 1024:g}MB"
+    )
+    if getattr(file, "size", None) and file.size > max_size:
+        raise too_large
+
+    upload = Upload(file.filename or "")
+    head = b""
+    try:
+        while True:
+            chunk = await file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            upload.size += len(chunk)
+            if upload.size > max_size:
+                raise too_large
+            if len(head) < SNIFF_SIZE:
+                head += chunk[:SNIFF_SIZE - len(head)]
+                if len(head) == SNIFF_SIZE:
+                    upload.format = _check_format(head, formats)
+            upload._hash.update(chunk)
+            if not upload._buffer_chunk(chunk):
+                await run_in_threadpool(upload._write_chunk, chunk)
+        if head and upload.format is None:
+            upload.format = _check_format(head, formats)
+        upload._finish()
+    except BaseException:
+        upload.close()
+        raise
+
+    logger.debug(f"Upload {upload.filename}: {upload.size} bytes, {upload.format}, "
+                 f"{'memory' if upload.in_memory else 'spooled'}")
+    return upload
+
+
+def _check_format(head: bytes, formats: FrozenSet[str]) -> str:
+    detected = sniff_format(head)
+    if detected not in formats:
+        raise _reject(
+            status.HTTP_400_BAD_REQUEST,
+            f"Unsupported file content. Allowed: {', '.join(sorted(formats))}",
+        )
+    return detected
+
+
+class UploadLimitMiddleware:
+    """
+    ASGI middleware rejecting multipart request bodies over max_body before
+    Starlette parses (and spools) them.
+    """
+
+    def __init__(self, app, max_body: int = MAX_UPLOAD_SIZE + MULTIPART_OVERHEAD):
+        self.app = app
+        self.max_body = max_body
+
+    async def _too_large(self, scope, receive, send) -> None:
+        response = JSONResponse(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            content={"detail": f"Request too large. Max: {self.max_body / 1024 / 1024:g}MB"},
+        )
+        await response(scope, receive, send)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        if not headers.get(b"content-type", b"").lower().startswith(b"multipart/"):
+            await self.app(scope, receive, send)
+            return
+
+        declared = headers.get(b"content-length", b"")
+        if declared.isdigit() and int(declared) > self.max_body:
+            logger.warning(f"⚠️ Rejected {scope['path']}: declared {int(declared)} bytes")
+            await self._too_large(scope, receive, send)
+            return
+
+        received = 0
+        exceeded = started = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body:
+                    exceeded = True
+                    raise _reject(status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, "Request too large")
+            return message
+
+        async def guarded_send(message):
+            nonlocal started
+            if exceeded and not started:
+                # The app's error for the cut-off body is replaced by a 413 below
+                return
+            started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            if not exceeded or started:
+                raise
+        if exceeded and not started:
+            logger.warning(f"⚠️ Rejected {scope['path']}: body over {self.max_body} bytes")
+            await self._too_large(scope, receive, send)
@@ -0,0 +1,159 @@
+"""
+Worker Roles
+Splits the backend into independently scalable processes:
+- api: lightweight CRUD/auth routes (no ML models)
+- ocr: image analysis (OpenCV, Tesseract, EasyOCR, TrOCR)
+- llm: symptom recommendations and medical Q&A (Ollama gateway)
+- tts: speech synthesis
+
+The api role forwards requests for features it does not host to the
+owning role over HTTP (OCR_WORKER_URL, LLM_WORKER_URL, TTS_WORKER_URL).
+Request and response bodies are streamed through an async client on the
+event loop, so a slow OCR or LLM call holds no threadpool thread and
+large uploads or TTS audio are never buffered whole.
+"""
+
+import logging
+from typing import Dict, List, Optional
+
+import httpx
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
+
+from app.core.config import settings
+from app.core.uploads import MAX_UPLOAD_SIZE, MULTIPART_OVERHEAD
+
+logger = logging.getLogger(__name__)
+
+# Feature names (see app.main.FEATURE_ROUTERS) hosted by each role
+ROLE_FEATURES: Dict[str, List[str]] = {
+    "api": [
+        "auth", "dashboard", "doctors", "appointments", "medicine_history",
+        "prescriptions", "hospital_report_history", "qa_history", "reminders",
+    ],
+    "ocr": [
+        "prescription_analysis", "hospital_reports", "medicine_identification",
+        "handwritten_prescriptions",
+    ],
+    "llm": ["symptoms"],
+    "tts": ["tts"],
+}
+
+# URL path prefixes served by each non-api role
+ROLE_PATH_PREFIXES: Dict[str, List[str]] = {
+    "ocr": [
+        "/api/prescriptions/analyze",
+        "/api/hospital-reports",
+        "/api/medicine-identification",
+        "/api/handwritten-prescriptions",
+    ],
+    "llm": ["/api/symptoms", "/api/medical-qa"],
+    "tts": ["/api/tts"],
+}
+
+# Headers that must not be copied between hops
+HOP_BY_HOP_HEADERS = {
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization",
+    "te", "trailers", "transfer-encoding", "upgrade", "host", "content-length",
+    "content-encoding",
+}
+
+PROXY_TIMEOUT = 300  # seconds; OCR + LLM pipelines can take minutes
+PROXY_CONNECT_TIMEOUT = 10  # seconds
+
+# Largest request body forwarded (the upload limit plus multipart framing)
+MAX_PROXY_BODY = MAX_UPLOAD_SIZE + MULTIPART_OVERHEAD
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_role_features(role: str) -> Optional[set]:
+    """Features for a role, or None for "all" (single-process mode)"""
+    role = role.strip().lower()
+    if role in ("", "all"):
+        return None
+    if role not in ROLE_FEATURES:
+        raise ValueError(f"Unknown WORKER_ROLE '{role}'. Expected one of: all, {', '.join(ROLE_FEATURES)}")
+    return set(ROLE_FEATURES[role])
+
+
+def get_remote_workers(enabled_features: set) -> Dict[str, str]:
+    """
+    Map of role -> base URL for roles this process does not host
+    but has a worker URL configured for.
+    """
+    urls = {
+        "ocr": settings.OCR_WORKER_URL,
+        "llm": settings.LLM_WORKER_URL,
+        "tts": settings.TTS_WORKER_URL,
+    }
+    remote = {}
+    for role, url in urls.items():
+        if url and not enabled_features.intersection(ROLE_FEATURES[role]):
+            remote[role] = url.rstrip("/")
+    return remote
+
+
+def resolve_remote_worker(path: str, remote_workers: Dict[str, str]) -> Optional[str]:
+    """Base URL of the worker that owns `path`, if it is remote"""
+    for role, base_url in remote_workers.items():
+        for prefix in ROLE_PATH_PREFIXES[role]:
+            if path == prefix or path.startswith(prefix + "/"):
+                return base_url
+    return None
+
+
+def _get_client() -> httpx.AsyncClient:
+    """Shared client, so connections to the workers are pooled and reused"""
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(timeout=httpx.Timeout(PROXY_TIMEOUT, connect=PROXY_CONNECT_TIMEOUT))
+    return _client
+
+
+async def close_proxy_client():
+    """Close pooled worker connections (application shutdown)"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def forward_request(request: Request, base_url: str) -> Response:
+    """Proxy the request to another worker role and stream its response back"""
+    declared = request.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > MAX_PROXY_BODY:
+        return JSONResponse(
+            status_code=413,
+            content={"detail": f"Request too large. Max: {MAX_PROXY_BODY / 1024 / 1024:g}MB"},
+        )
+
+    client = _get_client()
+    headers = {k: v for k, v in request.headers.items() if k.lower() not in HOP_BY_HOP_HEADERS}
+    upstream_request = client.build_request(
+        request.method,
+        f"{base_url}{request.url.path}",
+        params=list(request.query_params.multi_items()),
+        headers=headers,
+        content=request.stream(),
+    )
+    try:
+        upstream = await client.send(upstream_request, stream=True)
+    except httpx.HTTPError as e:
+        logger.error(f"❌ Worker at {base_url} unavailable for {request.url.path}: {e}")
+        return JSONResponse(
+            status_code=503,
+            content={"detail": "Service temporarily unavailable, please retry"},
+        )
+
+    response_headers = {
+        k: v for k, v in upstream.headers.items() if k.lower() not in HOP_BY_HOP_HEADERS
+    }
+    # Decoded chunks (content-encoding is dropped above), relayed as they arrive
+    return StreamingResponse(
+        upstream.aiter_bytes(),
+        status_code=upstream.status_code,
+        headers=response_headers,
+        background=BackgroundTask(upstream.aclose),
+    )
@@ -2,25 +2,24 @@
 SMA Sanjeevani Backend - Main Application Entry Point
 """
 from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import ValidationError
+import importlib
 import logging
+import threading
+import time
 
 from app.core.config import settings
-from app.core.database import init_db
-from app.api.routes.routes_auth import router as auth_router
-from app.api.routes.routes_dashboard import router as dashboard_router
-from app.api.routes.routes_doctors import router as doctors_router
-from app.api.routes.routes_appointments import router as appointments_router
-from app.api.routes.routes_medicine_history import router as medicine_history_router
-from app.api.routes.routes_prescriptions import router as prescriptions_router
-from app.api.routes.routes_qa_history import router as qa_history_router
-from app.api.routes.routes_reminders import router as reminders_router
-from app.api.routes.routes_hospital_reports import router as hospital_reports_router
-from app.api.routes.routes_hospital_report_history import router as hospital_report_history_router
-from app.api.routes.routes_handwritten_prescriptions import router as handwritten_prescriptions_router
-from app.services.symptoms_recommendation import router as symptoms_router
+from app.core.database import init_db, db_readiness, DB_STARTUP_MODE
+from app.core.lazy_imports import is_available
+from app.core import metrics
+from app.core.uploads import UploadLimitMiddleware
+from app.core.worker_roles import (
+    get_role_features, get_remote_workers, resolve_remote_worker, forward_request, close_proxy_client
+)
+from app.services.llm_resilience import breaker_stats
+from app.services.llm_scheduler import LLMOverloadedError, get_scheduler
 
 # Configure logging
 logging.basicConfig(
@@ -29,15 +28,52 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Medicine identification (requires cv2 / opencv-python); optional so server starts without it
-try:
-    from app.api.routes.routes_medicine_identification import router as medicine_identification_router
-    HAVE_MEDICINE_IDENTIFICATION = True
-    logger.info("✅ Medicine identification service loaded successfully")
-except ImportError as e:
-    HAVE_MEDICINE_IDENTIFICATION = False
-    medicine_identification_router = None
-    logger.error(f"❌ Medicine identification disabled: {e}")
+# Feature routers: (feature name, "module[:router attribute]", tags, required packages).
+# Modules are imported only for enabled features, so an API-only worker
+# (e.g. ENABLED_FEATURES=auth,dashboard,reminders) never loads OCR/ML libraries.
+FEATURE_ROUTERS = [
+    ("auth", "app.api.routes.routes_auth", ["Authentication"], ()),
+    ("dashboard", "app.api.routes.routes_dashboard", ["Dashboard"], ()),
+    ("doctors", "app.api.routes.routes_doctors", ["Doctors"], ()),
+    ("appointments", "app.api.routes.routes_appointments", ["Appointments"], ()),
+    ("medicine_history", "app.api.routes.routes_medicine_history", ["Medicine History"], ()),
+    ("prescriptions", "app.api.routes.routes_prescriptions", ["Prescriptions"], ()),
+    ("prescription_analysis", "app.api.routes.routes_prescriptions:analysis_router", ["Prescriptions"], ()),
+    ("hospital_reports", "app.api.routes.routes_hospital_reports", ["Hospital Reports"], ()),
+    ("hospital_report_history", "app.api.routes.routes_hospital_report_history", ["Hospital Report History"], ()),
+    ("qa_history", "app.api.routes.routes_qa_history", ["QA History"], ()),
+    ("reminders", "app.api.routes.routes_reminders", ["Reminders"], ()),
+    # Medicine identification requires cv2 (opencv-python); skipped if not installed
+    ("medicine_identification", "app.api.routes.routes_medicine_identification", ["Medicine Identification"], ("cv2",)),
+    ("symptoms", "app.services.symptoms_recommendation.router", ["Symptoms & Recommendations"], ()),
+    ("tts", "app.services.symptoms_recommendation.router:tts_router", ["Text to Speech"], ()),
+    ("handwritten_prescriptions", "app.api.routes.routes_handwritten_prescriptions", ["Handwritten Prescriptions"], ()),
+]
+
+# Features whose requests go to Ollama (used to decide whether to preload the model)
+LLM_FEATURES = {
+    "symptoms", "prescription_analysis", "hospital_reports",
+    "medicine_identification", "handwritten_prescriptions",
+}
+
+
+def get_enabled_features() -> set:
+    """
+    Features to register: an explicit ENABLED_FEATURES list wins, otherwise
+    the features of WORKER_ROLE, otherwise everything.
+    """
+    raw = settings.ENABLED_FEATURES.strip().lower()
+    if raw not in ("", "all", "*"):
+        return {name.strip() for name in raw.split(",") if name.strip()}
+    role_features = get_role_features(settings.WORKER_ROLE)
+    if role_features is not None:
+        return role_features
+    return {name for name, _, _, _ in FEATURE_ROUTERS}
+
+
+ENABLED_FEATURES = get_enabled_features()
+REMOTE_WORKERS = get_remote_workers(ENABLED_FEATURES)
+
 
 # Create FastAPI application
 app = FastAPI(
@@ -60,13 +96,26 @@ app.add_middleware(
 # Request logging middleware
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
-    """Log all incoming requests and responses"""
+    """Log all incoming requests and responses, and time them per route"""
     # Log incoming request
     if request.method in ["POST", "PUT", "PATCH", "DELETE"]:
         logger.info(f"📨 [{request.method}] {request.url.path} - From: {request.client.host if request.client else 'unknown'}")
     
     # Process request
-    response = await call_next(request)
+    start = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+    finally:
+        # Label by route template (/api/x/{id}), not the raw path, to keep series bounded
+        route = request.scope.get("route")
+        metrics.HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - start,
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=status_code,
+        )
     
     # Log response
     if request.method in ["POST", "PUT", "PATCH", "DELETE"]:
@@ -75,6 +124,21 @@ async def log_requests(request: Request, call_next):
     return response
 
 
+# Forward requests owned by other worker roles (OCR / LLM / TTS)
+@app.middleware("http")
+async def route_to_role_workers(request: Request, call_next):
+    """Proxy requests for features hosted by a remote worker role"""
+    if REMOTE_WORKERS:
+        target = resolve_remote_worker(request.url.path, REMOTE_WORKERS)
+        if target:
+            return await forward_request(request, target)
+    return await call_next(request)
+
+
+# Outermost: bound multipart bodies before they are parsed or proxied
+app.add_middleware(UploadLimitMiddleware)
+
+
 # Custom exception handler for validation errors
 @app.exception_handler(ValidationError)
 async def validation_exception_handler(request: Request, exc: ValidationError):
@@ -96,40 +160,64 @@ async def validation_exception_handler(request: Request, exc: ValidationError):
     )
 
 
+@app.exception_handler(LLMOverloadedError)
+async def llm_overloaded_handler(request: Request, exc: LLMOverloadedError):
+    """LLM queue deadline exceeded: shed the request with 429 + Retry-After"""
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc), "retry_after": exc.retry_after},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+def ensure_anonymous_user():
+    """Create the anonymous user (id=0) used for unauthenticated prescriptions"""
+    try:
+        from app.core.database import SessionLocal
+        from app.models.models import User
+        
+        db = SessionLocal()
+        anonymous_user = db.query(User).filter(User.id == 0).first()
+        
+        if not anonymous_user:
+            logger.info("🔄 Creating anonymous user for prescriptions...")
+            anonymous_user = User(
+                id=0,
+                username="anonymous",
+                email="anonymous@sanjeevani.local",
+                password_hash="disabled",
+                is_active=True
+            )
+            db.add(anonymous_user)
+            db.commit()
+            logger.info("✅ Anonymous user created successfully")
+        else:
+            logger.info("✅ Anonymous user already exists")
+        
+        db.close()
+    except Exception as e:
+        logger.warning(f"⚠️ Could not create anonymous user: {e}")
+
+
 @app.on_event("startup")
 async def startup_event():
     """Initialize database and services on application startup"""
+    if settings.OLLAMA_PRELOAD and ENABLED_FEATURES & LLM_FEATURES:
+        # Load and pin the model in the background so the first request doesn't pay for it
+        from app.services.llm_session import get_session
+        threading.Thread(target=get_session().preload, name="ollama-preload", daemon=True).start()
+    
+    if DB_STARTUP_MODE == "lazy":
+        # Don't block worker boot on database latency; /ready reports progress
+        db_readiness.start_probe(on_ready=ensure_anonymous_user)
+        logger.info("⏳ Database checks deferred to background readiness probe")
+        return
+    
     try:
         init_db()
         logger.info("✅ Database initialized successfully")
-        
-        # Create anonymous user for prescriptions
-        try:
-            from app.core.database import SessionLocal
-            from app.models.models import User
-            
-            db = SessionLocal()
-            anonymous_user = db.query(User).filter(User.id == 0).first()
-            
-            if not anonymous_user:
-                logger.info("🔄 Creating anonymous user for prescriptions...")
-                anonymous_user = User(
-                    id=0,
-                    username="anonymous",
-                    email="anonymous@sanjeevani.local",
-                    password_hash="disabled",
-                    is_active=True
-                )
-                db.add(anonymous_user)
-                db.commit()
-                logger.info("✅ Anonymous user created successfully")
-            else:
-                logger.info("✅ Anonymous user already exists")
-            
-            db.close()
-        except Exception as e:
-            logger.warning(f"⚠️ Could not create anonymous user: {e}")
-            
+        ensure_anonymous_user()
+        db_readiness.mark_ready()
     except Exception as e:
         logger.error(f"❌ Database initialization failed: {e}")
         raise
@@ -139,6 +227,7 @@ async def startup_event():
 async def shutdown_event():
     """Cleanup on application shutdown"""
     logger.info("🛑 Application shutting down")
+    await close_proxy_client()
 
 
 # Health check endpoint
@@ -148,31 +237,64 @@ async def health_check():
     return {
         "status": "healthy",
         "app": settings.APP_NAME,
-        "version": settings.APP_VERSION
+        "version": settings.APP_VERSION,
+        "role": settings.WORKER_ROLE
     }
 
 
+# Readiness probe endpoint (load balancers / orchestrators)
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe: 200 once the database is reachable and initialized"""
+    status = db_readiness.status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+
+# LLM queue metrics (admission control in front of Ollama)
+@app.get("/llm/queue")
+async def llm_queue_status():
+    """Running/queued LLM calls, queue wait times per priority class and circuit breaker state"""
+    return {**get_scheduler().stats(), "circuits": breaker_stats()}
+
+
+# Prometheus scrape endpoint
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Latency histograms and counters in the Prometheus text format"""
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
 # Include routers
-app.include_router(auth_router, tags=["Authentication"])
-app.include_router(dashboard_router, tags=["Dashboard"])
-app.include_router(doctors_router, tags=["Doctors"])
-app.include_router(appointments_router, tags=["Appointments"])
-app.include_router(medicine_history_router, tags=["Medicine History"])
-app.include_router(prescriptions_router, tags=["Prescriptions"])
-app.include_router(hospital_reports_router, tags=["Hospital Reports"])
-logger.info("✅ Hospital Report Analyzer router registered")
-app.include_router(hospital_report_history_router, tags=["Hospital Report History"])
-app.include_router(qa_history_router, tags=["QA History"])
-app.include_router(reminders_router, tags=["Reminders"])
-if HAVE_MEDICINE_IDENTIFICATION:
-    app.include_router(medicine_identification_router, tags=["Medicine Identification"])
-    logger.info("✅ Medicine Identification router registered")
-else:
-    logger.info("ℹ️ Medicine identification feature requires additional dependencies")
-app.include_router(symptoms_router, prefix="", tags=["Symptoms & Recommendations"])
-app.include_router(handwritten_prescriptions_router, tags=["Handwritten Prescriptions"])
-logger.info("✅ Handwritten Prescription Analyzer router registered")
+def include_feature_routers(app: FastAPI, enabled: set):
+    """Import and register routers for the enabled features only"""
+    known = {name for name, _, _, _ in FEATURE_ROUTERS}
+    for unknown in sorted(enabled - known):
+        logger.warning(f"⚠️ Unknown feature in ENABLED_FEATURES: {unknown}")
+    
+    for name, module_path, tags, requires in FEATURE_ROUTERS:
+        if name not in enabled:
+            logger.info(f"⏭️ Feature '{name}' disabled")
+            continue
+        missing = [pkg for pkg in requires if not is_available(pkg)]
+        if missing:
+            logger.error(f"❌ Feature '{name}' disabled, missing dependencies: {', '.join(missing)}")
+            continue
+        module_path, _, attr = module_path.partition(":")
+        try:
+            module = importlib.import_module(module_path)
+        except ImportError as e:
+            if not requires:
+                raise
+            # Optional feature: server still starts without it
+            logger.error(f"❌ Feature '{name}' disabled: {e}")
+            continue
+        app.include_router(getattr(module, attr or "router"), tags=tags)
+        logger.info(f"✅ {name} router registered")
+
 
+include_feature_routers(app, ENABLED_FEATURES)
+if REMOTE_WORKERS:
+    logger.info(f"🔀 Forwarding to worker roles: {REMOTE_WORKERS}")
 
 if __name__ == "__main__":
     import uvicorn
@@ -13,107 +13,60 @@ import os
 import time
 import random
 import requests
-from typing import Dict, Any
+from pydantic import Field
+from typing import Any, Dict, List, Optional, Type, Union
+from app.core.single_flight import flights, request_key
 from app.services.unified_medicine_database import UnifiedMedicineDatabase
+from app.services.llm_session import OllamaHTTPError, get_session
+from app.services.llm_resilience import LLMUnavailableError, retry_budget, spend_retry
+from app.services.llm_scheduler import LLMOverloadedError
+from app.services.prompt_budget import fit_prompt
+from app.services.structured_output import LLMOutput, StructuredOutputError, output_text
 
 logger = logging.getLogger(__name__)
 
-class EnhancedMedicineLLMGenerator:
-    """
-    Generates comprehensive medicine information using:
-    1. Phi-4 (Microsoft) LLM for natural language generation
-    2. Unified medicine database (50K + 250K medicines)
-    3. Pre-trained models for medical information
-    """
-    
-    OLLAMA_URL = "http://localhost:11434/api/generate"
-    MODEL = "phi4"
-    # Configurable timeouts and retry behavior
-    TIMEOUT_BASE = int(os.getenv('OLLAMA_TIMEOUT_BASE', '60'))  # base read timeout in seconds
-    MAX_RETRIES = int(os.getenv('OLLAMA_MAX_RETRIES', '3'))  # number of retry attempts on timeout/server error
-    NUM_PREDICT = int(os.getenv('OLLAMA_NUM_PREDICT', '2048'))  # maximum tokens to request from model
-    
-    @staticmethod
-    def generate_comprehensive_info(ocr_text: str, medicine_info: Dict[str, Any]) -> Dict[str, Any]:
-        """
-        Generate comprehensive medicine information for all scenarios:
-        - Adults
-        - Children (different age groups)
-        - Pregnancy
-        - Precautions
-        - Side effects
-        - When to use
-        - Instructions
-        
-        ALWAYS uses LLM to generate missing information even if database has partial data
-        """
-        
-        if not medicine_info.get('found'):
-            logger.warning(f"Medicine not found: {medicine_info.get('name')}")
-            # Even if not found, try to generate info from LLM
-            prompt = EnhancedMedicineLLMGenerator._create_comprehensive_prompt(ocr_text, medicine_info)
-            return EnhancedMedicineLLMGenerator._generate_with_fallback(
-                prompt, medicine_info, use_llm_even_if_empty=True
-            )
-        
-        # Create comprehensive LLM prompt
-        prompt = EnhancedMedicineLLMGenerator._create_comprehensive_prompt(ocr_text, medicine_info)
-        
-        logger.info(f"🧠 Generating comprehensive medicine info for: {medicine_info.get('name')}")
-        
-        # Always attempt LLM generation for comprehensive info
-        return EnhancedMedicineLLMGenerator._generate_with_fallback(prompt, medicine_info)
-    
-    @staticmethod
-    def _create_comprehensive_prompt(ocr_text: str, medicine_info: Dict[str, Any]) -> str:
-        """Create comprehensive prompt for accurate LLM-generated medicine information"""
-        
-        medicine_name = medicine_info.get('name', 'Unknown Medicine')
-        
-        prompt = f"""You are an expert medical information provider. Based on your medical knowledge, provide ACCURATE and COMPLETE information about the following medicine.
-
-MEDICINE IDENTIFIED FROM IMAGE:
-Medicine Name: {medicine_name}
-OCR Text from Image: {ocr_text}
+# Static instructions, sent as the system message so Ollama can reuse the
+# KV cache across requests; only the medicine/OCR text changes per request
+MEDICINE_INFO_SYSTEM_PROMPT = """You are an expert medical information provider. Based on your medical knowledge, provide ACCURATE and COMPLETE information about the medicine you are given.
 
 YOUR TASK: Generate ACCURATE medical information about this medicine using your medical knowledge. Do NOT make up information - use only verified medical knowledge.
 
-Provide the information in EXACTLY this format with all sections filled:
+Return ONE JSON object with these 7 fields, each a plain-text string (put sub-points on separate lines inside the string):
 
-1. MEDICINE NAME:
+"medicine_name" (MEDICINE NAME):
 Provide the exact generic and brand name of this medicine.
 
-2. TYPE:
+"type" (TYPE):
 Provide the pharmaceutical form (e.g., Tablet, Capsule, Syrup, Powder, Injection, Cream, etc.)
 Be specific about the formulation.
 
-3. DOSAGE:
+"dosage" (DOSAGE):
    For Adults: Provide standard adult dosage including frequency and maximum daily dose
    For Children: Provide age-specific dosages or indicate if not recommended for children
    For Pregnancy: Provide safety category (Category A/B/C/D/X) and explain safety in each trimester
    Include specific measurements and frequency for each group
 
-4. WHO CAN TAKE & AGE RESTRICTIONS:
+"who_can_take" (WHO CAN TAKE & AGE RESTRICTIONS):
    Suitable for: List specific age groups and conditions
    Avoid for: List specific contraindications and medical conditions where NOT recommended
    During Pregnancy: Specify pregnancy category and trimester-specific info
    During Breastfeeding: Specify if safe during breastfeeding and any precautions
 
-5. INSTRUCTIONS:
+"instructions" (INSTRUCTIONS):
    How to take: Provide detailed step-by-step instructions
    Best time to take: Specify optimal time (with/without food, morning/evening, etc.)
    If missed dose: Provide clear instructions
    Storage: Provide specific storage requirements (temperature, humidity, light, etc.)
    Special considerations: Any special handling or usage notes
 
-6. PRECAUTIONS:
+"precautions" (PRECAUTIONS):
    Important warnings: List critical warnings and cautions
    Avoid with: List specific medicines, foods, supplements that should NOT be taken together
    Check before taking: List medical conditions to check with doctor first
    Lab monitoring: Any tests or monitoring needed during use
    Contraindications: Absolute reasons NOT to take this medicine
 
-7. SIDE EFFECTS:
+"side_effects" (SIDE EFFECTS):
    Common: List frequently occurring side effects that are usually mild
    Serious: List serious side effects requiring immediate medical attention
    Allergic reactions: List signs of allergic reactions
@@ -131,16 +84,214 @@ CRITICAL INSTRUCTIONS:
 - Always mention "consult healthcare professional" where applicable
 - If you don't have accurate information about something, say "Specific information not available in medical database"
 
-Generate COMPLETE information for all 7 sections. Do not omit any section."""
+Fill in all 7 fields. Do not omit any field."""
+
+PRESCRIPTION_DECIPHERING_SYSTEM_PROMPT = """You are an expert pharmacist with 30+ years of experience reading handwritten doctor prescriptions.
+
+TASK: Decipher the NOISY handwritten prescription text you are given and extract structured medicine information.
+
+IMPORTANT NOTES:
+- The input text is from OCR (optical character recognition) of a handwritten prescription
+- It will contain spelling errors, unclear abbreviations, and medical shorthand
+- Your job is to INTERPRET the messy text and identify actual medicine names and instructions
+- You must work with INCOMPLETE and INCORRECT text
+
+YOUR TASK:
+1. Identify each DISTINCT medicine mentioned
+2. Extract dosage (e.g., "500mg", "1 tablet", "5ml")
+3. Extract frequency (e.g., "BD" = twice daily, "TDS" = thrice daily, "OD" = once daily, "QID" = four times daily)
+4. Extract duration if mentioned (e.g., "7 days", "2 weeks")
+5. Handle common medical abbreviations:
+   - BD = Bis Die (twice daily)
+   - TDS = Ter Die Sumendum (thrice daily)
+   - OD = Omni Die (once daily)
+   - QID = Quater In Die (four times daily)
+   - PC = Post Cibum (after meals)
+   - AC = Ante Cibum (before meals)
+   - HS = Hora Somni (at bedtime)
+   - AM/PM = morning/evening
+   - SOS = as needed
+   - IM = intramuscular, IV = intravenous, PO = oral
+
+RETURN EXACTLY THIS JSON FORMAT (object with an array of medicine objects):
+{"medicines": [
+  {
+    "medicine_name": "Actual medicine name (best guess if unclear)",
+    "dosage": "Amount and unit (e.g. 500mg, 1 tablet, 10ml)",
+    "frequency": "How many times per day or interval",
+    "duration": "How long to take (days/weeks/months or 'as needed')",
+    "special_instructions": "Any special instructions (with/without food, bedtime, etc.)",
+    "confidence": "high/medium/low (how confident you are about this medicine)",
+    "notes": "Any uncertainty or alternative interpretations"
+  },
+  ...
+]}
+
+RULES FOR DECIPHERING:
+1. Medicine names: Even if misspelled in OCR, identify the likely medicine
+2. For unclear entries, use "confidence": "low" and add notes
+3. If text says "as needed", set frequency to "as needed" and duration to "N/A"
+4. Remove duplicates - don't list the same medicine twice
+5. Only include items that are clearly medicines (ignore general notes)
+6. If cannot determine a field, use empty string ""
+
+EXAMPLE OUTPUT:
+{"medicines": [
+  {
+    "medicine_name": "Paracetamol",
+    "dosage": "500mg",
+    "frequency": "TDS (thrice daily)",
+    "duration": "5 days",
+    "special_instructions": "After meals",
+    "confidence": "high",
+    "notes": ""
+  },
+  {
+    "medicine_name": "Amoxicillin",
+    "dosage": "250mg",
+    "frequency": "BD (twice daily)",
+    "duration": "10 days",
+    "special_instructions": "With milk or water",
+    "confidence": "high",
+    "notes": ""
+  }
+]}
+
+CRITICAL: Return ONLY the JSON object, nothing else. Start with { and end with }"""
+
+
+# Reply schemas for the prompts above (sent to Ollama as the output format)
+
+class MedicineInfoOutput(LLMOutput):
+    medicine_name: Optional[str] = None
+    type: Optional[str] = None
+    dosage: Optional[str] = None
+    who_can_take: Optional[str] = None
+    instructions: Optional[str] = None
+    precautions: Optional[str] = None
+    side_effects: Optional[str] = None
+
+
+class DecipheredMedicine(LLMOutput):
+    medicine_name: str
+    dosage: str = ""
+    frequency: str = ""
+    duration: str = ""
+    special_instructions: str = ""
+    confidence: str = ""
+    notes: str = ""
+
+
+class PrescriptionDecipherOutput(LLMOutput):
+    medicines: List[DecipheredMedicine] = Field(default_factory=list)
+
+
+# Frontend section titles for the MedicineInfoOutput fields, in display order
+MEDICINE_INFO_SECTIONS = [
+    ("MEDICINE NAME", "medicine_name"),
+    ("TYPE", "type"),
+    ("DOSAGE", "dosage"),
+    ("WHO CAN TAKE & AGE RESTRICTIONS", "who_can_take"),
+    ("INSTRUCTIONS", "instructions"),
+    ("PRECAUTIONS", "precautions"),
+    ("SIDE EFFECTS", "side_effects"),
+]
+
+
+class EnhancedMedicineLLMGenerator:
+    """
+    Generates comprehensive medicine information using:
+    1. Phi-4 (Microsoft) LLM for natural language generation
+    2. Unified medicine database (50K + 250K medicines)
+    3. Pre-trained models for medical information
+    """
+    
+    MODEL = os.getenv("OLLAMA_MODEL", "phi4")
+    # Configurable timeouts and retry behavior
+    TIMEOUT_BASE = int(os.getenv('OLLAMA_TIMEOUT_BASE', '60'))  # base read timeout in seconds
+    MAX_RETRIES = int(os.getenv('OLLAMA_MAX_RETRIES', '3'))  # number of retry attempts on timeout/server error
+    NUM_PREDICT = int(os.getenv('OLLAMA_NUM_PREDICT', '2048'))  # maximum tokens to request from model
+    
+    @staticmethod
+    def generate_comprehensive_info(ocr_text: str, medicine_info: Dict[str, Any]) -> Dict[str, Any]:
+        """Comprehensive info for a medicine; identical concurrent calls share one LLM run"""
+        key = request_key("medicine_info", {
+            "ocr_text": " ".join((ocr_text or "").split()),
+            "medicine_info": medicine_info,
+        })
+        with retry_budget():
+            return flights.do(
+                key, EnhancedMedicineLLMGenerator._generate_comprehensive_info, ocr_text, medicine_info
+            )
+
+    @staticmethod
+    def _generate_comprehensive_info(ocr_text: str, medicine_info: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Generate comprehensive medicine information for all scenarios:
+        - Adults
+        - Children (different age groups)
+        - Pregnancy
+        - Precautions
+        - Side effects
+        - When to use
+        - Instructions
+        
+        ALWAYS uses LLM to generate missing information even if database has partial data
+        """
         
-        return prompt
+        if not medicine_info.get('found'):
+            logger.warning(f"Medicine not found: {medicine_info.get('name')}")
+            # Even if not found, try to generate info from LLM
+            prompt = EnhancedMedicineLLMGenerator._create_comprehensive_prompt(ocr_text, medicine_info)
+            return EnhancedMedicineLLMGenerator._generate_with_fallback(prompt, medicine_info)
+        
+        # Create comprehensive LLM prompt
+        prompt = EnhancedMedicineLLMGenerator._create_comprehensive_prompt(ocr_text, medicine_info)
+        
+        logger.info(f"🧠 Generating comprehensive medicine info for: {medicine_info.get('name')}")
+        
+        # Always attempt LLM generation for comprehensive info
+        return EnhancedMedicineLLMGenerator._generate_with_fallback(prompt, medicine_info)
     
     @staticmethod
-    def _parse_comprehensive_output(llm_text: str, medicine_info: Dict[str, Any]) -> Dict[str, Any]:
-        """Parse LLM output into simplified 7-field format"""
+    def _create_comprehensive_prompt(ocr_text: str, medicine_info: Dict[str, Any]) -> str:
+        """
+        Create the per-request part of the medicine information prompt
+        (instructions and JSON fields are in MEDICINE_INFO_SYSTEM_PROMPT)
+        """
+        
+        medicine_name = medicine_info.get('name', 'Unknown Medicine')
+        # Name matched in the medicine database: the model describes it rather than re-reading the OCR text
+        if medicine_info.get('name_confirmed'):
+            medicine_name += " (confirmed against the medicine database; use this name as is)"
+        
+        def render(ocr_text: str) -> str:
+            return f"""MEDICINE IDENTIFIED FROM IMAGE:
+Medicine Name: {medicine_name}
+OCR Text from Image: {ocr_text}
+
+Return the JSON object with all 7 fields."""
         
-        # Extract all sections from LLM text
-        sections = EnhancedMedicineLLMGenerator._extract_all_sections(llm_text)
+        # OCR text from packaging is trimmed to what the template leaves of the token budget
+        return fit_prompt("medicine_info", render, system=MEDICINE_INFO_SYSTEM_PROMPT, ocr_text=ocr_text)
+    
+    @staticmethod
+    def _parse_comprehensive_output(info: Dict[str, Any], medicine_info: Dict[str, Any]) -> Dict[str, Any]:
+        """Map the structured LLM reply (MedicineInfoOutput) onto the simplified 7-field format"""
+        
+        def field(name: str, default: str) -> str:
+            value = (info.get(name) or "").strip()
+            return value or default
+        
+        sections = {
+            "MEDICINE NAME": field("medicine_name", medicine_info.get('name', 'Unknown')),
+            "TYPE": field("type", "Not specified"),
+            "DOSAGE": field("dosage", "As prescribed"),
+            "WHO CAN TAKE & AGE RESTRICTIONS": field("who_can_take", "Consult doctor"),
+            "INSTRUCTIONS": field("instructions", "Follow healthcare provider's instructions"),
+            "PRECAUTIONS": field("precautions", "Consult healthcare professional"),
+            "SIDE EFFECTS": field("side_effects", "Information not available"),
+        }
         
         result = {
             "medicine_name": medicine_info.get('name', 'Unknown'),
@@ -153,27 +304,22 @@ Generate COMPLETE information for all 7 sections. Do not omit any section."""
             "source": "LLM + Unified Database",
             "generated_at": __import__('datetime').datetime.now().isoformat(),
             
-            # Full LLM response
-            "full_information": llm_text,
+            # Full LLM response as numbered sections
+            "full_information": "\n\n".join(
+                f"{number}. {title}:\n{sections[title]}"
+                for number, (title, _) in enumerate(MEDICINE_INFO_SECTIONS, 1)
+            ),
             
             # Simplified 7 fields - structured for frontend single-column display
-            "sections": {
-                "MEDICINE NAME": sections.get("MEDICINE NAME", medicine_info.get('name', 'Unknown')),
-                "TYPE": sections.get("TYPE", "Not specified"),
-                "DOSAGE": sections.get("DOSAGE", "As prescribed"),
-                "WHO CAN TAKE & AGE RESTRICTIONS": sections.get("WHO CAN TAKE & AGE RESTRICTIONS", "Consult doctor"),
-                "INSTRUCTIONS": sections.get("INSTRUCTIONS", "Follow healthcare provider's instructions"),
-                "PRECAUTIONS": sections.get("PRECAUTIONS", "Consult healthcare professional"),
-                "SIDE EFFECTS": sections.get("SIDE EFFECTS", "Information not available")
-            },
+            "sections": sections,
             
             # Flat fields for compatibility
-            "type": sections.get("TYPE", "Not specified"),
-            "precautions": sections.get("PRECAUTIONS", "Consult healthcare professional"),
-            "side_effects": sections.get("SIDE EFFECTS", "Information not available"),
-            "dosage": sections.get("DOSAGE", "As prescribed"),
-            "who_can_take": sections.get("WHO CAN TAKE & AGE RESTRICTIONS", "Consult doctor"),
-            "instructions": sections.get("INSTRUCTIONS", "Follow healthcare provider's instructions"),
+            "type": sections["TYPE"],
+            "precautions": sections["PRECAUTIONS"],
+            "side_effects": sections["SIDE EFFECTS"],
+            "dosage": sections["DOSAGE"],
+            "who_can_take": sections["WHO CAN TAKE & AGE RESTRICTIONS"],
+            "instructions": sections["INSTRUCTIONS"],
             
             # Warnings
             "warnings": [
@@ -186,133 +332,7 @@ Generate COMPLETE information for all 7 sections. Do not omit any section."""
         return result
     
     @staticmethod
-    def _extract_all_sections(text: str) -> Dict[str, str]:
-        """
-        Extract simplified 7-section format from LLM output.
-        Handles detailed responses with sub-sections and bullet points.
-        """
-        sections = {}
-        
-        # List of section headers to look for (simplified)
-        section_headers = [
-            "MEDICINE NAME",
-            "TYPE",
-            "DOSAGE",
-            "WHO CAN TAKE & AGE RESTRICTIONS",
-            "INSTRUCTIONS",
-            "PRECAUTIONS",
-            "SIDE EFFECTS"
-        ]
-        
-        lines = text.split('\n')
-        current_section = None
-        current_content = []
-        
-        for i, line in enumerate(lines):
-            # Check if this line starts a new section (look for section number and header)
-            is_new_section = False
-            for header in section_headers:
-                # Match both "1. MEDICINE NAME:" and just "MEDICINE NAME:"
-                if header in line.upper() and (
-                    line.strip().startswith(header) or 
-                    line.strip().startswith(f"{section_headers.index(header) + 1}.") or
-                    (any(c.isdigit() for c in line[:3]) and header in line.upper())
-                ):
-                    # Save previous section
-                    if current_section:
-                        sections[current_section] = '\n'.join(current_content).strip()
-                    
-                    current_section = header
-                    current_content = []
-                    is_new_section = True
-                    # Skip the header line itself, get content from next line
-                    break
-            
-            if not is_new_section and current_section:
-                # Add line to current section
-                if line.strip():
-                    current_content.append(line)
-                elif current_content:  # Keep empty lines if we already have content
-                    current_content.append(line)
-        
-        # Save last section
-        if current_section:
-            sections[current_section] = '\n'.join(current_content).strip()
-        
-        # If no sections found, try alternative parsing - split by numbered sections
-        if not sections:
-            sections = EnhancedMedicineLLMGenerator._extract_sections_alternative(text, section_headers)
-        
-        # If still no sections, use full text
-        if not sections:
-            sections["FULL INFORMATION"] = text
-        
-        return sections
-    
-    @staticmethod
-    def _extract_sections_alternative(text: str, section_headers: list) -> Dict[str, str]:
-        """Alternative extraction method for numbered sections"""
-        sections = {}
-        
-        for idx, header in enumerate(section_headers, 1):
-            # Look for patterns like "1. MEDICINE NAME:" or "1.MEDICINE NAME" or "[MEDICINE NAME]"
-            pattern_variants = [
-                f"{idx}. {header}",
-                f"{idx}. {header.lower()}",
-                f"{idx}.{header}",
-                f"[{header}]",
-                header
-            ]
-            
-            for variant in pattern_variants:
-                if variant.lower() in text.lower():
-                    start_idx = text.lower().find(variant.lower())
-                    # Find next section start
-                    next_idx = len(text)
-                    for next_header in section_headers:
-                        if next_header != header:
-                            for next_variant in [f"{section_headers.index(next_header) + 1}.", f"[{next_header}]", next_header]:
-                                find_pos = text.lower().find(next_variant.lower(), start_idx + len(variant))
-                                if find_pos != -1 and find_pos < next_idx:
-                                    next_idx = find_pos
-                    
-                    content = text[start_idx + len(variant):next_idx].strip()
-                    if content:
-                        sections[header] = content
-                        break
-        
-        return sections
-    
-    @staticmethod
-    def _extract_sections(text: str) -> Dict[str, str]:
-        """Extract all sections from LLM output - simplified version"""
-        return EnhancedMedicineLLMGenerator._extract_all_sections(text)
-    
-    @staticmethod
-    def _extract_section(text: str, section_name: str) -> str:
-        """Extract specific section from text"""
-        
-        lines = text.split('\n')
-        section_content = []
-        found = False
-        
-        for line in lines:
-            if section_name.upper() in line.upper():
-                found = True
-                continue
-            
-            if found:
-                if any(header in line for header in ['OVERVIEW', 'WHEN TO USE', 'DOSAGE', 'PRECAUTIONS',
-                                                       'SIDE EFFECTS', 'INTERACTIONS', 'INSTRUCTIONS']):
-                    break
-                
-                if line.strip():
-                    section_content.append(line.strip())
-        
-        return ' '.join(section_content[:10]) if section_content else 'Information not available'
-    
-    @staticmethod
-    def _generate_with_fallback(prompt: str, medicine_info: Dict[str, Any], use_llm_even_if_empty: bool = False, retry_count: int = 0, max_retries: int = None) -> Dict[str, Any]:
+    def _generate_with_fallback(prompt: str, medicine_info: Dict[str, Any], max_retries: int = None) -> Dict[str, Any]:
         """
         Attempt LLM generation with automatic fallback
         
@@ -320,8 +340,7 @@ Generate COMPLETE information for all 7 sections. Do not omit any section."""
         Falls back to database response only if LLM completely fails
         
         Args:
-            retry_count: Current retry count (internal use)
-            max_retries: Maximum number of retries (default: 2)
+            max_retries: Maximum number of retries (default: OLLAMA_MAX_RETRIES)
         """
         # Determine max retries
         if max_retries is None:
@@ -335,59 +354,48 @@ Generate COMPLETE information for all 7 sections. Do not omit any section."""
             logger.info(f"🧠 Attempting LLM generation for: {medicine_info.get('name')} (attempt {attempt + 1}/{max_retries + 1}) - read_timeout={read_timeout}s")
 
             try:
-                payload = {
-                    "model": EnhancedMedicineLLMGenerator.MODEL,
-                    "prompt": prompt,
-                    "stream": False,
-                    "temperature": 0.1,  # low temperature for accuracy
-                    "top_p": 0.95,
-                    "top_k": 40,
-                    "num_predict": EnhancedMedicineLLMGenerator.NUM_PREDICT,
-                }
-
+                session = get_session(model=EnhancedMedicineLLMGenerator.MODEL)
                 # Use a tuple timeout: (connect_timeout, read_timeout)
-                response = requests.post(
-                    EnhancedMedicineLLMGenerator.OLLAMA_URL,
-                    json=payload,
-                    timeout=(10, read_timeout)
+                info = session.chat_structured(
+                    prompt,
+                    MedicineInfoOutput,
+                    system=MEDICINE_INFO_SYSTEM_PROMPT,
+                    endpoint="medicine_info",
+                    options={
+                        "temperature": 0.1,  # low temperature for accuracy
+                        "top_p": 0.95,
+                        "top_k": 40,
+                        "num_predict": EnhancedMedicineLLMGenerator.NUM_PREDICT,
+                    },
+                    timeout=(10, read_timeout),
                 )
 
-                if response.status_code == 200:
-                    # Some LLM endpoints respond with a 'response' field
-                    data = None
-                    try:
-                        data = response.json()
-                    except Exception:
-                        # fallback to raw text
-                        pass
-
-                    llm_output = ''
-                    if isinstance(data, dict):
-                        llm_output = data.get('response') or data.get('text') or data.get('output') or ''
-                    if not llm_output:
-                        # try raw text
-                        try:
-                            llm_output = response.text or ''
-                        except Exception:
-                            llm_output = ''
-
-                    if llm_output and llm_output.strip():
-                        logger.info("✅ LLM generated comprehensive medicine information successfully")
-                        return EnhancedMedicineLLMGenerator._parse_comprehensive_output(llm_output, medicine_info)
-
-                    logger.warning(f"LLM returned empty response on attempt {attempt + 1}")
-                    # fall through to retry
-
-                elif response.status_code == 404:
+                if any(info.values()):
+                    logger.info("✅ LLM generated comprehensive medicine information successfully")
+                    return EnhancedMedicineLLMGenerator._parse_comprehensive_output(info, medicine_info)
+
+                logger.warning(f"LLM returned empty response on attempt {attempt + 1}")
+                # fall through to retry
+
+            except OllamaHTTPError as e:
+                if e.status_code == 404:
                     logger.warning("⚠️ LLM service returned 404 - model/service unavailable")
                     break
-                elif response.status_code >= 500:
-                    logger.warning(f"LLM returned server error {response.status_code} on attempt {attempt + 1}")
-                    # retry on server errors
-                else:
-                    logger.warning(f"LLM returned status {response.status_code}, using fallback response")
+                if e.status_code < 500:
+                    logger.warning(f"LLM returned status {e.status_code}, using fallback response")
                     break
+                logger.warning(f"LLM returned server error {e.status_code} on attempt {attempt + 1}")
+                # retry on server errors
+
+            except StructuredOutputError as e:
+                logger.warning(f"⚠️ LLM reply did not match the medicine info format on attempt {attempt + 1}: {e}")
+                # retry
 
+            except LLMOverloadedError:
+                raise
+            except LLMUnavailableError as e:
+                logger.warning(f"⚡ {e}")
+                break
             except requests.exceptions.ConnectionError:
                 logger.warning("❌ Cannot connect to LLM service - Ollama may not be running")
                 break
@@ -402,6 +410,8 @@ Generate COMPLETE information for all 7 sections. Do not omit any section."""
 
             # Prepare for next attempt (if any)
             attempt += 1
+            if attempt <= max_retries and not spend_retry("medicine_info"):
+                break
             if attempt <= max_retries:
                 backoff = min(30, (2 ** attempt) + random.uniform(0.5, 1.5))
                 logger.info(f"Waiting {backoff:.1f}s before next LLM attempt...")
@@ -684,50 +694,28 @@ For safety, it's recommended to consult with:
         
         try:
             # Call LLM with retry logic
-            response_text = EnhancedMedicineLLMGenerator._call_ollama_with_retry(
-                prompt,
-                max_retries=EnhancedMedicineLLMGenerator.MAX_RETRIES,
-                timeout_base=EnhancedMedicineLLMGenerator.TIMEOUT_BASE
-            )
-            
-            logger.debug(f"LLM Response: {response_text[:500]}...")
-            
-            # Parse the JSON response
-            import json
-            
-            # Try to extract JSON from response
-            json_match = None
-            try:
-                # Look for JSON array in the response
-                start_idx = response_text.find('[')
-                end_idx = response_text.rfind(']') + 1
-                
-                if start_idx != -1 and end_idx > start_idx:
-                    json_str = response_text[start_idx:end_idx]
-                    medicines_list = json.loads(json_str)
-                    logger.info(f"✅ Successfully extracted {len(medicines_list)} medicines from prescription")
-                    return {
-                        "status": "success",
-                        "medicines": medicines_list,
-                        "raw_text": noisy_ocr_text,
-                        "llm_output": response_text,
-                        "generated_at": __import__('datetime').datetime.now().isoformat()
-                    }
-            except json.JSONDecodeError as je:
-                logger.warning(f"JSON parsing failed: {je}. Attempting fallback parsing...")
-            
-            # Fallback: manual parsing if JSON extraction fails
-            medicines_list = EnhancedMedicineLLMGenerator._parse_prescription_fallback(response_text)
+            with retry_budget():
+                parsed = EnhancedMedicineLLMGenerator._call_ollama_with_retry(
+                    prompt,
+                    max_retries=EnhancedMedicineLLMGenerator.MAX_RETRIES,
+                    timeout_base=EnhancedMedicineLLMGenerator.TIMEOUT_BASE,
+                    endpoint="prescription_deciphering",
+                    system=PRESCRIPTION_DECIPHERING_SYSTEM_PROMPT,
+                    output_model=PrescriptionDecipherOutput
+                )
             
+            medicines_list = parsed["medicines"]
+            logger.info(f"✅ Successfully extracted {len(medicines_list)} medicines from prescription")
             return {
                 "status": "success" if medicines_list else "partial",
                 "medicines": medicines_list,
                 "raw_text": noisy_ocr_text,
-                "llm_output": response_text,
-                "generated_at": __import__('datetime').datetime.now().isoformat(),
-                "note": "Used fallback parsing - results may be less accurate"
+                "llm_output": output_text(parsed),
+                "generated_at": __import__('datetime').datetime.now().isoformat()
             }
             
+        except LLMOverloadedError:
+            raise
         except Exception as e:
             logger.error(f"❌ Prescription deciphering failed: {e}")
             return {
@@ -744,148 +732,58 @@ For safety, it's recommended to consult with:
         Create a specialized prompt for an expert pharmacist LLM.
         The LLM must decipher messy, handwritten prescription text.
         """
-        prompt = f"""You are an expert pharmacist with 30+ years of experience reading handwritten doctor prescriptions.
-
-TASK: Decipher the following NOISY handwritten prescription text and extract structured medicine information.
-
-IMPORTANT NOTES:
-- The input text is from OCR (optical character recognition) of a handwritten prescription
-- It will contain spelling errors, unclear abbreviations, and medical shorthand
-- Your job is to INTERPRET the messy text and identify actual medicine names and instructions
-- You must work with INCOMPLETE and INCORRECT text
-
-NOISY OCR TEXT FROM HANDWRITTEN PRESCRIPTION:
+        def render(noisy_text: str) -> str:
+            return f"""NOISY OCR TEXT FROM HANDWRITTEN PRESCRIPTION:
 ---
 {noisy_text}
 ---
 
-YOUR TASK:
-1. Identify each DISTINCT medicine mentioned
-2. Extract dosage (e.g., "500mg", "1 tablet", "5ml")
-3. Extract frequency (e.g., "BD" = twice daily, "TDS" = thrice daily, "OD" = once daily, "QID" = four times daily)
-4. Extract duration if mentioned (e.g., "7 days", "2 weeks")
-5. Handle common medical abbreviations:
-   - BD = Bis Die (twice daily)
-   - TDS = Ter Die Sumendum (thrice daily)
-   - OD = Omni Die (once daily)
-   - QID = Quater In Die (four times daily)
-   - PC = Post Cibum (after meals)
-   - AC = Ante Cibum (before meals)
-   - HS = Hora Somni (at bedtime)
-   - AM/PM = morning/evening
-   - SOS = as needed
-   - IM = intramuscular, IV = intravenous, PO = oral
-
-RETURN EXACTLY THIS JSON FORMAT (array of medicine objects):
-[
-  {{
-    "medicine_name": "Actual medicine name (best guess if unclear)",
-    "dosage": "Amount and unit (e.g. 500mg, 1 tablet, 10ml)",
-    "frequency": "How many times per day or interval",
-    "duration": "How long to take (days/weeks/months or 'as needed')",
-    "special_instructions": "Any special instructions (with/without food, bedtime, etc.)",
-    "confidence": "high/medium/low (how confident you are about this medicine)",
-    "notes": "Any uncertainty or alternative interpretations"
-  }},
-  ...
-]
-
-RULES FOR DECIPHERING:
-1. Medicine names: Even if misspelled in OCR, identify the likely medicine
-2. For unclear entries, use "confidence": "low" and add notes
-3. If text says "as needed", set frequency to "as needed" and duration to "N/A"
-4. Remove duplicates - don't list the same medicine twice
-5. Only include items that are clearly medicines (ignore general notes)
-6. If cannot determine a field, use empty string ""
-
-EXAMPLE OUTPUT:
-[
-  {{
-    "medicine_name": "Paracetamol",
-    "dosage": "500mg",
-    "frequency": "TDS (thrice daily)",
-    "duration": "5 days",
-    "special_instructions": "After meals",
-    "confidence": "high",
-    "notes": ""
-  }},
-  {{
-    "medicine_name": "Amoxicillin",
-    "dosage": "250mg",
-    "frequency": "BD (twice daily)",
-    "duration": "10 days",
-    "special_instructions": "With milk or water",
-    "confidence": "high",
-    "notes": ""
-  }}
-]
-
-CRITICAL: Return ONLY the JSON array, nothing else. Start with [ and end with ]"""
-        
-        return prompt
-    
-    @staticmethod
-    def _parse_prescription_fallback(llm_output: str) -> list:
-        """
-        Fallback parser if JSON extraction fails.
-        Attempts to extract medicine information from natural language output.
-        """
-        import re
-        import json
-        
-        medicines = []
+Return ONLY the JSON object, nothing else."""
         
-        # Try to find any JSON-like structure first
-        json_patterns = [
-            r'\[\s*\{.*?\}\s*\]',  # Array of objects
-            r'\{[^}]*medicine[^}]*\}',  # Object with 'medicine'
-        ]
-        
-        for pattern in json_patterns:
-            matches = re.findall(pattern, llm_output, re.DOTALL)
-            for match in matches:
-                try:
-                    parsed = json.loads(match)
-                    if isinstance(parsed, list):
-                        medicines.extend(parsed)
-                    elif isinstance(parsed, dict):
-                        medicines.append(parsed)
-                except:
-                    continue
-        
-        if medicines:
-            logger.info(f"Fallback parser found {len(medicines)} medicines")
-            return medicines
-        
-        # Last resort: try to extract key phrases
-        logger.warning("Could not parse prescription output - returning empty list")
-        return []
+        return fit_prompt(
+            "prescription_deciphering", render,
+            system=PRESCRIPTION_DECIPHERING_SYSTEM_PROMPT, noisy_text=noisy_text
+        )
     
     @staticmethod
-    def _call_ollama_with_retry(prompt: str, max_retries: int = 3, timeout_base: int = 60) -> str:
+    def _call_ollama_with_retry(prompt: str, max_retries: int = 3, timeout_base: int = 60,
+                                endpoint: str = "document_parsing", system: str = "",
+                                output_model: Optional[Type[LLMOutput]] = None) -> Union[str, Dict[str, Any]]:
         """
         Helper method to call Ollama API with retry logic.
         Reuses existing retry mechanism from the class.
+        `system` carries the static instructions (sent as a stable system
+        message for KV cache reuse); token usage is recorded under `endpoint`.
+        With `output_model` the reply is constrained to that model's JSON
+        schema and returned as a validated dict instead of text.
         """
         import time
         
+        session = get_session(model=EnhancedMedicineLLMGenerator.MODEL)
+        options = {"num_predict": EnhancedMedicineLLMGenerator.NUM_PREDICT}
+        # Text replies only; structured ones are built by chat_structured
+        payload = session.build_payload(prompt, system=system, options=options) if output_model is None else None
+        
         for attempt in range(max_retries):
+            if attempt and not spend_retry(endpoint):
+                break
             try:
                 timeout = timeout_base * (2 ** attempt)  # Exponential backoff
                 
-                response = requests.post(
-                    EnhancedMedicineLLMGenerator.OLLAMA_URL,
-                    json={
-                        "model": EnhancedMedicineLLMGenerator.MODEL,
-                        "prompt": prompt,
-                        "stream": False,
-                        "num_predict": EnhancedMedicineLLMGenerator.NUM_PREDICT
-                    },
-                    timeout=timeout
-                )
+                if output_model is not None:
+                    return session.chat_structured(
+                        prompt,
+                        output_model,
+                        system=system,
+                        endpoint=endpoint,
+                        options=options,
+                        timeout=timeout,
+                    )
+                
+                response = session.post(payload, endpoint, timeout=timeout)
                 
                 if response.status_code == 200:
-                    response_text = response.json().get('response', '')
+                    response_text = session.read_reply(response.json(), endpoint, prompt, system)
                     if not response_text:
                         raise RuntimeError("LLM returned empty response")
                     return response_text
@@ -899,6 +797,8 @@ CRITICAL: Return ONLY the JSON array, nothing else. Start with [ and end with ]"
                 if attempt < max_retries - 1:
                     time.sleep(2 ** attempt)
                 continue
+            except (LLMOverloadedError, LLMUnavailableError):
+                raise
             except Exception as e:
                 logger.warning(f"Error on attempt {attempt + 1}: {e}")
                 if attempt < max_retries - 1:
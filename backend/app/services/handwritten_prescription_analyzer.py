@@ -12,8 +12,12 @@ from typing import Dict, Any, Optional
 from datetime import datetime
 from pathlib import Path
 
+from app.core.metrics import collect_stages
 from app.services.handwritten_prescription_preprocessor import HandwrittenPrescriptionPreprocessor
+from app.services.llm_scheduler import LLMOverloadedError
+from app.services.llm_session import get_session
 from app.services.multimethod_ocr import MultiMethodHandwrittenOCR
+from app.services.preprocessing_graph import shared_preprocessing
 
 logger = logging.getLogger(__name__)
 
@@ -57,8 +61,15 @@ class HybridHandwrittenPrescriptionAnalyzer:
             image_path: Path to prescription image
             
         Returns:
-            Complete structured analysis result
+            Complete structured analysis result, with per-stage timings
+            (seconds) in pipeline_stages
         """
+        with collect_stages() as stages, shared_preprocessing():
+            result = self._run_pipeline(image_path)
+        result['pipeline_stages'] = dict(stages)
+        return result
+
+    def _run_pipeline(self, image_path: str) -> Dict[str, Any]:
         self.logger.info(f"🏥 Starting prescription analysis: {image_path}")
 
         try:
@@ -130,6 +141,8 @@ class HybridHandwrittenPrescriptionAnalyzer:
             self.logger.info("✅ Prescription analysis complete")
             return report
 
+        except LLMOverloadedError:
+            raise
         except Exception as e:
             self.logger.error(f"❌ Analysis failed: {str(e)}", exc_info=True)
             return {
@@ -207,15 +220,16 @@ class HybridHandwrittenPrescriptionAnalyzer:
         """
 
         try:
-            response = requests.post(
-                f'{self.ollama_url}/api/generate',
-                json={
+            response = get_session(self.ollama_url, self.ollama_model).post(
+                {
                     'model': self.ollama_model,
                     'prompt': prompt,
                     'stream': False,
                     'temperature': 0.3  # Low temperature for precise extraction
                 },
-                timeout=120
+                "handwritten_prescription",
+                timeout=120,
+                path="/api/generate",
             )
 
             if response.status_code != 200:
@@ -247,6 +261,8 @@ class HybridHandwrittenPrescriptionAnalyzer:
         except requests.exceptions.Timeout:
             self.logger.error("LLM request timeout (120s)")
             return None
+        except LLMOverloadedError:
+            raise
         except Exception as e:
             self.logger.error(f"LLM parsing error: {e}")
             return None
@@ -399,23 +415,39 @@ class HybridHandwrittenPrescriptionAnalyzer:
                 tmp.write(image_bytes)
                 temp_path = tmp.name
 
-            # Analyze
-            result = self.analyze_prescription(temp_path)
+            return self.analyze_upload(temp_path, filename)
+
+        finally:
+            if temp_path and os.path.exists(temp_path):
+                try:
+                    os.unlink(temp_path)
+                except:
+                    pass
+
+    def analyze_upload(self, image_path: str, filename: str = 'prescription.jpg') -> Dict[str, Any]:
+        """
+        Analyze an uploaded prescription already on disk (for API uploads)
+        
+        Args:
+            image_path: Path to the uploaded image
+            filename: Original filename
+            
+        Returns:
+            Analysis result
+        """
+        try:
+            result = self.analyze_prescription(image_path)
             result['uploaded_file'] = filename
 
             return result
 
+        except LLMOverloadedError:
+            raise
         except Exception as e:
-            self.logger.error(f"Error processing bytes: {e}")
+            self.logger.error(f"Error processing upload: {e}")
             return {
                 'status': 'error',
                 'error': str(e),
                 'uploaded_file': filename
             }
-        finally:
-            if temp_path and os.path.exists(temp_path):
-                try:
-                    os.unlink(temp_path)
-                except:
-                    pass
 
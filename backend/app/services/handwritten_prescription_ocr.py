@@ -7,8 +7,30 @@ import easyocr
 import pytesseract
 import numpy as np
 import logging
-from typing import Dict, List, Tuple, Optional
+from typing import Any, Dict, List, Tuple, Optional
 import json
+import os
+import tempfile
+
+import cv2
+from PIL import Image
+
+from app.core.metrics import collect_stages, timed
+from app.services import text_regions
+from app.services.orientation import correct_orientation
+
+try:
+    import torch
+    from transformers import TrOCRProcessor, VisionEncoderDecoderModel
+    HAVE_TROCR = True
+except ImportError:
+    HAVE_TROCR = False
+
+try:
+    import craft_text_detector
+    HAVE_CRAFT = True
+except ImportError:
+    HAVE_CRAFT = False
 
 try:
     from paddleocr import PaddleOCR
@@ -26,6 +48,7 @@ class TextLineDetector:
     """
     
     @staticmethod
+    @timed("ocr.text_detection")
     def detect_text_regions(image: np.ndarray) -> List[Tuple[int, int, int, int]]:
         """
         Detect text regions in image using CRAFT or contour-based detection.
@@ -136,6 +159,7 @@ class PrescriptionImageNormalizer:
     """
     
     @staticmethod
+    @timed("preprocess.normalize")
     def normalize_image(image) -> np.ndarray:
         """
         Normalize image for handwritten text recognition.
@@ -178,186 +202,133 @@ class PrescriptionImageNormalizer:
 
 class TextCropPreprocessor:
     """
-    Preprocess individual text crop images for TrOCR.
+    Line crops for TrOCR. The page is binarized once; tall detections are
+    split into lines at empty rows of their ink profile (run lengths found
+    with NumPy), and every crop is a view into the binarized page.
     """
     
+    # Detections taller than this (px) may hold several lines
+    SPLIT_MIN_HEIGHT = 100
+    
+    # Shortest ink run (px) counted as a text line when splitting
+    MIN_LINE_HEIGHT = 8
+    
+    # Page margin (px) kept around every crop to avoid clipped characters
+    CROP_PADDING = 8
+    
     @staticmethod
-    def preprocess_crop(crop: np.ndarray) -> Image.Image:
+    @timed("preprocess.page_binarize")
+    def binarize_page(image: np.ndarray) -> np.ndarray:
         """
-        Preprocess a single text crop for TrOCR.
-        
-        Args:
-            crop: Text crop image (numpy array)
-            
-        Returns:
-            PIL Image ready for TrOCR
+        CLAHE + adaptive threshold of the whole page (text = black on white),
+        computed once instead of per crop
         """
-        # Ensure grayscale
-        if len(crop.shape) == 3:
-            gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
-        else:
-            gray = crop
-
-        # Contrast enhancement (CLAHE)
-        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-        enhanced = clahe.apply(gray)
-
-        # Adaptive thresholding (text = black on white background)
-        binary = cv2.adaptiveThreshold(
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if len(image.shape) == 3 else image
+        enhanced = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8)).apply(gray)
+        return cv2.adaptiveThreshold(
             enhanced, 255,
             cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
             cv2.THRESH_BINARY,
             31,  # Block size (must be odd)
             11   # Constant subtracted from mean
         )
-
-        # Add padding to avoid clipped characters
-        pad = 8
-        binary = cv2.copyMakeBorder(
-            binary, pad, pad, pad, pad,
-            borderType=cv2.BORDER_CONSTANT,
-            value=255
+    
+    @staticmethod
+    def preprocess_crop(crop: np.ndarray) -> Image.Image:
+        """
+        TrOCR input for a crop of the binarized page. No resize here: the
+        TrOCR processor resizes the whole batch in one call.
+        
+        Args:
+            crop: Crop of binarize_page() output (numpy array)
+            
+        Returns:
+            PIL Image (RGB, as TrOCR expects)
+        """
+        return Image.fromarray(crop).convert("RGB")
+    
+    @staticmethod
+    def _text_runs(has_ink: np.ndarray, min_length: int) -> np.ndarray:
+        """(start, end) of every run of True at least min_length long, shape (runs, 2)"""
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], has_ink.view(np.int8), [0]))))
+        runs = edges.reshape(-1, 2)
+        return runs[runs[:, 1] - runs[:, 0] >= min_length]
+    
+    @staticmethod
+    def _split_lines_in_crop(ink: np.ndarray) -> np.ndarray:
+        """
+        Text line row ranges (start, end) of a tall detection from its
+        horizontal ink profile. Empty when there is no reliable split.
+        
+        Args:
+            ink: Boolean ink mask of the detection (view of the page mask)
+        """
+        h, w = ink.shape
+        if h < 40:
+            return np.empty((0, 2), dtype=np.int64)
+        
+        # Rows whose ink exceeds 2% of the width (at least 5 px) hold text
+        row_sum = np.count_nonzero(ink, axis=1)
+        lines = TextCropPreprocessor._text_runs(
+            row_sum > max(5, int(0.02 * w)), TextCropPreprocessor.MIN_LINE_HEIGHT
         )
-
-        # Resize to a consistent height while keeping aspect ratio
-        target_h = 64
-        h, w = binary.shape
-        scale = target_h / max(h, 1)
-        new_w = max(1, int(w * scale))
-        resized = cv2.resize(binary, (new_w, target_h), interpolation=cv2.INTER_CUBIC)
-
-        # Convert to PIL Image and ensure RGB (TrOCR expects RGB)
-        pil_image = Image.fromarray(resized).convert("RGB")
-
-        return pil_image
+        
+        # If only one line detected, no split
+        return lines if len(lines) > 1 else np.empty((0, 2), dtype=np.int64)
     
     @staticmethod
-    def extract_line_crops(image: np.ndarray, boxes: List[Tuple[int, int, int, int]]) -> List[Tuple[int, np.ndarray]]:
+    @timed("preprocess.line_crops")
+    def extract_line_crops(image: np.ndarray, boxes: List[Tuple[int, int, int, int]],
+                           binary: Optional[np.ndarray] = None) -> List[Tuple[int, np.ndarray]]:
         """
-        Extract individual line crops from detected bounding boxes.
-        Store Y coordinate for later sorting.
+        Line crops (views of the binarized page) from detected bounding
+        boxes, splitting tall boxes into lines. Stores the Y coordinate for
+        later sorting.
         
         Args:
             image: Original image (numpy array)
             boxes: List of bounding boxes [(x1, y1, x2, y2), ...]
+            binary: binarize_page(image), if already computed
             
         Returns:
             List of (y_coordinate, crop_image) tuples
         """
         logger.info(f"📍 Extracting {len(boxes)} text line crops...")
         
-        line_crops = []
+        if binary is None:
+            binary = TextCropPreprocessor.binarize_page(image)
+        ink = binary == 0
+        page_h, page_w = binary.shape
+        pad = TextCropPreprocessor.CROP_PADDING
         
-        for box in boxes:
-            x1, y1, x2, y2 = box
-            
-            # Ensure bounds are valid
-            x1 = max(0, x1)
-            y1 = max(0, y1)
-            x2 = min(image.shape[1], x2)
-            y2 = min(image.shape[0], y2)
-            
-            # Skip invalid crops
-            if x2 <= x1 or y2 <= y1:
-                continue
-            
-            # Extract crop
-            crop = image[y1:y2, x1:x2]
-
-            # Only split very tall crops (> 100px height) to avoid over-fragmenting
-            crop_h = y2 - y1
-            if crop_h > 100:
-                split_crops = TextCropPreprocessor._split_lines_in_crop(crop)
-                if len(split_crops) > 1:
-                    for split_y, split_crop in split_crops:
-                        # Store with Y coordinate for sorting (relative to original image)
-                        line_crops.append((y1 + split_y, split_crop))
-                else:
-                    # Store with Y coordinate for sorting
-                    line_crops.append((y1, crop))
-            else:
+        boxes = np.asarray(boxes, dtype=np.int64).reshape(-1, 4)
+        # Ensure bounds are valid, skip empty boxes
+        boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, page_w)
+        boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, page_h)
+        boxes = boxes[(boxes[:, 2] > boxes[:, 0]) & (boxes[:, 3] > boxes[:, 1])]
+        
+        line_crops = []
+        for x1, y1, x2, y2 in boxes.tolist():
+            rows = np.array([[y1, y2]])
+            # Only split very tall crops to avoid over-fragmenting
+            if y2 - y1 > TextCropPreprocessor.SPLIT_MIN_HEIGHT:
+                split = TextCropPreprocessor._split_lines_in_crop(ink[y1:y2, x1:x2])
+                if len(split):
+                    rows = split + y1
+            
+            cx1, cx2 = max(0, x1 - pad), min(page_w, x2 + pad)
+            for top, bottom in rows.tolist():
                 # Store with Y coordinate for sorting
-                line_crops.append((y1, crop))
+                line_crops.append((top, binary[max(0, top - pad):min(page_h, bottom + pad), cx1:cx2]))
         
         logger.debug(f"✅ Extracted {len(line_crops)} valid crops")
         return line_crops
 
-    @staticmethod
-    def _split_lines_in_crop(crop: np.ndarray) -> List[Tuple[int, np.ndarray]]:
-        """
-        Attempt to split a large crop into multiple text lines using horizontal projection.
-        Returns list of (y_offset, crop) tuples. Empty list means no reliable split.
-        """
-        try:
-            if crop is None or crop.size == 0:
-                return []
-
-            # Convert to grayscale
-            if len(crop.shape) == 3:
-                gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
-            else:
-                gray = crop
-
-            # Binarize (text = white)
-            binary = cv2.adaptiveThreshold(
-                gray, 255,
-                cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-                cv2.THRESH_BINARY_INV,
-                21, 5
-            )
-
-            h, w = binary.shape
-            if h < 40:
-                return []
-
-            # Horizontal projection: sum of white pixels per row
-            row_sum = (binary > 0).sum(axis=1)
-            threshold = max(5, int(0.02 * w))
-
-            # Identify rows that likely contain text
-            text_rows = row_sum > threshold
-
-            # Find contiguous text row ranges
-            lines = []
-            in_line = False
-            start = 0
-            for i, is_text in enumerate(text_rows):
-                if is_text and not in_line:
-                    in_line = True
-                    start = i
-                elif not is_text and in_line:
-                    end = i
-                    if end - start >= 8:  # minimum line height
-                        lines.append((start, end))
-                    in_line = False
-            if in_line:
-                end = h
-                if end - start >= 8:
-                    lines.append((start, end))
-
-            # If only one line detected, no split
-            if len(lines) <= 1:
-                return []
-
-            # Build crops with padding
-            results = []
-            pad = 6
-            for (y_start, y_end) in lines:
-                y1 = max(0, y_start - pad)
-                y2 = min(h, y_end + pad)
-                line_crop = crop[y1:y2, :]
-                results.append((y1, line_crop))
-
-            return results
-        except Exception as e:
-            logger.debug(f"Line split failed: {e}")
-            return []
-
 
 class TrOCRRecognizer:
     """
     Handwritten text recognition using TrOCR.
-    Processes individual text crops, one at a time.
+    Processes text line crops in batches.
     """
     
     _processor = None
@@ -442,12 +413,28 @@ class TrOCRRecognizer:
         Returns:
             Recognized text
         """
+        texts = TrOCRRecognizer.recognize_text_crops([crop_image])
+        return texts[0] if texts else ""
+    
+    @staticmethod
+    def recognize_text_crops(crop_images: List[Image.Image]) -> List[str]:
+        """
+        Recognize text in a batch of image crops using TrOCR: one processor
+        call resizes and normalizes the whole batch, one generate() call
+        decodes it.
+        
+        Args:
+            crop_images: PIL Images of text crops
+            
+        Returns:
+            Recognized text per crop (empty strings if recognition failed)
+        """
         TrOCRRecognizer._initialize_trocr()
         
         try:
             # Prepare pixel values
             pixel_values = TrOCRRecognizer._processor(
-                crop_image,
+                images=crop_images,
                 return_tensors="pt"
             ).pixel_values.to(TrOCRRecognizer._device)
             
@@ -461,22 +448,23 @@ class TrOCRRecognizer:
                 )
             
             # Decode
-            text = TrOCRRecognizer._processor.batch_decode(
+            texts = TrOCRRecognizer._processor.batch_decode(
                 generated_ids,
                 skip_special_tokens=True
-            )[0]
+            )
             
-            return text.strip()
+            return [text.strip() for text in texts]
             
         except Exception as e:
             logger.error(f"❌ TrOCR recognition failed: {e}")
-            return ""
+            return [""] * len(crop_images)
     
     @staticmethod
+    @timed("ocr.trocr")
     def recognize_line_crops(line_crops: List[Tuple[int, np.ndarray]]) -> List[Tuple[int, str]]:
         """
-        Recognize text in multiple line crops.
-        Process one crop at a time.
+        Recognize text in multiple line crops, REGION_OCR_BATCH_SIZE crops
+        per TrOCR call.
         
         Args:
             line_crops: List of (y_coordinate, crop_image) tuples
@@ -487,21 +475,23 @@ class TrOCRRecognizer:
         logger.info(f"🧠 Recognizing text in {len(line_crops)} crops...")
         
         results = []
+        batch_size = text_regions.BATCH_SIZE
         
-        for i, (y_coord, crop) in enumerate(line_crops):
-            logger.debug(f"Processing crop {i+1}/{len(line_crops)} (Y={y_coord})")
-            
-            # Preprocess crop
-            pil_crop = TextCropPreprocessor.preprocess_crop(crop)
+        for start in range(0, len(line_crops), batch_size):
+            batch = line_crops[start:start + batch_size]
+            logger.debug(f"Processing crops {start + 1}-{start + len(batch)}/{len(line_crops)}")
             
-            # Recognize with TrOCR
-            text = TrOCRRecognizer.recognize_text_crop(pil_crop)
+            # Preprocess crops and recognize with TrOCR
+            texts = TrOCRRecognizer.recognize_text_crops(
+                [TextCropPreprocessor.preprocess_crop(crop) for _, crop in batch]
+            )
             
-            if text:
-                results.append((y_coord, text))
-                logger.debug(f"  ✅ Recognized: {text}")
-            else:
-                logger.debug(f"  ⚠️ No text recognized")
+            for (y_coord, _), text in zip(batch, texts):
+                if text:
+                    results.append((y_coord, text))
+                    logger.debug(f"  ✅ Recognized (Y={y_coord}): {text}")
+                else:
+                    logger.debug(f"  ⚠️ No text recognized (Y={y_coord})")
         
         logger.info(f"✅ Recognized text in {len(results)} crops")
         return results
@@ -513,22 +503,37 @@ class HandwrittenPrescriptionOCR:
     """
     
     @staticmethod
-    def process_prescription_image(image_path: str) -> Dict[str, Any]:
+    def process_prescription_image(image_path: str, image: Optional[np.ndarray] = None) -> Dict[str, Any]:
         """
         Complete pipeline: Normalize → Detect → Crop → Preprocess → TrOCR → Sort → Merge
         
         Args:
             image_path: Path to prescription image
+            image: The image already loaded and straightened (correct_orientation),
+                to skip reading it and estimating its orientation again
             
         Returns:
-            Dictionary with recognized text and metadata
+            Dictionary with recognized text and metadata, with per-stage
+            timings (seconds) in pipeline_stages
         """
+        with collect_stages() as stages:
+            result = HandwrittenPrescriptionOCR._run_pipeline(image_path, image)
+        result["pipeline_stages"] = dict(stages)
+        return result
+    
+    @staticmethod
+    def _run_pipeline(image_path: str, original_image: Optional[np.ndarray] = None) -> Dict[str, Any]:
         logger.info(f"🏥 Starting handwritten prescription OCR for: {image_path}")
         
         try:
-            # STEP 1: Load and normalize image
+            # STEP 1: Load, straighten and normalize image
             logger.info("📸 STEP 1: Loading and normalizing image...")
-            normalized_image = PrescriptionImageNormalizer.normalize_image(image_path)
+            if original_image is None:
+                original_image = cv2.imread(image_path)
+                if original_image is None:
+                    raise ValueError(f"Could not load original image from {image_path}")
+                original_image = correct_orientation(original_image)
+            normalized_image = PrescriptionImageNormalizer.normalize_image(original_image)
             
             # STEP 2: Detect text lines
             logger.info("🔍 STEP 2: Detecting text regions...")
@@ -546,12 +551,8 @@ class HandwrittenPrescriptionOCR:
             
             logger.info(f"✅ Detected {len(boxes)} text regions")
             
-            # STEP 3: Load original image for cropping
+            # STEP 3: Crop lines from the (straightened) original image
             logger.info("📍 STEP 3: Extracting text line crops...")
-            original_image = cv2.imread(image_path)
-            if original_image is None:
-                raise ValueError(f"Could not load original image from {image_path}")
-            
             line_crops = TextCropPreprocessor.extract_line_crops(original_image, boxes)
             
             if not line_crops:
@@ -582,14 +583,6 @@ class HandwrittenPrescriptionOCR:
                 "ocr_text": final_text,
                 "text_lines": [text for _, text in recognized_lines],
                 "num_lines_detected": len(recognized_lines),
-                "pipeline_stages": {
-                    "normalization": "✅ Complete",
-                    "text_detection": "✅ Complete",
-                    "crop_extraction": "✅ Complete",
-                    "trocr_recognition": "✅ Complete",
-                    "sorting": "✅ Complete",
-                    "merging": "✅ Complete"
-                },
                 "warnings": [
                     "This analysis is AI-assisted and should be verified with the original prescription",
                     "Non-Latin scripts may not be recognized correctly",
@@ -698,11 +691,11 @@ class HandwrittenPrescriptionOCR:
                 },
                 "step_3": {
                     "name": "Text Line Extraction",
-                    "technique": "Bounding box cropping with Y coordinate tracking"
+                    "technique": "Views of the binarized page, tall boxes split at empty rows of the ink profile"
                 },
                 "step_4": {
                     "name": "Crop Preprocessing",
-                    "technique": "Adaptive thresholding per crop"
+                    "technique": "One CLAHE + adaptive threshold pass over the page, batched resize in the TrOCR processor"
                 },
                 "step_5": {
                     "name": "Handwritten Text Recognition",
@@ -725,6 +718,6 @@ class HandwrittenPrescriptionOCR:
                 "ocr_text": "Full recognized text with line breaks",
                 "text_lines": "Array of individual recognized lines",
                 "num_lines_detected": "Number of detected text lines",
-                "pipeline_stages": "Status of each pipeline step"
+                "pipeline_stages": "Seconds spent in each pipeline stage"
             }
         }
@@ -7,7 +7,10 @@ import cv2
 import numpy as np
 import logging
 from typing import Tuple, Optional
-import imutils
+
+from app.core.metrics import timed
+from app.services.orientation import correct_orientation
+from app.services.preprocessing_graph import GRAYSCALE, preprocessing_graph
 
 logger = logging.getLogger(__name__)
 
@@ -18,6 +21,24 @@ class HandwrittenPrescriptionPreprocessor:
     def __init__(self):
         self.logger = logger
 
+    @staticmethod
+    def ocr_steps(target_size: Tuple[int, int] = (1920, 1440)) -> tuple:
+        """
+        Preprocessing steps: resize if too large, denoise (noise-adaptive + bilateral,
+        preserves edges), grayscale, CLAHE, adaptive threshold, then
+        closing (removes small holes) and opening (removes small noise)
+        """
+        return (
+            ("resize", *target_size),
+            ("denoise_color", 10, 10),
+            ("bilateral", 9, 75, 75),
+            GRAYSCALE,
+            ("contrast", 3.0, 8),
+            ("threshold_adaptive", "gaussian", 11, 2),
+            ("morphology", "close", "rect", 2),
+            ("morphology", "open", "rect", 2),
+        )
+
     def preprocess_for_ocr(self, image_path: str, target_size: Tuple[int, int] = (1920, 1440)) -> np.ndarray:
         """
         Complete preprocessing pipeline for handwritten prescriptions
@@ -34,36 +55,11 @@ class HandwrittenPrescriptionPreprocessor:
             image = cv2.imread(image_path)
             if image is None:
                 raise ValueError(f"Could not read image: {image_path}")
+            image = correct_orientation(image)
 
             self.logger.info("Starting handwritten prescription preprocessing...")
 
-            # Step 1: Resize if too large
-            image = self._resize_image(image, target_size)
-            self.logger.debug("✓ Image resized")
-
-            # Step 2: Denoise
-            denoised = self._denoise(image)
-            self.logger.debug("✓ Denoising completed")
-
-            # Step 3: Deskew (correct rotation)
-            deskewed = self._deskew(denoised)
-            self.logger.debug("✓ Deskewing completed")
-
-            # Step 4: Convert to grayscale
-            gray = cv2.cvtColor(deskewed, cv2.COLOR_BGR2GRAY)
-            self.logger.debug("✓ Grayscale conversion completed")
-
-            # Step 5: Contrast enhancement (CLAHE)
-            enhanced = self._enhance_contrast(gray)
-            self.logger.debug("✓ Contrast enhancement completed")
-
-            # Step 6: Adaptive thresholding
-            binary = self._adaptive_threshold(enhanced)
-            self.logger.debug("✓ Adaptive thresholding completed")
-
-            # Step 7: Morphological operations
-            processed = self._morphological_operations(binary)
-            self.logger.debug("✓ Morphological operations completed")
+            processed = preprocessing_graph(image).run(self.ocr_steps(target_size))
 
             self.logger.info("✅ Preprocessing completed successfully")
             return processed
@@ -72,112 +68,6 @@ class HandwrittenPrescriptionPreprocessor:
             self.logger.error(f"Error in preprocessing: {str(e)}")
             raise
 
-    def _resize_image(self, image: np.ndarray, max_size: Tuple[int, int]) -> np.ndarray:
-        """Resize image if larger than max_size"""
-        height, width = image.shape[:2]
-
-        if width > max_size[0] or height > max_size[1]:
-            # Calculate scale to fit within max_size
-            scale = min(max_size[0] / width, max_size[1] / height)
-            new_width = int(width * scale)
-            new_height = int(height * scale)
-            image = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_AREA)
-
-        return image
-
-    def _denoise(self, image: np.ndarray) -> np.ndarray:
-        """Remove noise from image using multiple techniques"""
-        try:
-            # Method 1: Non-local means denoising (use positional args for compatibility)
-            # Parameters: src, dest, h, hForColorComponents, templateWindowSize, searchWindowSize
-            denoised = cv2.fastNlMeansDenoisingColored(
-                image,
-                None,
-                10,  # h (filter strength for luminance)
-                10,  # hForColorComponents
-                7,   # templateWindowSize
-                21   # searchWindowSize
-            )
-        except cv2.error as e:
-            # Fallback for OpenCV version compatibility
-            self.logger.warning(f"fastNlMeansDenoisingColored failed: {e}. Using bilateral filter instead.")
-            denoised = image
-
-        # Method 2: Bilateral filtering (preserves edges)
-        denoised = cv2.bilateralFilter(denoised, 9, 75, 75)
-
-        return denoised
-
-    def _deskew(self, image: np.ndarray, threshold: float = 0.5) -> np.ndarray:
-        """
-        Detect and correct skew in handwritten text
-        Uses contour analysis to find rotation angle
-        """
-        try:
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            thresh = cv2.threshold(gray, 150, 255, cv2.THRESH_BINARY)[1]
-
-            # Find contours
-            cnts = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            cnts = imutils.grab_contours(cnts)
-
-            if len(cnts) > 0:
-                # Get minimum area rectangle
-                c = max(cnts, key=cv2.contourArea)
-                rect = cv2.minAreaRect(c)
-                angle = rect[-1]
-
-                # Adjust angle
-                if angle < -45:
-                    angle = 90 + angle
-
-                # If angle is small, no need to rotate
-                if abs(angle) > threshold:
-                    h, w = image.shape[:2]
-                    center = (w // 2, h // 2)
-                    M = cv2.getRotationMatrix2D(center, angle, 1.0)
-                    image = cv2.warpAffine(image, M, (w, h), borderMode=cv2.BORDER_REPLICATE)
-
-        except Exception as e:
-            self.logger.warning(f"Deskew failed: {str(e)}, continuing without deskew")
-
-        return image
-
-    def _enhance_contrast(self, image: np.ndarray) -> np.ndarray:
-        """Enhance contrast using CLAHE (Contrast Limited Adaptive Histogram Equalization)"""
-        # CLAHE for adaptive contrast enhancement
-        clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8, 8))
-        enhanced = clahe.apply(image)
-
-        return enhanced
-
-    def _adaptive_threshold(self, image: np.ndarray) -> np.ndarray:
-        """Apply adaptive thresholding for better text separation"""
-        # Adaptive threshold handles varying lighting conditions
-        binary = cv2.adaptiveThreshold(
-            image,
-            255,
-            cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-            cv2.THRESH_BINARY,
-            blockSize=11,  # Size of pixel neighborhood
-            C=2  # Constant subtracted
-        )
-
-        return binary
-
-    def _morphological_operations(self, image: np.ndarray) -> np.ndarray:
-        """Apply morphological operations to clean up binary image"""
-        # Define kernel
-        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (2, 2))
-
-        # Closing (dilation then erosion) - removes small holes
-        closed = cv2.morphologyEx(image, cv2.MORPH_CLOSE, kernel, iterations=1)
-
-        # Opening (erosion then dilation) - removes small noise
-        opened = cv2.morphologyEx(closed, cv2.MORPH_OPEN, kernel, iterations=1)
-
-        return opened
-
     def segment_text_regions(self, image: np.ndarray) -> list:
         """
         Detect and segment individual text regions/lines
@@ -204,6 +94,7 @@ class HandwrittenPrescriptionPreprocessor:
         x, y, w, h = region
         return image[y:y+h, x:x+w]
 
+    @timed("preprocess.quality_score")
     def get_image_quality_score(self, image: np.ndarray) -> float:
         """
         Calculate image quality score (0-1)
@@ -245,3 +136,4 @@ class HandwrittenPrescriptionPreprocessor:
             enhanced = gray
 
         return enhanced
+
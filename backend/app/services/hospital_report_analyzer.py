@@ -13,21 +13,26 @@ import cv2
 import numpy as np
 import tempfile
 import os
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 from PIL import Image
 
+from app.core.metrics import collect_stages, stage
+from app.services import tesseract_pool, text_regions
+from app.services.orientation import correct_orientation
+from app.services.preprocessing_graph import GRAYSCALE, preprocessing_graph, shared_preprocessing
+from app.services.llm_scheduler import LLMOverloadedError
+
 logger = logging.getLogger(__name__)
 
 # Import OCR libraries
 HAVE_TESSERACT = False
 HAVE_EASYOCR = False
 
-try:
-    import pytesseract
+if tesseract_pool.is_available():
     HAVE_TESSERACT = True
     logger.info("✅ Tesseract OCR available for hospital reports")
-except ImportError:
-    logger.warning("⚠️ pytesseract not installed")
+else:
+    logger.warning("⚠️ tesserocr/pytesseract not installed")
 
 try:
     import easyocr
@@ -54,8 +59,16 @@ class HospitalReportAnalyzer:
             image_path: Path to hospital report image
             
         Returns:
-            Dictionary with structured report information
+            Dictionary with structured report information, with per-stage
+            timings (seconds) in pipeline_stages
         """
+        with collect_stages() as stages, shared_preprocessing():
+            result = HospitalReportAnalyzer._run_pipeline(image_path)
+        result["pipeline_stages"] = dict(stages)
+        return result
+    
+    @staticmethod
+    def _run_pipeline(image_path: str) -> Dict[str, Any]:
         logger.info(f"🏥 Starting hospital report analysis for: {image_path}")
         
         try:
@@ -107,6 +120,8 @@ class HospitalReportAnalyzer:
                 ]
             }
             
+        except LLMOverloadedError:
+            raise
         except Exception as e:
             logger.error(f"❌ Hospital report analysis failed: {e}", exc_info=True)
             return {
@@ -128,6 +143,10 @@ class HospitalReportAnalyzer:
             image = cv2.imread(image_path)
             if image is None:
                 raise ValueError(f"Could not load image from {image_path}")
+            image = correct_orientation(image)
+            
+            # Text blocks/lines shared by every method below (None: read the whole page)
+            layout = text_regions.region_layout(image)
             
             all_results = []
             
@@ -140,8 +159,12 @@ class HospitalReportAnalyzer:
                         logger.info("  📍 Initializing EasyOCR reader...")
                         HospitalReportAnalyzer._easyocr_reader = easyocr.Reader(['en'], gpu=False)
                     
-                    # Try on original image
-                    result = HospitalReportAnalyzer._easyocr_reader.readtext(image)
+                    # Try on original image (only the detected text lines with region-first OCR)
+                    with stage("ocr.easyocr"):
+                        if layout:
+                            result = text_regions.easyocr_lines(HospitalReportAnalyzer._easyocr_reader, image, layout.lines)
+                        else:
+                            result = HospitalReportAnalyzer._easyocr_reader.readtext(image)
                     
                     # Sort by vertical position (top to bottom, left to right)
                     sorted_result = sorted(result, key=lambda x: (x[0][0][1], x[0][0][0]))
@@ -179,15 +202,14 @@ class HospitalReportAnalyzer:
                         (4, "single column of text"),
                         (11, "sparse text")
                     ]
+                    if layout:
+                        # Each detected block is a uniform block of text
+                        psm_modes = psm_modes[:1]
                     
                     for psm, description in psm_modes:
                         try:
-                            custom_config = f'--oem 3 --psm {psm}'
-                            text = pytesseract.image_to_string(
-                                preprocessed, 
-                                lang='eng',
-                                config=custom_config
-                            )
+                            with stage("ocr.tesseract"):
+                                text = HospitalReportAnalyzer._tesseract_text(preprocessed, psm, layout)
                             
                             if len(text.strip()) > best_length:
                                 best_text = text
@@ -209,12 +231,10 @@ class HospitalReportAnalyzer:
                     logger.info("🔍 METHOD 3: Tesseract on original grayscale...")
                     
                     # Convert to grayscale only
-                    if len(image.shape) == 3:
-                        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-                    else:
-                        gray = image
+                    gray = preprocessing_graph(image).run((GRAYSCALE,))
                     
-                    text = pytesseract.image_to_string(gray, lang='eng', config='--oem 3 --psm 3')
+                    with stage("ocr.tesseract"):
+                        text = HospitalReportAnalyzer._tesseract_text(gray, 3, layout)
                     
                     if text and len(text.strip()) > 20:
                         logger.info(f"  ✅ Tesseract-Original: {len(text)} chars")
@@ -274,6 +294,15 @@ class HospitalReportAnalyzer:
                 "ocr_text": ""
             }
     
+    @staticmethod
+    def _tesseract_text(image: np.ndarray, psm: int, layout: Optional[text_regions.TextLayout]) -> str:
+        """Tesseract text of the page, or of each text block (PSM 6) in reading order"""
+        if layout is None:
+            return tesseract_pool.image_to_string(image, psm=psm)
+        return text_regions.ocr_regions(
+            image, layout.blocks, lambda block: (tesseract_pool.image_to_string(block, psm=6), None)
+        )[0]
+    
     @staticmethod
     def _preprocess_for_ocr(image: np.ndarray) -> np.ndarray:
         """
@@ -353,6 +382,8 @@ class HospitalReportAnalyzer:
             
             return result
             
+        except LLMOverloadedError:
+            raise
         except Exception as e:
             logger.error(f"Error analyzing hospital report bytes: {e}")
             return {
@@ -6,24 +6,30 @@ Supports: Tesseract (printed), EasyOCR (printed), TrOCR (handwritten)
 import cv2
 import numpy as np
 import logging
-from typing import Dict, Any, Tuple
+from typing import Dict, Any, Optional, Tuple
 from PIL import Image
 import tempfile
 import os
 
+from app.services.orientation import correct_orientation
+from app.services.preprocessing_graph import GRAYSCALE, preprocessing_graph, shared_preprocessing
+
 logger = logging.getLogger(__name__)
 
+TESSERACT_STEPS = (GRAYSCALE, ("denoise", 10), ("contrast", 2.0, 8), ("threshold_otsu",))
+
 # Try importing OCR libraries
 HAVE_TESSERACT = False
 HAVE_EASYOCR = False
 HAVE_TROCR = False
 
-try:
-    import pytesseract
+from app.services import tesseract_pool
+
+if tesseract_pool.is_available():
     HAVE_TESSERACT = True
     logger.info("✅ Tesseract OCR available")
-except ImportError:
-    logger.warning("⚠️ pytesseract not installed")
+else:
+    logger.warning("⚠️ tesserocr/pytesseract not installed")
 
 try:
     import easyocr
@@ -70,16 +76,18 @@ class HybridPrescriptionOCR:
             image = cv2.imread(image_path)
             if image is None:
                 raise ValueError(f"Could not load image from {image_path}")
+            image = correct_orientation(image)
             
-            # Detect if handwritten or printed
-            is_handwritten = HybridPrescriptionOCR._detect_handwritten(image)
-            
-            if is_handwritten:
-                logger.info("📝 Detected: HANDWRITTEN prescription")
-                return HybridPrescriptionOCR._process_handwritten(image_path)
-            else:
-                logger.info("🖨️ Detected: PRINTED prescription")
-                return HybridPrescriptionOCR._process_printed(image)
+            with shared_preprocessing():
+                # Detect if handwritten or printed
+                is_handwritten = HybridPrescriptionOCR._detect_handwritten(image)
+                
+                if is_handwritten:
+                    logger.info("📝 Detected: HANDWRITTEN prescription")
+                    return HybridPrescriptionOCR._process_handwritten(image_path, image)
+                else:
+                    logger.info("🖨️ Detected: PRINTED prescription")
+                    return HybridPrescriptionOCR._process_printed(image)
                 
         except Exception as e:
             logger.error(f"❌ Prescription processing failed: {e}")
@@ -98,10 +106,7 @@ class HybridPrescriptionOCR:
         """
         try:
             # Convert to grayscale
-            if len(image.shape) == 3:
-                gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            else:
-                gray = image
+            gray = preprocessing_graph(image).run((GRAYSCALE,))
             
             # Calculate edge density
             edges = cv2.Canny(gray, 50, 150)
@@ -137,7 +142,7 @@ class HybridPrescriptionOCR:
         if HAVE_TESSERACT:
             try:
                 logger.info("🔍 Using Tesseract OCR...")
-                text = pytesseract.image_to_string(preprocessed, lang='eng', config='--psm 6')
+                text = tesseract_pool.image_to_string(preprocessed, psm=6)
                 
                 if text and len(text.strip()) > 10:
                     lines = [line.strip() for line in text.split('\n') if line.strip()]
@@ -185,9 +190,10 @@ class HybridPrescriptionOCR:
         }
     
     @staticmethod
-    def _process_handwritten(image_path: str) -> Dict[str, Any]:
+    def _process_handwritten(image_path: str, image: Optional[np.ndarray] = None) -> Dict[str, Any]:
         """
-        Process handwritten prescription using TrOCR.
+        Process handwritten prescription using TrOCR. image is the loaded,
+        straightened page, so its orientation is not estimated twice.
         """
         if not HAVE_TROCR:
             return {
@@ -201,30 +207,15 @@ class HybridPrescriptionOCR:
         
         # Import the existing handwritten OCR module
         from app.services.handwritten_prescription_ocr import HandwrittenPrescriptionOCR
-        return HandwrittenPrescriptionOCR.process_prescription_image(image_path)
+        return HandwrittenPrescriptionOCR.process_prescription_image(image_path, image)
     
     @staticmethod
     def _preprocess_for_tesseract(image: np.ndarray) -> np.ndarray:
         """
-        Preprocess image for better Tesseract accuracy on printed prescriptions.
+        Preprocess image for better Tesseract accuracy on printed prescriptions:
+        grayscale, denoise, increase contrast, binarize.
         """
-        # Convert to grayscale
-        if len(image.shape) == 3:
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        else:
-            gray = image
-        
-        # Denoise
-        denoised = cv2.fastNlMeansDenoising(gray, None, 10, 7, 21)
-        
-        # Increase contrast
-        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-        enhanced = clahe.apply(denoised)
-        
-        # Binarize
-        _, binary = cv2.threshold(enhanced, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-        
-        return binary
+        return preprocessing_graph(image).run(TESSERACT_STEPS)
     
     @staticmethod
     def process_from_bytes(image_bytes: bytes, filename: str = "prescription.jpg") -> Dict[str, Any]:
@@ -0,0 +1,176 @@
+"""
+LLM Failure Handling
+Circuit breaker and per-request retry budget for Ollama calls.
+
+- Circuit breaker (one per Ollama server): after LLM_BREAKER_FAILURES
+  consecutive connection errors (connect timeouts included) or 5xx answers
+  the circuit opens and calls fail immediately with LLMUnavailableError, so
+  callers go straight to their database / rule-based fallbacks. After
+  LLM_BREAKER_RESET_SECONDS a single probe call is let through (half-open);
+  its outcome closes the circuit or opens it again. Read timeouts are
+  neutral: a slow generation does not mean Ollama is down.
+- Retry budget: every retry of every nested retry loop within one request
+  draws from the same budget (LLM_RETRY_BUDGET), so retries no longer
+  multiply across layers.
+"""
+
+import contextvars
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+from app.core.metrics import gauge_callback
+
+logger = logging.getLogger(__name__)
+
+FAILURE_THRESHOLD = int(os.getenv("LLM_BREAKER_FAILURES", "3"))
+RESET_SECONDS = float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+RETRY_BUDGET = int(os.getenv("LLM_RETRY_BUDGET", "2"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class LLMUnavailableError(RuntimeError):
+    """The LLM is known to be down (circuit open) or the request's retries are used up"""
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker with single-probe half-open state"""
+
+    def __init__(self, name: str, failure_threshold: int = FAILURE_THRESHOLD, reset_seconds: float = RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = max(failure_threshold, 1)
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._stats = {"opened": 0, "rejected": 0}
+
+    def before_call(self, endpoint: str = "llm"):
+        """
+        Admit a call, or fail fast while the circuit is open.
+
+        Raises:
+            LLMUnavailableError: Circuit open (or half-open with a probe already running)
+        """
+        with self._lock:
+            if self._state == CLOSED:
+                return
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_seconds:
+                self._state = HALF_OPEN
+                self._probe_in_flight = False
+            if self._state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                logger.info(f"🔌 LLM circuit half-open for {self.name}: probing with {endpoint} request")
+                return
+            self._stats["rejected"] += 1
+            retry_in = max(self.reset_seconds - (time.monotonic() - self._opened_at), 0)
+        raise LLMUnavailableError(
+            f"LLM service at {self.name} is unavailable (circuit open, next probe in {retry_in:.0f}s)"
+        )
+
+    def record_success(self):
+        with self._lock:
+            if self._state != CLOSED:
+                logger.info(f"✅ LLM circuit closed for {self.name}: service recovered")
+            self._state = CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self, reason: str = ""):
+        with self._lock:
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    self._stats["opened"] += 1
+                    logger.warning(
+                        f"🔌 LLM circuit opened for {self.name} after {self._failures} consecutive failures"
+                        + (f" ({reason})" if reason else "")
+                        + f"; failing fast for {self.reset_seconds:.0f}s"
+                    )
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+    def record_abandoned(self):
+        """The admitted call never reached the server (e.g. shed by the scheduler)"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_seconds:
+                return HALF_OPEN
+            return self._state
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"state": self._state, "consecutive_failures": self._failures, **self._stats}
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(base_url: str) -> CircuitBreaker:
+    """Shared breaker per Ollama server"""
+    base_url = base_url.rstrip("/")
+    with _breakers_lock:
+        if base_url not in _breakers:
+            _breakers[base_url] = CircuitBreaker(base_url)
+        return _breakers[base_url]
+
+
+def breaker_stats() -> Dict[str, Dict]:
+    with _breakers_lock:
+        breakers = dict(_breakers)
+    return {name: breaker.stats() for name, breaker in breakers.items()}
+
+
+gauge_callback(
+    "sanjeevani_llm_circuit_open", "1 while the Ollama circuit breaker is open or half-open", ("server",),
+    lambda: [({"server": name}, int(stats["state"] != CLOSED)) for name, stats in breaker_stats().items()],
+)
+
+
+# ---------------------------------------------------------------------------
+# Per-request retry budget
+# ---------------------------------------------------------------------------
+
+_budget: contextvars.ContextVar[Optional[list]] = contextvars.ContextVar("llm_retry_budget", default=None)
+
+
+@contextmanager
+def retry_budget(retries: int = RETRY_BUDGET) -> Iterator[None]:
+    """
+    Scope sharing one retry budget. Nested scopes join the outermost one, so
+    wrap both request entry points and individual retry loops.
+    """
+    if _budget.get() is not None:
+        yield
+        return
+    token = _budget.set([retries])
+    try:
+        yield
+    finally:
+        _budget.reset(token)
+
+
+def spend_retry(endpoint: str = "llm") -> bool:
+    """Take one retry from the current budget; False when none are left"""
+    budget = _budget.get()
+    if budget is None:
+        return True
+    if budget[0] <= 0:
+        logger.warning(f"🛑 LLM [{endpoint}] retry budget exhausted for this request, not retrying")
+        return False
+    budget[0] -= 1
+    return True
@@ -0,0 +1,303 @@
+"""
+LLM Request Scheduler
+Admission control in front of Ollama: a bounded number of concurrent LLM
+calls, granted by priority class instead of arrival order.
+
+Priority classes (highest first):
+- interactive: medical Q&A
+- recommendation: symptom recommendations
+- document: hospital report / prescription parsing, medicine info
+
+Document parsing may hold at most LLM_MAX_CONCURRENCY - 1 slots, so a burst
+of long report parses never takes the last slot from interactive work. A
+caller that waits longer than its class deadline is rejected with
+LLMOverloadedError (HTTP 429) instead of piling up behind the backlog.
+
+Each waiting caller blocks a threadpool worker (anyio's default limit is
+40, shared with OCR and file I/O), so at most LLM_MAX_QUEUED calls wait at
+once; recommendation and document calls stop queuing at three quarters of
+that, keeping room for interactive ones. Callers beyond it are rejected
+immediately.
+"""
+
+import heapq
+import itertools
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+from app.core.metrics import gauge_callback, record_stage
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = 0
+RECOMMENDATION = 1
+DOCUMENT = 2
+
+CLASS_NAMES = {INTERACTIVE: "interactive", RECOMMENDATION: "recommendation", DOCUMENT: "document"}
+
+# Endpoint names used for LLM calls (see prompt_budget.BUDGETS) -> priority class
+ENDPOINT_PRIORITIES: Dict[str, int] = {
+    "medical_qa": INTERACTIVE,
+    "symptoms": RECOMMENDATION,
+    "hospital_report": DOCUMENT,
+    "handwritten_prescription": DOCUMENT,
+    "prescription_deciphering": DOCUMENT,
+    "medicine_info": DOCUMENT,
+}
+
+# Longest a request may wait for a slot before it is rejected (seconds)
+DEFAULT_DEADLINES: Dict[str, float] = {
+    "interactive": 20.0,
+    "recommendation": 45.0,
+    "document": 180.0,
+}
+
+MAX_CONCURRENCY = max(int(os.getenv("LLM_MAX_CONCURRENCY", "2")), 1)
+
+# Calls waiting for a slot at once (each holds a threadpool worker); well below the threadpool's 40
+MAX_QUEUED = max(int(os.getenv("LLM_MAX_QUEUED", "12")), 1)
+
+# Waits shorter than this are not logged
+LOG_WAIT_SECONDS = 1.0
+
+
+def _parse_deadline_overrides(value: str) -> Dict[str, float]:
+    """LLM_QUEUE_DEADLINES="interactive=10,document=300" """
+    overrides = {}
+    for item in value.split(","):
+        name, _, seconds = item.partition("=")
+        try:
+            overrides[name.strip()] = float(seconds)
+        except ValueError:
+            continue
+    return overrides
+
+
+DEADLINES: Dict[str, float] = {
+    **DEFAULT_DEADLINES,
+    **_parse_deadline_overrides(os.getenv("LLM_QUEUE_DEADLINES", "")),
+}
+
+
+class LLMOverloadedError(RuntimeError):
+    """No LLM slot became free within the request's queue deadline"""
+
+    def __init__(self, endpoint: str, waited: float, retry_after: int):
+        super().__init__(
+            f"LLM service is busy: {endpoint} request waited {waited:.0f}s for a slot. "
+            f"Please retry in about {retry_after}s."
+        )
+        self.endpoint = endpoint
+        self.waited = waited
+        self.retry_after = retry_after
+
+
+class _Ticket:
+    __slots__ = ("priority", "granted", "cancelled")
+
+    def __init__(self, priority: int):
+        self.priority = priority
+        self.granted = False
+        self.cancelled = False
+
+
+class LLMScheduler:
+    """Priority-ordered semaphore with per-class queue deadlines and metrics"""
+
+    def __init__(self, max_concurrency: int = MAX_CONCURRENCY, deadlines: Optional[Dict[str, float]] = None,
+                 max_queued: int = MAX_QUEUED):
+        self.max_concurrency = max_concurrency
+        self.deadlines = {**DEFAULT_DEADLINES, **(deadlines if deadlines is not None else DEADLINES)}
+        # Document parsing leaves one slot free for interactive work (when there is more than one)
+        self.class_limits = {DOCUMENT: max(max_concurrency - 1, 1)}
+        # Total queue depth up to which each class may still queue; interactive keeps the last quarter
+        lower = max(max_queued * 3 // 4, 1)
+        self.queue_limits = {INTERACTIVE: max_queued, RECOMMENDATION: lower, DOCUMENT: lower}
+
+        self._cond = threading.Condition()
+        self._sequence = itertools.count()
+        self._waiting: List[tuple] = []
+        self._active: Dict[int, int] = {p: 0 for p in CLASS_NAMES}
+        self._queued: Dict[int, int] = {p: 0 for p in CLASS_NAMES}
+        self._stats: Dict[int, Dict[str, float]] = {
+            p: {
+                "admitted": 0, "rejected": 0, "wait_seconds_total": 0.0, "wait_seconds_max": 0.0,
+                "busy_seconds_total": 0.0, "completed": 0,
+            }
+            for p in CLASS_NAMES
+        }
+
+    @staticmethod
+    def priority_for(endpoint: str) -> int:
+        return ENDPOINT_PRIORITIES.get(endpoint, DOCUMENT)
+
+    def _can_run(self, priority: int) -> bool:
+        if sum(self._active.values()) >= self.max_concurrency:
+            return False
+        limit = self.class_limits.get(priority)
+        return limit is None or self._active[priority] < limit
+
+    def _grant(self, ticket: _Ticket):
+        ticket.granted = True
+        self._active[ticket.priority] += 1
+
+    def _dispatch(self):
+        """Grant free slots to the highest-priority waiters (caller holds the lock)"""
+        granted = False
+        skipped = []
+        while self._waiting:
+            entry = self._waiting[0]
+            ticket = entry[2]
+            if ticket.cancelled:
+                heapq.heappop(self._waiting)
+                continue
+            if sum(self._active.values()) >= self.max_concurrency:
+                break
+            heapq.heappop(self._waiting)
+            if self._can_run(ticket.priority):
+                self._queued[ticket.priority] -= 1
+                self._grant(ticket)
+                granted = True
+            else:
+                # Class at its limit: let lower classes past without losing its place
+                skipped.append(entry)
+        for entry in skipped:
+            heapq.heappush(self._waiting, entry)
+        if granted:
+            self._cond.notify_all()
+
+    def _retry_after(self, priority: int) -> int:
+        """Rough seconds until a slot frees up, from recent call durations"""
+        durations = [s["busy_seconds_total"] / s["completed"] for s in self._stats.values() if s["completed"]]
+        average = sum(durations) / len(durations) if durations else 30.0
+        ahead = sum(1 for _, _, t in self._waiting if not t.cancelled and t.priority <= priority)
+        return max(1, math.ceil(average * (ahead + 1) / self.max_concurrency))
+
+    def _reject(self, endpoint: str, priority: int, reason: str, waited: float) -> LLMOverloadedError:
+        """Count and log a rejected call (caller holds the lock)"""
+        self._stats[priority]["rejected"] += 1
+        logger.warning(
+            f"🚦 LLM [{endpoint}] rejected {reason} "
+            f"({CLASS_NAMES[priority]}, {sum(self._active.values())} running, "
+            f"{sum(self._queued.values())} queued)"
+        )
+        return LLMOverloadedError(endpoint, waited, self._retry_after(priority))
+
+    def acquire(self, endpoint: str) -> int:
+        """
+        Wait for an LLM slot in the endpoint's priority class.
+
+        Returns:
+            The priority class (pass it to release)
+
+        Raises:
+            LLMOverloadedError: No slot within the class deadline, or the
+                queue is full
+        """
+        priority = self.priority_for(endpoint)
+        class_name = CLASS_NAMES[priority]
+        start = time.monotonic()
+        deadline = start + self.deadlines[class_name]
+        ticket = _Ticket(priority)
+
+        with self._cond:
+            if not self._waiting and self._can_run(priority):
+                self._grant(ticket)
+            elif sum(self._queued.values()) >= self.queue_limits[priority]:
+                # Queue full: fail now rather than hold a threadpool worker
+                raise self._reject(endpoint, priority, "with the queue full", 0.0)
+            else:
+                heapq.heappush(self._waiting, (priority, next(self._sequence), ticket))
+                self._queued[priority] += 1
+                self._dispatch()
+                while not ticket.granted:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        ticket.cancelled = True
+                        self._queued[priority] -= 1
+                        waited = time.monotonic() - start
+                        raise self._reject(endpoint, priority, f"after {waited:.1f}s in queue", waited)
+                    self._cond.wait(remaining)
+
+            waited = time.monotonic() - start
+            stats = self._stats[priority]
+            stats["admitted"] += 1
+            stats["wait_seconds_total"] += waited
+            stats["wait_seconds_max"] = max(stats["wait_seconds_max"], waited)
+
+        record_stage(f"llm.{endpoint}.queue", waited)
+        if waited >= LOG_WAIT_SECONDS:
+            logger.info(f"⏳ LLM [{endpoint}] waited {waited:.1f}s for a slot ({class_name})")
+        return priority
+
+    def release(self, priority: int, busy_seconds: float = 0.0):
+        with self._cond:
+            self._active[priority] -= 1
+            stats = self._stats[priority]
+            stats["completed"] += 1
+            stats["busy_seconds_total"] += busy_seconds
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, endpoint: str) -> Iterator[None]:
+        """Hold an LLM slot for the duration of one Ollama call"""
+        priority = self.acquire(endpoint)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(priority, time.monotonic() - start)
+
+    def stats(self) -> Dict:
+        """Queue depth, running calls and wait-time metrics per priority class"""
+        with self._cond:
+            classes = {}
+            for priority, name in CLASS_NAMES.items():
+                stats = self._stats[priority]
+                admitted = stats["admitted"]
+                classes[name] = {
+                    "running": self._active[priority],
+                    "queued": self._queued[priority],
+                    "admitted": admitted,
+                    "rejected": stats["rejected"],
+                    "wait_seconds_avg": stats["wait_seconds_total"] / admitted if admitted else 0.0,
+                    "wait_seconds_max": stats["wait_seconds_max"],
+                    "deadline_seconds": self.deadlines[name],
+                }
+            return {
+                "max_concurrency": self.max_concurrency,
+                "max_queued": self.queue_limits[INTERACTIVE],
+                "running": sum(self._active.values()),
+                "queue_depth": sum(self._queued.values()),
+                "classes": classes,
+            }
+
+
+_scheduler: Optional[LLMScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> LLMScheduler:
+    """Shared per-process scheduler"""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = LLMScheduler()
+    return _scheduler
+
+
+def _class_gauge(key: str):
+    def read():
+        classes = get_scheduler().stats()["classes"]
+        return [({"priority_class": name}, stats[key]) for name, stats in classes.items()]
+    return read
+
+
+gauge_callback("sanjeevani_llm_queue_depth", "LLM calls waiting for a slot", ("priority_class",), _class_gauge("queued"))
+gauge_callback("sanjeevani_llm_running", "LLM calls holding a slot", ("priority_class",), _class_gauge("running"))
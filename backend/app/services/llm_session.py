@@ -0,0 +1,300 @@
+"""
+LLM Session Manager
+Talks to Ollama through /api/chat with a stable system message per task, so
+the server can reuse the KV cache for the shared prefix instead of
+re-evaluating the same instruction block on every request, and keeps the
+model loaded between bursts with keep_alive.
+
+Every call holds a slot of the shared LLM scheduler (llm_scheduler), which
+bounds concurrency and orders waiting calls by priority, and goes through the
+server's circuit breaker (llm_resilience), which fails fast while Ollama is
+down.
+
+Each task (symptoms, hospital_report, ...) keeps its static instructions in a
+system prompt; only the per-request content goes into the user message.
+Prompt-eval savings are estimated per request by comparing the tokens Ollama
+evaluated with the size of the full prompt.
+
+chat_structured() asks for a reply matching a Pydantic output model
+(structured_output) and parses it while it streams in.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Type
+
+import requests
+
+from app.core.metrics import stage
+from app.services.llm_resilience import get_breaker
+from app.services.llm_scheduler import get_scheduler
+from app.services.prompt_budget import estimate_tokens, record_ollama_usage
+from app.services.structured_output import JSONStreamParser, LLMOutput, format_for, validate_output
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_OLLAMA_URL = "http://localhost:11434"
+DEFAULT_MODEL = "phi4"
+
+# Tokens the chat template adds around each message (role markers)
+CHAT_TEMPLATE_TOKENS_PER_MESSAGE = 4
+
+# Streamed chunks read after a structured reply is complete before the
+# stream is closed (the final chunk carries the token counts)
+MAX_TRAILING_CHUNKS = 16
+
+
+class OllamaHTTPError(RuntimeError):
+    """Ollama answered with a non-200 status"""
+
+    def __init__(self, status_code: int, body: str):
+        super().__init__(f"Ollama error: {status_code} - {body[:500]}")
+        self.status_code = status_code
+
+
+class LLMSession:
+    """Ollama chat client for one server/model, with prefix-cache accounting"""
+
+    def __init__(self, base_url: str, model: str, keep_alive: Optional[str] = None):
+        if keep_alive is None:
+            # How long Ollama keeps the model loaded after a request ("-1" pins it)
+            from app.core.config import settings
+            keep_alive = settings.OLLAMA_KEEP_ALIVE
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.keep_alive = keep_alive
+        self.chat_url = f"{self.base_url}/api/chat"
+        self._lock = threading.Lock()
+        # system prompt hash -> evaluated/estimated token ratio of an uncached request
+        self._prefix_calibration: Dict[str, float] = {}
+        self._stats = {"requests": 0, "prompt_tokens": 0, "evaluated_tokens": 0, "saved_tokens": 0}
+
+    def build_payload(
+        self,
+        user: str,
+        system: str = "",
+        options: Optional[Dict[str, Any]] = None,
+        format: Optional[Any] = None,
+    ) -> Dict[str, Any]:
+        """/api/chat request body; the system message goes first so it forms the cached prefix"""
+        messages = []
+        if system:
+            messages.append({"role": "system", "content": system})
+        messages.append({"role": "user", "content": user})
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "stream": False,
+            "keep_alive": self.keep_alive,
+        }
+        if options:
+            payload["options"] = options
+        if format is not None:
+            payload["format"] = format
+        return payload
+
+    def read_reply(self, data: Dict[str, Any], endpoint: str, user: str, system: str = "") -> str:
+        """Reply text of an /api/chat response; records token usage and cache savings"""
+        usage = record_ollama_usage(endpoint, data)
+        if usage:
+            self._record_savings(endpoint, usage["prompt_tokens"], user, system)
+        message = data.get("message") or {}
+        return message.get("content", "") or data.get("response", "")
+
+    @contextmanager
+    def _exchange(
+        self, payload: Dict[str, Any], endpoint: str, timeout: Any, path: str, stream: bool = False
+    ) -> Iterator[requests.Response]:
+        """
+        One request to Ollama, holding the breaker admission and scheduler
+        slot while the body is read. The breaker outcome is recorded once,
+        after the body: only connection failures (including connect
+        timeouts) and 5xx answers count against Ollama. A read timeout means
+        a slow generation on a server that is up, and is neutral.
+        """
+        breaker = get_breaker(self.base_url)
+        breaker.before_call(endpoint)
+        failure: Optional[str] = None
+        succeeded = False
+        try:
+            with get_scheduler().slot(endpoint), stage(f"llm.{endpoint}"):
+                try:
+                    response = requests.post(f"{self.base_url}{path}", json=payload, timeout=timeout, stream=stream)
+                except requests.ConnectionError as e:
+                    # ConnectTimeout is a ConnectionError too; ReadTimeout is not
+                    failure = type(e).__name__
+                    raise
+                if response.status_code >= 500:
+                    failure = f"HTTP {response.status_code}"
+                try:
+                    yield response
+                finally:
+                    response.close()
+                succeeded = failure is None
+        finally:
+            if failure:
+                breaker.record_failure(failure)
+            elif succeeded:
+                breaker.record_success()
+            else:
+                # Shed by the scheduler, timed out reading, or failed in the caller
+                breaker.record_abandoned()
+
+    def post(
+        self, payload: Dict[str, Any], endpoint: str, timeout: Any = 600, path: str = "/api/chat"
+    ) -> requests.Response:
+        """
+        POST a payload to Ollama (/api/chat by default) once the circuit
+        breaker admits it and a scheduler slot is granted.
+
+        Raises:
+            LLMUnavailableError: Circuit open, Ollama is known to be down
+            LLMOverloadedError: No slot within the endpoint's queue deadline
+            requests.RequestException: Ollama unreachable or timed out
+        """
+        # Without stream=True, requests reads the whole body inside the slot
+        with self._exchange(payload, endpoint, timeout, path) as response:
+            return response
+
+    def chat(
+        self,
+        user: str,
+        system: str = "",
+        endpoint: str = "llm",
+        options: Optional[Dict[str, Any]] = None,
+        timeout: Any = 600,
+        format: Optional[Any] = None,
+    ) -> str:
+        """
+        Send one chat turn and return the reply text.
+
+        Raises:
+            requests.RequestException: Ollama unreachable or timed out
+            OllamaHTTPError: Ollama answered with an error status
+            LLMOverloadedError: No scheduler slot within the queue deadline
+        """
+        response = self.post(self.build_payload(user, system, options, format), endpoint, timeout)
+        if response.status_code != 200:
+            raise OllamaHTTPError(response.status_code, response.text)
+        return self.read_reply(response.json(), endpoint, user, system)
+
+    def chat_structured(
+        self,
+        user: str,
+        output_model: Type[LLMOutput],
+        system: str = "",
+        endpoint: str = "llm",
+        options: Optional[Dict[str, Any]] = None,
+        timeout: Any = 600,
+    ) -> Dict[str, Any]:
+        """
+        Send one chat turn constrained to output_model's JSON schema, parse
+        the reply as it streams in and return it validated.
+
+        Raises:
+            StructuredOutputError: Reply incomplete or not matching the model
+            OllamaHTTPError: Ollama answered with an error status
+            requests.RequestException: Ollama unreachable or timed out
+            LLMOverloadedError: No scheduler slot within the queue deadline
+        """
+        payload = self.build_payload(user, system, options, format=format_for(output_model))
+        payload["stream"] = True
+        parser = JSONStreamParser()
+        final: Dict[str, Any] = {}
+
+        with self._exchange(payload, endpoint, timeout, "/api/chat", stream=True) as response:
+            if response.status_code != 200:
+                raise OllamaHTTPError(response.status_code, response.text)
+            trailing = 0
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get("error"):
+                    raise OllamaHTTPError(500, chunk["error"])
+                parser.feed((chunk.get("message") or {}).get("content", ""))
+                if chunk.get("done"):
+                    final = chunk
+                    break
+                if parser.complete:
+                    trailing += 1
+                    if trailing > MAX_TRAILING_CHUNKS:
+                        logger.info(f"✂️ [{endpoint}] structured reply complete, closing stream early")
+                        break
+
+        if final:
+            self.read_reply(final, endpoint, user, system)
+        return validate_output(parser.value(), output_model)
+
+    def preload(self, timeout: int = 300) -> bool:
+        """Load the model and pin it with keep_alive (an empty chat loads without generating)"""
+        try:
+            response = requests.post(
+                self.chat_url,
+                json={"model": self.model, "messages": [], "keep_alive": self.keep_alive},
+                timeout=timeout,
+            )
+            response.raise_for_status()
+            logger.info(f"✅ Ollama model {self.model} loaded (keep_alive={self.keep_alive})")
+            return True
+        except requests.RequestException as e:
+            logger.warning(f"⚠️ Could not preload Ollama model {self.model}: {e}")
+            return False
+
+    def _record_savings(self, endpoint: str, evaluated: int, user: str, system: str):
+        estimated = (
+            (estimate_tokens(system) + CHAT_TEMPLATE_TOKENS_PER_MESSAGE if system else 0)
+            + estimate_tokens(user) + CHAT_TEMPLATE_TOKENS_PER_MESSAGE
+        )
+        prefix_key = hashlib.sha1(system.encode("utf-8")).hexdigest()
+
+        with self._lock:
+            calibration = self._prefix_calibration.get(prefix_key)
+            ratio = evaluated / estimated if estimated else 1.0
+            if calibration is None or ratio >= calibration:
+                # A fully evaluated (uncached) prompt has the highest ratio:
+                # it calibrates the token estimate for later requests
+                self._prefix_calibration[prefix_key] = ratio
+                prompt_tokens = evaluated
+            else:
+                prompt_tokens = round(estimated * calibration)
+            saved = prompt_tokens - evaluated
+            self._stats["requests"] += 1
+            self._stats["prompt_tokens"] += prompt_tokens
+            self._stats["evaluated_tokens"] += evaluated
+            self._stats["saved_tokens"] += saved
+
+        if saved:
+            logger.info(
+                f"♻️ KV cache [{endpoint}]: evaluated {evaluated} of ~{prompt_tokens} prompt tokens "
+                f"(~{saved} reused, {100 * saved / prompt_tokens:.0f}%)"
+            )
+        elif calibration is not None and system:
+            logger.info(f"⚠️ KV cache [{endpoint}]: system prompt re-evaluated (model reloaded or cache evicted)")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["saved_share"] = (
+            stats["saved_tokens"] / stats["prompt_tokens"] if stats["prompt_tokens"] else 0.0
+        )
+        return stats
+
+
+_sessions: Dict[tuple, LLMSession] = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(base_url: Optional[str] = None, model: Optional[str] = None) -> LLMSession:
+    """Shared session per (server, model); defaults come from OLLAMA_URL / OLLAMA_MODEL"""
+    base_url = (base_url or os.getenv("OLLAMA_URL", DEFAULT_OLLAMA_URL)).strip()
+    model = (model or os.getenv("OLLAMA_MODEL", DEFAULT_MODEL)).strip()
+    key = (base_url, model)
+    with _sessions_lock:
+        if key not in _sessions:
+            _sessions[key] = LLMSession(base_url, model)
+        return _sessions[key]
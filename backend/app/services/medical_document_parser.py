@@ -5,105 +5,22 @@ with focus on 80%+ accuracy
 """
 
 import logging
-import json
 import re
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 import time
 
-logger = logging.getLogger(__name__)
+from pydantic import Field
 
+from app.services.prompt_budget import fit_prompt
+from app.services.llm_resilience import retry_budget
+from app.services.llm_scheduler import LLMOverloadedError
+from app.services.structured_output import LLMOutput
 
-class MedicalDocumentParser:
-    """
-    Parses medical documents with enhanced accuracy.
-    Focuses on complete extraction of all relevant fields.
-    """
-    
-    @staticmethod
-    def parse_hospital_report_accurate(extracted_text: str, max_retries: int = 5, timeout: int = 120) -> Dict[str, Any]:
-        """
-        Parse hospital report with maximum accuracy.
-        Allows more time for better results.
-        """
-        logger.info("🧠 HIGH ACCURACY MODE: Parsing hospital report with detailed extraction...")
-        
-        prompt = MedicalDocumentParser._create_hospital_report_prompt(extracted_text)
-        
-        try:
-            from app.services.enhanced_medicine_llm_generator import EnhancedMedicineLLMGenerator
-            
-            # Call LLM with increased timeout for accuracy
-            logger.info(f"📞 Calling LLM (timeout: {timeout}s, retries: {max_retries})...")
-            response_text = EnhancedMedicineLLMGenerator._call_ollama_with_retry(
-                prompt,
-                max_retries=max_retries,
-                timeout_base=timeout
-            )
-            
-            if not response_text or len(response_text.strip()) < 50:
-                logger.warning("⚠️ LLM returned empty or very short response, using fallback")
-                return MedicalDocumentParser._parse_with_regex(extracted_text)
-            
-            logger.debug(f"📄 Raw LLM Response length: {len(response_text)} chars")
-            logger.info(f"📄 LLM RESPONSE PREVIEW:\n{response_text[:800]}")
-            
-            # Try to extract and parse JSON
-            parsed = MedicalDocumentParser._extract_json_safe(response_text)
-            
-            if parsed:
-                logger.info(f"✅ Successfully parsed with {len(parsed.get('medicines', []))} medicines found")
-                logger.info(f"📋 PARSED DATA: {list(parsed.keys())}")
-                return parsed
-            else:
-                logger.warning("⚠️ JSON parsing failed, using regex-based fallback")
-                return MedicalDocumentParser._parse_with_regex(extracted_text)
-                
-        except Exception as e:
-            logger.error(f"❌ LLM parsing error: {e}")
-            logger.info("📍 Falling back to regex-based parsing...")
-            return MedicalDocumentParser._parse_with_regex(extracted_text)
-    
-    @staticmethod
-    def parse_handwritten_prescription_accurate(extracted_text: str, max_retries: int = 5, timeout: int = 120) -> Dict[str, Any]:
-        """
-        Parse handwritten prescription with maximum accuracy.
-        """
-        logger.info("🧠 HIGH ACCURACY MODE: Parsing handwritten prescription...")
-        
-        prompt = MedicalDocumentParser._create_handwritten_prescription_prompt(extracted_text)
-        
-        try:
-            from app.services.enhanced_medicine_llm_generator import EnhancedMedicineLLMGenerator
-            
-            response_text = EnhancedMedicineLLMGenerator._call_ollama_with_retry(
-                prompt,
-                max_retries=max_retries,
-                timeout_base=timeout
-            )
-            
-            if not response_text or len(response_text.strip()) < 50:
-                logger.warning("⚠️ LLM returned empty response")
-                return MedicalDocumentParser._parse_prescription_regex(extracted_text)
-            
-            parsed = MedicalDocumentParser._extract_json_safe(response_text)
-            
-            if parsed:
-                logger.info(f"✅ Found {len(parsed.get('medicines', []))} medicines")
-                return parsed
-            else:
-                return MedicalDocumentParser._parse_prescription_regex(extracted_text)
-                
-        except Exception as e:
-            logger.error(f"❌ Handwritten prescription parsing error: {e}")
-            return MedicalDocumentParser._parse_prescription_regex(extracted_text)
-    
-    @staticmethod
-    def _create_hospital_report_prompt(extracted_text: str) -> str:
-        """
-        Create comprehensive prompt for hospital report parsing.
-        Includes examples and strict formatting requirements.
-        """
-        prompt = f"""You are a MEDICAL DOCUMENT EXPERT with 20+ years of healthcare experience.
+logger = logging.getLogger(__name__)
+
+# Static instructions, sent as the system message so Ollama can reuse the
+# KV cache across documents; only the OCR text changes per request
+HOSPITAL_REPORT_SYSTEM_PROMPT = """You are a MEDICAL DOCUMENT EXPERT with 20+ years of healthcare experience.
 Your task is to extract EVERY piece of information from a hospital report and structure it carefully.
 
 IMPORTANT: 
@@ -113,12 +30,7 @@ IMPORTANT:
 - PRESERVE original names, numbers, and spellings
 - Return ONLY valid JSON
 
-HOSPITAL REPORT TEXT:
-==================
-{extracted_text[:2000]}
-==================
-
-CRITICAL TASK: Parse this hospital report completely and extract EVERY medicine mentioned.
+CRITICAL TASK: Parse the hospital report you are given completely and extract EVERY medicine mentioned.
 
 MEDICINE EXTRACTION PRIORITY:
 ⚠️ MOST IMPORTANT: Find ALL medicines in the text, even if:
@@ -145,37 +57,37 @@ WHAT TO EXTRACT:
 8. Complete medical advice and follow-up
 
 RETURN THIS EXACT JSON FORMAT:
-{{
-  "hospital_details": {{
+{
+  "hospital_details": {
     "name": "extracted hospital name or null",
     "address": "full address or null",
     "phone": "contact number or null",
     "email": "email or null"
-  }},
-  "patient_details": {{
+  },
+  "patient_details": {
     "name": "patient full name",
     "id": "patient ID/MR number or null",
     "age": "age in numbers or null",
     "gender": "Male/Female/Other or null",
     "contact": "phone number or null",
     "address": "address or null"
-  }},
-  "doctor_details": {{
+  },
+  "doctor_details": {
     "name": "doctor full name",
     "specialization": "specialization or null",
     "registration_number": "registration/license number or null",
     "contact": "contact or null"
-  }},
-  "visit_details": {{
+  },
+  "visit_details": {
     "date": "visit date or null",
     "type": "OPD/IPD/Emergency/Follow-up or null",
     "department": "department name or null",
     "chief_complaint": "main complaint or null",
     "diagnosis": "final diagnosis or null",
     "symptoms": ["symptom 1", "symptom 2", "symptom 3"] (or empty if none)
-  }},
+  },
   "medicines": [
-    {{
+    {
       "name": "medicine name with strength (e.g., Amoxicillin 500mg)",
       "dosage": "e.g., 1 tablet or 5ml",
       "frequency": "e.g., twice daily / BD / TDS",
@@ -183,48 +95,35 @@ RETURN THIS EXACT JSON FORMAT:
       "timing": "e.g., after food, before sleep, morning",
       "instructions": "any special instructions or null",
       "route": "oral/injection/topical or null"
-    }}
+    }
   ],
   "investigations": [
-    {{
+    {
       "name": "test/investigation name",
       "result": "result if shown or null",
       "normal_range": "normal values or null"
-    }}
+    }
   ],
-  "medical_advice": {{
+  "medical_advice": {
     "diet": "dietary restrictions or recommendations or null",
     "lifestyle": "activity level, rest needed, etc or null",
     "precautions": "things to avoid or be careful about or null",
     "follow_up": "when to return for follow-up or null",
     "emergency": "when to seek emergency care or null"
-  }},
+  },
   "additional_information": "any other important details from report or null"
-}}
+}
 
 VALIDATION CHECKLIST:
 ✓ All medicine names are exact from document
 ✓ Dosages and frequencies match document exactly
 ✓ No invented or assumed information
 ✓ Missing fields are null, not empty strings
-✓ Valid JSON syntax (can be parsed by json.loads)
+✓ Valid JSON syntax (can be parsed by json.loads)"""
 
-NOW PARSE THE REPORT AND RETURN ONLY THE JSON."""
-        return prompt
-    
-    @staticmethod
-    def _create_handwritten_prescription_prompt(extracted_text: str) -> str:
-        """
-        Create comprehensive prompt for handwritten prescription parsing.
-        """
-        prompt = f"""You are a PHARMACY EXPERT specializing in prescription reading.
+HANDWRITTEN_PRESCRIPTION_SYSTEM_PROMPT = """You are a PHARMACY EXPERT specializing in prescription reading.
 Your task is to extract EVERY medicine from a handwritten prescription accurately.
 
-PRESCRIPTION TEXT:
-==================
-{extracted_text[:1500]}
-==================
-
 TASK: Extract ALL medicines mentioned. For each medicine, get:
 1. Complete medicine name (including strength if written)
 2. Dosage (amount per dose: e.g., 1 tablet, 5ml, 250mg)
@@ -234,12 +133,12 @@ TASK: Extract ALL medicines mentioned. For each medicine, get:
 6. Special instructions if any
 
 RETURN THIS EXACT JSON:
-{{
+{
   "patient_name": "name if written or null",
   "doctor_name": "doctor name if visible or null",
   "prescription_date": "date if visible or null",
   "medicines": [
-    {{
+    {
       "name": "EXACT medicine name as written",
       "strength": "strength/dosage strength if written (e.g., 500mg) or null",
       "dosage": "amount per dose (e.g., 1 tablet, 5ml)",
@@ -247,59 +146,225 @@ RETURN THIS EXACT JSON:
       "duration": "how long (e.g., 7 days, 1 week, 10 tablets)",
       "timing": "when (e.g., after food, with water, morning) or null",
       "instructions": "any special instructions or null"
-    }}
+    }
   ],
   "additional_notes": "any other information from prescription or null"
-}}
+}
 
 CRITICAL RULES:
 - Extract names EXACTLY as written (preserve spelling)
 - Do NOT add information not on prescription
 - If unclear, put in instructions field
 - Return ONLY valid JSON
-- medicines array MUST contain all medicines found
+- medicines array MUST contain all medicines found"""
 
-NOW PARSE AND RETURN ONLY THE JSON."""
-        return prompt
+
+# Reply schemas matching the JSON formats in the system prompts above; sent
+# to Ollama as the output format and used to validate the parsed reply
+
+class HospitalDetails(LLMOutput):
+    name: Optional[str] = None
+    address: Optional[str] = None
+    phone: Optional[str] = None
+    email: Optional[str] = None
+
+
+class PatientDetails(LLMOutput):
+    name: Optional[str] = None
+    id: Optional[str] = None
+    age: Optional[str] = None
+    gender: Optional[str] = None
+    contact: Optional[str] = None
+    address: Optional[str] = None
+
+
+class DoctorDetails(LLMOutput):
+    name: Optional[str] = None
+    specialization: Optional[str] = None
+    registration_number: Optional[str] = None
+    contact: Optional[str] = None
+
+
+class VisitDetails(LLMOutput):
+    date: Optional[str] = None
+    type: Optional[str] = None
+    department: Optional[str] = None
+    chief_complaint: Optional[str] = None
+    diagnosis: Optional[str] = None
+    symptoms: List[str] = Field(default_factory=list)
+
+
+class ReportMedicine(LLMOutput):
+    name: str
+    dosage: Optional[str] = None
+    frequency: Optional[str] = None
+    duration: Optional[str] = None
+    timing: Optional[str] = None
+    instructions: Optional[str] = None
+    route: Optional[str] = None
+
+
+class Investigation(LLMOutput):
+    name: str
+    result: Optional[str] = None
+    normal_range: Optional[str] = None
+
+
+class MedicalAdvice(LLMOutput):
+    diet: Optional[str] = None
+    lifestyle: Optional[str] = None
+    precautions: Optional[str] = None
+    follow_up: Optional[str] = None
+    emergency: Optional[str] = None
+
+
+class HospitalReportOutput(LLMOutput):
+    hospital_details: HospitalDetails = Field(default_factory=HospitalDetails)
+    patient_details: PatientDetails = Field(default_factory=PatientDetails)
+    doctor_details: DoctorDetails = Field(default_factory=DoctorDetails)
+    visit_details: VisitDetails = Field(default_factory=VisitDetails)
+    medicines: List[ReportMedicine] = Field(default_factory=list)
+    investigations: List[Investigation] = Field(default_factory=list)
+    medical_advice: MedicalAdvice = Field(default_factory=MedicalAdvice)
+    additional_information: Optional[str] = None
+
+
+class PrescribedMedicine(LLMOutput):
+    name: str
+    strength: Optional[str] = None
+    dosage: Optional[str] = None
+    frequency: Optional[str] = None
+    duration: Optional[str] = None
+    timing: Optional[str] = None
+    instructions: Optional[str] = None
+
+
+class HandwrittenPrescriptionOutput(LLMOutput):
+    patient_name: Optional[str] = None
+    doctor_name: Optional[str] = None
+    prescription_date: Optional[str] = None
+    medicines: List[PrescribedMedicine] = Field(default_factory=list)
+    additional_notes: Optional[str] = None
+
+
+class MedicalDocumentParser:
+    """
+    Parses medical documents with enhanced accuracy.
+    Focuses on complete extraction of all relevant fields.
+    """
     
     @staticmethod
-    def _extract_json_safe(text: str) -> Dict[str, Any]:
+    def parse_hospital_report_accurate(extracted_text: str, max_retries: int = 5, timeout: int = 120) -> Dict[str, Any]:
         """
-        Safely extract and parse JSON from LLM response.
-        Handles various formats and errors.
+        Parse hospital report with maximum accuracy.
+        Allows more time for better results.
         """
+        logger.info("🧠 HIGH ACCURACY MODE: Parsing hospital report with detailed extraction...")
+        
+        prompt = MedicalDocumentParser._create_hospital_report_prompt(extracted_text)
+        
         try:
-            # Try direct parsing first
-            return json.loads(text)
-        except json.JSONDecodeError:
-            pass
+            from app.services.enhanced_medicine_llm_generator import EnhancedMedicineLLMGenerator
+            
+            # Call LLM with increased timeout for accuracy
+            logger.info(f"📞 Calling LLM (timeout: {timeout}s, retries: {max_retries})...")
+            # Retries across nested loops share one budget for this document
+            with retry_budget():
+                parsed = EnhancedMedicineLLMGenerator._call_ollama_with_retry(
+                    prompt,
+                    max_retries=max_retries,
+                    timeout_base=timeout,
+                    endpoint="hospital_report",
+                    system=HOSPITAL_REPORT_SYSTEM_PROMPT,
+                    output_model=HospitalReportOutput
+                )
+            
+            if parsed:
+                logger.info(f"✅ Successfully parsed with {len(parsed.get('medicines', []))} medicines found")
+                logger.info(f"📋 PARSED DATA: {list(parsed.keys())}")
+                return parsed
+            else:
+                logger.warning("⚠️ LLM returned no structured data, using regex-based fallback")
+                return MedicalDocumentParser._parse_with_regex(extracted_text)
+                
+        except LLMOverloadedError:
+            raise
+        except Exception as e:
+            logger.error(f"❌ LLM parsing error: {e}")
+            logger.info("📍 Falling back to regex-based parsing...")
+            return MedicalDocumentParser._parse_with_regex(extracted_text)
+    
+    @staticmethod
+    def parse_handwritten_prescription_accurate(extracted_text: str, max_retries: int = 5, timeout: int = 120) -> Dict[str, Any]:
+        """
+        Parse handwritten prescription with maximum accuracy.
+        """
+        logger.info("🧠 HIGH ACCURACY MODE: Parsing handwritten prescription...")
         
-        # Try to extract JSON from text
-        json_match = re.search(r'\{.*\}', text, re.DOTALL)
-        if json_match:
-            try:
-                json_str = json_match.group(0)
-                return json.loads(json_str)
-            except json.JSONDecodeError:
-                pass
+        prompt = MedicalDocumentParser._create_handwritten_prescription_prompt(extracted_text)
         
-        # Try to fix common JSON issues
         try:
-            # Remove markdown formatting
-            cleaned = re.sub(r'```json\n?', '', text)
-            cleaned = re.sub(r'```\n?', '', cleaned)
+            from app.services.enhanced_medicine_llm_generator import EnhancedMedicineLLMGenerator
             
-            # Find first { and last }
-            start = cleaned.find('{')
-            end = cleaned.rfind('}') + 1
-            if start >= 0 and end > start:
-                json_str = cleaned[start:end]
-                return json.loads(json_str)
-        except:
-            pass
+            with retry_budget():
+                parsed = EnhancedMedicineLLMGenerator._call_ollama_with_retry(
+                    prompt,
+                    max_retries=max_retries,
+                    timeout_base=timeout,
+                    endpoint="handwritten_prescription",
+                    system=HANDWRITTEN_PRESCRIPTION_SYSTEM_PROMPT,
+                    output_model=HandwrittenPrescriptionOutput
+                )
+            
+            if parsed:
+                logger.info(f"✅ Found {len(parsed.get('medicines', []))} medicines")
+                return parsed
+            else:
+                return MedicalDocumentParser._parse_prescription_regex(extracted_text)
+                
+        except LLMOverloadedError:
+            raise
+        except Exception as e:
+            logger.error(f"❌ Handwritten prescription parsing error: {e}")
+            return MedicalDocumentParser._parse_prescription_regex(extracted_text)
+    
+    @staticmethod
+    def _create_hospital_report_prompt(extracted_text: str) -> str:
+        """
+        Create the per-request part of the hospital report prompt
+        (instructions and JSON format are in HOSPITAL_REPORT_SYSTEM_PROMPT).
+        """
+        def render(extracted_text: str) -> str:
+            return f"""HOSPITAL REPORT TEXT:
+==================
+{extracted_text}
+==================
+
+NOW PARSE THE REPORT AND RETURN ONLY THE JSON."""
+        
+        # OCR text is trimmed to what the template leaves of the token budget
+        return fit_prompt(
+            "hospital_report", render, system=HOSPITAL_REPORT_SYSTEM_PROMPT, extracted_text=extracted_text
+        )
+    
+    @staticmethod
+    def _create_handwritten_prescription_prompt(extracted_text: str) -> str:
+        """
+        Create the per-request part of the handwritten prescription prompt
+        (instructions are in HANDWRITTEN_PRESCRIPTION_SYSTEM_PROMPT).
+        """
+        def render(extracted_text: str) -> str:
+            return f"""PRESCRIPTION TEXT:
+==================
+{extracted_text}
+==================
+
+NOW PARSE AND RETURN ONLY THE JSON."""
         
-        logger.warning("⚠️ Could not extract valid JSON from LLM response")
-        return None
+        return fit_prompt(
+            "handwritten_prescription", render,
+            system=HANDWRITTEN_PRESCRIPTION_SYSTEM_PROMPT, extracted_text=extracted_text
+        )
     
     @staticmethod
     def _parse_with_regex(text: str) -> Dict[str, Any]:
@@ -1,67 +1,68 @@
 """
 Medicine CSV RAG Service
-Loads medicine dataset from CSV and provides RAG (Retrieval Augmented Generation)
+Loads medicine dataset (via the columnar medicine store) and provides RAG (Retrieval Augmented Generation)
 capabilities integrated with LLM for intelligent medicine information generation.
 """
 
-import pandas as pd
+import bisect
 import logging
 from typing import Dict, Any, List, Optional
 from difflib import get_close_matches
-import os
+
+from app.services.medicine_store import MedicineRecord, get_medicine_store
 
 logger = logging.getLogger(__name__)
 
+SOURCE = "generic_database"
+
 class MedicineCSVRAG:
     """
     CSV-based RAG system for medicine information.
-    Loads medicine dataset and provides fuzzy search and retrieval.
+    Reads the medicine dataset from the shared memory-mapped store
+    (app.services.medicine_store) and provides fuzzy search and retrieval.
     """
     
-    _df = None
+    _store = None
+    _rows = range(0)
+    _columns: tuple = ()
     _medicine_index = None
     
     @classmethod
     def load_dataset(cls):
-        """Load medicine dataset from CSV file"""
-        if cls._df is not None:
+        """Map the medicine dataset (built from medicine_dataset.csv)"""
+        if cls._store is not None:
             return  # Already loaded
         
         try:
-            # Try multiple possible locations
-            possible_paths = [
-                os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))), 'medicine_dataset.csv'),
-                os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'medicine_dataset.csv'),
-                'medicine_dataset.csv'
-            ]
-            
-            csv_path = None
-            for path in possible_paths:
-                if os.path.exists(path):
-                    csv_path = path
-                    break
-            
-            if csv_path is None:
-                logger.warning(f"Medicine dataset not found in any location")
-                cls._df = pd.DataFrame()
+            store = get_medicine_store()
+            if SOURCE not in store.sources:
+                logger.warning("Medicine dataset not found in any location")
+                cls._store = False
                 return
             
-            cls._df = pd.read_csv(csv_path)
-            logger.info(f"✅ Loaded {len(cls._df)} medicines from CSV")
-            
-            # Create index for faster lookups
-            cls._medicine_index = {
-                name.lower(): idx 
-                for idx, name in enumerate(cls._df['Name'].values)
-            }
-            logger.info(f"✅ Created medicine index with {len(cls._medicine_index)} entries")
+            source = store.sources[SOURCE]
+            cls._rows = store.row_range(SOURCE)
+            # Only the CSV's own columns, not the merge bookkeeping
+            cls._columns = tuple(c for c in source["columns"] if c not in ("source", "dataset_version", "load_date"))
+            cls._medicine_index = store.name_index(SOURCE)
+            cls._store = store
+            logger.info(f"✅ Loaded {len(cls._rows)} medicines from store")
+            logger.info(f"✅ Medicine index has {len(cls._medicine_index)} entries")
             
         except Exception as e:
             logger.error(f"❌ Error loading medicine dataset: {e}")
-            cls._df = pd.DataFrame()
+            cls._store = False
     
     @classmethod
-    def search_medicine(cls, medicine_name: str) -> Optional[Dict[str, Any]]:
+    def _is_empty(cls) -> bool:
+        return not cls._store or len(cls._rows) == 0
+    
+    @classmethod
+    def _row(cls, idx: int) -> MedicineRecord:
+        return cls._store.record(idx, cls._columns)
+    
+    @classmethod
+    def search_medicine(cls, medicine_name: str) -> Optional[MedicineRecord]:
         """
         Search for medicine in dataset using fuzzy matching
         
@@ -69,33 +70,45 @@ class MedicineCSVRAG:
             medicine_name: Medicine name to search
             
         Returns:
-            Dictionary with medicine data or None if not found
+            Read-only medicine record (a Mapping) or None if not found
         """
         cls.load_dataset()
         
-        if cls._df.empty:
+        if cls._is_empty():
             return None
         
         medicine_lower = medicine_name.lower().strip()
         
         # Exact match first
-        if medicine_lower in cls._medicine_index:
-            idx = cls._medicine_index[medicine_lower]
-            return cls._df.iloc[idx].to_dict()
+        idx = cls._medicine_index.get(medicine_lower)
+        if idx is not None:
+            return cls._row(idx)
         
         # Fuzzy match
-        all_medicines = list(cls._medicine_index.keys())
+        all_medicines = cls._medicine_index.key_list()
         matches = get_close_matches(medicine_lower, all_medicines, n=3, cutoff=0.6)
         
         if matches:
             logger.info(f"Fuzzy matched '{medicine_name}' to '{matches[0]}'")
-            idx = cls._medicine_index[matches[0]]
-            return cls._df.iloc[idx].to_dict()
+            idx = cls._medicine_index.get(matches[0])
+            return cls._row(idx)
         
         return None
     
     @classmethod
-    def search_by_category(cls, category: str) -> List[Dict[str, Any]]:
+    def _search_column(cls, column: str, value: str) -> List[MedicineRecord]:
+        """Rows whose column equals value (case-insensitive), top 10"""
+        if cls._is_empty() or column not in cls._columns:
+            return []
+        
+        # Group index: only the matching rows are touched
+        rows = cls._store.group_index(column).rows_equal(value.lower())
+        first = bisect.bisect_left(rows, cls._rows.start)
+        last = min(bisect.bisect_left(rows, cls._rows.stop), first + 10)
+        return [cls._row(idx) for idx in rows[first:last]]
+    
+    @classmethod
+    def search_by_category(cls, category: str) -> List[MedicineRecord]:
         """
         Search medicines by category
         
@@ -106,18 +119,10 @@ class MedicineCSVRAG:
             List of matching medicine records
         """
         cls.load_dataset()
-        
-        if cls._df.empty:
-            return []
-        
-        matching = cls._df[
-            cls._df['Category'].str.lower() == category.lower()
-        ]
-        
-        return matching.to_dict('records')[:10]  # Return top 10
+        return cls._search_column('Category', category)  # Return top 10
     
     @classmethod
-    def search_by_indication(cls, indication: str) -> List[Dict[str, Any]]:
+    def search_by_indication(cls, indication: str) -> List[MedicineRecord]:
         """
         Search medicines by indication (disease/symptom)
         
@@ -128,15 +133,7 @@ class MedicineCSVRAG:
             List of matching medicine records
         """
         cls.load_dataset()
-        
-        if cls._df.empty:
-            return []
-        
-        matching = cls._df[
-            cls._df['Indication'].str.lower() == indication.lower()
-        ]
-        
-        return matching.to_dict('records')[:10]  # Return top 10
+        return cls._search_column('Indication', indication)  # Return top 10
     
     @classmethod
     def get_medicine_info(cls, medicine_name: str) -> Dict[str, Any]:
@@ -169,14 +166,14 @@ class MedicineCSVRAG:
             "indication": medicine_data.get('Indication', 'Unknown'),
             "classification": medicine_data.get('Classification', 'Unknown'),
             "found": True,
-            "raw_data": medicine_data
+            "raw_data": medicine_data.to_dict()
         }
     
     @classmethod
     def get_all_medicines_count(cls) -> int:
         """Get total count of medicines in dataset"""
         cls.load_dataset()
-        return len(cls._df) if cls._df is not None else 0
+        return 0 if cls._is_empty() else len(cls._rows)
     
     @classmethod
     def format_for_llm(cls, medicine_info: Dict[str, Any]) -> str:
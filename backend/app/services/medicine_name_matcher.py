@@ -0,0 +1,368 @@
+"""
+Medicine Name Matcher
+Finds the medicine named in OCR text by matching word n-grams against the
+medicine store's name index, with edit costs that know which characters
+OCR confuses (0/O, 1/l/I, 5/S, rn/m, cl/d, vv/w).
+
+Only the distinctive part of a name is compared: doses ("500mg", "650"),
+units, dosage forms ("tablet") and pharmacopoeia marks ("IP") are shared by
+thousands of names and would otherwise carry a match on their own. Those
+generic words only break ties between names with the same distinctive part
+("dolo 650" over "dolo" when the text says 650), and a multi-word name's
+first word must also match on its own.
+
+Distinctive parts are indexed by the trigrams of their "OCR skeleton"
+(confusable characters folded together), so a misread like "Paracetarno1"
+still shares most trigrams with "paracetamol". The index tables are built
+with the medicine store and memory-mapped by every worker. Candidates
+sharing enough trigrams are then ranked by a weighted edit distance in
+which a confusion costs far less than an arbitrary substitution.
+
+A match with similarity >= MEDICINE_MATCH_CONFIDENCE identifies the medicine
+with certainty; the LLM is then only asked for its information.
+"""
+
+import bisect
+import logging
+import os
+import re
+import threading
+from collections import defaultdict
+from functools import lru_cache
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Similarity (0-1) above which a dictionary hit is trusted without the LLM
+CONFIDENT_SIMILARITY = float(os.getenv("MEDICINE_MATCH_CONFIDENCE", "0.85"))
+
+# Lowest similarity still reported as a match
+MIN_SIMILARITY = 0.7
+
+# Longest OCR n-gram (in words) tried against the names
+MAX_NGRAM_WORDS = 4
+
+# Candidates (by shared trigrams) scored with the full edit distance
+MAX_CANDIDATES = 10
+
+# Least trigram overlap (Dice coefficient) for a candidate
+MIN_TRIGRAM_OVERLAP = 0.5
+
+MIN_NAME_LENGTH = 4
+
+# Substitution cost of characters OCR commonly confuses (others cost 1)
+CONFUSION_COST = 0.25
+
+_CONFUSABLE_CHARS = [
+    "0o", "1li|", "5s", "8b", "2z", "6g", "9q", "uv",
+]
+# Multi-character misreads: (as read, actual) both ways
+_CONFUSABLE_SEQUENCES = [("rn", "m"), ("cl", "d"), ("vv", "w"), ("ii", "u"), ("nn", "m")]
+
+_CHAR_CLASS: Dict[str, str] = {c: group[0] for group in _CONFUSABLE_CHARS for c in group}
+
+_TOKEN = re.compile(r"[a-z0-9|]+")
+
+# Words shared across many medicine names: forms, units, packs, pharmacopoeias
+GENERIC_WORDS = frozenset("""
+    tablet tablets tab tabs capsule capsules cap caps syrup syp suspension susp injection inj
+    cream ointment gel lotion drops drop solution sol spray inhaler powder sachet granules
+    mg mcg gm g ml kg iu unit units w v strip strips pack bottle
+    ip bp usp ph eur er sr xr cr mr od dt ds fc film coated uncoated oral
+""".split())
+
+_UNITS = ("mg", "mcg", "gm", "g", "ml", "iu", "kg", "w")
+
+
+@lru_cache(maxsize=65536)
+def is_generic(token: str) -> bool:
+    """Dose, unit, form or pharmacopoeia word (also as OCR misreads it)"""
+    if token in GENERIC_WORDS or skeleton(token) in _GENERIC_SKELETONS:
+        return True
+    # Doses: a digit, then digits (or letters OCR reads for them), then an optional unit
+    if not token[0].isdigit():
+        return False
+    key = skeleton(token)
+    for unit in _UNITS:
+        if key.endswith(skeleton(unit)) and len(key) > len(unit):
+            key = key[:-len(unit)]
+            break
+    return all(c.isdigit() or c == "." for c in key)
+
+
+def skeleton(text: str) -> str:
+    """Confusable characters folded together ("Paracetarno1" -> "paracetamol")"""
+    text = text.lower()
+    for read, actual in _CONFUSABLE_SEQUENCES:
+        text = text.replace(read, actual)
+    return "".join(_CHAR_CLASS.get(c, c) for c in text)
+
+
+_GENERIC_SKELETONS = frozenset(skeleton(word) for word in GENERIC_WORDS if len(word) > 2)
+
+
+def distinctive(text: str) -> Tuple[str, List[str]]:
+    """(distinctive words joined, generic words) of a name or OCR n-gram"""
+    core, generic = [], []
+    for token in _TOKEN.findall(text.lower()):
+        (generic if is_generic(token) else core).append(token)
+    return " ".join(core), generic
+
+
+def _trigrams(text: str) -> set:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _substitution_cost(a: str, b: str) -> float:
+    if a == b:
+        return 0.0
+    if _CHAR_CLASS.get(a, a) == _CHAR_CLASS.get(b, b):
+        return CONFUSION_COST
+    return 1.0
+
+
+def ocr_edit_distance(read: str, actual: str) -> float:
+    """
+    Levenshtein distance where confusable characters and sequences
+    (rn <-> m, ...) cost CONFUSION_COST instead of 1.
+    """
+    read, actual = read.lower(), actual.lower()
+    n, m = len(read), len(actual)
+    dist = [[0.0] * (m + 1) for _ in range(n + 1)]
+    for i in range(1, n + 1):
+        dist[i][0] = float(i)
+    for j in range(1, m + 1):
+        dist[0][j] = float(j)
+    for i in range(1, n + 1):
+        for j in range(1, m + 1):
+            best = min(
+                dist[i - 1][j] + 1,
+                dist[i][j - 1] + 1,
+                dist[i - 1][j - 1] + _substitution_cost(read[i - 1], actual[j - 1]),
+            )
+            for seq_a, seq_b in _CONFUSABLE_SEQUENCES:
+                for x, y in ((seq_a, seq_b), (seq_b, seq_a)):
+                    if i >= len(x) and j >= len(y) and read[i - len(x):i] == x and actual[j - len(y):j] == y:
+                        best = min(best, dist[i - len(x)][j - len(y)] + CONFUSION_COST)
+            dist[i][j] = best
+    return dist[n][m]
+
+
+def similarity(read: str, actual: str) -> float:
+    longest = max(len(read), len(actual))
+    return 1.0 - ocr_edit_distance(read, actual) / longest if longest else 0.0
+
+
+@dataclass
+class NameMatch:
+    name: str          # index key (lower-cased medicine name)
+    matched_text: str  # OCR n-gram it was read from
+    similarity: float
+
+    @property
+    def confident(self) -> bool:
+        return self.similarity >= CONFIDENT_SIMILARITY
+
+    def to_dict(self) -> Dict:
+        return {**asdict(self), "confident": self.confident}
+
+
+class Postings(NamedTuple):
+    """Sorted keys -> row ids: rows[starts[i]:starts[i + 1]] belong to keys[i]"""
+    keys: Sequence[str]
+    starts: Sequence[int]
+    rows: Sequence[int]
+
+
+def _postings(groups: Dict[str, List[int]]) -> Postings:
+    keys = sorted(groups)
+    starts = [0]
+    rows: List[int] = []
+    for key in keys:
+        rows.extend(groups[key])
+        starts.append(len(rows))
+    return Postings(keys, starts, rows)
+
+
+def matcher_tables(names: Sequence[str]) -> Dict[str, Any]:
+    """
+    Index tables of a matcher over names: the generic words of each name,
+    distinctive parts (sorted) -> name ids, OCR skeletons -> distinctive
+    parts, skeleton trigrams -> distinctive parts and the trigram count of
+    each part. build_medicine_store writes them next to the name index.
+    """
+    generic_words = []
+    by_core: Dict[str, List[int]] = defaultdict(list)
+    for row, name in enumerate(names):
+        core, generic = distinctive(name)
+        generic_words.append(" ".join(generic))
+        if len(core) >= MIN_NAME_LENGTH:
+            by_core[core].append(row)
+
+    by_skeleton: Dict[str, List[int]] = defaultdict(list)
+    by_gram: Dict[str, List[int]] = defaultdict(list)
+    gram_counts = []
+    for position, core in enumerate(sorted(by_core)):
+        key = skeleton(core)
+        by_skeleton[key].append(position)
+        grams = _trigrams(key)
+        gram_counts.append(len(grams))
+        for gram in grams:
+            by_gram[gram].append(position)
+    return {
+        "generic": generic_words,
+        "cores": _postings(by_core),
+        "skeletons": _postings(by_skeleton),
+        "grams": _postings(by_gram),
+        "gram_counts": gram_counts,
+    }
+
+
+class MedicineNameMatcher:
+    """Trigram index over OCR skeletons of the distinctive part of medicine names"""
+
+    def __init__(self, names: Sequence[str], tables: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            names: Index keys (lower-cased medicine names)
+            tables: matcher_tables(names), e.g. memory-mapped from the
+                medicine store; built here when not given
+        """
+        tables = tables or matcher_tables(names)
+        self.names = names
+        self._generic = tables["generic"]
+        # Distinctive part -> names sharing it (e.g. every strength of one brand)
+        cores = tables["cores"]
+        self._cores = cores.keys
+        self._core_starts = np.asarray(cores.starts, dtype=np.int64)
+        self._core_names = np.asarray(cores.rows, dtype=np.int64)
+        self._skeletons: Postings = tables["skeletons"]
+        grams = tables["grams"]
+        self._grams = {gram: position for position, gram in enumerate(grams.keys)}
+        self._gram_starts = np.asarray(grams.starts, dtype=np.int64)
+        self._gram_cores = np.asarray(grams.rows, dtype=np.int64)
+        self._gram_counts = np.asarray(tables["gram_counts"], dtype=np.int64)
+
+    def __len__(self) -> int:
+        """Number of distinctive parts indexed"""
+        return len(self._cores)
+
+    def _by_skeleton(self, key: str) -> Sequence[int]:
+        position = bisect.bisect_left(self._skeletons.keys, key)
+        if position < len(self._skeletons.keys) and self._skeletons.keys[position] == key:
+            return self._skeletons.rows[self._skeletons.starts[position]:self._skeletons.starts[position + 1]]
+        return ()
+
+    def _names_of(self, core: int) -> np.ndarray:
+        return self._core_names[self._core_starts[core]:self._core_starts[core + 1]]
+
+    def _gram_postings(self, gram: str) -> Optional[np.ndarray]:
+        position = self._grams.get(gram)
+        if position is None:
+            return None
+        return self._gram_cores[self._gram_starts[position]:self._gram_starts[position + 1]]
+
+    def _candidates(self, key: str) -> List[int]:
+        """Distinctive parts sharing enough trigrams with key, most shared first"""
+        grams = _trigrams(key)
+        lists = [postings for postings in map(self._gram_postings, grams) if postings is not None]
+        if not lists:
+            return []
+        positions, shared = np.unique(np.concatenate(lists), return_counts=True)
+        dice = 2.0 * shared / (len(grams) + self._gram_counts[positions])
+        keep = dice >= MIN_TRIGRAM_OVERLAP
+        positions, dice = positions[keep], dice[keep]
+        if len(positions) > MAX_CANDIDATES:
+            top = np.argpartition(-dice, MAX_CANDIDATES)[:MAX_CANDIDATES]
+            positions, dice = positions[top], dice[top]
+        return [int(p) for p in positions[np.argsort(-dice, kind="stable")]]
+
+    def _score(self, core: str, candidate: str) -> float:
+        """Similarity of the distinctive parts; a multi-word name's first word must match alone"""
+        score = similarity(core, candidate)
+        if score >= MIN_SIMILARITY and " " in candidate:
+            if similarity(core.split(" ", 1)[0], candidate.split(" ", 1)[0]) < MIN_SIMILARITY:
+                return 0.0
+        return score
+
+    def match_ngram(self, text: str, context: frozenset = frozenset()) -> Optional[NameMatch]:
+        """
+        Best medicine name for one OCR n-gram of distinctive words. Names
+        sharing the best distinctive part are told apart by how many of
+        their generic words (doses, forms) appear in context.
+        """
+        core = text.lower()
+        key = skeleton(core)
+        if len(key) < MIN_NAME_LENGTH:
+            return None
+        exact = self._by_skeleton(key)
+        best_core, best_score = None, 0.0
+        for position in (exact if exact else self._candidates(key)):
+            score = self._score(core, self._cores[position])
+            if score >= MIN_SIMILARITY and score > best_score:
+                best_core, best_score = position, score
+        if best_core is None:
+            return None
+        candidates = {n: self.names[n] for n in map(int, self._names_of(best_core))}
+        generic = {n: frozenset(self._generic[n].split()) for n in candidates}
+        name = max(
+            candidates,
+            key=lambda n: (len(generic[n] & context), -len(generic[n] - context), -len(candidates[n])),
+        )
+        return NameMatch(name=candidates[name], matched_text=core, similarity=round(best_score, 3))
+
+    def match(self, ocr_text: str) -> Optional[NameMatch]:
+        """
+        Best medicine name over all n-grams of the OCR text's distinctive
+        words. Among equally similar matches the longer matched text wins.
+        """
+        tokens = _TOKEN.findall(ocr_text.lower())
+        context = frozenset(t for t in tokens if is_generic(t))
+        words = [t for t in tokens if not is_generic(t)]
+        best: Optional[NameMatch] = None
+        seen = set()
+        for size in range(1, MAX_NGRAM_WORDS + 1):
+            for start in range(len(words) - size + 1):
+                ngram = " ".join(words[start:start + size])
+                if ngram in seen:
+                    continue
+                seen.add(ngram)
+                found = self.match_ngram(ngram, context)
+                if found is None:
+                    continue
+                if best is None or (found.similarity, len(found.matched_text)) > (best.similarity, len(best.matched_text)):
+                    best = found
+        return best
+
+
+_matcher: Optional[MedicineNameMatcher] = None
+_matcher_lock = threading.Lock()
+
+
+def get_matcher() -> Optional[MedicineNameMatcher]:
+    """Shared matcher over the medicine store's names (None if the store cannot be loaded)"""
+    global _matcher
+    if _matcher is None:
+        with _matcher_lock:
+            if _matcher is None:
+                try:
+                    from app.services.medicine_store import get_medicine_store
+                    store = get_medicine_store()
+                    _matcher = MedicineNameMatcher(store.name_index().keys, store.matcher_tables())
+                    logger.info(f"✅ Medicine name matcher mapped: {len(_matcher)} distinctive names")
+                except Exception as e:
+                    logger.warning(f"⚠️ Medicine name matcher unavailable: {e}")
+                    return None
+    return _matcher
+
+
+def find_medicine_name(ocr_text: str) -> Optional[NameMatch]:
+    """Medicine named in OCR text, or None when nothing in the index is close"""
+    matcher = get_matcher()
+    if matcher is None or not ocr_text:
+        return None
+    return matcher.match(ocr_text)
@@ -7,8 +7,19 @@ import numpy as np
 import logging
 import os
 import tempfile
-from typing import Dict, Any
+from typing import Any, Callable, Dict, Optional, Union
 import requests
+from starlette.concurrency import run_in_threadpool
+
+from app.core.metrics import collect_stages, stage
+from app.core.result_cache import results
+from app.core.single_flight import content_key, digest_key, flights
+from app.services import tesseract_pool, text_regions
+from app.services.llm_scheduler import LLMOverloadedError
+from app.services.medicine_name_matcher import NameMatch, find_medicine_name
+from app.services.ocr_planner import OCRPlanner, classify_image, score_text
+from app.services.orientation import correct_orientation
+from app.services.preprocessing_graph import GRAYSCALE, preprocessing_graph, shared_preprocessing
 
 logger = logging.getLogger(__name__)
 
@@ -22,6 +33,9 @@ try:
 except Exception as e:
     logger.debug(f"⚠️ Pytesseract not available: {e}")
 
+# In-process engine (tesserocr) or the pytesseract subprocess fallback
+HAVE_TESSERACT = tesseract_pool.is_available()
+
 # EasyOCR support (primary OCR engine)
 HAVE_EASYOCR = False
 try:
@@ -32,6 +46,62 @@ except ImportError:
     logger.error("❌ EasyOCR not installed - OCR features will not work")
 
 
+MEDICINE_VARIANTS = ("Gray Denoised", "CLAHE OTSU", "CLAHE Adaptive Mean", "Inverted OTSU")
+
+# Auto, single block, single line, sparse text
+MEDICINE_PSM_MODES = (3, 6, 7, 11)
+
+# Pass order used until the planner has learned one for the image type
+DEFAULT_OCR_PASSES = [(variant, psm) for variant in MEDICINE_VARIANTS for psm in MEDICINE_PSM_MODES]
+
+_planner = OCRPlanner(DEFAULT_OCR_PASSES)
+
+
+def default_ocr_passes(image_type: str) -> list:
+    if image_type == "dark":
+        # Light print on dark packaging: the inverted binarization reads black on white
+        return sorted(DEFAULT_OCR_PASSES, key=lambda p: p[0] != "Inverted OTSU")
+    return DEFAULT_OCR_PASSES
+
+
+# Preprocessing steps of each variant; all share grayscale -> denoise and
+# the CLAHE node, so each is computed once per image
+MEDICINE_VARIANT_STEPS = {
+    # Mild denoise + grayscale
+    "Gray Denoised": (GRAYSCALE, ("denoise", 8)),
+    # CLAHE + OTSU
+    "CLAHE OTSU": (GRAYSCALE, ("denoise", 8), ("contrast", 1.5, 8), ("blur", 3), ("threshold_otsu",)),
+    # CLAHE + Adaptive Mean
+    "CLAHE Adaptive Mean": (GRAYSCALE, ("denoise", 8), ("contrast", 1.5, 8), ("threshold_adaptive", "mean", 21, 10)),
+    # Inverted OTSU
+    "Inverted OTSU": (GRAYSCALE, ("denoise", 8), ("contrast", 1.5, 8), ("blur", 3), ("threshold_otsu",), ("invert",)),
+}
+
+
+class MedicineImageVariants:
+    """
+    Preprocessing variants for medicine packaging OCR (reflective surfaces,
+    blister packs, prescriptions, bottles), each computed on first use so
+    passes that are never run cost no preprocessing.
+    """
+
+    def __init__(self, image_array):
+        if isinstance(image_array, str):
+            # If it's a path, read it
+            img = cv2.imread(image_array)
+        else:
+            img = image_array
+        
+        if img is None:
+            raise ValueError("Could not load image")
+        
+        self.graph = preprocessing_graph(img)
+        self.gray = self.graph.run((GRAYSCALE,))
+    
+    def get(self, name: str) -> np.ndarray:
+        return self.graph.run(MEDICINE_VARIANT_STEPS[name])
+
+
 def preprocess_image_multiple_methods(image_array: np.ndarray) -> list:
     """
     Try multiple preprocessing strategies for medicine packaging OCR.
@@ -43,51 +113,38 @@ def preprocess_image_multiple_methods(image_array: np.ndarray) -> list:
     Returns:
         list of (method_name, processed_image) tuples
     """
-    if isinstance(image_array, str):
-        # If it's a path, read it
-        img = cv2.imread(image_array)
-    else:
-        img = image_array
-    
-    if img is None:
-        raise ValueError("Could not load image")
-    
-    # Convert to grayscale
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    
-    results = []
-    
-    # METHOD 1: Mild denoise + grayscale
-    mild_denoise = cv2.fastNlMeansDenoising(gray, None, h=8, templateWindowSize=7, searchWindowSize=21)
-    results.append(('Gray Denoised', mild_denoise))
+    variants = MedicineImageVariants(image_array)
+    return [(name, variants.get(name)) for name in MEDICINE_VARIANTS]
+
+
+def _easyocr_text(image_array: np.ndarray) -> tuple:
+    """EasyOCR text and mean confidence of the original image"""
+    if not hasattr(extract_text_from_image, '_easyocr_reader'):
+        logger.info("📥 Loading EasyOCR reader...")
+        extract_text_from_image._easyocr_reader = easyocr.Reader(['en'], gpu=False)
     
-    # METHOD 2: CLAHE + OTSU
-    clahe = cv2.createCLAHE(clipLimit=1.5, tileGridSize=(8, 8))
-    clahe_img = clahe.apply(mild_denoise)
-    blurred = cv2.GaussianBlur(clahe_img, (3, 3), 0)
-    _, otsu = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-    results.append(('CLAHE OTSU', otsu))
+    reader = extract_text_from_image._easyocr_reader
     
-    # METHOD 3: CLAHE + Adaptive Mean
-    adaptive = cv2.adaptiveThreshold(
-        clahe_img, 255,
-        cv2.ADAPTIVE_THRESH_MEAN_C,
-        cv2.THRESH_BINARY,
-        21, 10
-    )
-    results.append(('CLAHE Adaptive Mean', adaptive))
-    
-    # METHOD 4: Inverted OTSU
-    inverted = cv2.bitwise_not(otsu)
-    results.append(('Inverted OTSU', inverted))
+    # Ensure proper image format
+    if len(image_array.shape) == 2:
+        img_rgb = cv2.cvtColor(image_array, cv2.COLOR_GRAY2RGB)
+    else:
+        img_rgb = cv2.cvtColor(image_array, cv2.COLOR_BGR2RGB)
     
-    return results
+    with stage("ocr.easyocr"):
+        detections = reader.readtext(img_rgb, detail=1)
+    text = " ".join(" ".join(text for _, text, _ in detections).split())
+    confidence = sum(conf for _, _, conf in detections) / len(detections) if detections else None
+    return text, confidence
 
 
 def extract_text_from_image(image_array: np.ndarray) -> str:
     """
     Extract text from medicine packaging using OCR.
-    Tries multiple preprocessing and OCR methods to get best result.
+    Runs preprocessing variant + PSM passes in the order chosen by the
+    adaptive OCR planner until one scores well enough, and falls back to
+    EasyOCR when Tesseract is missing or every pass scored poorly. When
+    text covers only part of the photo, everything runs on the text area.
     
     Args:
         image_array: numpy array of image
@@ -95,77 +152,52 @@ def extract_text_from_image(image_array: np.ndarray) -> str:
     Returns:
         Extracted text from the image
     """
-    logger.info(f"📷 Starting OCR extraction. Pytesseract: {HAVE_PYTESSERACT}, EasyOCR: {HAVE_EASYOCR}")
+    logger.info(f"📷 Starting OCR extraction. Tesseract: {HAVE_TESSERACT} (in-process: {tesseract_pool.uses_pool()}), EasyOCR: {HAVE_EASYOCR}")
+    
+    # Packaging photos are mostly background: keep the box around the detected text
+    layout = text_regions.region_layout(image_array)
+    if layout:
+        image_array = text_regions.crop(image_array, layout.bounds)
     
     try:
-        preprocessed_images = preprocess_image_multiple_methods(image_array)
+        variants = MedicineImageVariants(image_array)
     except Exception as e:
         logger.error(f"Preprocessing failed: {e}")
         raise
     
+    image_type = classify_image(variants.gray)
     best_text = ""
-    best_length = 0
+    best_score = -1.0
     best_method = ""
-    all_texts = []
     
-    # Try Tesseract first if available
-    if HAVE_PYTESSERACT:
-        logger.info("🔍 Trying Tesseract OCR...")
-        psm_modes = [
-            ('Auto', 3),
-            ('Single Block', 6),
-            ('Single Line', 7),
-            ('Sparse Text', 11)
-        ]
+    if HAVE_TESSERACT:
+        logger.info(f"🔍 Trying Tesseract OCR ({image_type} image)...")
         
-        # Try all preprocessing + PSM combinations
-        for method_name, processed_img in preprocessed_images:
-            for psm_name, psm_mode in psm_modes:
-                try:
-                    config = f'--oem 3 --psm {psm_mode}'
-                    text = pytesseract.image_to_string(processed_img, config=config)
-                    text = " ".join(text.split())  # Clean whitespace
-                    all_texts.append(text)
-                    
-                    if len(text) > best_length:
-                        best_length = len(text)
-                        best_text = text
-                        best_method = f"{method_name} + PSM {psm_mode}"
-                except Exception as e:
-                    logger.debug(f"PSM {psm_mode} failed: {e}")
-                    continue
-    
-    # Try EasyOCR as fallback or primary if Tesseract unavailable
-    if HAVE_EASYOCR:
+        def recognize(variant: str, psm: int):
+            processed_img = variants.get(variant)
+            with stage("ocr.tesseract"):
+                return tesseract_pool.image_to_string_with_confidence(processed_img, psm=psm)
+        
+        plan = _planner.run(image_type, recognize, default=default_ocr_passes(image_type))
+        if plan.best:
+            best_text, best_score = plan.best.text, plan.best.score
+            best_method = f"{plan.best.variant} + PSM {plan.best.psm}"
+        logger.info(f"🧭 OCR planner: {plan.calls}/{len(DEFAULT_OCR_PASSES)} Tesseract passes, best score {best_score:.2f}")
+    
+    # EasyOCR when Tesseract is unavailable or no pass was good enough
+    if HAVE_EASYOCR and best_score < _planner.accept_score:
         logger.info("🔍 Trying EasyOCR...")
         try:
-            if not hasattr(extract_text_from_image, '_easyocr_reader'):
-                logger.info("📥 Loading EasyOCR reader...")
-                extract_text_from_image._easyocr_reader = easyocr.Reader(['en'], gpu=False)
-            
-            reader = extract_text_from_image._easyocr_reader
-            
-            # Ensure proper image format
-            if len(image_array.shape) == 2:
-                img_rgb = cv2.cvtColor(image_array, cv2.COLOR_GRAY2RGB)
-            else:
-                img_rgb = cv2.cvtColor(image_array, cv2.COLOR_BGR2RGB)
-            
-            text_list = reader.readtext(img_rgb, detail=0, paragraph=True)
-            text = " ".join(text_list)
-            text = " ".join(text.split())
-            all_texts.append(text)
-            
-            if len(text) > best_length:
-                best_length = len(text)
-                best_text = text
-                best_method = "EasyOCR"
+            text, confidence = _easyocr_text(image_array)
+            score = score_text(text, confidence)
+            if (score, len(text)) > (best_score, len(best_text)):
+                best_text, best_score, best_method = text, score, "EasyOCR"
         except Exception as e:
             logger.warning(f"EasyOCR failed: {e}")
     
-    logger.info(f"Best OCR result: {best_method} ({best_length} chars)")
+    logger.info(f"Best OCR result: {best_method} ({len(best_text)} chars, score {best_score:.2f})")
     
-    if best_length < 5:
+    if len(best_text) < 5:
         logger.warning("OCR found very little text, result may be poor")
     
     return best_text
@@ -175,6 +207,9 @@ def analyze_medicine_with_phi4(ocr_text: str) -> Dict[str, Any]:
     """
     Analyze medicine using integrated LLM + Unified Database system.
     Combines Phi-4 LLM with unified database (50K + 250K medicines).
+    When the OCR text contains a confident dictionary match for a medicine
+    name, the LLM is given that name as confirmed and only asked for its
+    information.
     
     Args:
         ocr_text: Text extracted from medicine packaging
@@ -188,47 +223,45 @@ def analyze_medicine_with_phi4(ocr_text: str) -> Dict[str, Any]:
     logger.info(f"🔍 Starting comprehensive medicine analysis for OCR text: {ocr_text[:50]}...")
     
     # Step 1: Extract medicine name from OCR text
-    medicine_name = extract_medicine_name(ocr_text)
+    match = find_medicine_name(ocr_text)
+    medicine_name = extract_medicine_name(ocr_text, match)
     logger.info(f"📝 Extracted medicine name: {medicine_name}")
     
     # Step 2: Retrieve medicine data from Unified Database (50K + 250K medicines)
     medicine_info = UnifiedMedicineDatabase.get_medicine_info(medicine_name)
     logger.info(f"📊 Retrieved medicine data from unified database for: {medicine_info.get('name')}")
     
+    if match and match.confident and medicine_info.get('found'):
+        logger.info(f"📗 Dictionary match '{match.matched_text}' -> '{match.name}' ({match.similarity:.2f})")
+        medicine_info = {**medicine_info, 'name_confirmed': True}
+    
     # Step 3: Use Enhanced LLM to generate comprehensive information
     # Includes: precautions, dosage for adults/children/pregnancy, side effects, etc.
     result = EnhancedMedicineLLMGenerator.generate_comprehensive_info(ocr_text, medicine_info)
     logger.info(f"✅ Generated comprehensive medicine information: {result.get('medicine_name')}")
+    if match:
+        result["name_match"] = match.to_dict()
     
     return result
 
 
-def extract_medicine_name(ocr_text: str) -> str:
+def extract_medicine_name(ocr_text: str, match: Optional[NameMatch] = None) -> str:
     """
     Extract medicine name from OCR text
     
     Args:
         ocr_text: Raw OCR text from image
+        match: Result of find_medicine_name(ocr_text), if already computed
         
     Returns:
         Extracted medicine name
     """
-    text_lower = ocr_text.lower()
-    
-    # Common medicine name patterns
-    common_patterns = [
-        "paracetamol", "cetirizine", "ibuprofen", "amoxicillin", 
-        "metformin", "omeprazole", "aspirin", "acetaminophen",
-        "cough", "cold", "fever", "pain", "allergy"
-    ]
-    
-    # Check for common patterns
-    for pattern in common_patterns:
-        if pattern in text_lower:
-            logger.info(f"Found common medicine pattern: {pattern}")
-            return pattern
+    match = match or find_medicine_name(ocr_text)
+    if match:
+        logger.info(f"Matched medicine name in dictionary: {match.name} ({match.similarity:.2f})")
+        return match.name
     
-    # Extract first word or first significant word
+    # Not in the name index: first significant word
     words = ocr_text.split()
     for word in words:
         if len(word) > 3:  # Prefer words longer than 3 characters
@@ -241,16 +274,46 @@ def extract_medicine_name(ocr_text: str) -> str:
     return "unknown"
 
 
-async def process_medicine_image(image_path: str) -> Dict[str, Any]:
+async def process_medicine_image(
+    image_path: Union[str, Callable[[], str]], content: Optional[bytes] = None,
+    user_id: Optional[int] = None, digest: Optional[str] = None,
+) -> Dict[str, Any]:
     """
-    Complete pipeline: OCR + LLM analysis of medicine image.
+    Complete pipeline: OCR + LLM analysis of medicine image, run in a worker
+    thread. When the uploaded bytes are given, concurrent uploads of the same
+    image share one pipeline run, and a signed-in user's repeat upload of the
+    image is answered from the result cache.
     
     Args:
-        image_path: Path to medicine image
+        image_path: Path to medicine image, or a function returning it
+            (called in the worker thread, only if the image is analyzed)
+        content: Raw uploaded image bytes (coalescing and cache key)
+        user_id: Uploading user, None for anonymous uploads (not cached)
+        digest: sha256 (hex) of content, if already computed
     
     Returns:
         Dictionary with complete medicine information
     """
+    if content is None:
+        return await run_in_threadpool(identify_medicine_image, image_path)
+    key = digest_key("medicine_image", digest) if digest else content_key("medicine_image", content)
+    return await run_in_threadpool(
+        results.cached, "medicine_image", user_id, content,
+        flights.do, key, identify_medicine_image, image_path, digest=digest,
+    )
+
+
+def identify_medicine_image(image_path: Union[str, Callable[[], str]]) -> Dict[str, Any]:
+    """OCR + LLM analysis of a medicine image file (blocking), with per-stage timings in pipeline_stages"""
+    if callable(image_path):
+        image_path = image_path()
+    with collect_stages() as stages, shared_preprocessing():
+        result = _identify_medicine_image(image_path)
+    result["pipeline_stages"] = dict(stages)
+    return result
+
+
+def _identify_medicine_image(image_path: str) -> Dict[str, Any]:
     logger.info(f"Processing medicine image: {image_path}")
     
     try:
@@ -259,6 +322,7 @@ async def process_medicine_image(image_path: str) -> Dict[str, Any]:
         image = cv2.imread(image_path)
         if image is None:
             raise ValueError("Could not read image file")
+        image = correct_orientation(image)
         
         ocr_text = extract_text_from_image(image)
         logger.info(f"OCR Text ({len(ocr_text)} chars): {ocr_text[:200]}")
@@ -277,6 +341,8 @@ async def process_medicine_image(image_path: str) -> Dict[str, Any]:
             "message": "Medicine identification successful"
         }
         
+    except LLMOverloadedError:
+        raise
     except Exception as e:
         logger.error(f"Medicine processing failed: {e}")
         return {
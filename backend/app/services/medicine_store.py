@@ -0,0 +1,587 @@
+"""
+Medicine Columnar Store
+Compact, read-only binary copy of the medicine CSV datasets.
+
+The CSVs are converted once (scripts/build_medicine_store.py, or on first use)
+into one file per column: a UTF-8 blob (<col>.bin) plus an int64 offsets
+array (<col>.off), together with a prebuilt sorted name index. Every worker
+memory-maps the same files, so N processes share a single page-cache copy and
+loading takes milliseconds instead of a pd.read_csv per class per process.
+
+Low-cardinality columns (category, indication, manufacturer, ...) also get a
+group index (lower-cased value -> ascending row ids), and rows are returned as
+MedicineRecord views that read values straight from the column arrays. The
+OCR name matcher's trigram tables are precompiled into the store as well.
+"""
+
+import bisect
+import csv
+import heapq
+import json
+import logging
+import mmap
+import os
+import shutil
+import threading
+from array import array
+from contextlib import contextmanager
+from datetime import datetime
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+try:
+    import fcntl  # serializes store builds across worker processes
+except ImportError:  # Windows
+    fcntl = None
+
+FORMAT_VERSION = 3
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+PROJECT_DIR = os.path.dirname(BACKEND_DIR)
+
+DEFAULT_STORE_DIR = os.getenv(
+    "MEDICINE_STORE_DIR", os.path.join(BACKEND_DIR, "resources", "medicine_store")
+)
+
+# (source name, dataset version, CSV file name) in merge order
+DATASET_SOURCES = [
+    ("generic_database", "1.0", "medicine_dataset.csv"),
+    ("india_database", "2.0", "A_Z_medicines_dataset_of_India.csv"),
+]
+
+# Value used for cells missing after merging datasets with different columns
+MERGE_FILL_VALUE = "Not specified"
+
+# Columns that hold the display name, in order of preference
+NAME_COLUMNS = ("name", "Name")
+
+ALL_ROWS_INDEX = "all"
+
+# Postings tables of the OCR name matcher (matcher_<part>.*)
+MATCHER_POSTINGS = ("cores", "skeletons", "grams")
+
+# Columns that get a value -> row ids group index
+GROUP_COLUMNS = (
+    "Category", "Indication", "Manufacturer",
+    "category", "type", "manufacturer_name",
+)
+
+
+def find_dataset_csv(file_name: str) -> Optional[str]:
+    """Locate a dataset CSV in resources/datasets or the legacy locations"""
+    candidates = [
+        os.path.join(PROJECT_DIR, "resources", "datasets", file_name),
+        os.path.join(PROJECT_DIR, file_name),
+        os.path.join(BACKEND_DIR, file_name),
+        file_name,
+    ]
+    for path in candidates:
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def _source_fingerprint(path: str) -> Dict[str, Any]:
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime": int(stat.st_mtime)}
+
+
+# ---------------------------------------------------------------------------
+# Build
+# ---------------------------------------------------------------------------
+
+def _write_strings(path_prefix: str, values: Sequence[str]):
+    """Write strings as <prefix>.bin (UTF-8 blob) + <prefix>.off (int64 offsets)"""
+    offsets = array("q", [0])
+    with open(path_prefix + ".bin", "wb") as blob:
+        position = 0
+        for value in values:
+            encoded = value.encode("utf-8")
+            blob.write(encoded)
+            position += len(encoded)
+            offsets.append(position)
+    with open(path_prefix + ".off", "wb") as f:
+        offsets.tofile(f)
+
+
+def _write_ints(path: str, values: Sequence[int]):
+    with open(path, "wb") as f:
+        array("q", values).tofile(f)
+
+
+def _write_name_index(store_dir: str, index_name: str, names: Sequence[str], start: int, stop: int) -> List[str]:
+    """Sorted unique keys -> row id (last occurrence wins, like a dict index); returns the keys"""
+    index: Dict[str, int] = {}
+    for row in range(start, stop):
+        if names[row]:
+            index[names[row]] = row
+    keys = sorted(index)
+    _write_strings(os.path.join(store_dir, f"index_{index_name}"), keys)
+    _write_ints(os.path.join(store_dir, f"index_{index_name}.rows"), [index[k] for k in keys])
+    return keys
+
+
+def _write_postings(path_prefix: str, keys: Sequence[str], starts: Sequence[int], rows: Sequence[int]):
+    """Sorted keys (<prefix>.bin/.off), per-key start positions and concatenated row ids"""
+    _write_strings(path_prefix, keys)
+    _write_ints(path_prefix + ".starts", starts)
+    _write_ints(path_prefix + ".rows", rows)
+
+
+def _write_matcher_tables(store_dir: str, names: Sequence[str]):
+    """OCR name matcher tables over the name index keys (see medicine_name_matcher)"""
+    from app.services.medicine_name_matcher import matcher_tables
+
+    tables = matcher_tables(names)
+    _write_strings(os.path.join(store_dir, "matcher_generic"), tables["generic"])
+    for part in MATCHER_POSTINGS:
+        _write_postings(os.path.join(store_dir, f"matcher_{part}"), *tables[part])
+    _write_ints(os.path.join(store_dir, "matcher_gram_counts"), tables["gram_counts"])
+
+
+def _write_group_index(path_prefix: str, values: Sequence[str]):
+    """
+    Lower-cased value -> ascending row ids, written as sorted keys
+    (<prefix>.bin/.off), per-key start positions (<prefix>.starts) and the
+    concatenated row ids (<prefix>.rows).
+    """
+    groups: Dict[str, List[int]] = {}
+    for row, value in enumerate(values):
+        if value:
+            groups.setdefault(value.lower(), []).append(row)
+    keys = sorted(groups)
+    starts = [0]
+    rows: List[int] = []
+    for key in keys:
+        rows.extend(groups[key])
+        starts.append(len(rows))
+    _write_postings(path_prefix, keys, starts, rows)
+
+
+@contextmanager
+def _build_lock(store_dir: str):
+    """Exclusive lock on <store_dir>.lock, held while a store is built and swapped in"""
+    os.makedirs(os.path.dirname(os.path.abspath(store_dir)), exist_ok=True)
+    with open(f"{store_dir}.lock", "a") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        yield
+
+
+def build_medicine_store(store_dir: str = DEFAULT_STORE_DIR) -> Dict[str, Any]:
+    """
+    Convert the medicine CSVs into the columnar store at store_dir.
+    Builds into a temporary directory and swaps it in, so concurrent
+    readers never see a half-written store; builds by several processes
+    are serialized with a lock file.
+
+    Returns:
+        The store manifest
+    """
+    with _build_lock(store_dir):
+        return _build_store(store_dir)
+
+
+def ensure_medicine_store(store_dir: str = DEFAULT_STORE_DIR) -> bool:
+    """
+    Build the store if it is missing or stale. Workers starting together
+    wait for the first one's build instead of each building and swapping
+    the directory under the others.
+
+    Returns:
+        True if this call built the store
+    """
+    if not is_store_stale(store_dir):
+        return False
+    with _build_lock(store_dir):
+        # Another worker may have finished a build while we waited
+        if not is_store_stale(store_dir):
+            return False
+        logger.info("🔄 Medicine store missing or stale, building from CSV...")
+        try:
+            _build_store(store_dir)
+        except PermissionError as e:
+            # Windows cannot rename a directory whose files another process has mapped
+            if not os.path.exists(os.path.join(store_dir, "manifest.json")):
+                raise
+            logger.warning(f"⚠️ Medicine store in use, keeping the existing one until workers restart: {e}")
+            return False
+        return True
+
+
+def _build_store(store_dir: str) -> Dict[str, Any]:
+    found = [
+        (name, version, find_dataset_csv(file_name))
+        for name, version, file_name in DATASET_SOURCES
+    ]
+    found = [(name, version, path) for name, version, path in found if path]
+    if not found:
+        raise FileNotFoundError("No medicine dataset CSV found")
+
+    load_date = datetime.now().isoformat()
+    columns: List[str] = []
+    rows: List[Dict[str, str]] = []
+    sources = []
+
+    for name, version, path in found:
+        with open(path, newline="", encoding="utf-8") as f:
+            reader = csv.DictReader(f)
+            source_columns = list(reader.fieldnames or []) + ["source", "dataset_version", "load_date"]
+            start = len(rows)
+            for record in reader:
+                record["source"] = name
+                record["dataset_version"] = version
+                record["load_date"] = load_date
+                rows.append(record)
+        for column in source_columns:
+            if column not in columns:
+                columns.append(column)
+        sources.append({
+            "name": name,
+            "file": os.path.basename(path),
+            "path": os.path.abspath(path),
+            "start": start,
+            "stop": len(rows),
+            "columns": source_columns,
+            **_source_fingerprint(path),
+        })
+        logger.info(f"✅ Read {os.path.basename(path)}: {len(rows) - start} records")
+
+    # Missing cells are filled like the previous pandas merge (fillna) when
+    # several datasets are combined, and left empty (None on read) otherwise
+    fill_value = MERGE_FILL_VALUE if len(sources) > 1 else ""
+
+    tmp_dir = f"{store_dir}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    groups = {}
+    for position, column in enumerate(columns):
+        values = []
+        for record in rows:
+            value = record.get(column)
+            values.append(value if value not in (None, "") else fill_value)
+        _write_strings(os.path.join(tmp_dir, f"col_{position}"), values)
+        if column in GROUP_COLUMNS:
+            _write_group_index(os.path.join(tmp_dir, f"group_{position}"), values)
+            groups[column] = position
+
+    names = []
+    for record in rows:
+        name = ""
+        for column in NAME_COLUMNS:
+            value = (record.get(column) or "").strip()
+            if value and value != MERGE_FILL_VALUE:
+                name = value.lower()
+                break
+        names.append(name)
+    _write_strings(os.path.join(tmp_dir, "names"), names)
+
+    keys = _write_name_index(tmp_dir, ALL_ROWS_INDEX, names, 0, len(rows))
+    for source in sources:
+        _write_name_index(tmp_dir, source["name"], names, source["start"], source["stop"])
+    _write_matcher_tables(tmp_dir, keys)
+
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "built_at": datetime.now().isoformat(),
+        "n_rows": len(rows),
+        "columns": columns,
+        "fill_value": fill_value,
+        "groups": groups,
+        "sources": sources,
+    }
+    with open(os.path.join(tmp_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+
+    # Swap the new store in
+    old_dir = f"{store_dir}.old-{os.getpid()}"
+    try:
+        if os.path.exists(store_dir):
+            os.replace(store_dir, old_dir)
+        os.replace(tmp_dir, store_dir)
+    except OSError:
+        if os.path.exists(old_dir) and not os.path.exists(store_dir):
+            os.replace(old_dir, store_dir)
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+    logger.info(f"✅ Built medicine store at {store_dir}: {len(rows)} rows, {len(columns)} columns")
+    return manifest
+
+
+def is_store_stale(store_dir: str = DEFAULT_STORE_DIR) -> bool:
+    """True if the store is missing, from an older format or older than its CSVs"""
+    manifest_path = os.path.join(store_dir, "manifest.json")
+    if not os.path.exists(manifest_path):
+        return True
+    try:
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return True
+    if manifest.get("format_version") != FORMAT_VERSION:
+        return True
+
+    built_sources = {s["name"]: s for s in manifest.get("sources", [])}
+    for name, _, file_name in DATASET_SOURCES:
+        path = find_dataset_csv(file_name)
+        built = built_sources.get(name)
+        if path is None:
+            if built is not None:
+                return True
+            continue
+        if built is None:
+            return True
+        current = _source_fingerprint(path)
+        if current["size"] != built.get("size") or current["mtime"] != built.get("mtime"):
+            return True
+    return False
+
+
+# ---------------------------------------------------------------------------
+# Read
+# ---------------------------------------------------------------------------
+
+def _map_file(path: str):
+    """Read-only memory map of a file (empty files map to b"")"""
+    if os.path.getsize(path) == 0:
+        return b""
+    with open(path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _map_ints(path: str) -> memoryview:
+    """Zero-copy int64 view over a memory-mapped file (native byte order)"""
+    data = _map_file(path)
+    if not data:
+        return memoryview(array("q"))
+    return memoryview(data).cast("q")
+
+
+class StringColumn(Sequence):
+    """Read-only sequence of strings backed by a memory-mapped blob + offsets"""
+
+    def __init__(self, path_prefix: str):
+        self.blob = _map_file(path_prefix + ".bin")
+        self.offsets = _map_ints(path_prefix + ".off")
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [self[i] for i in range(*row.indices(len(self)))]
+        return self.blob[self.offsets[row]:self.offsets[row + 1]].decode("utf-8")
+
+    def row_at_offset(self, offset: int) -> int:
+        """Row whose bytes contain blob position `offset`"""
+        return bisect.bisect_right(self.offsets, offset) - 1
+
+    def find_substring(self, needle: str, start: int = 0, stop: Optional[int] = None) -> Optional[int]:
+        """
+        First row in [start, stop) whose value contains `needle`, searched
+        directly in the mapped blob without decoding every row.
+        """
+        stop = len(self) if stop is None else stop
+        if not needle or start >= stop:
+            return None
+        encoded = needle.encode("utf-8")
+        position = self.offsets[start]
+        end = self.offsets[stop]
+        while True:
+            position = self.blob.find(encoded, position, end)
+            if position < 0:
+                return None
+            row = self.row_at_offset(position)
+            if position + len(encoded) <= self.offsets[row + 1]:
+                return row
+            # Match spans two rows: resume at the start of the next row
+            position = self.offsets[row + 1]
+
+
+class NameIndex:
+    """Sorted lower-cased names -> row ids, searched with bisect"""
+
+    def __init__(self, path_prefix: str):
+        self.keys = StringColumn(path_prefix)
+        self.rows = _map_ints(path_prefix + ".rows")
+        self._key_list: Optional[List[str]] = None
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def get(self, key: str) -> Optional[int]:
+        position = bisect.bisect_left(self.keys, key)
+        if position < len(self.keys) and self.keys[position] == key:
+            return self.rows[position]
+        return None
+
+    def key_list(self) -> List[str]:
+        """All keys decoded once (for difflib fuzzy matching)"""
+        if self._key_list is None:
+            self._key_list = list(self.keys)
+        return self._key_list
+
+
+class GroupIndex:
+    """Lower-cased column value -> ascending row ids"""
+
+    def __init__(self, path_prefix: str):
+        self.keys = StringColumn(path_prefix)
+        self.starts = _map_ints(path_prefix + ".starts")
+        self.rows = _map_ints(path_prefix + ".rows")
+        self._key_list: Optional[List[str]] = None
+
+    def key_list(self) -> List[str]:
+        if self._key_list is None:
+            self._key_list = list(self.keys)
+        return self._key_list
+
+    def _group(self, position: int) -> memoryview:
+        return self.rows[self.starts[position]:self.starts[position + 1]]
+
+    def rows_equal(self, value: str) -> memoryview:
+        """Row ids whose value equals `value` (already lower-cased)"""
+        position = bisect.bisect_left(self.keys, value)
+        if position < len(self.keys) and self.keys[position] == value:
+            return self._group(position)
+        return self.rows[0:0]
+
+    def rows_containing(self, text: str) -> Iterator[int]:
+        """Row ids, in row order, whose value contains `text` (already lower-cased)"""
+        groups = [
+            self._group(position)
+            for position, key in enumerate(self.key_list())
+            if text in key
+        ]
+        return heapq.merge(*groups)
+
+
+class MedicineRecord(Mapping):
+    """
+    Read-only view of one row. Values are decoded from the mapped column
+    arrays on access; use to_dict() when a real dict is needed (e.g. JSON).
+    """
+
+    __slots__ = ("_store", "_row", "_columns")
+
+    def __init__(self, store: "MedicineStore", row: int, columns: Sequence[str]):
+        self._store = store
+        self._row = row
+        self._columns = columns
+
+    @property
+    def row(self) -> int:
+        return self._row
+
+    def __getitem__(self, column: str) -> Optional[str]:
+        if column not in self._columns:
+            raise KeyError(column)
+        return self._store.value(column, self._row)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._columns)
+
+    def __len__(self) -> int:
+        return len(self._columns)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return self._store.row_dict(self._row, self._columns)
+
+    def __repr__(self) -> str:
+        return f"MedicineRecord(row={self._row}, {self.to_dict()!r})"
+
+
+class MedicineStore:
+    """Memory-mapped medicine dataset opened from a built store directory"""
+
+    def __init__(self, store_dir: str = DEFAULT_STORE_DIR):
+        self.store_dir = store_dir
+        with open(os.path.join(store_dir, "manifest.json"), encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        self.n_rows: int = self.manifest["n_rows"]
+        self.columns: List[str] = self.manifest["columns"]
+        self._column_positions = {name: i for i, name in enumerate(self.columns)}
+        self._columns: Dict[str, StringColumn] = {}
+        self._indexes: Dict[str, NameIndex] = {}
+        self._groups: Dict[str, GroupIndex] = {}
+        self._group_positions: Dict[str, int] = self.manifest.get("groups", {})
+        self.names = StringColumn(os.path.join(store_dir, "names"))
+        self.sources = {s["name"]: s for s in self.manifest["sources"]}
+
+    def __len__(self) -> int:
+        return self.n_rows
+
+    def column(self, name: str) -> StringColumn:
+        if name not in self._columns:
+            position = self._column_positions[name]
+            self._columns[name] = StringColumn(os.path.join(self.store_dir, f"col_{position}"))
+        return self._columns[name]
+
+    def has_column(self, name: str) -> bool:
+        return name in self._column_positions
+
+    def name_index(self, source: str = ALL_ROWS_INDEX) -> NameIndex:
+        if source not in self._indexes:
+            self._indexes[source] = NameIndex(os.path.join(self.store_dir, f"index_{source}"))
+        return self._indexes[source]
+
+    def has_group_index(self, column: str) -> bool:
+        return column in self._group_positions
+
+    def group_index(self, column: str) -> GroupIndex:
+        if column not in self._groups:
+            position = self._group_positions[column]
+            self._groups[column] = GroupIndex(os.path.join(self.store_dir, f"group_{position}"))
+        return self._groups[column]
+
+    def matcher_tables(self) -> Dict[str, Any]:
+        """Mapped OCR name matcher tables over name_index().keys (see medicine_name_matcher.matcher_tables)"""
+        prefix = os.path.join(self.store_dir, "matcher_")
+        return {
+            "generic": StringColumn(prefix + "generic"),
+            **{part: GroupIndex(prefix + part) for part in MATCHER_POSTINGS},
+            "gram_counts": _map_ints(prefix + "gram_counts"),
+        }
+
+    def row_range(self, source: Optional[str] = None) -> range:
+        if source is None:
+            return range(self.n_rows)
+        info = self.sources[source]
+        return range(info["start"], info["stop"])
+
+    def value(self, column: str, row: int) -> Optional[str]:
+        value = self.column(column)[row]
+        return value if value != "" else None
+
+    def row_dict(self, row: int, columns: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+        """Row as {column: value}; empty cells become None"""
+        return {name: self.value(name, row) for name in (columns or self.columns)}
+
+    def record(self, row: int, columns: Optional[Sequence[str]] = None) -> MedicineRecord:
+        """Lightweight row view (no values decoded until accessed)"""
+        return MedicineRecord(self, row, columns or self.columns)
+
+
+_store: Optional[MedicineStore] = None
+_store_lock = threading.Lock()
+
+
+def get_medicine_store(store_dir: str = DEFAULT_STORE_DIR) -> MedicineStore:
+    """
+    Shared per-process MedicineStore, building it from the CSVs first if it
+    is missing or out of date.
+    """
+    global _store
+    if _store is not None:
+        return _store
+    with _store_lock:
+        if _store is None:
+            ensure_medicine_store(store_dir)
+            _store = MedicineStore(store_dir)
+            logger.info(f"✅ Medicine store mapped: {_store.n_rows} medicines from {store_dir}")
+    return _store
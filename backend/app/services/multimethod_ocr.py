@@ -5,7 +5,6 @@ Automatically uses GPU if available, falls back to CPU
 """
 
 import easyocr
-import pytesseract
 import numpy as np
 import cv2
 import logging
@@ -15,6 +14,8 @@ from PIL import Image
 
 # Device management - GPU/CPU auto-detection
 from app.core.device_manager import DeviceManager, get_ocr_device_config, get_torch_device
+from app.core.metrics import timed
+from app.services import tesseract_pool, text_regions
 
 try:
     from paddleocr import PaddleOCR
@@ -177,6 +178,9 @@ class MultiMethodHandwrittenOCR:
         self.logger.info(f"📊 Image shape: {image.shape}, dtype: {image.dtype}")
         self.logger.info("")
         
+        # Text blocks/lines found once and shared by every engine (None: read the whole page)
+        layout = text_regions.region_layout(image)
+        
         # Run ALL OCR methods and collect results
         all_results = []
         
@@ -184,7 +188,7 @@ class MultiMethodHandwrittenOCR:
         self.logger.info("🔍 [1/4] RUNNING EASYOCR...")
         self.logger.info("-" * 80)
         if self._easyocr_reader:
-            easyocr_result = self._extract_with_easyocr(image)
+            easyocr_result = self._extract_with_easyocr(image, layout)
             if easyocr_result:
                 all_results.append(easyocr_result)
                 self.logger.info("📄 EASYOCR EXTRACTED TEXT:")
@@ -201,7 +205,7 @@ class MultiMethodHandwrittenOCR:
         # 2. Tesseract
         self.logger.info("🔍 [2/4] RUNNING TESSERACT...")
         self.logger.info("-" * 80)
-        tesseract_result = self._extract_with_tesseract(image)
+        tesseract_result = self._extract_with_tesseract(image, layout)
         if tesseract_result:
             all_results.append(tesseract_result)
             self.logger.info("📄 TESSERACT EXTRACTED TEXT:")
@@ -217,7 +221,7 @@ class MultiMethodHandwrittenOCR:
         self.logger.info("🔍 [3/4] RUNNING TROCR (Handwritten Specialist)...")
         self.logger.info("-" * 80)
         if self._trocr_processor and self._trocr_model:
-            trocr_result = self._extract_with_trocr(image)
+            trocr_result = self._extract_with_trocr(image, layout)
             if trocr_result:
                 all_results.append(trocr_result)
                 self.logger.info("📄 TROCR EXTRACTED TEXT:")
@@ -235,7 +239,7 @@ class MultiMethodHandwrittenOCR:
         self.logger.info("🔍 [4/4] RUNNING PADDLEOCR...")
         self.logger.info("-" * 80)
         if self._paddle_ocr:
-            paddle_result = self._extract_with_paddleocr(image)
+            paddle_result = self._extract_with_paddleocr(image, layout)
             if paddle_result:
                 all_results.append(paddle_result)
                 self.logger.info("📄 PADDLEOCR EXTRACTED TEXT:")
@@ -271,6 +275,7 @@ class MultiMethodHandwrittenOCR:
             'methods_used': [r.method for r in all_results],
             'confidence': best_result.confidence,
             'quality_score': quality_score,
+            'text_regions': len(layout.blocks) if layout else 0,
             'individual_results': {
                 result.method: {
                     'text': result.text,
@@ -280,8 +285,9 @@ class MultiMethodHandwrittenOCR:
             }
         }
     
-    def _extract_with_easyocr(self, image: np.ndarray) -> Optional[OCRResult]:
-        """Extract text using EasyOCR"""
+    @timed("ocr.easyocr")
+    def _extract_with_easyocr(self, image: np.ndarray, layout: Optional[text_regions.TextLayout] = None) -> Optional[OCRResult]:
+        """Extract text using EasyOCR (recognition of the detected lines only, when given a layout)"""
         if not self._easyocr_reader:
             return None
         
@@ -289,7 +295,10 @@ class MultiMethodHandwrittenOCR:
             self.logger.debug("🔍 Running EasyOCR extraction...")
             
             # EasyOCR returns list of ([bbox], text, confidence) tuples
-            results = self._easyocr_reader.readtext(image)
+            if layout:
+                results = text_regions.easyocr_lines(self._easyocr_reader, image, layout.lines)
+            else:
+                results = self._easyocr_reader.readtext(image)
             
             if not results:
                 self.logger.debug("  ⚠️ EasyOCR returned no results")
@@ -318,8 +327,9 @@ class MultiMethodHandwrittenOCR:
             self.logger.warning(f"❌ EasyOCR failed: {e}")
             return None
     
-    def _extract_with_tesseract(self, image: np.ndarray) -> Optional[OCRResult]:
-        """Extract text using Tesseract OCR"""
+    @timed("ocr.tesseract")
+    def _extract_with_tesseract(self, image: np.ndarray, layout: Optional[text_regions.TextLayout] = None) -> Optional[OCRResult]:
+        """Extract text using Tesseract OCR (one PSM 6 pass per text block, when given a layout)"""
         try:
             self.logger.debug("🔍 Running Tesseract extraction...")
             
@@ -329,22 +339,20 @@ class MultiMethodHandwrittenOCR:
             
             # PSM 3: Fully automatic page segmentation, but no OSD
             # PSM 6: Assume a single uniform block of text
-            for psm in [3, 6]:
+            # Detected text blocks are uniform blocks already: PSM 6 on each
+            for psm in ([6] if layout else [3, 6]):
                 try:
-                    custom_config = f'--psm {psm}'
-                    result = pytesseract.image_to_string(image, config=custom_config)
+                    if layout:
+                        result, confidence = text_regions.ocr_regions(
+                            image, layout.blocks,
+                            lambda block: tesseract_pool.image_to_string_with_confidence(block, psm=psm),
+                        )
+                    else:
+                        result, confidence = tesseract_pool.image_to_string_with_confidence(image, psm=psm)
                     
                     if result.strip():
-                        # If we got text, assign reasonable confidence
-                        avg_confidence = 0.75  # Reasonable default for Tesseract
-                        
-                        try:
-                            data = pytesseract.image_to_data(image, config=custom_config, output_type=pytesseract.Output.DICT)
-                            confidences = [int(conf) for conf in data['confidence'] if int(conf) > 0]
-                            if confidences:
-                                avg_confidence = np.mean(confidences) / 100.0
-                        except:
-                            pass  # Use default confidence
+                        # Reasonable default for Tesseract when no word was scored
+                        avg_confidence = confidence if confidence is not None else 0.75
                         
                         if avg_confidence > best_confidence:
                             best_text = result
@@ -370,8 +378,9 @@ class MultiMethodHandwrittenOCR:
             self.logger.warning(f"❌ Tesseract failed: {e}")
             return None
     
-    def _extract_with_paddleocr(self, image: np.ndarray) -> Optional[OCRResult]:
-        """Extract text using PaddleOCR"""
+    @timed("ocr.paddleocr")
+    def _extract_with_paddleocr(self, image: np.ndarray, layout: Optional[text_regions.TextLayout] = None) -> Optional[OCRResult]:
+        """Extract text using PaddleOCR (block by block, when given a layout)"""
         if not self._paddle_ocr or not PADDLE_AVAILABLE:
             return None
         
@@ -379,7 +388,15 @@ class MultiMethodHandwrittenOCR:
             self.logger.debug("🔍 Running PaddleOCR extraction...")
             
             # PaddleOCR returns list of ([bbox], (text, confidence)) tuples
-            results = self._paddle_ocr.ocr(image, cls=True)
+            if layout:
+                results = [
+                    line
+                    for block in layout.blocks
+                    for line in (self._paddle_ocr.ocr(text_regions.crop(image, block), cls=True) or [])
+                    if line
+                ]
+            else:
+                results = self._paddle_ocr.ocr(image, cls=True)
             
             if not results or not results[0]:
                 self.logger.debug("  ⚠️ PaddleOCR returned no results")
@@ -410,8 +427,12 @@ class MultiMethodHandwrittenOCR:
             self.logger.warning(f"❌ PaddleOCR failed: {e}")
             return None
     
-    def _extract_with_trocr(self, image: np.ndarray) -> Optional[OCRResult]:
-        """Extract text using TrOCR (Transformer-based OCR for handwriting) with GPU support"""
+    @timed("ocr.trocr")
+    def _extract_with_trocr(self, image: np.ndarray, layout: Optional[text_regions.TextLayout] = None) -> Optional[OCRResult]:
+        """
+        Extract text using TrOCR (Transformer-based OCR for handwriting) with GPU support.
+        TrOCR reads single lines, so with a layout the detected lines are read in batches.
+        """
         if not self._trocr_processor or not self._trocr_model:
             return None
         
@@ -427,19 +448,25 @@ class MultiMethodHandwrittenOCR:
             else:
                 image_rgb = image
             
-            pil_image = Image.fromarray(image_rgb)
-            
-            # Process with TrOCR
-            pixel_values = self._trocr_processor(pil_image, return_tensors="pt").pixel_values
+            pieces = [text_regions.crop(image_rgb, line) for line in layout.lines] if layout else [image_rgb]
             
-            # Move to device if GPU available
-            if device:
-                pixel_values = pixel_values.to(device)
-            
-            with torch.no_grad():
-                generated_ids = self._trocr_model.generate(pixel_values)
+            lines = []
+            for start in range(0, len(pieces), text_regions.BATCH_SIZE):
+                pil_images = [Image.fromarray(piece).convert("RGB") for piece in pieces[start:start + text_regions.BATCH_SIZE]]
+                
+                # Process with TrOCR
+                pixel_values = self._trocr_processor(images=pil_images, return_tensors="pt").pixel_values
+                
+                # Move to device if GPU available
+                if device:
+                    pixel_values = pixel_values.to(device)
+                
+                with torch.no_grad():
+                    generated_ids = self._trocr_model.generate(pixel_values)
+                
+                lines.extend(self._trocr_processor.batch_decode(generated_ids, skip_special_tokens=True))
             
-            generated_text = self._trocr_processor.batch_decode(generated_ids, skip_special_tokens=True)[0]
+            generated_text = '\n'.join(line.strip() for line in lines if line.strip())
             
             if not generated_text.strip():
                 self.logger.debug("  ⚠️ TrOCR returned no text")
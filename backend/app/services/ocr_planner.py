@@ -0,0 +1,297 @@
+"""
+Adaptive OCR Planner
+Decides which preprocessing variant × Tesseract PSM passes to run on an
+image, instead of always running the whole grid and keeping the longest
+string.
+
+Passes run one at a time in a planned order. Each result is scored from the
+mean word confidence, the share of word-like tokens and whether a known
+medicine name (medicine store name index) was read. The search stops at the
+first pass that reaches the acceptance score, so a clean image costs one OCR
+call and only poor images expand to more variants and modes.
+
+The order is learned per image type (dark, glare, low_contrast, normal): each
+finished search records which pass produced the kept result, and passes that
+win more often for that type are tried first. A small share of searches
+(OCR_PLANNER_EXPLORE) starts with a random other pass, so passes that early
+stopping never reaches still get tried and an early winner cannot lock in.
+
+Outcomes are kept in memory and merged into OCR_PLANNER_STATS every
+OCR_PLANNER_SAVE_EVERY searches (and at exit), adding to what other worker
+processes have saved rather than overwriting it. scripts/benchmark_ocr_planner.py
+compares the planner with the full grid on the `test images` folder.
+"""
+
+import atexit
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+try:
+    import fcntl  # serializes the stats merge across worker processes
+except ImportError:  # Windows
+    fcntl = None
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+
+STATS_PATH = os.getenv("OCR_PLANNER_STATS", os.path.join(BACKEND_DIR, "resources", "ocr_planner_stats.json"))
+
+# Score (0-1) at which a pass is accepted and the search stops
+ACCEPT_SCORE = float(os.getenv("OCR_PLANNER_ACCEPT_SCORE", "0.7"))
+
+# Upper bound on passes per image (0 = the whole grid)
+MAX_PASSES = int(os.getenv("OCR_PLANNER_MAX_PASSES", "0"))
+
+# Share of searches that try a random pass first
+EXPLORE_RATE = float(os.getenv("OCR_PLANNER_EXPLORE", "0.05"))
+
+# Searches between merges of the learned outcomes into the stats file; also merged after SAVE_INTERVAL seconds
+SAVE_EVERY = int(os.getenv("OCR_PLANNER_SAVE_EVERY", "50"))
+SAVE_INTERVAL = 300.0
+
+# Score weights: mean word confidence, word-like tokens, known medicine name
+WEIGHT_CONFIDENCE = 0.5
+WEIGHT_WORDLIKE = 0.2
+WEIGHT_DICTIONARY = 0.3
+
+_TOKEN = re.compile(r"[A-Za-z][A-Za-z0-9\-]*")
+
+Pass = Tuple[str, int]  # (variant name, page segmentation mode)
+
+
+@dataclass
+class OCRAttempt:
+    variant: str
+    psm: int
+    text: str
+    confidence: Optional[float]
+    score: float
+
+
+@dataclass
+class PlanResult:
+    image_type: str
+    best: Optional[OCRAttempt]
+    attempts: List[OCRAttempt] = field(default_factory=list)
+
+    @property
+    def calls(self) -> int:
+        return len(self.attempts)
+
+    @property
+    def text(self) -> str:
+        return self.best.text if self.best else ""
+
+
+def classify_image(gray) -> str:
+    """Coarse image type from grayscale statistics (NumPy array)"""
+    if float(gray.mean()) < 100:
+        return "dark"  # light print on dark packaging
+    if float((gray > 245).mean()) > 0.15:
+        return "glare"  # reflective foil / blister packs
+    if float(gray.std()) < 35:
+        return "low_contrast"
+    return "normal"
+
+
+_vocabulary: Optional[FrozenSet[str]] = None
+_vocabulary_lock = threading.Lock()
+
+
+def medicine_vocabulary() -> FrozenSet[str]:
+    """Lower-cased words of all medicine names in the store (empty if it cannot be loaded)"""
+    global _vocabulary
+    if _vocabulary is None:
+        with _vocabulary_lock:
+            if _vocabulary is None:
+                try:
+                    from app.services.medicine_store import get_medicine_store
+                    keys = get_medicine_store().name_index().key_list()
+                    _vocabulary = frozenset(
+                        word for key in keys for word in key.split() if len(word) >= 4
+                    )
+                except Exception as e:
+                    logger.warning(f"⚠️ Medicine name index unavailable for OCR scoring: {e}")
+                    _vocabulary = frozenset()
+    return _vocabulary
+
+
+def score_text(text: str, confidence: Optional[float], vocabulary: Optional[FrozenSet[str]] = None) -> float:
+    """
+    Quality score (0-1) of an OCR result. Without a vocabulary the
+    dictionary term is left out and the other weights renormalized.
+    """
+    vocabulary = medicine_vocabulary() if vocabulary is None else vocabulary
+    tokens = [t.lower() for t in _TOKEN.findall(text)]
+    if not tokens:
+        return 0.0
+    wordlike = sum(1 for t in tokens if len(t) >= 2 and t.isalpha()) / len(tokens)
+    parts = [(WEIGHT_CONFIDENCE, confidence or 0.0), (WEIGHT_WORDLIKE, wordlike)]
+    if vocabulary:
+        parts.append((WEIGHT_DICTIONARY, 1.0 if any(t in vocabulary for t in tokens) else 0.0))
+    return sum(w * v for w, v in parts) / sum(w for w, _ in parts)
+
+
+class OCRPlanner:
+    """Orders OCR passes per image type from logged outcomes and runs them until one is good enough"""
+
+    def __init__(self, passes: Sequence[Pass], stats_path: Optional[str] = STATS_PATH,
+                 accept_score: float = ACCEPT_SCORE, max_passes: int = MAX_PASSES,
+                 vocabulary: Optional[FrozenSet[str]] = None, explore_rate: float = EXPLORE_RATE,
+                 save_every: int = SAVE_EVERY):
+        self.passes = list(passes)
+        # None = medicine store names (loaded on first score)
+        self.vocabulary = vocabulary
+        self.stats_path = stats_path
+        self.accept_score = accept_score
+        self.max_passes = max_passes or len(self.passes)
+        self.explore_rate = explore_rate
+        self.save_every = max(save_every, 1)
+        self._random = random.Random()
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        # image type -> "variant|psm" -> [wins, tries]
+        self._stats: Dict[str, Dict[str, List[int]]] = self._load()
+        # Outcomes recorded since the last merge into the stats file
+        self._pending: Dict[str, Dict[str, List[int]]] = {}
+        self._pending_searches = 0
+        self._saved_at = time.monotonic()
+        if self.stats_path:
+            atexit.register(self.flush)
+
+    @staticmethod
+    def _key(variant: str, psm: int) -> str:
+        return f"{variant}|{psm}"
+
+    def _load(self) -> Dict[str, Dict[str, List[int]]]:
+        if not self.stats_path or not os.path.exists(self.stats_path):
+            return {}
+        try:
+            with open(self.stats_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ Ignoring unreadable OCR planner stats {self.stats_path}: {e}")
+            return {}
+
+    @staticmethod
+    def _add(stats: Dict[str, Dict[str, List[int]]], deltas: Dict[str, Dict[str, List[int]]]):
+        for image_type, entries in deltas.items():
+            counts = stats.setdefault(image_type, {})
+            for key, (wins, tries) in entries.items():
+                entry = counts.setdefault(key, [0, 0])
+                entry[0] += wins
+                entry[1] += tries
+
+    def flush(self):
+        """Merge outcomes recorded since the last flush into the stats file (other processes' saves are kept)"""
+        if not self.stats_path:
+            return
+        with self._save_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                self._pending_searches = 0
+                self._saved_at = time.monotonic()
+            if not pending:
+                return
+            try:
+                with open(f"{self.stats_path}.lock", "a") as lock_file:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file, fcntl.LOCK_EX)
+                    stats = self._load()
+                    self._add(stats, pending)
+                    tmp_path = f"{self.stats_path}.{os.getpid()}.tmp"
+                    with open(tmp_path, "w", encoding="utf-8") as f:
+                        json.dump(stats, f, indent=1, sort_keys=True)
+                    os.replace(tmp_path, self.stats_path)
+            except OSError as e:
+                logger.debug(f"Could not save OCR planner stats: {e}")
+                return
+            # Pick up what other processes learned, plus anything recorded meanwhile
+            with self._lock:
+                self._add(stats, self._pending)
+                self._stats = stats
+
+    def order(self, image_type: str, default: Optional[Sequence[Pass]] = None) -> List[Pass]:
+        """
+        Passes for an image type, most frequent winners first. Passes with
+        equal (smoothed) win rates keep the default order.
+        """
+        default = list(default or self.passes)
+        with self._lock:
+            stats = dict(self._stats.get(image_type, {}))
+        if not stats:
+            return default
+
+        def win_rate(item: Tuple[int, Pass]) -> Tuple[float, int]:
+            rank, (variant, psm) = item
+            wins, tries = stats.get(self._key(variant, psm), (0, 0))
+            return (-(wins + 1) / (tries + 2), rank)
+
+        return [p for _, p in sorted(enumerate(default), key=win_rate)]
+
+    def record(self, image_type: str, attempts: Sequence[OCRAttempt], winner: Optional[OCRAttempt]):
+        """Log which passes were tried and which one produced the kept result"""
+        with self._lock:
+            stats = self._stats.setdefault(image_type, {})
+            pending = self._pending.setdefault(image_type, {})
+            for attempt in attempts:
+                key = self._key(attempt.variant, attempt.psm)
+                won = 1 if attempt is winner else 0
+                for counts in (stats, pending):
+                    entry = counts.setdefault(key, [0, 0])
+                    entry[0] += won
+                    entry[1] += 1
+            self._pending_searches += 1
+            due = (self._pending_searches >= self.save_every
+                   or time.monotonic() - self._saved_at >= SAVE_INTERVAL)
+        if due:
+            self.flush()
+
+    def run(
+        self,
+        image_type: str,
+        recognize: Callable[[str, int], Tuple[str, Optional[float]]],
+        default: Optional[Sequence[Pass]] = None,
+        exhaustive: bool = False,
+        learn: bool = True,
+    ) -> PlanResult:
+        """
+        Run passes in planned order until one reaches the acceptance score.
+
+        Args:
+            image_type: classify_image() result
+            recognize: (variant, psm) -> (text, mean word confidence or None)
+            default: Order to use before anything has been learned
+            exhaustive: Run every pass (full grid, for benchmarking)
+            learn: Record the outcome for future orderings
+        """
+        result = PlanResult(image_type=image_type, best=None)
+        plan = self.order(image_type, default)
+        if not exhaustive and len(plan) > 1 and self._random.random() < self.explore_rate:
+            plan.insert(0, plan.pop(self._random.randrange(1, len(plan))))
+        limit = len(plan) if exhaustive else self.max_passes
+        for variant, psm in plan[:limit]:
+            try:
+                text, confidence = recognize(variant, psm)
+            except Exception as e:
+                logger.debug(f"OCR pass {variant} + PSM {psm} failed: {e}")
+                continue
+            text = " ".join(text.split())
+            attempt = OCRAttempt(variant, psm, text, confidence, score_text(text, confidence, self.vocabulary))
+            result.attempts.append(attempt)
+            if result.best is None or (attempt.score, len(text)) > (result.best.score, len(result.best.text)):
+                result.best = attempt
+            if not exhaustive and attempt.score >= self.accept_score:
+                break
+
+        if learn and result.attempts:
+            self.record(image_type, result.attempts, result.best)
+        return result
@@ -0,0 +1,204 @@
+"""
+Page Orientation and Skew Correction
+Estimates how an uploaded page is rotated (quarter turns and small skew)
+from a downsampled copy and straightens it with a single warp at full
+resolution, before any OCR engine sees it.
+
+Estimation works on a sample of ink-pixel coordinates from a page shrunk to
+ANALYSIS_SIZE pixels. Candidate rotations are applied to the coordinates
+(not the image) and scored by how sharply the ink concentrates into text
+lines in the row projection profile. This is done for the page as loaded and
+turned 90 degrees, over +-MAX_SKEW degrees, coarse then fine.
+
+Profiles cannot tell a page from the same page upside down, and ink-shape
+heuristics (ascenders vs descenders) misfire on handwriting, so a half turn
+is only applied on Tesseract's orientation detection (OSD) with at least
+OSD_MIN_CONFIDENCE. Without Tesseract, pages are only deskewed and turned
+upright from sideways.
+"""
+
+import logging
+import os
+from dataclasses import dataclass
+from typing import Tuple
+
+import cv2
+import numpy as np
+
+from app.core.metrics import timed
+from app.services import tesseract_pool
+
+logger = logging.getLogger(__name__)
+
+# Set AUTO_ORIENT=false to leave uploads as they are
+ENABLED = os.getenv("AUTO_ORIENT", "true").lower() == "true"
+
+# Longest side (px) of the copy used for estimation
+ANALYSIS_SIZE = 1000
+
+# Ink pixels sampled for the projection profiles
+MAX_SAMPLES = 30000
+
+# Largest skew corrected (degrees)
+MAX_SKEW = 15.0
+
+# Skew below this is left alone (degrees)
+MIN_SKEW = 0.3
+
+# How much sharper the profile must be before turning the page 90 degrees
+QUARTER_TURN_MARGIN = 1.15
+
+# Longest side (px) of the straightened copy Tesseract OSD looks at, and the
+# OSD confidence needed before turning a page upside down
+OSD_SIZE = 1600
+OSD_MIN_CONFIDENCE = 5.0
+
+_QUARTER_TURNS = {
+    90: cv2.ROTATE_90_COUNTERCLOCKWISE,
+    180: cv2.ROTATE_180,
+    270: cv2.ROTATE_90_CLOCKWISE,
+}
+
+
+@dataclass
+class Orientation:
+    rotation: int  # quarter turn (0/90/180/270, counter-clockwise) to apply
+    skew: float    # further counter-clockwise rotation (degrees)
+
+    @property
+    def angle(self) -> float:
+        return self.rotation + self.skew
+
+    @property
+    def is_identity(self) -> bool:
+        return self.rotation == 0 and abs(self.skew) < MIN_SKEW
+
+
+def _ink_points(image: np.ndarray) -> np.ndarray:
+    """(x, y) of sampled ink pixels on the downsampled page, as float arrays (2, N)"""
+    gray = image if image.ndim == 2 else cv2.cvtColor(
+        image, cv2.COLOR_BGRA2GRAY if image.shape[2] == 4 else cv2.COLOR_BGR2GRAY
+    )
+    height, width = gray.shape
+    scale = ANALYSIS_SIZE / max(height, width)
+    if scale < 1:
+        gray = cv2.resize(gray, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+    ink = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)[1]
+    if np.count_nonzero(ink) > ink.size / 2:
+        # Light print on dark background: ink is the minority class
+        ink = cv2.bitwise_not(ink)
+    ys, xs = np.nonzero(ink)
+    if len(xs) > MAX_SAMPLES:
+        chosen = np.random.default_rng(0).choice(len(xs), MAX_SAMPLES, replace=False)
+        xs, ys = xs[chosen], ys[chosen]
+    return np.vstack([xs, ys]).astype(np.float32)
+
+
+def _rotated_rows(points: np.ndarray, angles: np.ndarray) -> np.ndarray:
+    """
+    Row coordinate of every point after rotating by each angle (degrees,
+    counter-clockwise as in cv2.getRotationMatrix2D), shape (angles, points)
+    """
+    theta = np.deg2rad(angles)[:, None]
+    return -np.sin(theta) * points[0] + np.cos(theta) * points[1]
+
+
+def _profiles(rows: np.ndarray) -> np.ndarray:
+    """Row projection profile (1 px bins) per angle, shape (angles, bins)"""
+    bins = np.floor(rows - rows.min(axis=1, keepdims=True)).astype(np.int64)
+    length = int(bins.max()) + 1
+    offsets = np.arange(len(rows))[:, None] * length
+    return np.bincount((bins + offsets).ravel(), minlength=len(rows) * length).reshape(len(rows), length)
+
+
+def _sharpness(rows: np.ndarray) -> np.ndarray:
+    """
+    Sum of squared profile bins relative to the same ink spread evenly over
+    the profile's extent (1.0), so profiles of different lengths compare
+    """
+    extent = np.ptp(rows, axis=1) + 1
+    squares = (_profiles(rows).astype(np.float64) ** 2).sum(axis=1)
+    return squares * extent / rows.shape[1] ** 2
+
+
+def _best_angle(points: np.ndarray, center: float) -> Tuple[float, float]:
+    """Angle within +-MAX_SKEW of center whose profile is sharpest, and its score"""
+    coarse = center + np.arange(-MAX_SKEW, MAX_SKEW + 0.5, 0.5)
+    best = coarse[int(np.argmax(_sharpness(_rotated_rows(points, coarse))))]
+    fine = best + np.arange(-0.5, 0.55, 0.05)
+    scores = _sharpness(_rotated_rows(points, fine))
+    index = int(np.argmax(scores))
+    return float(fine[index]), float(scores[index])
+
+
+def _shrink(image: np.ndarray, size: int) -> np.ndarray:
+    height, width = image.shape[:2]
+    scale = size / max(height, width)
+    if scale >= 1:
+        return image
+    return cv2.resize(image, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+
+
+def _osd_half_turn(image: np.ndarray, orientation: "Orientation") -> bool:
+    """Whether Tesseract confidently reads the straightened page as upside down"""
+    osd = tesseract_pool.detect_orientation(apply_orientation(_shrink(image, OSD_SIZE), orientation))
+    if osd is None:
+        return False
+    rotation, confidence = osd
+    return rotation == 180 and confidence >= OSD_MIN_CONFIDENCE
+
+
+def estimate_orientation(image: np.ndarray) -> Orientation:
+    """
+    Rotation that makes the text lines horizontal and the page upright
+    (upside-down pages only when Tesseract OSD says so)
+    """
+    points = _ink_points(image)
+    if points.shape[1] < 100:
+        return Orientation(0, 0.0)
+
+    upright_angle, upright_score = _best_angle(points, 0.0)
+    turned_angle, turned_score = _best_angle(points, 90.0)
+    angle = turned_angle if turned_score > upright_score * QUARTER_TURN_MARGIN else upright_angle
+
+    rotation = int(round(angle / 90.0)) % 4 * 90
+    skew = angle - round(angle / 90.0) * 90.0
+    orientation = Orientation(rotation, round(skew, 2) + 0.0)
+    if tesseract_pool.is_available() and _osd_half_turn(image, orientation):
+        orientation.rotation = (rotation + 180) % 360
+    return orientation
+
+
+def apply_orientation(image: np.ndarray, orientation: Orientation) -> np.ndarray:
+    """Rotate the full-resolution image in one step (exact quarter turn when there is no skew)"""
+    if orientation.is_identity:
+        return image
+    if abs(orientation.skew) < MIN_SKEW:
+        return cv2.rotate(image, _QUARTER_TURNS[orientation.rotation])
+
+    height, width = image.shape[:2]
+    matrix = cv2.getRotationMatrix2D((width / 2, height / 2), orientation.angle, 1.0)
+    cos, sin = abs(matrix[0, 0]), abs(matrix[0, 1])
+    new_width, new_height = int(round(height * sin + width * cos)), int(round(height * cos + width * sin))
+    # Re-center on the enlarged canvas so nothing is cut off
+    matrix[0, 2] += new_width / 2 - width / 2
+    matrix[1, 2] += new_height / 2 - height / 2
+    return cv2.warpAffine(
+        image, matrix, (new_width, new_height), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE
+    )
+
+
+@timed("preprocess.orient")
+def correct_orientation(image: np.ndarray) -> np.ndarray:
+    """Upright, deskewed copy of the page (the image itself when nothing needs correcting)"""
+    if not ENABLED:
+        return image
+    try:
+        orientation = estimate_orientation(image)
+    except Exception as e:
+        logger.warning(f"⚠️ Orientation estimation failed: {e}, using image as is")
+        return image
+    if orientation.is_identity:
+        return image
+    logger.info(f"🔄 Rotating page by {orientation.rotation}° and deskewing by {orientation.skew:.2f}°")
+    return apply_orientation(image, orientation)
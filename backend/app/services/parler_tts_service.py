@@ -11,6 +11,8 @@ import logging
 from typing import Optional, Tuple
 from pathlib import Path
 
+from app.core.metrics import timed
+
 logger = logging.getLogger(__name__)
 
 # Language to Parler-TTS language code mapping
@@ -186,6 +188,7 @@ def get_parler_tts_service() -> ParlerTTSService:
     return _parler_service
 
 
+@timed("tts.parler")
 def generate_parler_tts_audio(
     text: str,
     language: str = "english",
@@ -0,0 +1,177 @@
+"""
+Preprocessing Graph
+Declarative, memoized image preprocessing shared by all OCR variants.
+
+A variant is a sequence of steps, each an operation name plus parameters:
+
+    PRINTED_TEXT = (GRAYSCALE, ("denoise", 10), ("bilateral", 9, 75, 75),
+                    ("contrast", 3.0, 10), ("threshold_adaptive", "gaussian", 11, 2))
+
+PreprocessGraph keeps every intermediate node of one image keyed by its step
+prefix, so variants that start with the same steps (grayscale -> denoise(h)
+-> CLAHE(clip, tile) -> ...) compute the shared part once. Each computed node
+is timed as the pipeline stage preprocess.<operation>.
+
+The denoise steps are noise-adaptive (see app.services.denoise): their h is
+the strongest NL-means the variant allows, used only on images that are
+noisy enough to need it.
+
+Inside a shared_preprocessing() scope (opened by the analysis pipelines),
+preprocessing_graph() returns the same graph for the same pixels, so the
+printed-text, Tesseract and medicine variants of one upload reuse each
+other's nodes even when the image was loaded separately.
+
+Nodes are shared between callers: treat returned arrays as read-only.
+"""
+
+import contextvars
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from app.core.metrics import stage
+from app.services import denoise
+
+logger = logging.getLogger(__name__)
+
+Step = Tuple[Any, ...]  # (operation name, *parameters)
+
+GRAYSCALE: Step = ("grayscale",)
+
+
+def _grayscale(image: np.ndarray) -> np.ndarray:
+    if image.ndim == 2:
+        return image
+    code = cv2.COLOR_BGRA2GRAY if image.shape[2] == 4 else cv2.COLOR_BGR2GRAY
+    return cv2.cvtColor(image, code)
+
+
+def _resize(image: np.ndarray, max_width: int, max_height: int) -> np.ndarray:
+    """Shrink to fit within max_width x max_height (never enlarges)"""
+    height, width = image.shape[:2]
+    if width <= max_width and height <= max_height:
+        return image
+    scale = min(max_width / width, max_height / height)
+    return cv2.resize(image, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+
+
+def _denoise_color(image: np.ndarray, h: float, h_color: float) -> np.ndarray:
+    """Noise-adaptive color denoise; unchanged image if this OpenCV build rejects it"""
+    try:
+        return denoise.denoise_color(image, h, h_color)
+    except cv2.error as e:
+        logger.warning(f"fastNlMeansDenoisingColored failed: {e}. Skipping.")
+        return image
+
+
+def _contrast(image: np.ndarray, clip_limit: float, tile: int) -> np.ndarray:
+    """CLAHE"""
+    return cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=(tile, tile)).apply(image)
+
+
+def _threshold_otsu(image: np.ndarray) -> np.ndarray:
+    return cv2.threshold(image, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
+
+
+_ADAPTIVE_METHODS = {"gaussian": cv2.ADAPTIVE_THRESH_GAUSSIAN_C, "mean": cv2.ADAPTIVE_THRESH_MEAN_C}
+
+
+def _threshold_adaptive(image: np.ndarray, method: str, block_size: int, c: float) -> np.ndarray:
+    return cv2.adaptiveThreshold(image, 255, _ADAPTIVE_METHODS[method], cv2.THRESH_BINARY, block_size, c)
+
+
+_MORPH_OPS = {
+    "close": cv2.MORPH_CLOSE, "open": cv2.MORPH_OPEN,
+    "erode": cv2.MORPH_ERODE, "dilate": cv2.MORPH_DILATE,
+}
+_KERNEL_SHAPES = {"rect": cv2.MORPH_RECT, "ellipse": cv2.MORPH_ELLIPSE}
+
+
+def _morphology(image: np.ndarray, op: str, shape: str, size: int, iterations: int = 1) -> np.ndarray:
+    kernel = cv2.getStructuringElement(_KERNEL_SHAPES[shape], (size, size))
+    return cv2.morphologyEx(image, _MORPH_OPS[op], kernel, iterations=iterations)
+
+
+OPERATIONS: Dict[str, Callable[..., np.ndarray]] = {
+    "grayscale": _grayscale,
+    "resize": _resize,
+    "denoise": denoise.denoise,
+    "denoise_color": _denoise_color,
+    "bilateral": lambda image, d, sigma_color, sigma_space: cv2.bilateralFilter(image, d, sigma_color, sigma_space),
+    "median": lambda image, ksize: cv2.medianBlur(image, ksize),
+    "blur": lambda image, ksize: cv2.GaussianBlur(image, (ksize, ksize), 0),
+    "contrast": _contrast,
+    "threshold_otsu": _threshold_otsu,
+    "threshold_adaptive": _threshold_adaptive,
+    "invert": cv2.bitwise_not,
+    "morphology": _morphology,
+}
+
+
+class PreprocessGraph:
+    """Memoized preprocessing nodes of one image"""
+
+    def __init__(self, image: np.ndarray):
+        self.image = image
+        self._nodes: Dict[Tuple[Step, ...], np.ndarray] = {(): image}
+        self._lock = threading.RLock()
+
+    def run(self, steps: Sequence[Step]) -> np.ndarray:
+        """Result of applying steps to the image, reusing every cached prefix"""
+        steps = tuple(tuple(step) for step in steps)
+        with self._lock:
+            current = self.image
+            for depth in range(1, len(steps) + 1):
+                key = steps[:depth]
+                node = self._nodes.get(key)
+                if node is None:
+                    name, *params = key[-1]
+                    with stage(f"preprocess.{name}"):
+                        node = OPERATIONS[name](current, *params)
+                    self._nodes[key] = node
+                current = node
+            return current
+
+    def __len__(self) -> int:
+        return len(self._nodes) - 1
+
+
+def fingerprint(image: np.ndarray) -> str:
+    """Content key of an image (shape, dtype and pixel hash)"""
+    digest = hashlib.blake2b(np.ascontiguousarray(image).data, digest_size=16).hexdigest()
+    return f"{image.shape}:{image.dtype}:{digest}"
+
+
+_graphs: contextvars.ContextVar[Optional[Dict[str, PreprocessGraph]]] = contextvars.ContextVar(
+    "preprocessing_graphs", default=None
+)
+
+
+@contextmanager
+def shared_preprocessing() -> Iterator[None]:
+    """Share graphs by image content for the enclosed work (nested scopes join the outer one)"""
+    if _graphs.get() is not None:
+        yield
+        return
+    token = _graphs.set({})
+    try:
+        yield
+    finally:
+        _graphs.reset(token)
+
+
+def preprocessing_graph(image: np.ndarray) -> PreprocessGraph:
+    """The scope's graph for these pixels, or a new graph outside a shared_preprocessing() scope"""
+    graphs = _graphs.get()
+    if graphs is None:
+        return PreprocessGraph(image)
+    key = fingerprint(image)
+    graph = graphs.get(key)
+    if graph is None:
+        graph = graphs[key] = PreprocessGraph(image)
+    return graph
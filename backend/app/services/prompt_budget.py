@@ -0,0 +1,243 @@
+"""
+Prompt Token Budgeting
+Keeps LLM prompts within per-endpoint token budgets and records how many
+tokens Ollama actually evaluated.
+
+On a CPU-hosted Phi-4, prompt evaluation time grows with prompt length, so
+the variable parts of a prompt (OCR text, retrieved context) are compacted and
+trimmed to whatever the fixed template leaves of the endpoint budget.
+
+Token counts use tiktoken's cl100k_base encoding when it is installed (close
+to Phi-4's tokenizer) and a character/word approximation otherwise.
+"""
+
+import logging
+import math
+import os
+import re
+import threading
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from app.core.metrics import LLM_PHASE_SECONDS, LLM_TOKENS, record_stage
+
+logger = logging.getLogger(__name__)
+
+try:
+    import tiktoken  # type: ignore
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    _ENCODING = None
+
+# Prompt token budget per endpoint (template + variable text)
+DEFAULT_BUDGETS: Dict[str, int] = {
+    "symptoms": 1400,
+    "medical_qa": 1200,
+    "hospital_report": 2000,
+    "handwritten_prescription": 1000,
+    "prescription_deciphering": 1500,
+    "medicine_info": 1100,
+}
+
+# Floor for a trimmed section, so a long template never starves the input
+MIN_SECTION_TOKENS = 64
+
+TRUNCATION_MARKER = "\n[...]\n"
+
+# Share of a trimmed OCR text kept from the start (the rest from the end);
+# headers and Rx lists sit at the top, signatures and follow-up at the bottom
+HEAD_SHARE = 0.7
+
+_PIECE_RE = re.compile(r"[A-Za-z]+|\d+|[^\sA-Za-z\d]")
+
+
+def _parse_budget_overrides(value: str) -> Dict[str, int]:
+    """PROMPT_TOKEN_BUDGETS="symptoms=1600,hospital_report=2400" """
+    overrides = {}
+    for item in value.split(","):
+        name, _, tokens = item.partition("=")
+        if name.strip() and tokens.strip().isdigit():
+            overrides[name.strip()] = int(tokens)
+    return overrides
+
+
+BUDGETS: Dict[str, int] = {
+    **DEFAULT_BUDGETS,
+    **_parse_budget_overrides(os.getenv("PROMPT_TOKEN_BUDGETS", "")),
+}
+
+
+def estimate_tokens(text: str) -> int:
+    """Token count of text (exact with tiktoken, approximate otherwise)"""
+    if not text:
+        return 0
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text, disallowed_special=()))
+    tokens = 0
+    for piece in _PIECE_RE.findall(text):
+        if piece.isascii():
+            # BPE keeps common words whole and splits long ones in ~4-char chunks
+            tokens += math.ceil(len(piece) / 4) if piece.isalpha() else math.ceil(len(piece) / 3)
+        else:
+            # Indic scripts and symbols: roughly one token per character
+            tokens += len(piece)
+    return tokens
+
+
+def compact_text(text: str) -> str:
+    """Collapse whitespace and drop empty, symbol-only and back-to-back repeated lines (OCR noise)"""
+    lines = []
+    for line in text.splitlines():
+        line = " ".join(line.split())
+        if not any(c.isalnum() for c in line):
+            continue
+        if lines and line.lower() == lines[-1].lower():
+            continue
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def _prefix_within(text: str, max_tokens: int) -> str:
+    """Longest prefix of text (cut at a line or word boundary) within max_tokens"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if estimate_tokens(text[:mid]) <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    prefix = text[:low]
+    # Prefer whole lines, then whole words
+    for separator, min_share in (("\n", 0.8), (" ", 0.5)):
+        cut = prefix.rfind(separator)
+        if cut > low * min_share:
+            return prefix[:cut]
+    return prefix
+
+
+def truncate_to_tokens(text: str, max_tokens: int, keep_tail: bool = True) -> str:
+    """
+    Shorten text to max_tokens. With keep_tail, the start and the end of the
+    text are kept around a "[...]" marker; otherwise only the start is kept.
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    if not keep_tail:
+        return _prefix_within(text, max_tokens)
+
+    available = max(max_tokens - estimate_tokens(TRUNCATION_MARKER), 1)
+    head = _prefix_within(text, int(available * HEAD_SHARE))
+    tail_budget = available - estimate_tokens(head)
+    tail = _prefix_within(text[len(head):][::-1], tail_budget)[::-1] if tail_budget > 0 else ""
+    return head + TRUNCATION_MARKER + tail.lstrip()
+
+
+def fit_prompt(
+    endpoint: str,
+    render: Callable[..., str],
+    system: str = "",
+    head_only: Iterable[str] = (),
+    **sections: str,
+) -> str:
+    """
+    Render a prompt whose variable sections are trimmed to the endpoint budget.
+
+    Args:
+        endpoint: Budget name (see BUDGETS)
+        render: Builds the prompt from the sections as keyword arguments
+        system: Static system prompt sent alongside (counts against the budget)
+        **sections: Variable text (OCR text, retrieved context, ...). Sections
+            are compacted, then share the tokens the template leaves, in the
+            order given (earlier sections are served first).
+        head_only: Sections trimmed from the end only (ranked context, where
+            the last lines matter least); others keep their start and end.
+
+    Returns:
+        The rendered prompt
+    """
+    budget = BUDGETS.get(endpoint)
+    sections = {name: compact_text(text or "") for name, text in sections.items()}
+    if budget is None:
+        return render(**sections)
+
+    overhead = estimate_tokens(system) + estimate_tokens(render(**{name: "" for name in sections}))
+    remaining = max(budget - overhead, MIN_SECTION_TOKENS * len(sections))
+
+    fitted = {}
+    trimmed = []
+    for name, text in sections.items():
+        allowed = max(remaining, MIN_SECTION_TOKENS)
+        tokens = estimate_tokens(text)
+        if tokens > allowed:
+            text = truncate_to_tokens(text, allowed, keep_tail=name not in head_only)
+            trimmed.append(f"{name} {tokens}→{estimate_tokens(text)}")
+            tokens = estimate_tokens(text)
+        fitted[name] = text
+        remaining -= tokens
+
+    prompt = render(**fitted)
+    total = estimate_tokens(system) + estimate_tokens(prompt)
+    logger.info(
+        f"📏 Prompt [{endpoint}]: ~{total} tokens (budget {budget}, template {overhead})"
+        + (f", trimmed {', '.join(trimmed)}" if trimmed else "")
+    )
+    return prompt
+
+
+# ---------------------------------------------------------------------------
+# Ollama usage accounting
+# ---------------------------------------------------------------------------
+
+_usage_lock = threading.Lock()
+_usage: Dict[str, Dict[str, float]] = {}
+
+
+def record_ollama_usage(endpoint: str, response_json: Optional[Dict[str, Any]]) -> Dict[str, float]:
+    """
+    Log prompt/completion token counts and eval durations from an Ollama
+    /api/generate or /api/chat response and add them to the endpoint totals.
+
+    Returns:
+        The usage of this call (empty if Ollama sent no metadata)
+    """
+    if not isinstance(response_json, dict) or "eval_count" not in response_json:
+        return {}
+
+    ns = 1e9
+    usage = {
+        "prompt_tokens": response_json.get("prompt_eval_count", 0),
+        "completion_tokens": response_json.get("eval_count", 0),
+        "load_seconds": response_json.get("load_duration", 0) / ns,
+        "prompt_eval_seconds": response_json.get("prompt_eval_duration", 0) / ns,
+        "eval_seconds": response_json.get("eval_duration", 0) / ns,
+        "total_seconds": response_json.get("total_duration", 0) / ns,
+    }
+    prompt_rate = usage["prompt_tokens"] / usage["prompt_eval_seconds"] if usage["prompt_eval_seconds"] else 0
+    eval_rate = usage["completion_tokens"] / usage["eval_seconds"] if usage["eval_seconds"] else 0
+    logger.info(
+        f"🔢 Ollama [{endpoint}]: prompt {usage['prompt_tokens']} tok in {usage['prompt_eval_seconds']:.1f}s "
+        f"({prompt_rate:.0f} tok/s), completion {usage['completion_tokens']} tok in {usage['eval_seconds']:.1f}s "
+        f"({eval_rate:.1f} tok/s), total {usage['total_seconds']:.1f}s"
+    )
+
+    for phase in ("load", "prompt_eval", "eval"):
+        seconds = usage[f"{phase}_seconds"]
+        LLM_PHASE_SECONDS.observe(seconds, endpoint=endpoint, phase=phase)
+        if seconds:
+            record_stage(f"llm.{endpoint}.{phase}", seconds)
+    LLM_TOKENS.inc(usage["prompt_tokens"], endpoint=endpoint, kind="prompt")
+    LLM_TOKENS.inc(usage["completion_tokens"], endpoint=endpoint, kind="completion")
+
+    with _usage_lock:
+        totals = _usage.setdefault(endpoint, {"calls": 0, **{key: 0 for key in usage}})
+        totals["calls"] += 1
+        for key, value in usage.items():
+            totals[key] += value
+    return usage
+
+
+def get_usage_stats() -> Dict[str, Dict[str, float]]:
+    """Accumulated Ollama usage per endpoint since process start"""
+    with _usage_lock:
+        return {endpoint: dict(totals) for endpoint, totals in _usage.items()}
@@ -0,0 +1,127 @@
+"""
+Structured LLM Output
+JSON-schema constrained replies from Ollama, parsed while they stream in.
+
+Each task declares its reply as a Pydantic model (subclass of LLMOutput).
+The model's JSON schema is sent as Ollama's `format`, so the reply is a
+single JSON value; JSONStreamParser follows it chunk by chunk in one linear
+pass (no searching for braces afterwards) and the parsed value is validated
+against the same model.
+
+OLLAMA_STRUCTURED_FORMAT=json sends plain `format: "json"` instead of the
+schema, for Ollama versions older than 0.5.
+"""
+
+import json
+import os
+from functools import lru_cache
+from typing import Any, Dict, Optional, Type
+
+from pydantic import BaseModel, ConfigDict, ValidationError
+
+STRUCTURED_FORMAT = os.getenv("OLLAMA_STRUCTURED_FORMAT", "schema").lower().strip()
+
+
+class StructuredOutputError(ValueError):
+    """The LLM reply is not valid JSON for the task's output model"""
+
+
+class LLMOutput(BaseModel):
+    """Base for LLM reply models: unknown keys are dropped, numbers accepted for text fields"""
+
+    model_config = ConfigDict(extra="ignore", coerce_numbers_to_str=True)
+
+
+@lru_cache(maxsize=None)
+def _schema(model: Type[LLMOutput]) -> Dict[str, Any]:
+    return model.model_json_schema()
+
+
+def format_for(model: Type[LLMOutput]) -> Any:
+    """Ollama `format` value for a reply model"""
+    return "json" if STRUCTURED_FORMAT == "json" else _schema(model)
+
+
+def validate_output(data: Any, model: Type[LLMOutput]) -> Dict[str, Any]:
+    """Validated reply as a plain dict (defaults filled in)"""
+    try:
+        return model.model_validate(data).model_dump()
+    except ValidationError as e:
+        raise StructuredOutputError(f"{model.__name__} validation failed: {e}") from e
+
+
+class JSONStreamParser:
+    """
+    Incremental reader for one top-level JSON value arriving in chunks.
+
+    Tracks nesting depth and string/escape state as characters arrive, so
+    the end of the value is known as soon as its closing bracket streams in
+    and every character is looked at once.
+    """
+
+    def __init__(self):
+        self._parts = []
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._started = False
+        self.complete = False
+
+    def feed(self, chunk: str) -> bool:
+        """Add a chunk; True once the top-level value is complete"""
+        if self.complete or not chunk:
+            return self.complete
+
+        start = 0
+        if not self._started:
+            # Skip anything before the value (whitespace, stray preamble)
+            positions = [p for p in (chunk.find("{"), chunk.find("[")) if p != -1]
+            if not positions:
+                return False
+            start = min(positions)
+            self._started = True
+
+        for i in range(start, len(chunk)):
+            char = chunk[i]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._parts.append(chunk[start:i + 1])
+                    self.complete = True
+                    return True
+        self._parts.append(chunk[start:])
+        return False
+
+    @property
+    def text(self) -> str:
+        return "".join(self._parts)
+
+    def value(self) -> Any:
+        """
+        The parsed value.
+
+        Raises:
+            StructuredOutputError: The value is incomplete or not valid JSON
+        """
+        if not self.complete:
+            raise StructuredOutputError(f"Incomplete JSON in LLM reply ({len(self.text)} chars received)")
+        try:
+            return json.loads(self.text)
+        except ValueError as e:
+            raise StructuredOutputError(f"Invalid JSON in LLM reply: {e}") from e
+
+
+def output_text(data: Optional[Dict[str, Any]]) -> str:
+    """Compact JSON text of a validated reply (for raw-output fields)"""
+    return json.dumps(data or {}, ensure_ascii=False)
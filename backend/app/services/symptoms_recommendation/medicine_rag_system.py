@@ -5,9 +5,15 @@ Provides retrieval-augmented generation for accurate medicine recommendations
 
 import json
 import logging
-from typing import List, Dict, Optional
+import math
+import re
+from collections import defaultdict
+from functools import lru_cache
+from typing import List, Dict, Optional, Tuple
 from pathlib import Path
 
+from .safety_engine import AhoCorasick
+
 logger = logging.getLogger(__name__)
 
 # Global medicine knowledge base
@@ -262,44 +268,156 @@ MEDICINE_KNOWLEDGE_BASE = {
     }
 }
 
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def _tokens(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower().replace("_", " "))
+
+
+def _trigrams(text: str) -> set:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def normalize_symptoms(symptoms: List[str]) -> Tuple[str, ...]:
+    """Lower-cased, stripped symptoms with duplicates removed (order kept)"""
+    return tuple(dict.fromkeys(s.lower().strip() for s in symptoms if s and s.strip()))
+
+
 class MedicineRAGSystem:
     """RAG System for medicine recommendations"""
     
     def __init__(self):
         self.knowledge_base = MEDICINE_KNOWLEDGE_BASE
+        self.build_index()
         logger.info(f"Initialized Medicine RAG with {len(self.knowledge_base)} condition types")
     
+    def build_index(self):
+        """
+        Precompute lookup structures over the knowledge base. Condition ids
+        are positions in knowledge-base order, so "lowest id" reproduces the
+        first-match order of a linear scan.
+        - synonym automaton: synonyms contained in a symptom
+        - synonym trigram index: symptoms contained in a synonym
+        - token inverted index (with IDF weights): ranked multi-symptom retrieval
+        - medicine ids: dedup of medicines without dict comparisons
+        Call again (it also clears the context cache) if the knowledge base changes.
+        """
+        self._condition_keys = list(self.knowledge_base.keys())
+        self._condition_ids = {key: cid for cid, key in enumerate(self._condition_keys)}
+        
+        self._synonyms: List[Tuple[str, int]] = []
+        for cid, key in enumerate(self._condition_keys):
+            for synonym in self.knowledge_base[key].get("synonyms", []):
+                self._synonyms.append((synonym, cid))
+        
+        self._synonym_matcher = AhoCorasick(
+            (synonym, ("synonym", cid)) for synonym, cid in self._synonyms
+        )
+        self._synonym_trigrams: Dict[str, set] = defaultdict(set)
+        for sid, (synonym, _) in enumerate(self._synonyms):
+            for gram in _trigrams(synonym):
+                self._synonym_trigrams[gram].add(sid)
+        
+        postings: Dict[str, set] = defaultdict(set)
+        for cid, key in enumerate(self._condition_keys):
+            data = self.knowledge_base[key]
+            text = " ".join([key, data.get("condition", "")] + data.get("synonyms", []))
+            for token in _tokens(text):
+                postings[token].add(cid)
+        n_conditions = max(len(self._condition_keys), 1)
+        self._token_index = {token: sorted(cids) for token, cids in postings.items()}
+        self._token_idf = {
+            token: math.log(1 + n_conditions / len(cids)) for token, cids in postings.items()
+        }
+        
+        canonical_ids: Dict[str, int] = {}
+        self._medicine_ids: Dict[int, List[int]] = {}
+        for cid, key in enumerate(self._condition_keys):
+            ids = []
+            for med in self.knowledge_base[key].get("medicines", []):
+                canonical = json.dumps(med, sort_keys=True)
+                ids.append(canonical_ids.setdefault(canonical, len(canonical_ids)))
+            self._medicine_ids[cid] = ids
+        
+        self._cached_context = lru_cache(maxsize=512)(self._build_llm_context)
+    
+    def _match_condition_id(self, symptom_lower: str) -> Optional[int]:
+        """Condition id for a symptom (exact key, then synonym either way)"""
+        if symptom_lower in self._condition_ids:
+            return self._condition_ids[symptom_lower]
+        
+        # Synonyms contained in the symptom
+        candidates = {cid for _, cid in self._synonym_matcher.iter_matches(symptom_lower)}
+        
+        # Symptom contained in a synonym: intersect trigram postings, then verify
+        if len(symptom_lower) >= 3:
+            grams = _trigrams(symptom_lower)
+            sids = set.intersection(*(self._synonym_trigrams.get(g, set()) for g in grams))
+        else:
+            sids = range(len(self._synonyms))
+        for sid in sids:
+            synonym, cid = self._synonyms[sid]
+            if symptom_lower in synonym:
+                candidates.add(cid)
+        
+        return min(candidates) if candidates else None
+    
     def get_medicines_for_symptom(self, symptom: str) -> Optional[Dict]:
         """
         Retrieve medicines for a specific symptom using RAG
         """
-        symptom_lower = symptom.lower().strip()
-        
-        # Direct match
-        if symptom_lower in self.knowledge_base:
-            return self.knowledge_base[symptom_lower]
+        cid = self._match_condition_id(symptom.lower().strip())
+        return self.knowledge_base[self._condition_keys[cid]] if cid is not None else None
+    
+    def rank_conditions(self, symptoms: List[str], top_k: int = 3) -> List[Tuple[str, float]]:
+        """
+        Rank conditions for several symptoms at once by IDF-weighted token
+        overlap (exact/synonym matches get a strong boost).
         
-        # Fuzzy match with synonyms
-        for condition_key, condition_data in self.knowledge_base.items():
-            if "synonyms" in condition_data:
-                for synonym in condition_data["synonyms"]:
-                    if symptom_lower in synonym or synonym in symptom_lower:
-                        return condition_data
+        Returns:
+            [(condition key, score)] best first
+        """
+        scores: Dict[int, float] = defaultdict(float)
+        for symptom in normalize_symptoms(symptoms):
+            cid = self._match_condition_id(symptom)
+            if cid is not None:
+                scores[cid] += 10.0
+            for token in set(_tokens(symptom)):
+                for token_cid in self._token_index.get(token, ()):
+                    scores[token_cid] += self._token_idf[token]
         
-        return None
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:top_k]
+        return [(self._condition_keys[cid], score) for cid, score in ranked]
+    
+    def _retrieve_condition_ids(self, symptoms: Tuple[str, ...]) -> List[int]:
+        """Condition ids for normalized symptoms, in symptom order, deduplicated"""
+        retrieved: Dict[int, None] = {}
+        for symptom in symptoms:
+            cid = self._match_condition_id(symptom)
+            if cid is None:
+                # No direct/synonym hit: fall back to the best token match
+                ranked = self.rank_conditions([symptom], top_k=1)
+                cid = self._condition_ids[ranked[0][0]] if ranked else None
+            if cid is not None:
+                retrieved.setdefault(cid)
+        return list(retrieved)
     
     def format_for_llm_context(self, symptoms: List[str]) -> str:
         """
-        Format medicine knowledge base for LLM context (RAG)
+        Format medicine knowledge base for LLM context (RAG).
+        Cached per normalized symptom list.
         """
+        return self._cached_context(normalize_symptoms(symptoms))
+    
+    def _build_llm_context(self, symptoms: Tuple[str, ...]) -> str:
         context = "# GLOBAL MEDICINE KNOWLEDGE BASE (from WHO and medical databases)\n\n"
         context += "Use this knowledge base to recommend medicines:\n\n"
         
-        retrieved_conditions = []
-        for symptom in symptoms:
-            medicine_data = self.get_medicines_for_symptom(symptom)
-            if medicine_data and medicine_data not in retrieved_conditions:
-                retrieved_conditions.append(medicine_data)
+        retrieved_conditions = [
+            self.knowledge_base[self._condition_keys[cid]]
+            for cid in self._retrieve_condition_ids(symptoms)
+        ]
         
         for idx, condition_data in enumerate(retrieved_conditions, 1):
             context += f"## {idx}. {condition_data['condition']}\n"
@@ -325,13 +443,17 @@ class MedicineRAGSystem:
         Get all available medicines for given symptoms
         """
         medicines_list = []
+        seen_ids = set()
         
         for symptom in symptoms:
-            medicine_data = self.get_medicines_for_symptom(symptom)
-            if medicine_data and "medicines" in medicine_data:
-                for med in medicine_data["medicines"]:
-                    if med not in medicines_list:
-                        medicines_list.append(med)
+            cid = self._match_condition_id(symptom.lower().strip())
+            if cid is None:
+                continue
+            medicine_data = self.knowledge_base[self._condition_keys[cid]]
+            for med, med_id in zip(medicine_data.get("medicines", []), self._medicine_ids[cid]):
+                if med_id not in seen_ids:
+                    seen_ids.add(med_id)
+                    medicines_list.append(med)
         
         return medicines_list
 
@@ -1,6 +1,8 @@
 from typing import List, Optional, Any
 from pydantic import BaseModel, Field
 
+from app.services.structured_output import LLMOutput
+
 
 class SymptomRequest(BaseModel):
     age: int
@@ -27,3 +29,35 @@ class SymptomResponse(BaseModel):
     doctor_consultation_advice: str
     disclaimer: str
     tts_payload: Optional[str] = None
+
+
+class RecommendedMedicineOutput(LLMOutput):
+    """One medicine in the LLM's recommendation reply"""
+    name: str
+    brand_names: List[str] = Field(default_factory=list)
+    type: str = ""
+    dosage: str = ""
+    frequency: str = ""
+    duration: str = ""
+    instructions: str = ""
+    mechanism: str = ""
+    effectiveness: str = ""
+    contraindications: List[str] = Field(default_factory=list)
+    side_effects: List[str] = Field(default_factory=list)
+    interactions: List[str] = Field(default_factory=list)
+    warnings: List[str] = Field(default_factory=list)
+    why_this_medicine: str = ""
+
+
+class SymptomLLMOutput(LLMOutput):
+    """Reply schema for the symptom recommendation prompt (prompt_templates.SYSTEM_PROMPT)"""
+    predicted_condition: str
+    symptom_analysis: str = ""
+    reasoning: str = ""
+    recommended_medicines: List[RecommendedMedicineOutput] = Field(default_factory=list)
+    medicine_combination_rationale: str = ""
+    home_care_advice: List[str] = Field(default_factory=list)
+    when_to_see_doctor: str = ""
+    doctor_consultation_advice: str = ""
+    additional_notes: str = ""
+    disclaimer: str = ""
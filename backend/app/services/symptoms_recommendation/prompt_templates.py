@@ -1,16 +1,12 @@
-PROMPT_TEMPLATE = """INSTRUCTION: YOU MUST OUTPUT ONLY VALID JSON. NO OTHER TEXT.
+from typing import Tuple
+
+from app.services.prompt_budget import fit_prompt
+
+SYSTEM_PROMPT = """INSTRUCTION: YOU MUST OUTPUT ONLY VALID JSON. NO OTHER TEXT.
 
 You are Phi-4, a medical expert AI trained on global medical knowledge and pharmaceutical databases.
 Your task is to analyze patient symptoms and recommend appropriate medicines using your own independent medical reasoning.
 
-Patient Information:
-- Age: {age} years
-- Gender: {gender}
-- Reported Symptoms: {symptoms}
-- Known Allergies: {allergies}
-- Existing Medical Conditions: {conditions}
-- Pregnancy Status: {pregnant}
-
 TASK: ANALYZE SYMPTOMS AND RECOMMEND MEDICINES
 1. Carefully analyze the provided symptoms
 2. Using YOUR medical knowledge, determine the most likely condition
@@ -22,12 +18,12 @@ TASK: ANALYZE SYMPTOMS AND RECOMMEND MEDICINES
 8. Provide clear usage instructions
 
 OUTPUT STRUCTURE (MUST be valid JSON):
-{{
+{
   "predicted_condition": "The specific medical condition based on symptoms",
   "symptom_analysis": "Brief explanation of your diagnosis reasoning",
   "reasoning": "Your medical thinking process - what made you choose this diagnosis",
   "recommended_medicines": [
-    {{
+    {
       "name": "Full medicine name with strength (e.g., Paracetamol 500mg)",
       "brand_names": ["Common brand names used in India"],
       "type": "Category (Antipyretic, Analgesic, Antitussive, etc.)",
@@ -42,7 +38,7 @@ OUTPUT STRUCTURE (MUST be valid JSON):
       "interactions": ["Drug interactions to watch for"],
       "warnings": ["Important safety warnings"],
       "why_this_medicine": "Why this specific medicine for this patient's symptoms"
-    }}
+    }
   ],
   "medicine_combination_rationale": "Why these medicines work together for this condition",
   "home_care_advice": [
@@ -55,14 +51,30 @@ OUTPUT STRUCTURE (MUST be valid JSON):
   "doctor_consultation_advice": "When and why to see a healthcare provider",
   "additional_notes": "Any other important medical information",
   "disclaimer": "This is AI-generated medical information. Always consult a qualified doctor for proper diagnosis and treatment."
-}}
+}
+
+Respond in the language requested in the patient message."""
 
+
+# Per-request part of the prompt; SYSTEM_PROMPT stays identical across
+# requests so Ollama can reuse its KV cache
+USER_TEMPLATE = """Patient Information:
+- Age: {age} years
+- Gender: {gender}
+- Reported Symptoms: {symptoms}
+- Known Allergies: {allergies}
+- Existing Medical Conditions: {conditions}
+- Pregnancy Status: {pregnant}
+{reference_section}
 LANGUAGE: Respond in {language_display}
 
 BEGIN JSON OUTPUT (nothing before {{):"""
 
 
-def build_prompt(req: dict, rag_context: str = "") -> str:
+def build_messages(req: dict, rag_context: str = "") -> Tuple[str, str]:
+    """
+    (system prompt, user message) for a symptom recommendation request
+    """
     # Language mapping for prompt
     lang_names = {
         "english": "English",
@@ -79,7 +91,7 @@ def build_prompt(req: dict, rag_context: str = "") -> str:
     language_display = lang_names.get(language, "English")
     language_display_upper = language_display.upper()
 
-    prompt = PROMPT_TEMPLATE.format(
+    fields = dict(
         age=req.get("age"),
         gender=req.get("gender"),
         symptoms=", ".join(req.get("symptoms", [])),
@@ -89,6 +101,19 @@ def build_prompt(req: dict, rag_context: str = "") -> str:
         language_display=language_display,
         language_display_upper=language_display_upper,
     )
-    
-    # RAG context is NOT used - Phi-4 thinks independently
-    return prompt
+
+    def render(rag_context: str) -> str:
+        # Retrieved reference notes are advisory; Phi-4 still reasons independently
+        reference_section = ""
+        if rag_context:
+            reference_section = (
+                "\nREFERENCE NOTES (retrieved from the medicine knowledge base; use only if relevant):\n"
+                f"{rag_context}\n"
+            )
+        return USER_TEMPLATE.format(reference_section=reference_section, **fields)
+
+    # Reference notes are trimmed to what the template leaves of the budget
+    user = fit_prompt(
+        "symptoms", render, system=SYSTEM_PROMPT, head_only=("rag_context",), rag_context=rag_context
+    )
+    return SYSTEM_PROMPT, user
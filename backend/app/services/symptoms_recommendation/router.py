@@ -1,4 +1,5 @@
 from fastapi import APIRouter, HTTPException, Depends
+from starlette.concurrency import run_in_threadpool
 import logging
 import os
 import requests
@@ -12,6 +13,7 @@ from . import service
 from app.core.database import get_db
 from app.models.models import MedicineHistory, QAHistory
 from app.core.middleware import get_current_user_optional
+from app.services.llm_scheduler import LLMOverloadedError
 
 # Import TTS services
 try:
@@ -25,6 +27,8 @@ except ImportError as e:
     has_parler_tts = False
 
 router = APIRouter()
+# TTS endpoints live on their own router so they can run in a separate worker role
+tts_router = APIRouter()
 logger = logging.getLogger(__name__)
 
 # Try enhanced TTS first, fallback to original
@@ -124,7 +128,7 @@ async def recommend(payload: SymptomRequest, db: Session = Depends(get_db), user
     logger.info("=== ENDPOINT HIT: /api/symptoms/recommend ===")
     logger.info("Incoming payload: %s", payload.dict())
     try:
-        resp = service.recommend_symptoms(payload)
+        resp = await run_in_threadpool(service.recommend_symptoms, payload)
         logger.info("Response ready: %s", resp)
         
         # Save to database if user_id is provided
@@ -150,6 +154,8 @@ async def recommend(payload: SymptomRequest, db: Session = Depends(get_db), user
     except NotImplementedError as e:
         logger.exception("LLM provider not configured")
         raise HTTPException(status_code=501, detail=str(e))
+    except LLMOverloadedError:
+        raise
     except Exception as e:
         logger.exception("Failed to generate recommendation: %s", e)
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
@@ -175,7 +181,7 @@ async def medical_qa(
     
     try:
         # Answer in the requested language if supported
-        answer = service.answer_medical_question(question, language=request_language)
+        answer = await run_in_threadpool(service.answer_medical_question, question, language=request_language)
         logger.info("✅ Medical QA response generated: %d chars", len(answer) if answer else 0)
         
         # Save to database if user_id is provided
@@ -198,12 +204,14 @@ async def medical_qa(
         response_data = {"answer": answer}
         logger.info("📤 Sending response: %s", response_data)
         return response_data
+    except LLMOverloadedError:
+        raise
     except Exception as e:
         logger.exception("❌ Failed to answer medical question: %s", e)
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 
-@router.post("/api/tts")
+@tts_router.post("/api/tts")
 async def generate_tts(data: dict):
     """Generate speech audio from text using Enhanced TTS (Bhashini/gTTS/Google/Coqui)"""
     logger.info("=== ENDPOINT HIT: /api/tts ===")
@@ -253,13 +261,13 @@ async def generate_tts(data: dict):
         }
 
 
-@router.get("/api/tts/languages")
+@tts_router.get("/api/tts/languages")
 async def get_tts_languages():
     """Get list of supported TTS languages"""
     return tts_service.get_supported_languages()
 
 
-@router.post("/api/tts/parler")
+@tts_router.post("/api/tts/parler")
 async def generate_parler_tts(data: dict):
     """
     Generate speech audio using Indic Parler-TTS (native language support)
@@ -362,7 +370,7 @@ async def generate_parler_tts(data: dict):
             }
 
 
-@router.get("/api/tts/parler/languages")
+@tts_router.get("/api/tts/parler/languages")
 async def get_parler_languages():
     """Get list of languages supported by Parler-TTS"""
     return {
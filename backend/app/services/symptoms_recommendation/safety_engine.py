@@ -0,0 +1,157 @@
+"""
+Compiled medicine safety rule engine.
+
+Rules are loaded from a data file (app/data/safety_rules.json by default,
+override with SAFETY_RULES_PATH) and compiled into Aho-Corasick automata, so
+each medicine name is checked against every applicable rule in a single pass
+no matter how many keywords the rule file holds. Automata for a given
+patient context (allergies, pregnancy, conditions) are cached.
+"""
+
+import json
+import logging
+import os
+from collections import deque
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, FrozenSet, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RULES_PATH = Path(__file__).resolve().parents[2] / "data" / "safety_rules.json"
+
+# (kind, detail) attached to every keyword, e.g. ("unsafe_class", "opioids")
+Reason = Tuple[str, str]
+
+
+class AhoCorasick:
+    """Multi-pattern substring matcher (lower-cased patterns -> payloads)"""
+
+    def __init__(self, patterns: Iterable[Tuple[str, Reason]]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[Reason, ...]] = [()]
+
+        for pattern, payload in patterns:
+            pattern = pattern.lower()
+            if not pattern:
+                continue
+            state = 0
+            for char in pattern:
+                nxt = self._goto[state].get(char)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][char] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(())
+                state = nxt
+            if payload not in self._out[state]:
+                self._out[state] += (payload,)
+
+        # Breadth-first failure links; outputs inherit from their fail state
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(char, 0)
+                self._out[nxt] += tuple(p for p in self._out[self._fail[nxt]] if p not in self._out[nxt])
+
+    def __len__(self) -> int:
+        return len(self._goto)
+
+    def iter_matches(self, text: str) -> Iterator[Reason]:
+        """Yield the payload of every pattern occurring in text"""
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for char in text.lower():
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if out[state]:
+                yield from out[state]
+
+    def first_match(self, text: str) -> Optional[Reason]:
+        return next(self.iter_matches(text), None)
+
+
+class SafetyRuleEngine:
+    """Evaluates medicine safety rules compiled from a rule file"""
+
+    def __init__(self, rules: Dict):
+        self.rules = rules
+        self.unsafe_classes: Dict[str, List[str]] = rules.get("unsafe_classes", {})
+        self.emergency_symptoms: List[str] = rules.get("emergency_symptoms", [])
+        self.allergy_cross_reactivity: Dict[str, List[str]] = rules.get("allergy_cross_reactivity", {})
+        self.pregnancy_contraindicated: List[str] = rules.get("pregnancy_contraindicated", [])
+        self.condition_contraindications: Dict[str, List[str]] = rules.get("condition_contraindications", {})
+
+        self._emergency = AhoCorasick((kw, ("emergency", kw)) for kw in self.emergency_symptoms)
+        # Recognise rule keys inside free-text allergies/conditions ("penicillin allergy")
+        self._allergy_keys = AhoCorasick((key, ("allergy", key)) for key in self.allergy_cross_reactivity)
+        self._condition_keys = AhoCorasick((key, ("condition", key)) for key in self.condition_contraindications)
+        self._matcher = lru_cache(maxsize=256)(self._compile_matcher)
+
+    @classmethod
+    def from_file(cls, path: Optional[str] = None) -> "SafetyRuleEngine":
+        path = Path(path or os.getenv("SAFETY_RULES_PATH") or DEFAULT_RULES_PATH)
+        with open(path, encoding="utf-8") as f:
+            rules = json.load(f)
+        engine = cls(rules)
+        logger.info(f"✅ Loaded safety rules from {path}")
+        return engine
+
+    def is_emergency(self, text: str) -> bool:
+        return self._emergency.first_match(text) is not None
+
+    def _active_conditions(self, conditions: Iterable[str]) -> FrozenSet[str]:
+        active = set()
+        for condition in conditions:
+            active.update(detail for _, detail in self._condition_keys.iter_matches(condition))
+        return frozenset(active)
+
+    def _compile_matcher(
+        self, allergies: FrozenSet[str], pregnancy: bool, conditions: FrozenSet[str]
+    ) -> AhoCorasick:
+        """One automaton holding every rule that applies to this patient context"""
+        patterns: List[Tuple[str, Reason]] = []
+        for group, keywords in self.unsafe_classes.items():
+            patterns.extend((kw, ("unsafe_class", group)) for kw in keywords)
+        for allergy in allergies:
+            patterns.append((allergy, ("allergy", allergy)))
+            for _, key in self._allergy_keys.iter_matches(allergy):
+                patterns.extend((kw, ("allergy", key)) for kw in self.allergy_cross_reactivity[key])
+        if pregnancy:
+            patterns.extend((kw, ("pregnancy", kw)) for kw in self.pregnancy_contraindicated)
+        for condition in conditions:
+            patterns.extend(
+                (kw, ("condition", condition)) for kw in self.condition_contraindications[condition]
+            )
+        return AhoCorasick(patterns)
+
+    def matcher_for(
+        self, allergies: Optional[Iterable[str]], pregnancy: bool, conditions: Optional[Iterable[str]]
+    ) -> AhoCorasick:
+        """Cached automaton for a patient context"""
+        allergy_set = frozenset(a.lower().strip() for a in (allergies or []) if a and a.strip())
+        condition_set = self._active_conditions(c.lower() for c in (conditions or []) if c)
+        return self._matcher(allergy_set, bool(pregnancy), condition_set)
+
+    def check_medicine(self, name: str, matcher: AhoCorasick) -> Optional[Reason]:
+        """First rule the medicine violates, or None if it is allowed"""
+        return matcher.first_match(name)
+
+
+_engine: Optional[SafetyRuleEngine] = None
+
+
+def get_engine() -> SafetyRuleEngine:
+    """Shared engine compiled from the configured rule file"""
+    global _engine
+    if _engine is None:
+        _engine = SafetyRuleEngine.from_file()
+    return _engine
@@ -0,0 +1,316 @@
+"""
+Semantic Retrieval Index for Symptom RAG
+BM25 index over MEDICINE_KNOWLEDGE_BASE conditions and the medicine dataset
+indications, used to give the LLM a short, relevant reference context.
+
+Documents are indexed on word terms plus character trigrams of each word, so
+misspelled, inflected or loosely translated symptoms ("headach", "fungal
+rash", "feverish") still land on the right condition. The index is built
+offline (scripts/build_semantic_index.py, or on first use) into a JSON file
+and served in-process: each term's BM25 contributions are precomputed as
+NumPy arrays, a query sums them into a score vector and takes the top k
+with a partition. Query vectors and top-k results are cached.
+
+Indications in the medicine dataset are synthetic (a "fever" row is as
+likely an antibiotic as an antipyretic), so their documents are scored at
+SYMPTOM_RAG_INDICATION_WEIGHT times their BM25 score: 0 by default, which
+keeps them out of the prompt entirely.
+"""
+
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .medicine_rag_system import MEDICINE_KNOWLEDGE_BASE, normalize_symptoms
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 2
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+DEFAULT_INDEX_PATH = os.getenv(
+    "SEMANTIC_INDEX_PATH", os.path.join(BACKEND_DIR, "resources", "semantic_index.json")
+)
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Trigram terms only rescue near-misses; whole words dominate the score
+TRIGRAM_WEIGHT = 0.35
+
+# Results scoring below this fraction of the best hit are dropped
+RELATIVE_SCORE_CUTOFF = 0.35
+MIN_SCORE = 2.5
+
+# Score multiplier for dataset indication documents (0 = never retrieved)
+INDICATION_WEIGHT = float(os.getenv("SYMPTOM_RAG_INDICATION_WEIGHT", "0"))
+
+DEFAULT_TOP_K = 3
+DEFAULT_MAX_CONTEXT_CHARS = 1500
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+# Words that carry no retrieval signal in symptom descriptions
+STOPWORDS = frozenset({
+    "a", "an", "and", "the", "of", "in", "on", "at", "to", "for", "with", "from",
+    "my", "i", "is", "am", "are", "have", "has", "had", "feel", "feeling", "very",
+    "since", "days", "day", "lot", "some", "bit", "little", "mild", "severe",
+})
+
+
+def _stem(word: str) -> str:
+    """Light suffix stripping (coughing -> cough, headaches -> headache)"""
+    for suffix in ("ing", "ish", "es", "s"):
+        if len(word) > len(suffix) + 3 and word.endswith(suffix):
+            return word[:-len(suffix)]
+    return word
+
+
+def analyze(text: str) -> List[str]:
+    """Index terms for text: stemmed words plus '#'-prefixed word trigrams"""
+    terms = []
+    for word in _WORD_RE.findall(text.lower().replace("_", " ")):
+        if word in STOPWORDS:
+            continue
+        word = _stem(word)
+        terms.append(word)
+        padded = f" {word} "
+        terms.extend("#" + padded[i:i + 3] for i in range(len(padded) - 2))
+    return terms
+
+
+def _condition_documents() -> List[Dict]:
+    docs = []
+    for key, data in MEDICINE_KNOWLEDGE_BASE.items():
+        medicines = data.get("medicines", [])
+        text = " ".join(
+            [key, data.get("condition", "")]
+            + data.get("synonyms", [])
+            + [med.get("name", "") for med in medicines]
+        )
+        med_parts = [
+            f"{med['name']} ({med.get('dosage', 'as prescribed')}; "
+            f"avoid: {', '.join(med.get('contraindications', [])[:2]) or 'none listed'})"
+            for med in medicines[:3]
+        ]
+        context = (
+            f"- {data['condition']}: {'; '.join(med_parts)}. "
+            f"Home care: {', '.join(data.get('home_remedies', [])[:3])}. "
+            f"Red flags: {', '.join(data.get('warning_signs', [])[:2])}."
+        )
+        docs.append({"kind": "condition", "key": key, "text": text, "context": context})
+    return docs
+
+
+def _indication_documents() -> Tuple[List[Dict], Optional[str]]:
+    """One document per dataset indication, from the medicine store group index"""
+    try:
+        from app.services.medicine_store import get_medicine_store
+        store = get_medicine_store()
+    except Exception as e:
+        logger.warning(f"⚠️ Medicine store unavailable, indexing knowledge base only: {e}")
+        return [], None
+
+    if not store.has_group_index("Indication"):
+        return [], store.manifest.get("built_at")
+
+    indications = store.group_index("Indication")
+    docs = []
+    for indication in indications.key_list():
+        if not indication:
+            continue
+        rows = indications.rows_equal(indication)
+        names = []
+        for row in rows:
+            name = store.value("Name", row)
+            if name and name not in names:
+                names.append(name)
+            if len(names) == 4:
+                break
+        # Only example names: category counts of the synthetic rows read as clinical advice
+        context = f"- Dataset indication '{indication}': {len(rows)} listed medicines (e.g. {', '.join(names)})."
+        docs.append({"kind": "indication", "key": indication, "text": indication, "context": context})
+    return docs, store.manifest.get("built_at")
+
+
+def _knowledge_base_fingerprint() -> str:
+    canonical = json.dumps(MEDICINE_KNOWLEDGE_BASE, sort_keys=True)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def build_semantic_index(path: str = DEFAULT_INDEX_PATH) -> Dict:
+    """
+    Index the knowledge base conditions and dataset indications and write
+    the result to `path` (atomically).
+
+    Returns:
+        The serialized index
+    """
+    indication_docs, store_built_at = _indication_documents()
+    docs = _condition_documents() + indication_docs
+
+    postings: Dict[str, List[List[int]]] = defaultdict(list)
+    lengths = []
+    for doc_id, doc in enumerate(docs):
+        counts = Counter(analyze(doc.pop("text")))
+        lengths.append(sum(counts.values()))
+        for term, tf in counts.items():
+            postings[term].append([doc_id, tf])
+
+    index = {
+        "version": INDEX_VERSION,
+        "kb_fingerprint": _knowledge_base_fingerprint(),
+        "store_built_at": store_built_at,
+        "docs": docs,
+        "lengths": lengths,
+        "postings": postings,
+    }
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+    logger.info(f"✅ Built semantic index at {path}: {len(docs)} documents, {len(postings)} terms")
+    return index
+
+
+def is_index_stale(index: Dict) -> bool:
+    """True if the index predates the current knowledge base or medicine store"""
+    if index.get("version") != INDEX_VERSION:
+        return True
+    if index.get("kb_fingerprint") != _knowledge_base_fingerprint():
+        return True
+    try:
+        from app.services.medicine_store import get_medicine_store
+        built_at = get_medicine_store().manifest.get("built_at")
+    except Exception:
+        return False
+    return built_at != index.get("store_built_at")
+
+
+class SemanticIndex:
+    """In-process BM25 search over the serialized index"""
+
+    def __init__(self, index: Dict, indication_weight: float = INDICATION_WEIGHT):
+        self.docs: List[Dict] = index["docs"]
+        self.weights = [indication_weight if doc["kind"] == "indication" else 1.0 for doc in self.docs]
+        self.lengths: List[int] = index["lengths"]
+        self.postings: Dict[str, List[List[int]]] = index["postings"]
+
+        n_docs = max(len(self.docs), 1)
+        self.avg_length = (sum(self.lengths) / n_docs) or 1.0
+        self.idf = {
+            term: math.log(1 + (n_docs - len(plist) + 0.5) / (len(plist) + 0.5))
+            for term, plist in self.postings.items()
+        }
+        # term -> (doc ids, weighted BM25 contribution of the term to each doc)
+        lengths = np.asarray(self.lengths, dtype=np.float64)
+        weights = np.asarray(self.weights, dtype=np.float64)
+        self._contributions: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        for term, plist in self.postings.items():
+            ids, tf = (np.asarray(column) for column in zip(*plist))
+            keep = weights[ids] > 0
+            ids, tf = ids[keep], tf[keep].astype(np.float64)
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[ids] / self.avg_length)
+            self._contributions[term] = (ids, weights[ids] * self.idf[term] * tf * (BM25_K1 + 1) / (tf + norm))
+        self.query_vector = lru_cache(maxsize=4096)(self._query_vector)
+        self.search = lru_cache(maxsize=1024)(self._search)
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_INDEX_PATH, indication_weight: float = INDICATION_WEIGHT) -> "SemanticIndex":
+        index = None
+        if os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    index = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"⚠️ Unreadable semantic index at {path}: {e}")
+        if index is None or is_index_stale(index):
+            logger.info("🔄 Semantic index missing or stale, rebuilding...")
+            index = build_semantic_index(path)
+        return cls(index, indication_weight)
+
+    def _query_vector(self, text: str) -> Tuple[Tuple[str, float], ...]:
+        """Weighted query terms for one symptom (unknown terms dropped)"""
+        vector = []
+        for term, count in Counter(analyze(text)).items():
+            if term in self.idf:
+                weight = TRIGRAM_WEIGHT if term.startswith("#") else 1.0
+                vector.append((term, weight * count))
+        return tuple(vector)
+
+    def _search(self, symptoms: Tuple[str, ...], top_k: int) -> Tuple[Tuple[int, float], ...]:
+        if top_k <= 0:
+            return ()
+        scores = np.zeros(len(self.docs))
+        for symptom in symptoms:
+            for term, weight in self.query_vector(symptom):
+                ids, contribution = self._contributions[term]
+                scores[ids] += weight * contribution  # ids are unique within a term
+
+        hits = np.flatnonzero(scores > 0)
+        if not len(hits):
+            return ()
+        if len(hits) > top_k:
+            # k-th best score; among docs tied at it the lowest ids are kept (hits is ascending)
+            kth = np.partition(scores[hits], len(hits) - top_k)[len(hits) - top_k]
+            above = hits[scores[hits] > kth]
+            hits = np.concatenate((above, hits[scores[hits] == kth][:top_k - len(above)]))
+        # Best first, lower doc id first among equal scores
+        hits = hits[np.lexsort((hits, -scores[hits]))]
+        cutoff = max(MIN_SCORE, scores[hits[0]] * RELATIVE_SCORE_CUTOFF)
+        return tuple((int(doc_id), float(scores[doc_id])) for doc_id in hits if scores[doc_id] >= cutoff)
+
+    def top_documents(self, symptoms: List[str], top_k: int = DEFAULT_TOP_K) -> List[Tuple[Dict, float]]:
+        """[(document, score)] best first for a list of symptoms"""
+        return [(self.docs[doc_id], score) for doc_id, score in self.search(normalize_symptoms(symptoms), top_k)]
+
+    def build_context(
+        self,
+        symptoms: List[str],
+        top_k: int = DEFAULT_TOP_K,
+        max_chars: int = DEFAULT_MAX_CONTEXT_CHARS,
+    ) -> str:
+        """Compact reference notes for the prompt ("" when nothing relevant)"""
+        lines = []
+        used = 0
+        for doc, _ in self.top_documents(symptoms, top_k):
+            if used + len(doc["context"]) > max_chars and lines:
+                break
+            lines.append(doc["context"])
+            used += len(doc["context"]) + 1
+        return "\n".join(lines)
+
+
+_index: Optional[SemanticIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_semantic_index() -> SemanticIndex:
+    """Shared per-process index, loaded (or built) on first use"""
+    global _index
+    if _index is not None:
+        return _index
+    with _index_lock:
+        if _index is None:
+            _index = SemanticIndex.load()
+            logger.info(f"✅ Semantic index ready: {len(_index.docs)} documents")
+    return _index
+
+
+def get_semantic_context(symptoms: List[str], top_k: int = DEFAULT_TOP_K) -> str:
+    """Retrieved reference context for the symptom prompt"""
+    return get_semantic_index().build_context(symptoms, top_k=top_k)
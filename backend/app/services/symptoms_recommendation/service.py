@@ -1,12 +1,18 @@
 import os
-import json
 import logging
 from typing import Dict, Callable, Optional, List
 
 import requests
 
+from app.core.metrics import stage
+from app.core.single_flight import flights, request_key
+from app.services.llm_session import get_session
+from app.services.llm_resilience import LLMUnavailableError
+from app.services.llm_scheduler import LLMOverloadedError
+from app.services.prompt_budget import fit_prompt
+from app.services.structured_output import StructuredOutputError
 from . import prompt_templates, safety_rules, utils
-from .models import SymptomRequest, SymptomResponse, MedicineRecommendation
+from .models import SymptomRequest, SymptomResponse, MedicineRecommendation, SymptomLLMOutput
 from .translation_service import (
     translate_symptoms_to_english,
     translate_response_to_language,
@@ -180,7 +186,14 @@ except Exception:
         _translator = None
 
 
-def call_llm(prompt: str) -> str:
+def call_llm(prompt: str, system: str = "", endpoint: str = "symptoms") -> Dict:
+    """
+    Send a prompt to Phi-4 and return its reply, validated against
+    SymptomLLMOutput (the reply is schema-constrained JSON, parsed as it
+    streams in). `system` holds the static instructions, sent as a stable
+    system message so Ollama reuses its KV cache; `prompt` is the
+    per-request content.
+    """
     provider = os.environ.get("LLM_PROVIDER", "ollama").lower().strip()
     logger.info("=" * 70)
     logger.info("LLM PROVIDER: '%s'", provider)
@@ -198,42 +211,23 @@ def call_llm(prompt: str) -> str:
         
         logger.info("Model: %s", ollama_model)
         
-        api_url = f"{ollama_url}/api/generate"
-        payload = {
-            "model": ollama_model,
-            "prompt": prompt,
-            "stream": False,
+        session = get_session(ollama_url, ollama_model)
+        options = {
             "temperature": float(os.environ.get("LLM_TEMPERATURE", 0.3)),
             "num_predict": 512,  # Limit to 512 tokens for faster generation
         }
         
         try:
             logger.info("Sending request to Phi-4...")
-            resp = requests.post(api_url, json=payload, timeout=600)
-            
-            if resp.status_code != 200:
-                error_msg = resp.text
-                logger.error("Ollama error (status %d): %s", resp.status_code, error_msg)
-                raise Exception(f"Ollama error: {resp.status_code} - {error_msg}")
-            
-            resp.raise_for_status()
-            
-            # Ollama returns {"response": "...text..."} format
-            resp_json = resp.json()
-            llm_output = resp_json.get("response", "")
-            
-            logger.info("✓ Phi-4 response received")
-            
-            # Try to extract JSON from the response
-            try:
-                parsed = utils.try_parse_json(llm_output)
-                logger.info("✓ Successfully parsed Phi-4 response")
-                return json.dumps(parsed)
-            except Exception as parse_err:
-                logger.error("✗ Failed to parse JSON from Phi-4 response")
-                logger.error("Parse error: %s", parse_err)
-                raise ValueError(f"Phi-4 did not return valid JSON. Error: {parse_err}")
+            parsed = session.chat_structured(
+                prompt, SymptomLLMOutput, system=system, endpoint=endpoint, options=options, timeout=600
+            )
+            logger.info("✓ Phi-4 response received and validated")
+            return parsed
                 
+        except StructuredOutputError as parse_err:
+            logger.error("✗ Phi-4 reply did not match the recommendation schema: %s", parse_err)
+            raise
         except requests.exceptions.ConnectionError as ce:
             logger.error("✗ FATAL: Cannot connect to Ollama (Phi-4)")
             logger.error("Ollama URL: %s", ollama_url)
@@ -245,6 +239,9 @@ def call_llm(prompt: str) -> str:
                 f"2. Verify Phi-4 model is installed: ollama list\n"
                 f"3. Check OLLAMA_URL in .env is correct"
             )
+        except LLMUnavailableError as e:
+            logger.warning("⚡ %s", e)
+            raise
         except Exception as e:
             logger.exception("✗ ERROR calling Ollama/Phi-4: %s", e)
             raise
@@ -269,7 +266,8 @@ def _translate_text_if_needed(text: str, lang: str) -> str:
         # Return original text - LLM should have generated in correct language anyway
         return text
     try:
-        translated = _translator(text, lang)
+        with stage("translation.indictrans"):
+            translated = _translator(text, lang)
         logger.debug("Translated text: '%s' -> '%s' (first 50 chars)", text[:50], translated[:50])
         return translated
     except Exception as e:
@@ -315,7 +313,41 @@ def translate_if_needed(resp: Dict, lang: str) -> Dict:
     return resp
 
 
+def _retrieve_rag_context(symptoms: List[str]) -> str:
+    """
+    Reference notes for the prompt from the semantic index.
+    SYMPTOM_RAG_TOP_K=0 disables retrieval; failures never block a recommendation.
+    """
+    top_k = int(os.environ.get("SYMPTOM_RAG_TOP_K", 3))
+    if top_k <= 0 or not symptoms:
+        return ""
+    try:
+        from .semantic_index import get_semantic_context
+        return get_semantic_context(symptoms, top_k=top_k)
+    except Exception as e:
+        logger.warning("⚠️ Symptom retrieval unavailable, continuing without reference notes: %s", e)
+        return ""
+
+
+def _normalized_list(values: Optional[List[str]]) -> List[str]:
+    return sorted({" ".join(v.lower().split()) for v in (values or []) if v and v.strip()})
+
+
 def recommend_symptoms(req: SymptomRequest) -> SymptomResponse:
+    """Recommendation for a symptom request; identical concurrent requests share one LLM run"""
+    key = request_key("symptoms", {
+        "age": req.age,
+        "gender": (req.gender or "").lower().strip(),
+        "symptoms": _normalized_list(req.symptoms),
+        "allergies": _normalized_list(req.allergies),
+        "existing_conditions": _normalized_list(req.existing_conditions),
+        "pregnancy_status": bool(req.pregnancy_status),
+        "language": (req.language or "english").lower().strip(),
+    })
+    return flights.do(key, _recommend_symptoms, req)
+
+
+def _recommend_symptoms(req: SymptomRequest) -> SymptomResponse:
     logger.info("=== NEW RECOMMENDATION REQUEST ===")
     body = req.dict()
     logger.info("Request body: %s", body)
@@ -332,14 +364,18 @@ def recommend_symptoms(req: SymptomRequest) -> SymptomResponse:
         body["symptoms"] = english_symptoms
         logger.info(f"Translated symptoms: {english_symptoms}")
     
-    # Step 2: Build prompt - Phi-4 will think independently
-    prompt = prompt_templates.build_prompt(body, rag_context="")
-    logger.info("Prompt built - Phi-4 will generate recommendations independently")
+    # Step 2: Retrieve compact reference notes for the symptoms
+    rag_context = _retrieve_rag_context(body.get("symptoms", []))
     
-    # Step 3: Call LLM for independent thinking
+    # Step 3: Build prompt - Phi-4 reasons independently, notes are advisory
+    system_prompt, prompt = prompt_templates.build_messages(body, rag_context=rag_context)
+    logger.info("Prompt built (%d chars, %d chars of reference notes)", len(prompt), len(rag_context))
+    
+    # Step 4: Call LLM for independent thinking
     try:
-        raw = call_llm(prompt)
-        parsed = utils.try_parse_json(raw)
+        parsed = call_llm(prompt, system=system_prompt)
+    except LLMOverloadedError:
+        raise
     except Exception as llm_err:
         # Fallback: Generate a symptom-aware response using RAG
         logger.warning("LLM failed: %s. Using intelligent fallback response...", str(llm_err))
@@ -418,7 +454,39 @@ def recommend_symptoms(req: SymptomRequest) -> SymptomResponse:
     return resp
 
 
+MEDICAL_QA_SYSTEM_PROMPT = """You are Sanjeevani, an advanced AI medical assistant trained on global medical knowledge.
+Your role is to:
+1. Answer medical, health, and healthcare-related questions comprehensively
+2. Support multiple languages and medical terminology from around the world
+3. Provide accurate, evidence-based medical information
+4. Always emphasize consulting healthcare professionals for serious concerns
+5. Handle rare diseases, specific conditions, and complex medical scenarios
+6. Explain medical concepts clearly for lay people
+
+Many users are rural users who need responses in their native language: always answer
+in the preferred language named in the user's message, whatever language the question is in.
+
+IMPORTANT RULES:
+- If the question is about health, medicine, disease, symptoms, treatment, prevention, or healthcare: ANSWER COMPREHENSIVELY
+- If the question is NOT medical: Politely decline and redirect to medical topics (in the preferred language)
+- Always include safety disclaimers when appropriate (in the preferred language)
+- Never diagnose definitively - provide information and suggest professional consultation (in the preferred language)
+- Accept medical terms in any language and from any medical tradition
+- Be thorough but concise (2-5 sentences for simple questions, more for complex ones)
+- Respond ONLY with the answer text, no JSON formatting, no markdown
+- CRITICAL: RESPOND ENTIRELY IN THE PREFERRED LANGUAGE - NO EXCEPTIONS"""
+
+
 def answer_medical_question(question: str, language: str = "english") -> str:
+    """Answer to a medical question; identical concurrent questions share one LLM run"""
+    key = request_key("medical_qa", {
+        "question": " ".join(question.lower().split()),
+        "language": (language or "english").lower().strip(),
+    })
+    return flights.do(key, _answer_medical_question, question, language)
+
+
+def _answer_medical_question(question: str, language: str = "english") -> str:
     """
     Answer ANY question using Phi-4 LLM as a medical assistant.
     The LLM intelligently determines if it's medical and responds appropriately.
@@ -444,40 +512,24 @@ def answer_medical_question(question: str, language: str = "english") -> str:
     }
     lang_display = lang_names.get(language.lower(), "English")
 
-    # Create a comprehensive prompt for medical Q&A
+    # The static instructions go in MEDICAL_QA_SYSTEM_PROMPT (identical for
+    # every request, so Ollama reuses its KV cache); the language instruction
+    # and the question form the per-request message.
     # The LLM itself will determine if the question is medical
-    # Using Phi-4 (Microsoft), a powerful general-purpose language model optimized for medical expertise
-    prompt = f"""You are Sanjeevani, an advanced AI medical assistant trained on global medical knowledge.
-Your role is to:
-1. Answer medical, health, and healthcare-related questions comprehensively
-2. Support multiple languages and medical terminology from around the world
-3. Provide accurate, evidence-based medical information
-4. Always emphasize consulting healthcare professionals for serious concerns
-5. Handle rare diseases, specific conditions, and complex medical scenarios
-6. Explain medical concepts clearly for lay people
-
-LANGUAGE INSTRUCTION (CRITICAL - MUST FOLLOW):
+    def render(question: str) -> str:
+        return f"""LANGUAGE INSTRUCTION (CRITICAL - MUST FOLLOW):
 - The user's preferred language is: {lang_display}
 - YOU MUST ALWAYS RESPOND IN {lang_display.upper()} LANGUAGE, regardless of the question language
 - Even if the question is in English, you MUST respond in {lang_display}
 - If the question is in a different language, still respond in {lang_display}
-- This is a requirement for rural users who need responses in their native language
 - DO NOT match the question language - ALWAYS use {lang_display}
 
-IMPORTANT RULES:
-- If the question is about health, medicine, disease, symptoms, treatment, prevention, or healthcare: ANSWER COMPREHENSIVELY
-- If the question is NOT medical: Politely decline and redirect to medical topics (in {lang_display})
-- Always include safety disclaimers when appropriate (in {lang_display})
-- Never diagnose definitively - provide information and suggest professional consultation (in {lang_display})
-- Accept medical terms in any language and from any medical tradition
-- Be thorough but concise (2-5 sentences for simple questions, more for complex ones)
-- Respond ONLY with the answer text, no JSON formatting, no markdown
-- CRITICAL: RESPOND ENTIRELY IN {lang_display.upper()} LANGUAGE - NO EXCEPTIONS
-
 Question from user: {question}
 
 Response (in {lang_display}):"""
 
+    prompt = fit_prompt("medical_qa", render, system=MEDICAL_QA_SYSTEM_PROMPT, question=question)
+
     try:
         logger.info("Calling Phi-4 LLM for medical Q&A...")
         
@@ -494,29 +546,19 @@ Response (in {lang_display}):"""
             raise Exception(f"Only Ollama provider is supported. Got: {provider}")
         
         # Call Ollama directly without JSON parsing
-        api_url = f"{ollama_url}/api/generate"
-        payload = {
-            "model": ollama_model,
-            "prompt": prompt,
-            "stream": False,
-            "temperature": float(os.environ.get("LLM_TEMPERATURE", 0.3)),
-        }
+        session = get_session(ollama_url, ollama_model)
+        options = {"temperature": float(os.environ.get("LLM_TEMPERATURE", 0.3))}
         
         logger.info("Sending request to Phi-4 via Ollama...")
         logger.info("Timeout: 60 seconds for Phi-4 medical Q&A response")
         
-        resp = requests.post(api_url, json=payload, timeout=60)
-        
-        if resp.status_code != 200:
-            error_msg = resp.text
-            logger.error("Ollama error (status %d): %s", resp.status_code, error_msg)
-            raise Exception(f"Ollama API error: {resp.status_code} - {error_msg}")
-        
-        resp.raise_for_status()
-        
-        # Extract response from Ollama
-        resp_json = resp.json()
-        answer = resp_json.get("response", "").strip()
+        answer = session.chat(
+            prompt,
+            system=MEDICAL_QA_SYSTEM_PROMPT,
+            endpoint="medical_qa",
+            options=options,
+            timeout=60,
+        ).strip()
         
         logger.info("✓ Phi-4 response received (%d chars)", len(answer))
         logger.info("Response (first 500 chars): %s", answer[:500])
@@ -548,7 +590,7 @@ Response (in {lang_display}):"""
         
         return answer
         
-    except requests.exceptions.ConnectionError as ce:
+    except (requests.exceptions.ConnectionError, LLMUnavailableError) as ce:
         logger.error("Connection error to Ollama: %s", ce)
         error_messages = {
             "english": f"Cannot connect to LLM service at {os.environ.get('OLLAMA_URL', 'http://localhost:11434')}. Please ensure Ollama is running with: ollama serve",
@@ -576,6 +618,8 @@ Response (in {lang_display}):"""
             "gujarati": "LLM સેવાએ પ્રતિભાવ આપવામાં ખૂબ સમય લીધો. કૃપા કરીને ફરીથી પ્રયાસ કરો.",
         }
         return timeout_messages.get(language.lower(), timeout_messages["english"])
+    except LLMOverloadedError:
+        raise
     except Exception as e:
         logger.exception("Error in answer_medical_question: %s", e)
         logger.error("Full error details: %s", str(e))
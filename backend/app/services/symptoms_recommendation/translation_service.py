@@ -9,6 +9,8 @@ from typing import Optional, Dict
 import os
 from pathlib import Path
 
+from app.core.metrics import stage
+
 logger = logging.getLogger(__name__)
 
 # Load environment variables from .env file if it exists
@@ -109,12 +111,13 @@ class TranslationService:
             # Try indic-trans2 first (better for Indic languages)
             if self.translator:
                 lang_code = LANGUAGE_CODES.get(source_language.lower(), source_language)
-                result = self.translator.translate_paragraph(
-                    text,
-                    source_language=lang_code,
-                    target_language="en",
-                    script=self._get_script(lang_code)
-                )
+                with stage("translation.indictrans2"):
+                    result = self.translator.translate_paragraph(
+                        text,
+                        source_language=lang_code,
+                        target_language="en",
+                        script=self._get_script(lang_code)
+                    )
                 logger.info(f"✅ Translated from {source_language} to English using Indic-Trans2")
                 return result
         except Exception as e:
@@ -123,11 +126,12 @@ class TranslationService:
         try:
             # Fallback to Google Translate
             if self.google_translator:
-                result = self.google_translator.translate_text(
-                    text,
-                    source_language=LANGUAGE_CODES.get(source_language.lower()),
-                    target_language="en"
-                )
+                with stage("translation.google"):
+                    result = self.google_translator.translate_text(
+                        text,
+                        source_language=LANGUAGE_CODES.get(source_language.lower()),
+                        target_language="en"
+                    )
                 logger.info(f"✅ Translated from {source_language} to English using Google Translate")
                 return result['translatedText']
         except Exception as e:
@@ -148,12 +152,13 @@ class TranslationService:
             # Try indic-trans2 first
             if self.translator:
                 lang_code = LANGUAGE_CODES.get(target_language.lower(), target_language)
-                result = self.translator.translate_paragraph(
-                    text,
-                    source_language="en",
-                    target_language=lang_code,
-                    script=self._get_script(lang_code)
-                )
+                with stage("translation.indictrans2"):
+                    result = self.translator.translate_paragraph(
+                        text,
+                        source_language="en",
+                        target_language=lang_code,
+                        script=self._get_script(lang_code)
+                    )
                 logger.info(f"✅ Translated from English to {target_language} using Indic-Trans2")
                 return result
         except Exception as e:
@@ -162,11 +167,12 @@ class TranslationService:
         try:
             # Fallback to Google Translate
             if self.google_translator:
-                result = self.google_translator.translate_text(
-                    text,
-                    source_language="en",
-                    target_language=LANGUAGE_CODES.get(target_language.lower())
-                )
+                with stage("translation.google"):
+                    result = self.google_translator.translate_text(
+                        text,
+                        source_language="en",
+                        target_language=LANGUAGE_CODES.get(target_language.lower())
+                    )
                 logger.info(f"✅ Translated from English to {target_language} using Google Translate")
                 return result['translatedText']
         except Exception as e:
@@ -0,0 +1,189 @@
+"""
+Tesseract Engine Pool
+Runs Tesseract in-process through tesserocr (Tesseract's C API) instead of
+starting the tesseract binary for every pytesseract call.
+
+Each worker thread keeps one initialized TessBaseAPI per language, so
+traineddata is loaded once per thread rather than once per call. Images go
+to the engine as raw 8-bit pixel buffers, with no temporary PNG, and the page
+segmentation mode is switched on the live engine. If tesserocr is not
+installed, or TESSERACT_POOL_ENABLED=false is set, calls fall back to
+pytesseract with the same arguments.
+"""
+
+import logging
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from app.core.metrics import gauge_callback
+
+logger = logging.getLogger(__name__)
+
+HAVE_TESSEROCR = False
+HAVE_PYTESSERACT = False
+
+try:
+    import tesserocr
+    HAVE_TESSEROCR = True
+except ImportError:
+    logger.info("ℹ️ tesserocr not installed, Tesseract calls use pytesseract subprocesses")
+
+try:
+    import pytesseract
+    HAVE_PYTESSERACT = True
+except ImportError:
+    pass
+
+POOL_ENABLED = os.getenv("TESSERACT_POOL_ENABLED", "true").lower() == "true"
+
+# tessdata directory for tesserocr (defaults to the one Tesseract was built with)
+TESSDATA_PATH = os.getenv("TESSDATA_PREFIX", "")
+
+_local = threading.local()
+_engines_lock = threading.Lock()
+_engines: List["tesserocr.PyTessBaseAPI"] = []
+
+
+def is_available() -> bool:
+    """Whether any Tesseract backend (pool or pytesseract) can run"""
+    return HAVE_TESSEROCR or HAVE_PYTESSERACT
+
+
+def uses_pool() -> bool:
+    return HAVE_TESSEROCR and POOL_ENABLED
+
+
+def _engine(lang: str) -> "tesserocr.PyTessBaseAPI":
+    """This thread's initialized engine for `lang`"""
+    engines: Optional[Dict[str, "tesserocr.PyTessBaseAPI"]] = getattr(_local, "engines", None)
+    if engines is None:
+        engines = _local.engines = {}
+    api = engines.get(lang)
+    if api is None:
+        kwargs = {"lang": lang, "oem": tesserocr.OEM.DEFAULT}
+        if TESSDATA_PATH:
+            kwargs["path"] = TESSDATA_PATH
+        api = engines[lang] = tesserocr.PyTessBaseAPI(**kwargs)
+        with _engines_lock:
+            _engines.append(api)
+        logger.info(f"🧵 Tesseract engine ({lang}) initialized for thread {threading.current_thread().name}")
+    return api
+
+
+def _to_gray(image: np.ndarray) -> np.ndarray:
+    """Contiguous 8-bit single-channel buffer (Tesseract binarizes internally)"""
+    if image.ndim == 3:
+        code = cv2.COLOR_BGRA2GRAY if image.shape[2] == 4 else cv2.COLOR_BGR2GRAY
+        image = cv2.cvtColor(image, code)
+    if image.dtype != np.uint8:
+        image = cv2.normalize(image, None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8)
+    return np.ascontiguousarray(image)
+
+
+def _recognize(image: np.ndarray, psm: int, lang: str, with_confidence: bool) -> Tuple[str, Optional[float]]:
+    gray = _to_gray(image)
+    height, width = gray.shape
+    api = _engine(lang)
+    try:
+        api.SetPageSegMode(psm)
+        api.SetImageBytes(gray.tobytes(), width, height, 1, width)
+        text = api.GetUTF8Text()
+        confidence = None
+        if with_confidence:
+            confidences = [c for c in api.AllWordConfidences() if c > 0]
+            confidence = sum(confidences) / len(confidences) / 100.0 if confidences else None
+        return text, confidence
+    finally:
+        # Drop the image and results; the loaded model stays
+        api.Clear()
+
+
+def image_to_string(image: np.ndarray, psm: int = 3, lang: str = "eng") -> str:
+    """
+    Recognize text in an image (NumPy array as from cv2) with the given
+    page segmentation mode.
+
+    Raises:
+        RuntimeError: No Tesseract backend is installed
+    """
+    if uses_pool():
+        return _recognize(image, psm, lang, with_confidence=False)[0]
+    if not HAVE_PYTESSERACT:
+        raise RuntimeError("Tesseract is not available (install tesserocr or pytesseract)")
+    return pytesseract.image_to_string(image, lang=lang, config=f"--oem 3 --psm {psm}")
+
+
+def image_to_string_with_confidence(image: np.ndarray, psm: int = 3, lang: str = "eng") -> Tuple[str, Optional[float]]:
+    """
+    Text plus mean word confidence (0-1, None when no words were scored).
+
+    Raises:
+        RuntimeError: No Tesseract backend is installed
+    """
+    if uses_pool():
+        return _recognize(image, psm, lang, with_confidence=True)
+    if not HAVE_PYTESSERACT:
+        raise RuntimeError("Tesseract is not available (install tesserocr or pytesseract)")
+    # One Tesseract run: the text is rebuilt from the word boxes
+    data = pytesseract.image_to_data(
+        image, lang=lang, config=f"--oem 3 --psm {psm}", output_type=pytesseract.Output.DICT
+    )
+    confidences = [float(c) for c in data.get("conf", []) if float(c) > 0]
+    return _text_from_data(data), (sum(confidences) / len(confidences) / 100.0 if confidences else None)
+
+
+def _text_from_data(data: Dict[str, list]) -> str:
+    """Text of image_to_data output: words joined per line, a blank line between paragraphs"""
+    paragraphs: Dict[Tuple[int, int], Dict[int, List[str]]] = {}
+    for word, block, par, line in zip(data["text"], data["block_num"], data["par_num"], data["line_num"]):
+        word = (word or "").strip()
+        if word:
+            paragraphs.setdefault((block, par), {}).setdefault(line, []).append(word)
+    return "\n\n".join(
+        "\n".join(" ".join(words) for words in lines.values()) for lines in paragraphs.values()
+    )
+
+
+def detect_orientation(image: np.ndarray) -> Optional[Tuple[int, float]]:
+    """
+    Tesseract orientation detection (OSD): degrees (0/90/180/270) the page
+    must be turned to be upright (Tesseract's "Rotate", from both backends),
+    and Tesseract's confidence in that. None when no backend or no osd
+    traineddata is installed, or detection fails.
+    """
+    try:
+        if uses_pool():
+            gray = _to_gray(image)
+            height, width = gray.shape
+            api = _engine("osd")
+            try:
+                api.SetPageSegMode(tesserocr.PSM.OSD_ONLY)
+                api.SetImageBytes(gray.tobytes(), width, height, 1, width)
+                osd = api.DetectOrientationScript()
+            finally:
+                api.Clear()
+            if not osd:
+                return None
+            # orient_deg is the page's detected rotation; the correction turns it back (pytesseract's "rotate")
+            return (360 - int(osd["orient_deg"])) % 360, float(osd["orient_conf"])
+        if HAVE_PYTESSERACT:
+            osd = pytesseract.image_to_osd(_to_gray(image), output_type=pytesseract.Output.DICT)
+            return int(osd["rotate"]) % 360, float(osd["orientation_conf"])
+    except Exception as e:
+        logger.debug(f"Tesseract OSD failed: {e}")
+    return None
+
+
+def engine_count() -> int:
+    with _engines_lock:
+        return len(_engines)
+
+
+gauge_callback(
+    "sanjeevani_tesseract_engines", "Initialized in-process Tesseract engines (one per thread and language)", (),
+    lambda: [({}, engine_count())],
+)
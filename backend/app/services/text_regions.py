@@ -0,0 +1,215 @@
+"""
+Region-First OCR
+Finds the text on a page with a cheap morphological detector so the heavy
+OCR engines only see the parts of the image that contain text.
+
+Detection runs once on a copy shrunk to DETECTION_SIZE pixels: the
+morphological gradient (high on stroke edges whether the print is dark or
+light) is binarized, characters are closed into text lines, lines that are
+mostly empty (page frames, paper edges) are dropped, and neighbouring lines are
+merged into blocks. Boxes are mapped back to full resolution.
+
+Engines then read
+    - blocks, one crop each (Tesseract with PSM 6, PaddleOCR), or
+    - lines, batched (EasyOCR recognition without its own detector, TrOCR)
+and the pieces are joined top-to-bottom, left-to-right.
+
+Pages where text covers more than REGION_OCR_MAX_COVERAGE of the pixels
+are read whole: cropping saves little there and the engines' own layout
+analysis is worth keeping.
+"""
+
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from app.core.metrics import timed
+
+logger = logging.getLogger(__name__)
+
+# Set REGION_OCR=false to always OCR whole pages
+ENABLED = os.getenv("REGION_OCR", "true").lower() == "true"
+
+# Largest share of the page the text blocks may cover for region-first OCR
+MAX_COVERAGE = float(os.getenv("REGION_OCR_MAX_COVERAGE", "0.6"))
+
+# Line crops recognized per engine call where the engine batches
+BATCH_SIZE = int(os.getenv("REGION_OCR_BATCH_SIZE", "16"))
+
+# Longest side (px) of the copy text is detected on
+DETECTION_SIZE = 1200
+
+# Smallest text line kept (px on the detection copy)
+MIN_LINE_HEIGHT = 6
+MIN_LINE_WIDTH = 8
+
+# Share of a line's box its joined strokes must fill (drops frames and page edges)
+MIN_LINE_FILL = 0.25
+
+# Lines closer than this many line heights (vertically) join one block
+BLOCK_LINE_GAP = 1.2
+
+# Margin (px on the detection copy) added around every box
+PADDING = 4
+
+Box = Tuple[int, int, int, int]  # (x, y, w, h)
+
+
+@dataclass
+class TextLayout:
+    """Text lines and blocks of one page, full-resolution coordinates"""
+    shape: Tuple[int, int]
+    lines: List[Box] = field(default_factory=list)
+    blocks: List[Box] = field(default_factory=list)
+
+    @property
+    def coverage(self) -> float:
+        """Share of the page inside text blocks"""
+        height, width = self.shape
+        return sum(w * h for _, _, w, h in self.blocks) / float(width * height) if width and height else 0.0
+
+    @property
+    def bounds(self) -> Optional[Box]:
+        """Smallest box holding every block"""
+        if not self.blocks:
+            return None
+        x0 = min(x for x, _, _, _ in self.blocks)
+        y0 = min(y for _, y, _, _ in self.blocks)
+        x1 = max(x + w for x, _, w, _ in self.blocks)
+        y1 = max(y + h for _, y, _, h in self.blocks)
+        return x0, y0, x1 - x0, y1 - y0
+
+
+def _gray(image: np.ndarray) -> np.ndarray:
+    if image.ndim == 2:
+        return image
+    code = cv2.COLOR_BGRA2GRAY if image.shape[2] == 4 else cv2.COLOR_BGR2GRAY
+    return cv2.cvtColor(image, code)
+
+
+def reading_order(boxes: Sequence[Box]) -> List[Box]:
+    """Boxes top-to-bottom; boxes sharing a row (half their height overlaps) left-to-right"""
+    rows: List[List[Box]] = []
+    for box in sorted(boxes, key=lambda b: b[1] + b[3] / 2):
+        if rows:
+            last = rows[-1][-1]
+            overlap = min(last[1] + last[3], box[1] + box[3]) - max(last[1], box[1])
+            if overlap >= 0.5 * min(last[3], box[3]):
+                rows[-1].append(box)
+                continue
+        rows.append([box])
+    return [box for row in rows for box in sorted(row, key=lambda b: b[0])]
+
+
+def _merge_lines(lines: List[Box]) -> List[Box]:
+    """Group vertically adjacent, horizontally overlapping lines into blocks"""
+    blocks: List[List[int]] = []  # [x0, y0, x1, y1, line height]
+    for x, y, w, h in sorted(lines, key=lambda b: b[1]):
+        for block in blocks:
+            gap = y - block[3]
+            overlaps = x < block[2] and x + w > block[0]
+            if overlaps and gap <= BLOCK_LINE_GAP * max(h, block[4]):
+                block[0], block[1] = min(block[0], x), min(block[1], y)
+                block[2], block[3] = max(block[2], x + w), max(block[3], y + h)
+                block[4] = max(block[4], h)
+                break
+        else:
+            blocks.append([x, y, x + w, y + h, h])
+    return [(x0, y0, x1 - x0, y1 - y0) for x0, y0, x1, y1, _ in blocks]
+
+
+@timed("ocr.region_detection")
+def detect_text_layout(image: np.ndarray) -> TextLayout:
+    """Text lines and blocks of the page"""
+    gray = _gray(image)
+    height, width = gray.shape
+    scale = min(1.0, DETECTION_SIZE / max(height, width))
+    small = gray if scale == 1.0 else cv2.resize(
+        gray, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA
+    )
+
+    gradient = cv2.morphologyEx(small, cv2.MORPH_GRADIENT, cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3)))
+    strokes = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
+    # Join characters and words of one line, not neighbouring lines
+    joined = cv2.morphologyEx(strokes, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (15, 3)))
+    # Components rather than outer contours: a page edge or frame must not swallow the text inside it
+    count, _, stats, _ = cv2.connectedComponentsWithStats(joined, connectivity=8)
+
+    lines = []
+    for x, y, w, h, area in stats[1:count]:
+        if h < MIN_LINE_HEIGHT or w < MIN_LINE_WIDTH or area < MIN_LINE_FILL * w * h:
+            continue
+        lines.append((int(x), int(y), int(w), int(h)))
+
+    small_h, small_w = small.shape
+
+    def to_full(box: Box) -> Box:
+        x, y, w, h = box
+        x0, y0 = max(0, x - PADDING), max(0, y - PADDING)
+        x1, y1 = min(small_w, x + w + PADDING), min(small_h, y + h + PADDING)
+        fx0, fy0 = int(x0 / scale), int(y0 / scale)
+        return fx0, fy0, min(width, int(np.ceil(x1 / scale))) - fx0, min(height, int(np.ceil(y1 / scale))) - fy0
+
+    return TextLayout(
+        shape=(height, width),
+        lines=reading_order([to_full(box) for box in lines]),
+        blocks=reading_order([to_full(box) for box in _merge_lines(lines)]),
+    )
+
+
+def region_layout(image: np.ndarray) -> Optional[TextLayout]:
+    """Layout for region-first OCR, or None when the page should be read whole"""
+    if not ENABLED:
+        return None
+    try:
+        layout = detect_text_layout(image)
+    except Exception as e:
+        logger.warning(f"⚠️ Text region detection failed: {e}, reading whole page")
+        return None
+    if not layout.blocks or layout.coverage > MAX_COVERAGE:
+        logger.debug(f"Text covers {layout.coverage:.0%} of the page, reading whole page")
+        return None
+    logger.info(f"🧩 Region-first OCR: {len(layout.blocks)} blocks, {len(layout.lines)} lines, "
+                f"{layout.coverage:.0%} of the page")
+    return layout
+
+
+def crop(image: np.ndarray, box: Box) -> np.ndarray:
+    x, y, w, h = box
+    return image[y:y + h, x:x + w]
+
+
+def ocr_regions(
+    image: np.ndarray,
+    boxes: Sequence[Box],
+    recognize: Callable[[np.ndarray], Tuple[str, Optional[float]]],
+) -> Tuple[str, Optional[float]]:
+    """
+    Text of every box (one line of output per box, in the given order) and
+    the confidence of the pieces weighted by their length, None if no piece
+    was scored. recognize(crop) returns (text, confidence or None).
+    """
+    texts, weighted, weight = [], 0.0, 0
+    for box in boxes:
+        text, confidence = recognize(crop(image, box))
+        text = text.strip()
+        if not text:
+            continue
+        texts.append(text)
+        if confidence is not None:
+            weighted += confidence * len(text)
+            weight += len(text)
+    return "\n".join(texts), (weighted / weight if weight else None)
+
+
+def easyocr_lines(reader, image: np.ndarray, lines: Sequence[Box]) -> list:
+    """
+    EasyOCR recognition of the detected lines only (its CRAFT detector is
+    skipped), batched, as readtext()-style (bbox, text, confidence) tuples
+    """
+    horizontal = [[x, x + w, y, y + h] for x, y, w, h in lines]
+    return reader.recognize(_gray(image), horizontal_list=horizontal, free_list=[], batch_size=BATCH_SIZE)
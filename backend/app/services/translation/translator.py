@@ -7,6 +7,8 @@ import logging
 from typing import Dict, Optional
 from googletrans import Translator
 
+from app.core.metrics import stage
+
 logger = logging.getLogger(__name__)
 
 
@@ -54,7 +56,8 @@ class MultiLangTranslator:
         
         try:
             logger.info(f"🔄 Translating to {target_lang}...")
-            result = self.translator.translate(text, src=source_lang, dest=target_code)
+            with stage("translation.googletrans"):
+                result = self.translator.translate(text, src=source_lang, dest=target_code)
             translated = result.text
             logger.info(f"✅ Translation complete")
             return translated
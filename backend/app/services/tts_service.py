@@ -10,6 +10,8 @@ import base64
 import logging
 from typing import Optional
 
+from app.core.metrics import timed
+
 logger = logging.getLogger(__name__)
 
 # Google Cloud TTS voice mapping for Indian languages
@@ -71,6 +73,7 @@ def get_voice_for_language(lang: str) -> str:
     return GOOGLE_VOICE_MAP.get(lang_norm, GOOGLE_VOICE_MAP["en"])
 
 
+@timed("tts.google_cloud")
 def generate_speech_google_cloud(text: str, language: str) -> Optional[bytes]:
     """
     Generate speech using Google Cloud Text-to-Speech API
@@ -111,6 +114,7 @@ def generate_speech_google_cloud(text: str, language: str) -> Optional[bytes]:
         return None
 
 
+@timed("tts.gtts")
 def generate_speech_gtts(text: str, language: str) -> Optional[bytes]:
     """
     Generate speech using gTTS (Google Translate TTS)
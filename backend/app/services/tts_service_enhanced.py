@@ -16,6 +16,8 @@ import warnings
 from typing import Optional
 import requests
 
+from app.core.metrics import timed
+
 # Suppress FFmpeg warnings from pydub
 logging.getLogger('pydub.utils').setLevel(logging.ERROR)
 warnings.filterwarnings('ignore', category=RuntimeWarning, module='pydub.utils')
@@ -88,6 +90,7 @@ BHASHINI_API_KEY = os.getenv("BHASHINI_API_KEY", None)  # Optional, can work wit
 USE_BHASHINI = True  # Always use Bhashini TTS
 
 
+@timed("tts.gtts_ai4bharat")
 def generate_speech_bhashini(text: str, language: str) -> Optional[bytes]:
     """
     Generate speech using gTTS (primary) with AI4Bharat IndicTTS as fallback
@@ -253,6 +256,7 @@ def generate_speech_bhashini(text: str, language: str) -> Optional[bytes]:
 #         return None
 
 
+@timed("tts.coqui")
 def generate_speech_coqui(text: str, language: str) -> Optional[bytes]:
     """
     Generate speech using Coqui TTS (Legacy fallback)
@@ -4,13 +4,12 @@ Merges multiple CSV datasets and provides comprehensive medicine information
 Integrates with PostgreSQL and Azure storage
 """
 
-import pandas as pd
 import logging
-import os
-import json
+from itertools import islice
 from typing import Dict, Any, List, Optional
 from difflib import get_close_matches
-from datetime import datetime
+
+from app.services.medicine_store import MedicineRecord, get_medicine_store
 
 logger = logging.getLogger(__name__)
 
@@ -21,144 +20,71 @@ class UnifiedMedicineDatabase:
     2. A_Z_medicines_dataset_of_India.csv (250K+ medicines with pricing/composition)
     
     Provides unified search and retrieval across all medicines.
+    The merged data lives in the shared memory-mapped medicine store
+    (built once by scripts/build_medicine_store.py or on first use).
     """
     
-    _df_combined = None
+    _store = None
     _medicine_index = None
     _loaded = False
     
     @classmethod
     def load_all_datasets(cls):
-        """Load and merge all medicine datasets"""
+        """Map the merged medicine datasets"""
         if cls._loaded:
             return  # Already loaded
         
-        logger.info("🔄 Loading and merging medicine datasets...")
+        logger.info("🔄 Loading merged medicine datasets...")
         
         try:
-            # Find datasets in resources/datasets folder
-            base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
-            resources_path = os.path.join(base_dir, 'resources', 'datasets')
-            
-            possible_paths = [
-                os.path.join(resources_path, 'medicine_dataset.csv'),
-                os.path.join(resources_path, 'A_Z_medicines_dataset_of_India.csv'),
-                os.path.join(base_dir, 'medicine_dataset.csv'),  # Fallback to old location
-                os.path.join(base_dir, 'A_Z_medicines_dataset_of_India.csv'),  # Fallback
-                'medicine_dataset.csv',
-                'A_Z_medicines_dataset_of_India.csv'
-            ]
-            
-            datasets = []
-            
-            # Load medicine_dataset.csv (50K+ generic medicines)
-            for path in possible_paths:
-                if 'medicine_dataset.csv' in path and os.path.exists(path):
-                    df1 = pd.read_csv(path)
-                    logger.info(f"✅ Loaded medicine_dataset.csv: {len(df1)} records")
-                    df1['source'] = 'generic_database'
-                    df1['dataset_version'] = '1.0'
-                    df1['load_date'] = datetime.now().isoformat()
-                    datasets.append(df1)
-                    break
-            
-            # Load A_Z_medicines_dataset_of_India.csv (250K+ Indian medicines with pricing)
-            for path in possible_paths:
-                if 'A_Z_medicines' in path and os.path.exists(path):
-                    df2 = pd.read_csv(path)
-                    logger.info(f"✅ Loaded A_Z_medicines_dataset_of_India.csv: {len(df2)} records")
-                    df2['source'] = 'india_database'
-                    df2['dataset_version'] = '2.0'
-                    df2['load_date'] = datetime.now().isoformat()
-                    datasets.append(df2)
-                    break
-            
-            if not datasets:
-                logger.error("❌ No medicine datasets found")
-                cls._df_combined = pd.DataFrame()
-                cls._loaded = True
-                return
-            
-            # Merge datasets intelligently
-            if len(datasets) == 2:
-                # Standardize column names for merging
-                df1, df2 = datasets
-                
-                # Create combined dataset with all columns
-                df_combined = pd.concat([df1, df2], ignore_index=True, sort=False)
-                
-                # Fill missing values
-                df_combined = df_combined.fillna('Not specified')
-                
-                logger.info(f"✅ Combined dataset: {len(df_combined)} total medicines")
-            else:
-                df_combined = datasets[0] if datasets else pd.DataFrame()
-                logger.info(f"✅ Using single dataset: {len(df_combined)} medicines")
+            cls._store = get_medicine_store()
+            for name, source in cls._store.sources.items():
+                logger.info(f"✅ {source['file']}: {source['stop'] - source['start']} records ({name})")
             
-            # Create medicine index for fast lookup
-            cls._df_combined = df_combined
-            cls._create_index()
+            # Prebuilt name index (lower-cased, stripped names -> row id)
+            cls._medicine_index = cls._store.name_index()
             cls._loaded = True
             
-            logger.info(f"✅ Unified database ready: {len(cls._df_combined)} medicines indexed")
+            logger.info(f"✅ Unified database ready: {len(cls._store)} medicines indexed")
             
         except Exception as e:
             logger.error(f"❌ Error loading datasets: {e}")
-            cls._df_combined = pd.DataFrame()
+            cls._store = None
             cls._loaded = True
     
     @classmethod
-    def _create_index(cls):
-        """Create fast lookup index"""
-        try:
-            cls._medicine_index = {}
-            
-            # Index by name
-            if 'name' in cls._df_combined.columns:
-                for idx, name in enumerate(cls._df_combined['name'].values):
-                    if pd.notna(name):
-                        cls._medicine_index[str(name).lower().strip()] = idx
-            
-            # Also try Name (capital N)
-            elif 'Name' in cls._df_combined.columns:
-                for idx, name in enumerate(cls._df_combined['Name'].values):
-                    if pd.notna(name):
-                        cls._medicine_index[str(name).lower().strip()] = idx
-            
-            logger.info(f"✅ Created index with {len(cls._medicine_index)} entries")
-        except Exception as e:
-            logger.warning(f"⚠️ Error creating index: {e}")
-            cls._medicine_index = {}
+    def _is_empty(cls) -> bool:
+        return cls._store is None or len(cls._store) == 0
     
     @classmethod
-    def search_medicine(cls, medicine_name: str) -> Optional[Dict[str, Any]]:
+    def search_medicine(cls, medicine_name: str) -> Optional[MedicineRecord]:
         """Search for medicine with fuzzy matching"""
         cls.load_all_datasets()
         
-        if cls._df_combined.empty or not medicine_name:
+        if cls._is_empty() or not medicine_name:
             return None
         
         medicine_lower = medicine_name.lower().strip()
         
         # Exact match first
-        if medicine_lower in cls._medicine_index:
-            idx = cls._medicine_index[medicine_lower]
-            return cls._df_combined.iloc[idx].to_dict()
+        idx = cls._medicine_index.get(medicine_lower)
+        if idx is not None:
+            return cls._store.record(idx)
         
-        # Try partial name match
-        for med_key in cls._medicine_index:
-            if medicine_lower in med_key:
-                idx = cls._medicine_index[med_key]
-                return cls._df_combined.iloc[idx].to_dict()
+        # Try partial name match (scans the mapped name blob in row order)
+        row = cls._store.names.find_substring(medicine_lower)
+        if row is not None:
+            idx = cls._medicine_index.get(cls._store.names[row])
+            return cls._store.record(idx)
         
         # Fuzzy match
-        all_medicines = list(cls._medicine_index.keys())
+        all_medicines = cls._medicine_index.key_list()
         matches = get_close_matches(medicine_lower, all_medicines, n=1, cutoff=0.6)
         
         if matches:
             logger.info(f"✅ Fuzzy matched '{medicine_name}' to '{matches[0]}'")
-            idx = cls._medicine_index[matches[0]]
-            return cls._df_combined.iloc[idx].to_dict()
+            idx = cls._medicine_index.get(matches[0])
+            return cls._store.record(idx)
         
         return None
     
@@ -203,7 +129,7 @@ class UnifiedMedicineDatabase:
             "classification": medicine_data.get('Classification', 'Not specified'),
             
             # Raw data for LLM context
-            "raw_data": medicine_data
+            "raw_data": medicine_data.to_dict()
         }
         
         # Combine compositions
@@ -218,7 +144,7 @@ class UnifiedMedicineDatabase:
     def get_total_medicines(cls) -> int:
         """Get total number of medicines"""
         cls.load_all_datasets()
-        return len(cls._df_combined) if cls._df_combined is not None else 0
+        return 0 if cls._is_empty() else len(cls._store)
     
     @classmethod
     def format_for_llm_comprehensive(cls, medicine_info: Dict[str, Any]) -> str:
@@ -256,54 +182,48 @@ Data Source: {medicine_info.get('source', 'database')} (Dataset v{medicine_info.
         return context
     
     @classmethod
-    def search_by_category(cls, category: str) -> List[Dict[str, Any]]:
-        """Search medicines by category"""
+    def _search_columns(cls, columns: List[str], text: str) -> List[MedicineRecord]:
+        """Up to 5 rows per column whose value contains text (case-insensitive), top 10"""
         cls.load_all_datasets()
         
-        if cls._df_combined.empty:
+        if cls._is_empty():
             return []
         
-        # Search in both Category columns
+        needle = text.lower()
         matches = []
-        for col in ['Category', 'category', 'type']:
-            if col in cls._df_combined.columns:
-                matching = cls._df_combined[
-                    cls._df_combined[col].astype(str).str.lower().str.contains(category.lower(), na=False)
-                ]
-                matches.extend(matching.to_dict('records')[:5])
+        for col in columns:
+            if not cls._store.has_group_index(col):
+                continue
+            # Substring test runs over the distinct values only, then the
+            # matching groups' row ids are merged back into row order
+            rows = cls._store.group_index(col).rows_containing(needle)
+            matches.extend(cls._store.record(idx) for idx in islice(rows, 5))
         
         return matches[:10]
     
     @classmethod
-    def search_by_manufacturer(cls, manufacturer: str) -> List[Dict[str, Any]]:
+    def search_by_category(cls, category: str) -> List[MedicineRecord]:
+        """Search medicines by category"""
+        # Search in both Category columns
+        return cls._search_columns(['Category', 'category', 'type'], category)
+    
+    @classmethod
+    def search_by_manufacturer(cls, manufacturer: str) -> List[MedicineRecord]:
         """Search medicines by manufacturer"""
-        cls.load_all_datasets()
-        
-        if cls._df_combined.empty:
-            return []
-        
         # Search in both manufacturer columns
-        matches = []
-        for col in ['manufacturer_name', 'Manufacturer']:
-            if col in cls._df_combined.columns:
-                matching = cls._df_combined[
-                    cls._df_combined[col].astype(str).str.lower().str.contains(manufacturer.lower(), na=False)
-                ]
-                matches.extend(matching.to_dict('records')[:5])
-        
-        return matches[:10]
+        return cls._search_columns(['manufacturer_name', 'Manufacturer'], manufacturer)
     
     @classmethod
     def get_statistics(cls) -> Dict[str, Any]:
         """Get database statistics"""
         cls.load_all_datasets()
         
-        if cls._df_combined.empty:
+        if cls._is_empty():
             return {"status": "empty"}
         
         return {
-            "total_medicines": len(cls._df_combined),
-            "data_sources": cls._df_combined['source'].unique().tolist() if 'source' in cls._df_combined.columns else [],
-            "columns": cls._df_combined.columns.tolist(),
+            "total_medicines": len(cls._store),
+            "data_sources": list(cls._store.sources),
+            "columns": list(cls._store.columns),
             "datasets_merged": cls._loaded
         }
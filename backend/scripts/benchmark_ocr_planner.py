@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Benchmark the adaptive OCR planner against the full variant × PSM grid
+
+For every image in the test folder, runs the full grid once (every
+preprocessing variant with every PSM) and then the adaptive planner, and
+reports the Tesseract calls each made and how close the planner's text is
+to the reference: a `<image name>.txt` transcript next to the image when
+present, otherwise the best full-grid result.
+
+Usage:
+    python scripts/benchmark_ocr_planner.py
+    python scripts/benchmark_ocr_planner.py --images "test images" --learn
+
+--learn records the full-grid winners in the planner stats file
+(OCR_PLANNER_STATS) so later runs and the server start from learned orderings.
+"""
+import argparse
+import difflib
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+import cv2
+
+from app.services import tesseract_pool
+from app.services.medicine_ocr_service import (
+    DEFAULT_OCR_PASSES, MedicineImageVariants, default_ocr_passes,
+)
+from app.services.ocr_planner import OCRPlanner, classify_image
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp", ".bmp", ".tif", ".tiff"}
+
+
+def similarity(a: str, b: str) -> float:
+    return difflib.SequenceMatcher(None, a.lower().split(), b.lower().split()).ratio() if a or b else 1.0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Compare adaptive OCR planning with the full grid")
+    parser.add_argument("--images", default=str(BACKEND_DIR / "test images"), help="Folder of test images")
+    parser.add_argument("--learn", action="store_true", help="Record full-grid winners in the planner stats")
+    args = parser.parse_args()
+
+    if not tesseract_pool.is_available():
+        print("Tesseract is not available (install tesserocr or pytesseract)")
+        return 1
+
+    images = sorted(p for p in Path(args.images).iterdir() if p.suffix.lower() in IMAGE_SUFFIXES)
+    if not images:
+        print(f"No images in {args.images}")
+        return 1
+
+    # Starts from the orderings learned so far; only --learn writes to them. No exploration, so runs compare
+    planner = OCRPlanner(DEFAULT_OCR_PASSES, explore_rate=0)
+    grid_calls = planner_calls = 0
+    grid_scores, planner_scores = [], []
+
+    print(f"{'image':40} {'type':12} {'grid':>5} {'plan':>5} {'grid acc':>9} {'plan acc':>9}")
+    for path in images:
+        image = cv2.imread(str(path))
+        if image is None:
+            print(f"{path.name[:40]:40} unreadable")
+            continue
+        variants = MedicineImageVariants(image)
+        image_type = classify_image(variants.gray)
+
+        def recognize(variant, psm):
+            return tesseract_pool.image_to_string_with_confidence(variants.get(variant), psm=psm)
+
+        default = default_ocr_passes(image_type)
+        grid = planner.run(image_type, recognize, default=default, exhaustive=True, learn=args.learn)
+        adaptive = planner.run(image_type, recognize, default=default, learn=False)
+
+        transcript = path.with_name(path.name + ".txt")
+        reference = transcript.read_text(encoding="utf-8") if transcript.exists() else grid.text
+        grid_acc, plan_acc = similarity(grid.text, reference), similarity(adaptive.text, reference)
+
+        grid_calls += grid.calls
+        planner_calls += adaptive.calls
+        grid_scores.append(grid_acc)
+        planner_scores.append(plan_acc)
+        print(f"{path.name[:40]:40} {image_type:12} {grid.calls:5} {adaptive.calls:5} {grid_acc:9.2f} {plan_acc:9.2f}")
+
+    if args.learn:
+        planner.flush()
+    if not grid_scores:
+        return 1
+    print(f"\nTesseract calls: grid {grid_calls}, planner {planner_calls} "
+          f"({100 * planner_calls / max(grid_calls, 1):.0f}% of the grid)")
+    print(f"Mean word similarity to reference: grid {sum(grid_scores) / len(grid_scores):.3f}, "
+          f"planner {sum(planner_scores) / len(planner_scores):.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
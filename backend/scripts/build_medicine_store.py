@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Build the memory-mapped medicine store from the medicine CSV datasets.
+
+Run once per deployment (or whenever the CSVs change) so workers can map
+the store read-only at startup instead of parsing the CSVs:
+
+    python scripts/build_medicine_store.py
+    python scripts/build_medicine_store.py --out /srv/sanjeevani/medicine_store
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.medicine_store import DEFAULT_STORE_DIR, build_medicine_store, MedicineStore
+
+logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the columnar medicine store")
+    parser.add_argument("--out", default=DEFAULT_STORE_DIR, help=f"Store directory (default: {DEFAULT_STORE_DIR})")
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print("💊 Building medicine store")
+    print("=" * 70)
+
+    start = time.perf_counter()
+    manifest = build_medicine_store(args.out)
+    build_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    store = MedicineStore(args.out)
+    store.name_index().get("paracetamol")
+    open_ms = (time.perf_counter() - start) * 1000
+
+    size = sum(
+        os.path.getsize(os.path.join(args.out, f)) for f in os.listdir(args.out)
+    )
+    print(f"✅ {manifest['n_rows']} rows, {len(manifest['columns'])} columns")
+    for source in manifest["sources"]:
+        print(f"   - {source['file']}: {source['stop'] - source['start']} rows")
+    print(f"📦 Store size: {size / 1024 / 1024:.1f} MB at {args.out}")
+    print(f"⏱️  Build: {build_seconds:.1f} s, open + first lookup: {open_ms:.1f} ms")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
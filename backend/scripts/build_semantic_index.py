@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Build the BM25 symptom retrieval index used for the symptom prompt context.
+
+Indexes MEDICINE_KNOWLEDGE_BASE conditions and the medicine dataset
+indications. Run after changing the knowledge base or the medicine CSVs (the
+index is also rebuilt automatically on first use when stale):
+
+    python scripts/build_semantic_index.py
+    python scripts/build_semantic_index.py --query "loose motions" --query "headach"
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.symptoms_recommendation.semantic_index import (
+    DEFAULT_INDEX_PATH,
+    SemanticIndex,
+    build_semantic_index,
+)
+
+logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the symptom retrieval index")
+    parser.add_argument("--out", default=DEFAULT_INDEX_PATH, help=f"Index file (default: {DEFAULT_INDEX_PATH})")
+    parser.add_argument("--query", action="append", default=[], help="Symptom to test against the built index")
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print("🔎 Building symptom retrieval index")
+    print("=" * 70)
+
+    start = time.perf_counter()
+    index = build_semantic_index(args.out)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    search = SemanticIndex.load(args.out)
+    load_ms = (time.perf_counter() - start) * 1000
+
+    kinds = {}
+    for doc in index["docs"]:
+        kinds[doc["kind"]] = kinds.get(doc["kind"], 0) + 1
+    print(f"✅ {len(index['docs'])} documents ({', '.join(f'{n} {k}' for k, n in kinds.items())}), "
+          f"{len(index['postings'])} terms")
+    print(f"📦 Index size: {os.path.getsize(args.out) / 1024:.1f} KB at {args.out}")
+    print(f"⏱️  Build: {build_ms:.0f} ms, load: {load_ms:.1f} ms")
+
+    for query in args.query:
+        hits = search.top_documents([query])
+        matches = ", ".join(f"{doc['key']} ({score:.1f})" for doc, score in hits) or "no match"
+        print(f"   '{query}' -> {matches}")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Import-time profiler for the SMA Sanjeevani backend
+
+Imports app.main in a fresh interpreter with `python -X importtime`,
+reports the slowest modules and fails (exit code 1) when the total
+exceeds the startup budget.
+
+Usage:
+    python scripts/profile_import_time.py
+    python scripts/profile_import_time.py --features auth,dashboard,reminders --budget-ms 800
+    python scripts/profile_import_time.py --module app.api.routes.routes_auth --top 30
+"""
+import argparse
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# Libraries that must never be imported by an API-only worker
+HEAVY_MODULES = [
+    "cv2", "easyocr", "pytesseract", "paddleocr", "torch", "transformers",
+    "pandas", "googletrans", "gtts", "scipy", "skimage",
+]
+
+
+def run_importtime(module: str, features: str) -> str:
+    """Import `module` in a subprocess and return the -X importtime log"""
+    env = os.environ.copy()
+    env["ENABLED_FEATURES"] = features
+    # Keep the database out of the measurement
+    env.setdefault("DB_STARTUP_MODE", "lazy")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        print(result.stderr[-2000:])
+        raise SystemExit(f"❌ Importing {module} failed (exit code {result.returncode})")
+    return result.stderr
+
+
+def parse_importtime(log: str):
+    """Parse `import time: self [us] | cumulative | imported package` lines"""
+    entries = []
+    for line in log.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line.split(":", 1)[1].split("|", 2)
+            # Nested imports are indented by two spaces per level
+            entries.append((name[1:].rstrip(), int(self_us), int(cumulative_us)))
+        except ValueError:
+            continue
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile backend import time")
+    parser.add_argument("--module", default="app.main", help="Module to import (default: app.main)")
+    parser.add_argument("--features", default=os.getenv("ENABLED_FEATURES", "all"),
+                        help="ENABLED_FEATURES value for the run (default: all)")
+    parser.add_argument("--budget-ms", type=float, default=1000.0,
+                        help="Fail if total import time exceeds this (default: 1000 ms)")
+    parser.add_argument("--top", type=int, default=20, help="Number of slowest modules to show")
+    parser.add_argument("--forbid-heavy", action="store_true",
+                        help="Fail if any heavy ML/OCR library gets imported")
+    args = parser.parse_args()
+
+    entries = parse_importtime(run_importtime(args.module, args.features))
+    top_level = [e for e in entries if not e[0].startswith(" ")]
+    total_ms = sum(cumulative for _, _, cumulative in top_level) / 1000
+
+    print("=" * 70)
+    print(f"📦 Import profile: {args.module}  (ENABLED_FEATURES={args.features})")
+    print("=" * 70)
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for name, self_us, cumulative_us in sorted(entries, key=lambda e: e[2], reverse=True)[:args.top]:
+        print(f"{cumulative_us / 1000:14.1f} {self_us / 1000:9.1f}  {name}")
+
+    imported = {name.strip() for name, _, _ in entries}
+    heavy_loaded = [m for m in HEAVY_MODULES if m in imported]
+
+    print("-" * 70)
+    print(f"⏱️  Total import time: {total_ms:.0f} ms (budget {args.budget_ms:.0f} ms)")
+    print(f"🏋️  Heavy libraries imported: {', '.join(heavy_loaded) or 'none'}")
+
+    failed = False
+    if total_ms > args.budget_ms:
+        print(f"❌ Import budget exceeded by {total_ms - args.budget_ms:.0f} ms")
+        failed = True
+    if args.forbid_heavy and heavy_loaded:
+        print("❌ Heavy libraries imported at startup")
+        failed = True
+    if not failed:
+        print("✅ Within startup budget")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
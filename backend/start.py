@@ -28,10 +28,26 @@ os.chdir(backend_dir)
 # Add backend directory to Python path
 sys.path.insert(0, str(backend_dir))
 
-if __name__ == "__main__":
+ROLES = ["api", "ocr", "llm", "tts"]
+
+# Default port per role. Kept here rather than under app/: importing app
+# modules loads app.core.config, whose settings read WORKER_ROLE at import
+# time, before run_role() has set it.
+ROLE_PORTS = {
+    "api": 8000,
+    "ocr": 8001,
+    "llm": 8002,
+    "tts": 8003,
+}
+
+
+def run_role(role: str, port: int):
+    """Run a single worker role (or "all") in this process"""
+    # Must be set before uvicorn imports app.main (and with it app.core.config)
+    os.environ["WORKER_ROLE"] = role
     import uvicorn
     
-    print("🚀 Starting SMA Sanjeevani Backend...")
+    print(f"🚀 Starting SMA Sanjeevani Backend (role: {role}, port: {port})...")
     print(f"📁 Working directory: {backend_dir}")
     print(f"🐍 Python version: {sys.version}")
     print("-" * 50)
@@ -39,7 +55,68 @@ if __name__ == "__main__":
     uvicorn.run(
         "app.main:app",
         host="0.0.0.0",
-        port=8000,
+        port=port,
         reload=False,  # Disable reload to keep server stable during testing
         log_level="info"
     )
+
+
+def run_split(host: str = "127.0.0.1"):
+    """
+    Launch every role as its own process. The api role is the public entry
+    point and forwards OCR/LLM/TTS requests to the other workers over HTTP.
+    """
+    import subprocess
+    import time
+    
+    env = os.environ.copy()
+    env.setdefault("OCR_WORKER_URL", f"http://{host}:{ROLE_PORTS['ocr']}")
+    env.setdefault("LLM_WORKER_URL", f"http://{host}:{ROLE_PORTS['llm']}")
+    env.setdefault("TTS_WORKER_URL", f"http://{host}:{ROLE_PORTS['tts']}")
+    
+    processes = {}
+    for role in ROLES:
+        role_env = dict(env, WORKER_ROLE=role)
+        processes[role] = subprocess.Popen(
+            [sys.executable, str(Path(__file__).resolve()), "--role", role],
+            env=role_env,
+        )
+        print(f"✅ Launched {role} worker (pid {processes[role].pid}, port {ROLE_PORTS[role]})")
+    
+    try:
+        while True:
+            for role, proc in processes.items():
+                if proc.poll() is not None:
+                    print(f"❌ {role} worker exited with code {proc.returncode}, stopping all workers")
+                    raise KeyboardInterrupt
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("🛑 Stopping workers...")
+        for proc in processes.values():
+            if proc.poll() is None:
+                proc.terminate()
+        for proc in processes.values():
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+
+if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Start the SMA Sanjeevani backend")
+    parser.add_argument(
+        "--role",
+        default=os.getenv("WORKER_ROLE", "all"),
+        choices=["all", "split"] + ROLES,
+        help="all = single process (default); api/ocr/llm/tts = one worker role; "
+             "split = launch every role as a separate process",
+    )
+    parser.add_argument("--port", type=int, default=None, help="Port (defaults to the role's port)")
+    args = parser.parse_args()
+    
+    if args.role == "split":
+        run_split()
+    else:
+        run_role(args.role, args.port or ROLE_PORTS.get(args.role, 8000))
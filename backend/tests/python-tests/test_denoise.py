@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""Test noise estimation and tiered denoise selection"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+import cv2
+import numpy as np
+
+from app.services.denoise import denoise, estimate_noise, plan_denoise
+
+
+def _page(sigma: float) -> np.ndarray:
+    page = np.full((800, 600), 245, dtype=np.uint8)
+    for row in range(14):
+        cv2.putText(page, "Paracetamol 500 mg", (30, 50 + row * 52), cv2.FONT_HERSHEY_SIMPLEX, 1.0, 20, 2)
+    noise = np.random.default_rng(0).normal(0, sigma, page.shape)
+    return np.clip(page + noise, 0, 255).astype(np.uint8)
+
+
+def test_estimate_ignores_text_edges():
+    for sigma in (0, 3, 8):
+        assert abs(estimate_noise(_page(sigma)) - sigma) < 1.0, sigma
+    print("[PASS] Noise sigma is measured from quiet tiles, not text strokes")
+
+
+def test_tier_follows_noise():
+    assert plan_denoise(0.5, 10).method == "none"
+    assert plan_denoise(3.0, 10).method == "bilateral"
+    plan = plan_denoise(20.0, 10)
+    assert plan.method == "nlmeans" and plan.h == 10 and plan.search_window == 21
+    assert plan_denoise(6.0, 10).h < 10
+
+    clean = _page(0)
+    assert denoise(clean, 10) is clean
+    print("[PASS] Clean images skip denoising, NL-means strength is capped by the caller")
+
+
+if __name__ == "__main__":
+    test_estimate_ignores_text_edges()
+    test_tier_follows_noise()
+    print("\n*** ALL DENOISE TESTS PASSED ***")
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""Test the LLM circuit breaker and the shared per-request retry budget"""
+
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+import requests
+
+from app.services import llm_session
+from app.services.llm_resilience import (
+    CircuitBreaker, LLMUnavailableError, get_breaker, retry_budget, spend_retry,
+)
+
+
+def rejected(breaker):
+    try:
+        breaker.before_call()
+        return False
+    except LLMUnavailableError:
+        return True
+
+
+def test_breaker_opens_and_probes():
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_seconds=0.1)
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record_failure("ConnectionError")
+    assert breaker.stats()["state"] == "open" and rejected(breaker)
+
+    time.sleep(0.15)
+    breaker.before_call()          # the single half-open probe
+    assert rejected(breaker)       # everyone else still fails fast
+    breaker.record_failure("Timeout")
+    assert rejected(breaker)
+
+    time.sleep(0.15)
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.stats()["state"] == "closed" and not rejected(breaker)
+    print("[PASS] Circuit opens, probes half-open and closes on recovery")
+
+
+class _Response:
+    def __init__(self, status_code=200, lines=(), error=None):
+        self.status_code = status_code
+        self.text = ""
+        self._lines, self._error = lines, error
+
+    def iter_lines(self):
+        yield from self._lines
+        if self._error:
+            raise self._error
+
+    def close(self):
+        pass
+
+
+def _call(outcome, stream: bool = False):
+    """One session exchange whose requests.post returns (or raises) outcome, reading the body"""
+    def post(*args, **kwargs):
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+    llm_session.requests.post = post
+    session = llm_session.LLMSession("http://ollama-test:11434", "phi4", keep_alive="30m")
+    try:
+        with session._exchange({}, "medical_qa", 1, "/api/chat", stream=stream) as response:
+            list(response.iter_lines())
+    except requests.RequestException:
+        pass
+
+
+def test_read_timeouts_do_not_open_breaker():
+    original = requests.post
+    breaker = get_breaker("http://ollama-test:11434")
+    try:
+        # A slow but healthy model: blocking calls time out reading, streamed ones time out
+        # mid-body (requests raises a ConnectionError there) after the 200 headers arrived
+        for _ in range(breaker.failure_threshold + 1):
+            _call(requests.ReadTimeout("read timed out"))
+            _call(_Response(lines=[b"{}"], error=requests.ConnectionError("Read timed out")), stream=True)
+        assert breaker.stats()["state"] == "closed" and breaker.stats()["consecutive_failures"] == 0
+
+        # Ollama down: refused connections, connect timeouts and 5xx open it
+        _call(requests.ConnectionError("refused"))
+        _call(requests.ConnectTimeout("connect timed out"))
+        _call(_Response(status_code=503))
+        assert breaker.stats()["state"] == "open"
+    finally:
+        llm_session.requests.post = original
+        breaker.record_success()
+    print("[PASS] Read timeouts are neutral; connection failures and 5xx open the circuit")
+
+
+def test_retry_budget_is_shared_by_nested_loops():
+    with retry_budget(2):
+        assert spend_retry()
+        with retry_budget(5):      # nested loop joins the outer budget
+            assert spend_retry()
+            assert not spend_retry()
+    assert spend_retry()           # no budget outside a request scope
+    print("[PASS] Nested retry loops share one budget")
+
+
+if __name__ == "__main__":
+    test_breaker_opens_and_probes()
+    test_read_timeouts_do_not_open_breaker()
+    test_retry_budget_is_shared_by_nested_loops()
+    print("\n*** ALL LLM RESILIENCE TESTS PASSED ***")
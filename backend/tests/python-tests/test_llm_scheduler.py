@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""Test the LLM admission scheduler (priorities, reserved slot, queue deadlines)"""
+
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from app.services.llm_scheduler import LLMOverloadedError, LLMScheduler
+
+
+def hold(scheduler, endpoint, seconds, order=None):
+    with scheduler.slot(endpoint):
+        if order is not None:
+            order.append(endpoint)
+        time.sleep(seconds)
+
+
+def start(target, *args):
+    thread = threading.Thread(target=target, args=args)
+    thread.start()
+    return thread
+
+
+def test_priority_order():
+    """Waiting Q&A is served before recommendations and document parsing"""
+    scheduler = LLMScheduler(max_concurrency=1, deadlines={"interactive": 5, "recommendation": 5, "document": 5})
+    order = []
+    threads = [start(hold, scheduler, "hospital_report", 0.2)]
+    time.sleep(0.05)
+    for endpoint in ("hospital_report", "symptoms", "medical_qa"):
+        threads.append(start(hold, scheduler, endpoint, 0.05, order))
+        time.sleep(0.02)
+    for thread in threads:
+        thread.join()
+    assert order == ["medical_qa", "symptoms", "hospital_report"], order
+    print("[PASS] Queued calls granted by priority class")
+
+
+def test_document_parsing_leaves_a_slot():
+    scheduler = LLMScheduler(max_concurrency=2, deadlines={"interactive": 1, "recommendation": 1, "document": 0.1})
+    thread = start(hold, scheduler, "hospital_report", 0.3)
+    time.sleep(0.05)
+    try:
+        scheduler.acquire("handwritten_prescription")
+        raise AssertionError("second document call should not take the reserved slot")
+    except LLMOverloadedError:
+        pass
+    # Interactive work still gets the reserved slot immediately
+    priority = scheduler.acquire("medical_qa")
+    scheduler.release(priority)
+    thread.join()
+    print("[PASS] Document parsing cannot take the last slot")
+
+
+def test_deadline_rejects_with_metrics():
+    scheduler = LLMScheduler(max_concurrency=1, deadlines={"interactive": 0.1, "recommendation": 1, "document": 1})
+    thread = start(hold, scheduler, "symptoms", 0.3)
+    time.sleep(0.05)
+    try:
+        scheduler.acquire("medical_qa")
+        raise AssertionError("expected LLMOverloadedError")
+    except LLMOverloadedError as e:
+        assert e.retry_after >= 1
+    thread.join()
+    stats = scheduler.stats()
+    assert stats["classes"]["interactive"]["rejected"] == 1
+    assert stats["running"] == 0 and stats["queue_depth"] == 0
+    print("[PASS] Queue deadline sheds load and is counted")
+
+
+def test_full_queue_rejects_immediately():
+    """Waiting callers are capped (each blocks a threadpool worker); interactive keeps headroom"""
+    scheduler = LLMScheduler(max_concurrency=1, deadlines={"interactive": 5, "recommendation": 5, "document": 5},
+                             max_queued=4)
+    threads = [start(hold, scheduler, "medical_qa", 0.3)]
+    time.sleep(0.05)
+    threads += [start(hold, scheduler, "hospital_report", 0.01) for _ in range(3)]
+    time.sleep(0.05)
+    assert scheduler.stats()["queue_depth"] == 3
+
+    started = time.monotonic()
+    try:
+        scheduler.acquire("symptoms")
+        raise AssertionError("expected LLMOverloadedError")
+    except LLMOverloadedError:
+        assert time.monotonic() - started < 0.05
+    # The last queue place is kept for interactive calls
+    threads.append(start(hold, scheduler, "medical_qa", 0.01))
+    time.sleep(0.05)
+    assert scheduler.stats()["queue_depth"] == 4
+    for thread in threads:
+        thread.join()
+    assert scheduler.stats()["classes"]["recommendation"]["rejected"] == 1
+    print("[PASS] Full queue rejects without waiting; interactive calls can still queue")
+
+
+if __name__ == "__main__":
+    test_priority_order()
+    test_document_parsing_leaves_a_slot()
+    test_deadline_rejects_with_metrics()
+    test_full_queue_rejects_immediately()
+    print("\n*** ALL LLM SCHEDULER TESTS PASSED ***")
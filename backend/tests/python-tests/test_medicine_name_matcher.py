@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""Test OCR-confusion-aware medicine name matching"""
+
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from app.services.medicine_name_matcher import MedicineNameMatcher, ocr_edit_distance
+
+NAMES = ["paracetamol", "dolo 650", "dolo", "cetirizine", "amoxicillin", "metformin", "omeprazole"]
+
+
+def test_confusions_cost_less_than_other_edits():
+    assert ocr_edit_distance("paracetarno1", "paracetamol") < ocr_edit_distance("paracetaxyz", "paracetamol")
+    assert ocr_edit_distance("0meprazo1e", "omeprazole") == 0.5
+    assert ocr_edit_distance("rnetformin", "metformin") == 0.25
+    print("[PASS] OCR confusions (0/o, 1/l, rn/m) are cheap edits")
+
+
+def test_matches_misread_names_in_ocr_text():
+    matcher = MedicineNameMatcher(NAMES)
+    match = matcher.match("Each tablet contains PARACETARNO1 IP 500 mg")
+    assert match.name == "paracetamol" and match.confident
+
+    # The dose picks the strength; only the brand is compared
+    match = matcher.match("D0LO 650 Tablets")
+    assert match.name == "dolo 650" and match.matched_text == "d0lo"
+    assert matcher.match("Dolo Tablets").name == "dolo"
+
+    assert matcher.match("Batch No 2231 Exp 06/2027 MRP Rs 30") is None
+    print("[PASS] Misread names are found over word n-grams, doses only break ties")
+
+
+def _store_names(count: int):
+    """Store-sized index: random brands with the doses and forms real names share"""
+    rng = random.Random(0)
+    doses = ["5mg", "10mg", "40mg", "100mg", "250mg", "500mg", "650mg", "1g", "5ml", "0.5%"]
+    forms = ["tablet", "capsule", "syrup", "injection", "cream", "drops", "suspension", "gel"]
+    names = []
+    for _ in range(count):
+        brand = "".join(rng.choice("abcdefghjkmnprtuvwxyz") for _ in range(rng.randint(5, 10)))
+        names.append(f"{brand} {rng.choice(doses)} {rng.choice(forms)}")
+    # Short brands sharing the dose and form words of the real names below
+    names += ["ouip 500mg tablet", "iklp 500mg tablet", "dolx 650 tablet"]
+    return names + ["paracetamol 500mg tablet", "dolo 650 tablet", "amoxicillin 250mg capsule"]
+
+
+def test_generic_words_do_not_carry_matches_in_large_index():
+    started = time.perf_counter()
+    matcher = MedicineNameMatcher(_store_names(250_000))
+    built = time.perf_counter() - started
+
+    texts = {
+        "Batch B2231 Paracetarno1 IP 500mg tablet Mfg by Cipla Ltd": "paracetamol 500mg tablet",
+        "D0LO 650 Tablets IP Micro Labs Limited": "dolo 650 tablet",
+        "Amoxici11in Capsules IP 250mg keep out of reach of children": "amoxicillin 250mg capsule",
+    }
+    slowest = 0.0
+    for text, name in texts.items():
+        started = time.perf_counter()
+        match = matcher.match(text)
+        slowest = max(slowest, time.perf_counter() - started)
+        assert match is not None and match.name == name and match.confident, (text, match)
+    # Dose and form words alone never identify a medicine
+    assert matcher.match("IP 500mg tablet 10 tablets") is None
+    assert slowest < 0.25, f"lookup took {slowest:.2f}s"
+    print(f"[PASS] {len(matcher.names)} names indexed in {built:.1f}s, lookups <= {slowest * 1000:.0f}ms")
+
+
+if __name__ == "__main__":
+    test_confusions_cost_less_than_other_edits()
+    test_matches_misread_names_in_ocr_text()
+    test_generic_words_do_not_carry_matches_in_large_index()
+    print("\n*** ALL MEDICINE NAME MATCHER TESTS PASSED ***")
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""Test indexed symptom retrieval in the medicine RAG system against a fixture knowledge base"""
+
+import csv
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from app.services.symptoms_recommendation.medicine_rag_system import MedicineRAGSystem
+
+FIXTURE = Path(__file__).resolve().parent / "fixtures" / "symptom_conditions.csv"
+
+PROBES = [
+    "fever", "Feverish", "high temperature", "temperat", "i have a runny nose", "nose", "migraine",
+    "chest", "chest burning", "loose motions since morning", "febrile headache", "cough", "rash", "",
+]
+
+
+def load_knowledge_base(path: Path = FIXTURE) -> dict:
+    """Knowledge base from one CSV row per (condition, medicine); list columns are '|'-separated"""
+    knowledge_base = {}
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            entry = knowledge_base.setdefault(row["key"], {
+                "condition": row["condition"],
+                "synonyms": row["synonyms"].split("|"),
+                "medicines": [],
+                "home_remedies": row["home_remedies"].split("|"),
+                "warning_signs": row["warning_signs"].split("|"),
+            })
+            entry["medicines"].append({
+                "name": row["medicine"],
+                "common_brands": [row["brand"]],
+                "dosage": row["dosage"],
+                "contraindications": row["contraindications"].split("|"),
+            })
+    return knowledge_base
+
+
+def fixture_rag() -> MedicineRAGSystem:
+    rag = MedicineRAGSystem()
+    rag.knowledge_base = load_knowledge_base()
+    rag.build_index()
+    return rag
+
+
+def linear_scan(knowledge_base: dict, symptom: str):
+    """Reference: the original first-match scan (exact key, then synonym either way)"""
+    symptom_lower = symptom.lower().strip()
+    if symptom_lower in knowledge_base:
+        return knowledge_base[symptom_lower]
+    for condition_data in knowledge_base.values():
+        for synonym in condition_data.get("synonyms", []):
+            if symptom_lower in synonym or synonym in symptom_lower:
+                return condition_data
+    return None
+
+
+def test_lookup_matches_linear_scan():
+    rag = fixture_rag()
+    for symptom in PROBES:
+        expected = linear_scan(rag.knowledge_base, symptom)
+        assert rag.get_medicines_for_symptom(symptom) is expected, symptom
+    assert rag.get_medicines_for_symptom("i have a runny nose")["condition"] == "Common Cold"
+    assert rag.get_medicines_for_symptom("temperat")["condition"] == "Fever/Pyrexia"
+    # Ambiguous hit keeps the first condition in knowledge base order
+    assert rag.get_medicines_for_symptom("chest")["condition"] == "Cough"
+    assert rag.get_medicines_for_symptom("rash") is None
+    print(f"[PASS] Indexed lookup agrees with the linear scan on {len(PROBES)} symptoms")
+
+
+def test_ranking_and_context():
+    rag = fixture_rag()
+    ranked = rag.rank_conditions(["loose motions", "fever"], top_k=3)
+    assert {key for key, _ in ranked[:2]} == {"diarrhea", "fever"}, ranked
+
+    # Repeated and differently cased symptoms retrieve each condition once
+    context = rag.format_for_llm_context(["Fever", "febrile", "blocked nose"])
+    assert context.count("Fever/Pyrexia") == 1 and "## 2. Common Cold" in context
+    assert "Paracetamol" in context and "Cetirizine" in context
+    # No synonym hit: falls back to the best token match
+    assert rag.get_medicines_for_symptom("burning sensation") is None
+    assert "Acidity/Heartburn" in rag.format_for_llm_context(["burning sensation"])
+    assert rag.format_for_llm_context([" FEVER "]) is rag.format_for_llm_context(["fever"])
+    print("[PASS] Multi-symptom ranking, token fallback and cached context")
+
+
+def test_medicines_deduplicated():
+    rag = fixture_rag()
+    names = [med["name"] for med in rag.get_medicines_list(["fever", "headache", "feverish"])]
+    assert names == ["Paracetamol", "Ibuprofen"], names
+    print("[PASS] Medicines shared by conditions are listed once")
+
+
+if __name__ == "__main__":
+    test_lookup_matches_linear_scan()
+    test_ranking_and_context()
+    test_medicines_deduplicated()
+    print("\n*** ALL MEDICINE RAG SYSTEM TESTS PASSED ***")
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""Test the columnar medicine store: build from CSV, lookups, group indexes, matcher tables, concurrent builds"""
+
+import csv
+import multiprocessing
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from app.services import medicine_store
+from app.services.medicine_name_matcher import MedicineNameMatcher
+from app.services.medicine_store import (
+    MERGE_FILL_VALUE,
+    MedicineRecord,
+    MedicineStore,
+    build_medicine_store,
+    ensure_medicine_store,
+    is_store_stale,
+)
+
+GENERIC_ROWS = [
+    {"Name": "Paracetamol", "Category": "Analgesic", "Indication": "Fever", "Strength": "500 mg"},
+    {"Name": "Ibuprofen", "Category": "Analgesic", "Indication": "Pain", "Strength": "400 mg"},
+    {"Name": "Amoxicillin", "Category": "Antibiotic", "Indication": "Infection", "Strength": ""},
+    {"Name": "Cetirizine", "Category": "Antihistamine", "Indication": "Allergy", "Strength": "10 mg"},
+]
+
+INDIA_ROWS = [
+    {"name": "Dolo 650 Tablet", "manufacturer_name": "Micro Labs", "type": "allopathy"},
+    {"name": "Azithral 500 Tablet", "manufacturer_name": "Alembic", "type": "allopathy"},
+    {"name": "Crocin Advance Tablet", "manufacturer_name": "GSK", "type": "allopathy"},
+]
+
+
+def _write_csv(path: str, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+@contextmanager
+def _datasets():
+    """Point the store at two small CSVs in a temporary directory (absolute paths resolve as is)"""
+    original = medicine_store.DATASET_SOURCES
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            yield _write_datasets(tmp)
+        finally:
+            medicine_store.DATASET_SOURCES = original
+
+
+def _write_datasets(tmp: str) -> str:
+    generic = os.path.join(tmp, "generic.csv")
+    india = os.path.join(tmp, "india.csv")
+    _write_csv(generic, GENERIC_ROWS)
+    _write_csv(india, INDIA_ROWS)
+    medicine_store.DATASET_SOURCES = [
+        ("generic_database", "1.0", generic),
+        ("india_database", "2.0", india),
+    ]
+    return os.path.join(tmp, "medicine_store")
+
+
+def test_build_and_lookup():
+    with _datasets() as store_dir:
+        manifest = build_medicine_store(store_dir)
+        assert manifest["n_rows"] == len(GENERIC_ROWS) + len(INDIA_ROWS)
+        assert not is_store_stale(store_dir)
+
+        store = MedicineStore(store_dir)
+        row = store.name_index().get("dolo 650 tablet")
+        assert row == len(GENERIC_ROWS)
+        assert store.name_index("generic_database").get("dolo 650 tablet") is None
+        assert store.name_index("india_database").get("dolo 650 tablet") == row
+        assert store.row_range("india_database") == range(len(GENERIC_ROWS), len(GENERIC_ROWS) + len(INDIA_ROWS))
+
+        # Cells missing after the merge take the fill value like the pandas fillna did
+        assert store.value("Category", row) == MERGE_FILL_VALUE
+        assert store.value("manufacturer_name", row) == "Micro Labs"
+        assert store.value("source", row) == "india_database"
+        assert store.names.find_substring("azithral") == row + 1
+        del store
+    print("[PASS] Store built from CSV, names and per-source indexes resolve rows")
+
+
+def test_medicine_record():
+    with _datasets() as store_dir:
+        build_medicine_store(store_dir)
+        store = MedicineStore(store_dir)
+        record = store.record(store.name_index().get("paracetamol"), ["Name", "Category", "Strength"])
+        assert isinstance(record, MedicineRecord)
+        assert record["Name"] == "Paracetamol" and len(record) == 3
+        assert record.to_dict() == {"Name": "Paracetamol", "Category": "Analgesic", "Strength": "500 mg"}
+        try:
+            record["manufacturer_name"]
+            raise AssertionError("column outside the view must raise KeyError")
+        except KeyError:
+            pass
+        del record, store
+    print("[PASS] MedicineRecord reads values from the column arrays")
+
+
+def test_group_indexes():
+    with _datasets() as store_dir:
+        build_medicine_store(store_dir)
+        store = MedicineStore(store_dir)
+        assert store.has_group_index("Category") and store.has_group_index("manufacturer_name")
+        assert not store.has_group_index("Strength")
+
+        category = store.group_index("Category")
+        assert list(category.rows_equal("analgesic")) == [0, 1]
+        assert list(category.rows_equal("antiviral")) == []
+        assert list(category.rows_containing("anti")) == [2, 3]
+        assert "not specified" in category.key_list()
+
+        manufacturer = store.group_index("manufacturer_name")
+        assert list(manufacturer.rows_equal("gsk")) == [len(GENERIC_ROWS) + 2]
+        del category, manufacturer, store
+    print("[PASS] Group indexes return ascending row ids by value")
+
+
+def test_stale_after_csv_change():
+    with _datasets() as store_dir:
+        assert ensure_medicine_store(store_dir) is True
+        assert ensure_medicine_store(store_dir) is False
+
+        generic = medicine_store.DATASET_SOURCES[0][2]
+        _write_csv(generic, GENERIC_ROWS[:2])
+        os.utime(generic, (0, 0))
+        assert is_store_stale(store_dir)
+        assert ensure_medicine_store(store_dir) is True
+        assert MedicineStore(store_dir).n_rows == 2 + len(INDIA_ROWS)
+    print("[PASS] Changed CSVs mark the store stale and it is rebuilt")
+
+
+def test_matcher_tables_mapped():
+    with _datasets() as store_dir:
+        build_medicine_store(store_dir)
+        store = MedicineStore(store_dir)
+        keys = store.name_index().keys
+        mapped = MedicineNameMatcher(keys, store.matcher_tables())
+        built = MedicineNameMatcher(list(keys))
+        for text in ("D0LO 650 Tablets IP", "Paracetarno1 IP 500 mg", "Azithra1 500", "Vitamin C 500 mg"):
+            expected = built.match(text)
+            assert mapped.match(text) == expected, text
+        assert mapped.match("D0LO 650 Tablets IP").name == "dolo 650 tablet"
+        del mapped, keys, store
+    print("[PASS] Precompiled matcher tables match like an index built in memory")
+
+
+def _ensure(store_dir: str, results):
+    results.put(ensure_medicine_store(store_dir))
+
+
+def test_concurrent_builds_serialized():
+    if medicine_store.fcntl is None:
+        print("[SKIP] No fcntl: concurrent builds are not serialized on this platform")
+        return
+    context = multiprocessing.get_context("fork")
+    with _datasets() as store_dir:
+        results = context.Queue()
+        workers = [context.Process(target=_ensure, args=(store_dir, results)) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(30)
+            assert worker.exitcode == 0, worker.exitcode
+        built = [results.get(timeout=5) for _ in workers]
+        assert built.count(True) == 1, built
+        assert MedicineStore(store_dir).n_rows == len(GENERIC_ROWS) + len(INDIA_ROWS)
+    print("[PASS] Workers starting together build the store once")
+
+
+if __name__ == "__main__":
+    test_build_and_lookup()
+    test_medicine_record()
+    test_group_indexes()
+    test_stale_after_csv_change()
+    test_matcher_tables_mapped()
+    test_concurrent_builds_serialized()
+    print("\n*** ALL MEDICINE STORE TESTS PASSED ***")
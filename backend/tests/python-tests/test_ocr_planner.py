@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""Test adaptive OCR pass planning: early stop, scoring and learned orderings"""
+
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from app.services.ocr_planner import OCRPlanner, score_text
+
+PASSES = [(variant, psm) for variant in ("gray", "otsu", "inverted") for psm in (3, 6)]
+VOCABULARY = frozenset({"paracetamol", "cetirizine"})
+
+
+def _recognizer(readings, calls):
+    def recognize(variant, psm):
+        calls.append((variant, psm))
+        return readings.get((variant, psm), ("~~ ,. |", 0.2))
+    return recognize
+
+
+def test_score_prefers_confident_known_names():
+    clean = score_text("Paracetamol Tablets IP 500 mg", 0.9, VOCABULARY)
+    noisy = score_text("Pa7a ce% ~| ta8 l", 0.4, VOCABULARY)
+    unknown = score_text("Batch Expiry Price", 0.9, VOCABULARY)
+    assert clean > unknown > noisy and score_text("", None, VOCABULARY) == 0.0
+    print("[PASS] Confident text with a known medicine name scores highest")
+
+
+def test_stops_at_first_accepted_pass():
+    planner = OCRPlanner(PASSES, stats_path=None, accept_score=0.7, vocabulary=VOCABULARY, explore_rate=0)
+    calls = []
+    result = planner.run("normal", _recognizer({("gray", 3): ("Cetirizine Tablets", 0.92)}, calls))
+    assert calls == [("gray", 3)] and result.calls == 1 and "Cetirizine" in result.text
+
+    calls = []
+    readings = {("otsu", 6): ("Cetirizine Tablets", 0.9), ("inverted", 6): ("Cetirizine Tablets 10 mg", 0.95)}
+    result = planner.run("normal", _recognizer(readings, calls), exhaustive=True, learn=False)
+    assert len(calls) == len(PASSES) and result.best.variant == "inverted"
+    print("[PASS] Search stops at the first good pass; exhaustive mode runs the grid")
+
+
+def test_learns_ordering_per_image_type():
+    with tempfile.TemporaryDirectory() as tmp:
+        stats_path = os.path.join(tmp, "stats.json")
+        planner = OCRPlanner(PASSES, stats_path=stats_path, accept_score=0.7, vocabulary=VOCABULARY,
+                             explore_rate=0, save_every=2)
+        readings = {("inverted", 6): ("Paracetamol 500", 0.9)}
+        for _ in range(3):
+            planner.run("dark", _recognizer(readings, []))
+        # Saved in batches: the third search is still pending
+        with open(stats_path, encoding="utf-8") as f:
+            assert json.load(f)["dark"]["inverted|6"] == [2, 2]
+        planner.flush()
+
+        reloaded = OCRPlanner(PASSES, stats_path=stats_path, accept_score=0.7, vocabulary=VOCABULARY, explore_rate=0)
+        assert reloaded.order("dark")[0] == ("inverted", 6)
+        assert reloaded.order("normal") == PASSES
+
+        calls = []
+        reloaded.run("dark", _recognizer(readings, calls))
+        assert calls == [("inverted", 6)]
+    print("[PASS] Winning passes move to the front for their image type and persist")
+
+
+def test_processes_merge_stats_and_explore():
+    with tempfile.TemporaryDirectory() as tmp:
+        stats_path = os.path.join(tmp, "stats.json")
+        # Two worker processes sharing one stats file
+        first, second = (
+            OCRPlanner(PASSES, stats_path=stats_path, accept_score=0.7, vocabulary=VOCABULARY, explore_rate=0)
+            for _ in range(2)
+        )
+        first.run("glare", _recognizer({("gray", 3): ("Paracetamol 500", 0.9)}, []))
+        second.run("glare", _recognizer({("gray", 3): ("Paracetamol 500", 0.9)}, []))
+        first.flush()
+        second.flush()
+        with open(stats_path, encoding="utf-8") as f:
+            assert json.load(f)["glare"]["gray|3"] == [2, 2]
+        assert second.order("glare")[0] == ("gray", 3)
+
+        # An explored search starts somewhere other than the learned winner
+        explorer = OCRPlanner(PASSES, stats_path=None, accept_score=0.7, vocabulary=VOCABULARY, explore_rate=1)
+        explorer._stats = second._stats
+        calls = []
+        explorer.run("glare", _recognizer({}, calls))
+        assert calls[0] != ("gray", 3) and len(calls) == len(PASSES)
+    print("[PASS] Stats from several processes add up; exploration tries other passes first")
+
+
+if __name__ == "__main__":
+    test_score_prefers_confident_known_names()
+    test_stops_at_first_accepted_pass()
+    test_learns_ordering_per_image_type()
+    test_processes_merge_stats_and_explore()
+    print("\n*** ALL OCR PLANNER TESTS PASSED ***")
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""Test page rotation/skew estimation and single-warp correction"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+import cv2
+import numpy as np
+
+from app.services import orientation
+from app.services.orientation import Orientation, apply_orientation, estimate_orientation
+
+SAMPLE = next((Path(__file__).resolve().parents[2] / "test images").glob("*.webp"))
+
+
+def _page() -> np.ndarray:
+    page = np.full((1400, 1000, 3), 255, dtype=np.uint8)
+    lines = ["Rx Paracetamol 500 mg", "Take one tablet daily", "Amoxicillin 250 mg",
+             "Before food for 5 days", "Dr Sharma MBBS Reg 1234", "Follow up after a week"]
+    for row in range(24):
+        text = lines[row % len(lines)]
+        cv2.putText(page, text, (60, 80 + row * 52), cv2.FONT_HERSHEY_SIMPLEX, 1.1, (0, 0, 0), 2)
+    return page
+
+
+def test_detects_skew_and_quarter_turns():
+    page = _page()
+    for rotation, skew in [(0, 0.0), (0, 5.0), (0, -8.0), (90, 0.0), (180, 3.0), (270, -4.0)]:
+        rotated = apply_orientation(page, Orientation(rotation, skew))
+        found = estimate_orientation(rotated)
+        # Undoing the rotation must leave the text lines horizontal (upright or,
+        # without Tesseract OSD, possibly upside down)
+        residual = (found.angle + rotation + skew + 90) % 180 - 90
+        assert abs(residual) < 0.5, (rotation, skew, found)
+    print("[PASS] Skew and sideways pages are straightened within 0.5 degrees")
+
+
+def test_no_half_turn_without_osd():
+    real_osd = orientation.tesseract_pool.detect_orientation
+    try:
+        orientation.tesseract_pool.detect_orientation = lambda image: None
+        assert estimate_orientation(_page()).rotation == 0
+        upside_down = apply_orientation(_page(), Orientation(180, 0.0))
+        assert estimate_orientation(upside_down).rotation == 0
+        # A confident OSD reading is what turns a page over
+        orientation.tesseract_pool.detect_orientation = lambda image: (180, 12.0)
+        if orientation.tesseract_pool.is_available():
+            assert estimate_orientation(upside_down).rotation == 180
+    finally:
+        orientation.tesseract_pool.detect_orientation = real_osd
+    print("[PASS] Pages are only turned over on confident Tesseract OSD")
+
+
+def test_bundled_prescription_stays_upright():
+    # Upright handwritten prescription: capitals and descenders must not flip it
+    found = estimate_orientation(cv2.imread(str(SAMPLE)))
+    assert found.rotation == 0 and abs(found.skew) < 5, found
+    print(f"[PASS] Bundled handwritten prescription kept upright (skew {found.skew:.2f} degrees)")
+
+
+def test_upright_page_left_alone():
+    page = _page()
+    assert estimate_orientation(page).is_identity
+    assert apply_orientation(page, Orientation(0, 0.1)) is page
+    print("[PASS] Upright pages are returned without a warp")
+
+
+if __name__ == "__main__":
+    test_detects_skew_and_quarter_turns()
+    test_upright_page_left_alone()
+    test_no_half_turn_without_osd()
+    test_bundled_prescription_stays_upright()
+    print("\n*** ALL ORIENTATION TESTS PASSED ***")
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""Test memoized preprocessing nodes and per-scope graph sharing"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+import numpy as np
+
+from app.core.metrics import collect_stages
+from app.services.preprocessing_graph import (
+    GRAYSCALE, PreprocessGraph, preprocessing_graph, shared_preprocessing,
+)
+
+OTSU = (GRAYSCALE, ("denoise", 8), ("contrast", 1.5, 8), ("threshold_otsu",))
+ADAPTIVE = (GRAYSCALE, ("denoise", 8), ("contrast", 1.5, 8), ("threshold_adaptive", "mean", 21, 10))
+
+
+def _image() -> np.ndarray:
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 255, (120, 160, 3), dtype=np.uint8)
+
+
+def test_shared_prefix_computed_once():
+    graph = PreprocessGraph(_image())
+    with collect_stages() as stages:
+        otsu = graph.run(OTSU)
+        graph.run(ADAPTIVE)
+    assert len(graph) == 5  # grayscale, denoise, contrast + two thresholds
+    assert graph.run(OTSU) is otsu and set(np.unique(otsu)) <= {0, 255}
+    assert {"preprocess.grayscale", "preprocess.denoise", "preprocess.threshold_otsu"} <= set(stages)
+    print("[PASS] Variants reuse the shared grayscale -> denoise -> CLAHE nodes")
+
+
+def test_scope_shares_graph_by_content():
+    image = _image()
+    assert preprocessing_graph(image) is not preprocessing_graph(image)
+    with shared_preprocessing():
+        graph = preprocessing_graph(image)
+        assert preprocessing_graph(image.copy()) is graph
+        assert preprocessing_graph(np.zeros_like(image)) is not graph
+    print("[PASS] Same pixels share one graph inside a shared_preprocessing() scope")
+
+
+if __name__ == "__main__":
+    test_shared_prefix_computed_once()
+    test_scope_shares_graph_by_content()
+    print("\n*** ALL PREPROCESSING GRAPH TESTS PASSED ***")
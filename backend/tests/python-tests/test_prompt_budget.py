@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""Test prompt budgeting: variable sections are trimmed to the endpoint budget"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from app.services import prompt_budget
+from app.services.prompt_budget import (
+    TRUNCATION_MARKER,
+    estimate_tokens,
+    fit_prompt,
+    truncate_to_tokens,
+)
+
+SYSTEM = "You are a careful pharmacist."
+
+
+def _render(ocr_text: str) -> str:
+    return f"Read this prescription and list the medicines.\n\nOCR TEXT:\n{ocr_text}\n\nAnswer in JSON."
+
+
+def _long_ocr(lines: int = 400) -> str:
+    return "\n".join(f"Line {i}: Tab Paracetamol 500mg twice daily for {i} days" for i in range(lines))
+
+
+def test_short_input_unchanged():
+    text = "Tab Amoxicillin 500mg\nOne capsule three times daily"
+    assert truncate_to_tokens(text, 200) == text
+    assert fit_prompt("handwritten_prescription", _render, system=SYSTEM, ocr_text=text) == _render(text)
+    print("[PASS] Input within budget is passed through unchanged")
+
+
+def test_prompt_within_budget():
+    budget = prompt_budget.BUDGETS["handwritten_prescription"]
+    prompt = fit_prompt("handwritten_prescription", _render, system=SYSTEM, ocr_text=_long_ocr())
+    total = estimate_tokens(SYSTEM) + estimate_tokens(prompt)
+    assert total <= budget, f"{total} tokens > budget {budget}"
+    print(f"[PASS] Long OCR text fitted to the budget ({total}/{budget} tokens)")
+
+
+def test_only_variable_section_trimmed():
+    text = _long_ocr()
+    prompt = fit_prompt("handwritten_prescription", _render, system=SYSTEM, ocr_text=text)
+    template_start, template_end = _render("").split("\n\n\n")
+    assert prompt.startswith(template_start) and prompt.endswith(template_end)
+
+    fitted = prompt[len(template_start) + 1:-len(template_end) - 1]
+    assert TRUNCATION_MARKER in fitted
+    # Start and end of the OCR text kept around the marker
+    assert fitted.startswith("Line 0:") and fitted.rstrip().endswith("for 399 days"), fitted[-80:]
+    print("[PASS] Only the OCR text is trimmed, keeping its start and end")
+
+
+def test_head_only_keeps_start():
+    text = _long_ocr()
+    trimmed = truncate_to_tokens(text, 100, keep_tail=False)
+    assert estimate_tokens(trimmed) <= 100
+    assert text.startswith(trimmed) and TRUNCATION_MARKER not in trimmed
+    print("[PASS] Head-only truncation keeps a prefix within the limit")
+
+
+def test_unknown_endpoint_not_trimmed():
+    text = _long_ocr(50)
+    assert fit_prompt("no_such_endpoint", _render, ocr_text=text) == _render(text)
+    print("[PASS] Endpoints without a budget render the full text")
+
+
+if __name__ == "__main__":
+    test_short_input_unchanged()
+    test_prompt_within_budget()
+    test_only_variable_section_trimmed()
+    test_head_only_keeps_start()
+    test_unknown_endpoint_not_trimmed()
+    print("\n*** ALL PROMPT BUDGET TESTS PASSED ***")
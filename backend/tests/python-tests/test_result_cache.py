@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""Test the per-user upload result cache and its near-duplicate matching"""
+
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+import cv2
+import numpy as np
+
+from app.core.result_cache import ResultCache, fingerprint
+
+DOSES = ["Tab Dolo 650 1-0-1", "Cap Amox 500 bd", "Syp Benadryl 5ml", "Tab Pan 40 od"]
+
+
+def _upload(lines, quality: int = 90, scale: float = 1.0) -> bytes:
+    page = np.full((1600, 1200, 3), 245, dtype=np.uint8)
+    cv2.rectangle(page, (40, 40), (1160, 200), (60, 60, 60), 4)
+    cv2.putText(page, "CITY HOSPITAL", (80, 150), cv2.FONT_HERSHEY_SIMPLEX, 3, (20, 20, 20), 6)
+    for row, line in enumerate(lines):
+        cv2.putText(page, line, (100, 350 + row * 90), cv2.FONT_HERSHEY_SCRIPT_SIMPLEX, 2, (30, 30, 30), 3)
+    if scale != 1.0:
+        page = cv2.resize(page, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return cv2.imencode(".jpg", page, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes()
+
+
+class _Pipeline:
+    def __init__(self):
+        self.runs = 0
+
+    def __call__(self, content: bytes) -> dict:
+        self.runs += 1
+        return {"status": "success", "run": self.runs}
+
+
+def test_repeat_and_reencoded_uploads_hit():
+    cache, pipeline = ResultCache(ttl=60, max_entries=8, max_distance=6, enabled=True), _Pipeline()
+    original = _upload(DOSES)
+
+    first = cache.cached("prescription", 7, original, pipeline, original)
+    first["user_id"] = 7  # callers may mutate what they get
+    again = cache.cached("prescription", 7, original, pipeline, original)
+    assert again == {"status": "success", "run": 1, "result_cache": "exact"}
+
+    resized = _upload(DOSES, quality=50, scale=0.6)
+    assert cache.cached("prescription", 7, resized, pipeline, resized)["result_cache"] == "near"
+    assert pipeline.runs == 1
+    print("[PASS] Same bytes and a resized, re-compressed copy are served from cache")
+
+
+def test_different_pages_and_users_miss():
+    cache, pipeline = ResultCache(ttl=60, max_entries=8, max_distance=6, enabled=True), _Pipeline()
+    original = _upload(DOSES)
+    cache.cached("prescription", 7, original, pipeline, original)
+
+    # Same letterhead and layout, one dose changed
+    changed = _upload(DOSES[:1] + ["Cap Amox 250 bd"] + DOSES[2:])
+    assert "result_cache" not in cache.cached("prescription", 7, changed, pipeline, changed)
+    # Another user, another namespace, anonymous
+    assert "result_cache" not in cache.cached("prescription", 8, original, pipeline, original)
+    assert "result_cache" not in cache.cached("hospital_report", 7, original, pipeline, original)
+    assert "result_cache" not in cache.cached("prescription", None, original, pipeline, original)
+    assert pipeline.runs == 5
+    print("[PASS] Changed dose, other users, other namespaces and anonymous uploads are not served")
+
+
+def test_bounds_and_failures():
+    cache = ResultCache(ttl=0.05, max_entries=2, max_distance=6, enabled=True)
+    uploads = [_upload([f"Tab Item {n} od"] * 3) for n in range(3)]
+    for n, content in enumerate(uploads):
+        cache.cached("prescription", 7, content, lambda: {"status": "success", "n": n})
+    assert len(cache) == 2
+    outcome, _ = cache.get("prescription", "7", fingerprint(uploads[0]))
+    assert outcome is None  # evicted as least recently used
+    time.sleep(0.06)
+    assert "result_cache" not in cache.cached("prescription", 7, uploads[2], lambda: {"status": "success"})
+
+    failing = _upload(["Unreadable"])
+    cache.cached("prescription", 7, failing, lambda: {"status": "error", "error": "OCR failed"})
+    assert cache.cached("prescription", 7, failing, lambda: {"status": "success"}) == {"status": "success"}
+    print("[PASS] Size bound evicts LRU entries, TTL expires them, failed results are not cached")
+
+
+if __name__ == "__main__":
+    test_repeat_and_reencoded_uploads_hit()
+    test_different_pages_and_users_miss()
+    test_bounds_and_failures()
+    print("\n*** ALL RESULT CACHE TESTS PASSED ***")
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""Test the compiled medicine safety rule engine"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from app.services.symptoms_recommendation import safety_rules
+from app.services.symptoms_recommendation.safety_engine import AhoCorasick, get_engine
+
+MEDS = [
+    {"name": "Amoxicillin"},
+    {"name": "Paracetamol"},
+    {"name": "Ibuprofen"},
+    {"name": "Cetirizine"},
+    {"name": "Augmentin 625"},
+]
+
+
+def names(meds):
+    return [m["name"] for m in meds]
+
+
+def test_automaton_matches_all_patterns():
+    """Overlapping patterns are all reported in one pass"""
+    ac = AhoCorasick([("he", ("p", "he")), ("she", ("p", "she")), ("hers", ("p", "hers"))])
+    found = {detail for _, detail in ac.iter_matches("USHERS")}
+    assert found == {"he", "she", "hers"}
+    print("[PASS] Aho-Corasick reports overlapping matches")
+
+
+def test_unsafe_classes_removed():
+    assert names(safety_rules.filter_medicines(MEDS, [], False, [])) == [
+        "Paracetamol", "Ibuprofen", "Cetirizine", "Augmentin 625"
+    ]
+    print("[PASS] Unsafe medicine classes filtered")
+
+
+def test_allergy_cross_reactivity():
+    result = safety_rules.filter_medicines(MEDS, ["Penicillin allergy"], False, [])
+    assert "Augmentin 625" not in names(result)
+    print("[PASS] Penicillin allergy removes amoxicillin-class brands")
+
+
+def test_pregnancy_and_conditions():
+    result = safety_rules.filter_medicines(MEDS, [], True, ["Chronic liver disease"])
+    assert names(result) == ["Cetirizine", "Augmentin 625"]
+    print("[PASS] Pregnancy and condition contraindications applied")
+
+
+def test_emergency_detection():
+    assert safety_rules.is_emergency(["Mild chest pain", "cough"])
+    assert not safety_rules.is_emergency(["cough", "runny nose"])
+    print("[PASS] Emergency symptoms detected")
+
+
+def test_matcher_cached_per_context():
+    engine = get_engine()
+    assert engine.matcher_for(["Sulfa"], False, []) is engine.matcher_for(["sulfa "], False, [])
+    print("[PASS] Compiled automata cached per allergy set")
+
+
+if __name__ == "__main__":
+    test_automaton_matches_all_patterns()
+    test_unsafe_classes_removed()
+    test_allergy_cross_reactivity()
+    test_pregnancy_and_conditions()
+    test_emergency_detection()
+    test_matcher_cached_per_context()
+    print("\n*** ALL SAFETY RULE TESTS PASSED ***")
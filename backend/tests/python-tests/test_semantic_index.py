@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""Test symptom retrieval: synthetic dataset indications stay out of the prompt"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from app.services.symptoms_recommendation import semantic_index
+from app.services.symptoms_recommendation.semantic_index import SemanticIndex, build_semantic_index
+
+
+def _fever_indication():
+    # What the synthetic dataset aggregates to: "fever" rows of mostly antibiotics
+    context = "- Dataset indication 'Fever': 812 listed medicines (e.g. Amoxiclav, Azithral)."
+    return [{"kind": "indication", "key": "Fever", "text": "Fever", "context": context}], None
+
+
+def _build(tmp: str) -> dict:
+    original = semantic_index._indication_documents
+    semantic_index._indication_documents = _fever_indication
+    try:
+        return build_semantic_index(os.path.join(tmp, "index.json"))
+    finally:
+        semantic_index._indication_documents = original
+
+
+def test_indications_excluded_by_default():
+    with tempfile.TemporaryDirectory() as tmp:
+        index = _build(tmp)
+    context = SemanticIndex(index).build_context(["fever"], top_k=3)
+    assert "Fever/Pyrexia" in context and "Dataset indication" not in context, context
+    print("[PASS] Knowledge base conditions retrieved, synthetic indications left out")
+
+
+def test_indications_down_weighted_when_enabled():
+    with tempfile.TemporaryDirectory() as tmp:
+        index = _build(tmp)
+    ranked = SemanticIndex(index, indication_weight=0.5).top_documents(["fever"], top_k=5)
+    kinds = [doc["kind"] for doc, _ in ranked]
+    assert "indication" in kinds and kinds[0] == "condition", kinds
+    print("[PASS] With a weight, indications rank below knowledge base conditions")
+
+
+if __name__ == "__main__":
+    test_indications_excluded_by_default()
+    test_indications_down_weighted_when_enabled()
+    print("\n*** ALL SEMANTIC INDEX TESTS PASSED ***")
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""Test single-flight coalescing of identical in-flight requests"""
+
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from app.core.single_flight import SingleFlight, request_key
+
+
+def run_concurrently(flight, key, fn, callers=5):
+    results, errors = [], []
+
+    def caller():
+        try:
+            results.append(flight.do(key, fn))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=caller) for _ in range(callers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+
+def test_identical_requests_share_one_run():
+    flight = SingleFlight(enabled=True)
+    runs = []
+
+    def work():
+        runs.append(1)
+        time.sleep(0.2)
+        return {"medicines": ["Paracetamol"]}
+
+    results, errors = run_concurrently(flight, request_key("symptoms", {"symptoms": ["fever"]}), work)
+    assert len(runs) == 1 and not errors
+    assert all(r == {"medicines": ["Paracetamol"]} for r in results)
+    # Each caller owns its copy
+    assert len({id(r) for r in results}) == len(results)
+    assert flight.stats()["symptoms"] == {"executed": 1, "coalesced": 4}
+    assert flight.in_flight() == 0
+    print("[PASS] Concurrent identical requests share one run")
+
+
+def test_errors_reach_every_waiter():
+    flight = SingleFlight(enabled=True)
+
+    def work():
+        time.sleep(0.1)
+        raise RuntimeError("Ollama error: 500")
+
+    results, errors = run_concurrently(flight, "medical_qa:1", work, callers=3)
+    assert not results and len(errors) == 3
+    print("[PASS] Failure propagated to coalesced callers")
+
+
+def test_key_ignores_field_order():
+    assert request_key("qa", {"a": 1, "b": 2}) == request_key("qa", {"b": 2, "a": 1})
+    assert request_key("qa", {"a": 1}) != request_key("symptoms", {"a": 1})
+    print("[PASS] Request keys are canonical and namespaced")
+
+
+if __name__ == "__main__":
+    test_identical_requests_share_one_run()
+    test_errors_reach_every_waiter()
+    test_key_ignores_field_order()
+    print("\n*** ALL SINGLE-FLIGHT TESTS PASSED ***")
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""Test incremental parsing and validation of structured LLM replies"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from app.services.structured_output import JSONStreamParser, StructuredOutputError, validate_output
+from app.services.medical_document_parser import HandwrittenPrescriptionOutput
+
+
+def test_stream_parser_finds_end_of_value():
+    reply = '{"predicted_condition": "Flu {viral}", "notes": "say \\"hi\\" ]"}'
+    parser = JSONStreamParser()
+    chunks = [reply[i:i + 5] for i in range(0, len(reply), 5)]
+    done = [parser.feed(chunk) for chunk in chunks + ["\n\n trailing"]]
+    assert done[-1] and not any(done[:len(chunks) - 1])
+    assert parser.value()["predicted_condition"] == "Flu {viral}"
+
+    truncated = JSONStreamParser()
+    truncated.feed(reply[:20])
+    try:
+        truncated.value()
+        raise AssertionError("incomplete reply accepted")
+    except StructuredOutputError:
+        pass
+    print("[PASS] Stream parser ends at the closing bracket and rejects truncated replies")
+
+
+def test_validate_output_fills_defaults():
+    parsed = validate_output(
+        {"patient_name": "A. Kumar", "medicines": [{"name": "Cetirizine", "strength": 10}], "x": 1},
+        HandwrittenPrescriptionOutput,
+    )
+    assert parsed["medicines"][0]["strength"] == "10" and parsed["doctor_name"] is None and "x" not in parsed
+    try:
+        validate_output({"medicines": [{"dosage": "1 tablet"}]}, HandwrittenPrescriptionOutput)
+        raise AssertionError("medicine without a name accepted")
+    except StructuredOutputError:
+        pass
+    print("[PASS] Replies are validated against the output model")
+
+
+if __name__ == "__main__":
+    test_stream_parser_finds_end_of_value()
+    test_validate_output_fills_defaults()
+    print("\n*** ALL STRUCTURED OUTPUT TESTS PASSED ***")
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""Test the in-process Tesseract engine pool (needs tesserocr or pytesseract)"""
+
+import sys
+import threading
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+import cv2
+import numpy as np
+import pytest
+
+from app.services import tesseract_pool
+
+needs_tesseract = pytest.mark.skipif(
+    not tesseract_pool.is_available(), reason="Tesseract not installed (tesserocr or pytesseract)"
+)
+
+
+def _text_image(text: str, channels: int = 3) -> np.ndarray:
+    image = np.full((80, 420, channels), 255, dtype=np.uint8)
+    cv2.putText(image, text, (10, 55), cv2.FONT_HERSHEY_SIMPLEX, 1.4, (0, 0, 0), 3)
+    return image
+
+
+@needs_tesseract
+def test_recognizes_color_and_gray_images():
+    color = _text_image("PARACETAMOL 500")
+    gray = cv2.cvtColor(color, cv2.COLOR_BGR2GRAY)
+    for image in (color, gray, _text_image("PARACETAMOL 500", channels=4)):
+        text, confidence = tesseract_pool.image_to_string_with_confidence(image, psm=7)
+        assert "PARACETAMOL" in text.upper(), text
+        assert confidence is None or 0 < confidence <= 1
+    print("[PASS] Color, grayscale and BGRA images are recognized")
+
+
+@needs_tesseract
+def test_one_engine_per_thread():
+    if not tesseract_pool.uses_pool():
+        print("[SKIP] tesserocr not installed, pytesseract fallback in use")
+        return
+    before = tesseract_pool.engine_count()
+    image = _text_image("AMOXICILLIN")
+
+    def work():
+        # Switching PSM reuses the thread's engine
+        for psm in (3, 6, 7, 11):
+            tesseract_pool.image_to_string(image, psm=psm)
+
+    threads = [threading.Thread(target=work) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert tesseract_pool.engine_count() - before == 3
+    print("[PASS] Each thread initializes its engine once")
+
+
+def test_text_rebuilt_from_word_boxes():
+    data = {
+        "text": ["", "", "", "Tab", "Dolo", "650", "", "1-0-1", "", "Cap"],
+        "block_num": [1, 1, 1, 1, 1, 1, 1, 1, 2, 2],
+        "par_num": [0, 1, 1, 1, 1, 1, 1, 1, 1, 1],
+        "line_num": [0, 0, 1, 1, 1, 1, 2, 2, 1, 1],
+    }
+    assert tesseract_pool._text_from_data(data) == "Tab Dolo 650\n1-0-1\n\nCap"
+    print("[PASS] pytesseract fallback text is rebuilt from one image_to_data run")
+
+
+if __name__ == "__main__":
+    test_text_rebuilt_from_word_boxes()
+    if not tesseract_pool.is_available():
+        print("[SKIP] Tesseract not installed (tesserocr or pytesseract)")
+        sys.exit(0)
+    test_recognizes_color_and_gray_images()
+    test_one_engine_per_thread()
+    print("\n*** ALL TESSERACT POOL TESTS PASSED ***")
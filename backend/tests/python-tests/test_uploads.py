@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""Test chunked upload ingestion: limits, format sniffing, memory vs spooled buffers"""
+
+import asyncio
+import hashlib
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+import cv2
+import numpy as np
+from fastapi import HTTPException
+
+from app.core import uploads
+from app.core.uploads import UploadLimitMiddleware, memory_budget, receive_upload, sniff_format
+
+
+class _File:
+    """Stands in for starlette's UploadFile: async chunked reads, size unknown"""
+
+    def __init__(self, content: bytes, filename: str = "rx.jpg"):
+        self.filename = filename
+        self.size = None
+        self._content = content
+        self._offset = 0
+        self.bytes_read = 0
+
+    async def read(self, size: int = -1) -> bytes:
+        end = len(self._content) if size < 0 else self._offset + size
+        chunk = self._content[self._offset:end]
+        self._offset += len(chunk)
+        self.bytes_read += len(chunk)
+        return chunk
+
+
+def _jpeg(width: int, height: int) -> bytes:
+    noise = np.random.default_rng(0).integers(0, 255, (height, width, 3), dtype=np.uint8)
+    return cv2.imencode(".jpg", noise, [cv2.IMWRITE_JPEG_QUALITY, 95])[1].tobytes()
+
+
+def _receive(content: bytes, **kwargs):
+    return asyncio.run(receive_upload(_File(content), **kwargs))
+
+
+def test_small_upload_in_memory():
+    content = _jpeg(200, 100)
+    upload = _receive(content)
+    assert upload.in_memory and upload.format == "jpeg" and upload.size == len(content)
+    assert upload.digest == hashlib.sha256(content).hexdigest()
+    assert upload.is_image() and upload.image().shape == (100, 200, 3)
+    path = upload.path
+    assert path.endswith(".jpg") and Path(path).read_bytes() == content
+    upload.close()
+    assert not os.path.exists(path) and memory_budget.used == 0
+    print("[PASS] Small upload kept in memory, hashed and sniffed while read")
+
+
+def test_large_upload_spooled():
+    content = _jpeg(1200, 900)
+    assert len(content) > uploads.MEMORY_LIMIT
+    upload = _receive(content)
+    assert not upload.in_memory and memory_budget.used == 0
+    # Decoded straight from the mapped spool file; the path is that same file
+    assert upload.image().shape == (900, 1200, 3)
+    assert Path(upload.path).stat().st_size == len(content)
+    path = upload.path
+    upload.close()
+    assert not os.path.exists(path)
+    print(f"[PASS] {len(content) // 1024} KB upload spooled to disk and decoded from an mmap")
+
+
+def test_rejected_early():
+    content = _jpeg(1200, 900)
+    source = _File(content)
+    try:
+        asyncio.run(receive_upload(source, max_size=len(content) // 2))
+        raise AssertionError("oversized upload accepted")
+    except HTTPException as e:
+        assert e.status_code == 413
+    assert source.bytes_read <= len(content) // 2 + uploads.CHUNK_SIZE
+
+    source = _File(b"MZ\x90\x00" + bytes(uploads.CHUNK_SIZE * 4))
+    try:
+        asyncio.run(receive_upload(source))
+        raise AssertionError("executable accepted")
+    except HTTPException as e:
+        assert e.status_code == 400
+    assert source.bytes_read == uploads.CHUNK_SIZE
+    assert memory_budget.used == 0
+
+    assert sniff_format(b"RIFF\x00\x00\x00\x00WEBPVP8 ") == "webp"
+    assert sniff_format(b"%PDF-1.7\n") == "pdf"
+    print("[PASS] Oversized and non-image uploads rejected without reading them whole")
+
+
+def test_budget_spools_when_full():
+    reserved = memory_budget.limit - 1000
+    assert memory_budget.reserve(reserved)
+    try:
+        upload = _receive(_jpeg(200, 100))
+        assert not upload.in_memory and upload.is_image()
+        upload.close()
+    finally:
+        memory_budget.release(reserved)
+    print("[PASS] Small uploads spool to disk once the process memory budget is used")
+
+
+async def _read_body(scope, receive, send):
+    """ASGI app standing in for the multipart parser: reads the whole body, then answers 200"""
+    scope["body_read"] = 0
+    while True:
+        message = await receive()
+        scope["body_read"] += len(message.get("body", b""))
+        if not message.get("more_body"):
+            break
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+def _post(body_chunks, content_type=b"multipart/form-data; boundary=x", declared=None):
+    """(status, bytes the app read) of a request through UploadLimitMiddleware(max_body=1000)"""
+    headers = [(b"content-type", content_type)]
+    if declared is not None:
+        headers.append((b"content-length", str(declared).encode()))
+    scope = {"type": "http", "method": "POST", "path": "/upload", "headers": headers}
+    messages = [
+        {"type": "http.request", "body": chunk, "more_body": i < len(body_chunks) - 1}
+        for i, chunk in enumerate(body_chunks)
+    ]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(UploadLimitMiddleware(_read_body, max_body=1000)(scope, receive, send))
+    return sent[0]["status"], scope.get("body_read", 0)
+
+
+def test_request_limit_before_parsing():
+    assert _post([b"x" * 500, b"x" * 400], declared=900) == (200, 900)
+
+    # Declared too large: rejected before the app reads anything
+    assert _post([b"x" * 2000], declared=2000) == (413, 0)
+
+    # Chunked, no declared size: cut off at the first chunk past the limit
+    status, _ = _post([b"x" * 600] * 10)
+    assert status == 413
+
+    # Only multipart bodies are limited
+    assert _post([b"x" * 2000], content_type=b"application/json", declared=2000) == (200, 2000)
+    print("[PASS] Oversized multipart requests get 413 before the body is parsed")
+
+
+if __name__ == "__main__":
+    test_small_upload_in_memory()
+    test_large_upload_spooled()
+    test_rejected_early()
+    test_budget_spools_when_full()
+    test_request_limit_before_parsing()
+    print("\n*** ALL UPLOAD TESTS PASSED ***")